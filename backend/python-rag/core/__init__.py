@@ -0,0 +1,8 @@
+"""Shared runtime infrastructure for the RAG backend."""
+
+from .config_store import ConfigStore, get_config_store
+
+__all__ = [
+    "ConfigStore",
+    "get_config_store",
+]
@@ -0,0 +1,337 @@
+"""Admission control and priority scheduling for generations sent to model runners.
+
+Each runner gets a concurrency limit, and each model on it an optional,
+lower one. A request that finds no free slot waits in a bounded per-runner
+queue instead of piling onto the runner, where every extra concurrent
+generation slows all the others down. Requests are shed with ``Overloaded``
+(served as 429 with ``Retry-After``) when:
+
+* the queue of their priority class is full,
+* the expected wait already exceeds the request's deadline, or
+* the request waited ``max_wait`` seconds, or until its deadline.
+
+Requests belong to a priority class. ``interactive`` traffic (UI queries)
+is always dispatched before ``batch`` traffic (test runs, evaluation
+batches), and ``reserved`` slots of every runner are kept for it, so batch
+work only fills the capacity interactive traffic leaves idle. A batch
+request that has waited ``aging`` seconds is promoted and competes as
+interactive, which bounds its starvation under sustained interactive load.
+Within a class, requests are served in arrival order. A waiter whose model
+is at its own limit does not block waiters for other models behind it.
+
+The expected wait is estimated from a moving average of how long a slot is
+held, the number of requests ahead and the slots the class may use.
+
+Limits are per process; with several uvicorn workers, each worker admits up
+to the limit.
+"""
+
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import asyncio
+import math
+import os
+import time
+
+RUNNER_MAX_CONCURRENCY = int(os.getenv("RUNNER_MAX_CONCURRENCY", "4"))
+# 0 means models are only bounded by the runner limit
+MODEL_MAX_CONCURRENCY = int(os.getenv("MODEL_MAX_CONCURRENCY", "0"))
+ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", "32"))
+ADMISSION_MAX_WAIT_SECONDS = float(os.getenv("ADMISSION_MAX_WAIT_SECONDS", "30"))
+# Slots per runner that batch traffic may not use
+INTERACTIVE_RESERVED_SLOTS = int(os.getenv("INTERACTIVE_RESERVED_SLOTS", "1"))
+# Seconds after which a waiting batch request competes as interactive
+ADMISSION_AGING_SECONDS = float(os.getenv("ADMISSION_AGING_SECONDS", "20"))
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+PRIORITY_CLASSES = (INTERACTIVE, BATCH)
+
+# Weight of the latest slot hold time in the moving average
+_SERVICE_ALPHA = 0.2
+_INITIAL_SERVICE_SECONDS = 5.0
+
+
+class Overloaded(Exception):
+    """A request was shed; retry after ``retry_after`` seconds."""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(f"Model runner overloaded: {reason}")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def _granted(future: asyncio.Future) -> bool:
+    return future.done() and not future.cancelled() and future.exception() is None
+
+
+class _Waiter:
+    __slots__ = ("model", "priority", "future", "enqueued", "deadline")
+
+    def __init__(self, model: str, priority: str, future: asyncio.Future, deadline: Optional[float]):
+        self.model = model
+        self.priority = priority
+        self.future = future
+        self.enqueued = time.monotonic()
+        self.deadline = deadline
+
+
+class AdmissionController:
+    """
+    Concurrency limits with bounded, prioritized wait queues per runner.
+
+    Deadlines are ``time.monotonic()`` values.
+
+    Args:
+        runner_limit: Concurrent generations per runner
+        model_limit: Concurrent generations per model on a runner (0: no extra limit)
+        queue_size: Waiting requests per runner and priority class before new ones are rejected
+        max_wait: Longest a request waits for a slot
+        limits: Per-runner overrides of ``runner_limit``
+        reserved: Slots per runner kept for interactive traffic (at most limit - 1)
+        aging: Seconds after which a waiting batch request is treated as interactive
+        on_queue_change: Called with (runner, priority, queued) whenever a queue grows or shrinks
+    """
+
+    def __init__(
+        self,
+        runner_limit: int = RUNNER_MAX_CONCURRENCY,
+        model_limit: int = MODEL_MAX_CONCURRENCY,
+        queue_size: int = ADMISSION_QUEUE_SIZE,
+        max_wait: float = ADMISSION_MAX_WAIT_SECONDS,
+        limits: Optional[Dict[str, int]] = None,
+        reserved: int = INTERACTIVE_RESERVED_SLOTS,
+        aging: float = ADMISSION_AGING_SECONDS,
+        on_queue_change: Optional[Callable[[str, str, int], None]] = None,
+    ):
+        self.runner_limit = runner_limit
+        self.model_limit = model_limit
+        self.queue_size = queue_size
+        self.max_wait = max_wait
+        self.limits = dict(limits or {})
+        self.reserved = reserved
+        self.aging = aging
+        self.on_queue_change = on_queue_change
+        self._active: Dict[str, int] = {}
+        self._active_models: Dict[Tuple[str, str], int] = {}
+        self._active_classes: Dict[Tuple[str, str], int] = {}
+        self._queues: Dict[str, List[_Waiter]] = {}
+        self._service: Dict[str, float] = {}
+        self.rejected: Dict[str, int] = {}
+        self.promoted = 0
+
+    def limit(self, runner: str) -> int:
+        return self.limits.get(runner, self.runner_limit)
+
+    def class_limit(self, runner: str, priority: str) -> int:
+        """Slots a priority class may occupy on a runner."""
+        limit = self.limit(runner)
+        if priority == INTERACTIVE:
+            return limit
+        return limit - min(self.reserved, limit - 1)
+
+    def _aged(self, waiter: _Waiter, now: float) -> bool:
+        return waiter.priority == BATCH and now - waiter.enqueued >= self.aging
+
+    def _effective(self, waiter: _Waiter, now: float) -> str:
+        return INTERACTIVE if self._aged(waiter, now) else waiter.priority
+
+    def _has_slot(self, runner: str, model: str, priority: str) -> bool:
+        if self._active.get(runner, 0) >= self.class_limit(runner, priority):
+            return False
+        return not self.model_limit or self._active_models.get((runner, model), 0) < self.model_limit
+
+    def _take(self, runner: str, model: str, priority: str) -> None:
+        self._active[runner] = self._active.get(runner, 0) + 1
+        self._active_models[(runner, model)] = self._active_models.get((runner, model), 0) + 1
+        self._active_classes[(runner, priority)] = self._active_classes.get((runner, priority), 0) + 1
+
+    def waiting(self, runner: str) -> int:
+        """Requests of any priority waiting for a slot on a runner."""
+        return len(self._queues.get(runner, ()))
+
+    def _queued(self, runner: str, priority: str) -> int:
+        return sum(1 for w in self._queues.get(runner, ()) if w.priority == priority)
+
+    def _notify(self, runner: str, priorities=PRIORITY_CLASSES) -> None:
+        if self.on_queue_change is not None:
+            for priority in priorities:
+                self.on_queue_change(runner, priority, self._queued(runner, priority))
+
+    def expected_wait(self, runner: str, ahead: int, priority: str = INTERACTIVE) -> float:
+        """Seconds until a request with ``ahead`` requests before it gets a slot."""
+        service = self._service.get(runner, _INITIAL_SERVICE_SECONDS)
+        return service * math.ceil((ahead + 1) / self.class_limit(runner, priority))
+
+    def _ahead(self, runner: str, priority: str) -> int:
+        """Waiters that will be served before a new request of this class."""
+        queue = self._queues.get(runner, ())
+        if priority == BATCH:
+            return len(queue)
+        now = time.monotonic()
+        return sum(1 for w in queue if self._effective(w, now) == INTERACTIVE)
+
+    def _reject(self, reason: str, retry_after: float) -> Overloaded:
+        self.rejected[reason] = self.rejected.get(reason, 0) + 1
+        return Overloaded(reason, max(1.0, retry_after))
+
+    async def acquire(
+        self,
+        runner: str,
+        model: str,
+        deadline: Optional[float] = None,
+        priority: str = INTERACTIVE,
+    ) -> float:
+        """
+        Wait for a slot.
+
+        Returns:
+            Seconds spent queued
+
+        Raises:
+            Overloaded: The request was shed
+            ValueError: Unknown priority class
+        """
+        if priority not in PRIORITY_CLASSES:
+            raise ValueError(f"Priority must be one of {list(PRIORITY_CLASSES)}")
+        queue = self._queues.setdefault(runner, [])
+        if not self._ahead(runner, priority) and self._has_slot(runner, model, priority):
+            self._take(runner, model, priority)
+            return 0.0
+
+        now = time.monotonic()
+        expected = self.expected_wait(runner, self._ahead(runner, priority), priority)
+        if self._queued(runner, priority) >= self.queue_size:
+            raise self._reject("queue_full", expected)
+        if deadline is not None and now + expected > deadline:
+            raise self._reject("deadline", expected)
+
+        waiter = _Waiter(model, priority, asyncio.get_running_loop().create_future(), deadline)
+        queue.append(waiter)
+        # A slot may be free for this request while earlier waiters wait on their model's limit
+        self._dispatch(runner)
+        if _granted(waiter.future):
+            return 0.0
+        self._notify(runner, (priority,))
+        timeout = self.max_wait if deadline is None else min(self.max_wait, deadline - now)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), timeout=max(timeout, 0.0))
+        except asyncio.TimeoutError:
+            if _granted(waiter.future):
+                # Granted at the same moment the wait timed out: keep the slot
+                return time.monotonic() - waiter.enqueued
+            self._discard(runner, waiter)
+            raise self._reject("timeout", self.expected_wait(runner, self._ahead(runner, priority), priority))
+        except asyncio.CancelledError:
+            if _granted(waiter.future):
+                self.release(runner, model, priority=priority)
+            else:
+                self._discard(runner, waiter)
+            raise
+        return time.monotonic() - waiter.enqueued
+
+    def _discard(self, runner: str, waiter: _Waiter) -> None:
+        queue = self._queues.get(runner)
+        if queue is not None and waiter in queue:
+            queue.remove(waiter)
+            self._notify(runner, (waiter.priority,))
+        if not waiter.future.done():
+            waiter.future.cancel()
+
+    def release(
+        self,
+        runner: str,
+        model: str,
+        held_seconds: Optional[float] = None,
+        priority: str = INTERACTIVE,
+    ) -> None:
+        """Free a slot and hand it to the waiters that can use it, highest priority first."""
+        self._active[runner] = max(self._active.get(runner, 0) - 1, 0)
+        key = (runner, model)
+        self._active_models[key] = max(self._active_models.get(key, 0) - 1, 0)
+        key = (runner, priority)
+        self._active_classes[key] = max(self._active_classes.get(key, 0) - 1, 0)
+        if held_seconds is not None:
+            previous = self._service.get(runner)
+            self._service[runner] = held_seconds if previous is None else (
+                _SERVICE_ALPHA * held_seconds + (1 - _SERVICE_ALPHA) * previous
+            )
+        self._dispatch(runner)
+
+    def _dispatch(self, runner: str) -> None:
+        queue = self._queues.get(runner)
+        if not queue:
+            return
+        now = time.monotonic()
+        changed = set()
+        # Interactive (and aged batch) first; arrival order within a class
+        order = sorted(queue, key=lambda w: (self._effective(w, now) != INTERACTIVE, w.enqueued))
+        for waiter in order:
+            if waiter.future.done():
+                queue.remove(waiter)
+                changed.add(waiter.priority)
+            elif waiter.deadline is not None and now >= waiter.deadline:
+                # Its caller could not use the answer any more; don't spend a slot on it
+                queue.remove(waiter)
+                waiter.future.set_exception(self._reject("deadline", self.expected_wait(runner, 0, waiter.priority)))
+                changed.add(waiter.priority)
+            elif self._has_slot(runner, waiter.model, self._effective(waiter, now)):
+                queue.remove(waiter)
+                if self._aged(waiter, now):
+                    self.promoted += 1
+                self._take(runner, waiter.model, waiter.priority)
+                waiter.future.set_result(None)
+                changed.add(waiter.priority)
+            elif self._active.get(runner, 0) >= self.limit(runner):
+                break
+        if changed:
+            self._notify(runner, tuple(p for p in PRIORITY_CLASSES if p in changed))
+
+    @asynccontextmanager
+    async def slot(
+        self,
+        runner: str,
+        model: str,
+        deadline: Optional[float] = None,
+        priority: str = INTERACTIVE,
+    ):
+        """Hold a slot for the body of the block; yields the seconds spent queued."""
+        queued = await self.acquire(runner, model, deadline, priority)
+        start = time.monotonic()
+        try:
+            yield queued
+        finally:
+            self.release(runner, model, time.monotonic() - start, priority)
+
+    def stats(self) -> Dict[str, Any]:
+        runners = set(self._active) | set(self._queues)
+        return {
+            "runners": {
+                runner: {
+                    "limit": self.limit(runner),
+                    "active": self._active.get(runner, 0),
+                    "queued": len(self._queues.get(runner, ())),
+                    "service_seconds": self._service.get(runner),
+                    "classes": {
+                        priority: {
+                            "limit": self.class_limit(runner, priority),
+                            "active": self._active_classes.get((runner, priority), 0),
+                            "queued": self._queued(runner, priority),
+                        }
+                        for priority in PRIORITY_CLASSES
+                    },
+                    "models": {
+                        model: active for (r, model), active in self._active_models.items()
+                        if r == runner and active
+                    },
+                }
+                for runner in sorted(runners)
+            },
+            "model_limit": self.model_limit or None,
+            "reserved_interactive_slots": self.reserved,
+            "aging_seconds": self.aging,
+            "queue_size": self.queue_size,
+            "max_wait_seconds": self.max_wait,
+            "promoted": self.promoted,
+            "rejected": dict(self.rejected),
+        }
@@ -0,0 +1,192 @@
+"""Response compression negotiated from ``Accept-Encoding``.
+
+``CompressionMiddleware`` is a plain ASGI middleware. It compresses JSON,
+NDJSON and text responses with zstd, when the ``zstandard`` package is
+installed and the client accepts it, or else with gzip. Complete bodies
+are only compressed once they reach ``COMPRESSION_MIN_BYTES``: below that,
+the headers cost more than they save. Streamed bodies are compressed chunk
+by chunk and flushed after each chunk, so NDJSON consumers still see rows
+as they are produced. Server-sent events and responses that already carry
+a ``Content-Encoding`` are passed through untouched.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+import os
+import zlib
+
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "4096"))
+GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+ZSTD_LEVEL = int(os.getenv("COMPRESSION_ZSTD_LEVEL", "3"))
+
+COMPRESSIBLE_TYPES = (
+    b"application/json",
+    b"application/x-ndjson",
+    b"application/openmetrics-text",
+    b"text/plain",
+    b"text/html",
+    b"text/csv",
+)
+
+_zstd = None
+_zstd_loaded = False
+
+
+def _get_zstd():
+    """Load zstandard once; None if it is not installed."""
+    global _zstd, _zstd_loaded
+    if not _zstd_loaded:
+        try:
+            import zstandard
+            _zstd = zstandard
+        except ImportError:
+            _zstd = None
+        _zstd_loaded = True
+    return _zstd
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """
+    Pick the response encoding from an ``Accept-Encoding`` header.
+
+    Returns:
+        "zstd", "gzip", or None for identity
+    """
+    if not accept_encoding:
+        return None
+    weights: Dict[str, float] = {}
+    for item in accept_encoding.lower().split(","):
+        name, _, params = item.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name.strip()] = q
+    wildcard = weights.get("*", 0.0)
+    candidates = [("zstd", 1)] if _get_zstd() is not None else []
+    candidates.append(("gzip", 0))
+    # Highest q wins; zstd breaks ties because it is faster at a similar ratio
+    best = max(
+        ((weights.get(name, wildcard), rank, name) for name, rank in candidates),
+        default=(0.0, 0, None)
+    )
+    return best[2] if best[0] > 0 else None
+
+
+class _Compressor:
+    """Streaming compressor with per-chunk flush."""
+
+    def __init__(self, encoding: str):
+        if encoding == "zstd":
+            zstd = _get_zstd()
+            self._obj = zstd.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+            self._flush_mode = zstd.COMPRESSOBJ_FLUSH_BLOCK
+        else:
+            self._obj = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+            self._flush_mode = zlib.Z_SYNC_FLUSH
+
+    def chunk(self, data: bytes) -> bytes:
+        return self._obj.compress(data) + self._obj.flush(self._flush_mode)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._obj.compress(data) + self._obj.flush()
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    """Compress a complete body."""
+    return _Compressor(encoding).finish(data)
+
+
+def _header(headers: List[Tuple[bytes, bytes]], name: bytes) -> Optional[bytes]:
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return None
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing eligible responses.
+
+    Args:
+        app: The wrapped ASGI application
+        minimum_size: Complete bodies below this many bytes are sent as-is
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        accept = _header(scope.get("headers") or [], b"accept-encoding")
+        encoding = negotiate_encoding(accept.decode("latin-1") if accept else None)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await self.app(scope, receive, _CompressingSender(send, encoding, self.minimum_size))
+
+
+class _CompressingSender:
+    """Wraps ``send`` for one response; decides on the first body message."""
+
+    def __init__(self, send, encoding: str, minimum_size: int):
+        self.send = send
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.start: Optional[Dict[str, Any]] = None
+        self.compressor: Optional[_Compressor] = None
+        self.passthrough = False
+
+    def _eligible(self, headers: List[Tuple[bytes, bytes]]) -> bool:
+        if _header(headers, b"content-encoding") is not None:
+            return False
+        content_type = (_header(headers, b"content-type") or b"").lower()
+        return content_type.startswith(COMPRESSIBLE_TYPES)
+
+    def _start_headers(self, length: Optional[int]) -> List[Tuple[bytes, bytes]]:
+        headers = [
+            (k, v) for k, v in self.start["headers"]
+            if k.lower() not in (b"content-length", b"vary")
+        ]
+        vary = _header(self.start["headers"], b"vary")
+        headers.append((b"vary", vary + b", Accept-Encoding" if vary else b"Accept-Encoding"))
+        headers.append((b"content-encoding", self.encoding.encode()))
+        if length is not None:
+            headers.append((b"content-length", str(length).encode()))
+        return headers
+
+    async def __call__(self, message):
+        if message["type"] == "http.response.start":
+            self.start = {**message, "headers": list(message.get("headers") or [])}
+            self.passthrough = not self._eligible(self.start["headers"])
+            if self.passthrough:
+                await self.send(message)
+            return
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.compressor is None:
+            if not more_body:
+                if len(body) < self.minimum_size:
+                    self.passthrough = True
+                    await self.send(self.start)
+                    await self.send(message)
+                    return
+                compressed = compress(body, self.encoding)
+                await self.send({**self.start, "headers": self._start_headers(len(compressed))})
+                await self.send({"type": "http.response.body", "body": compressed, "more_body": False})
+                return
+            # Streaming: length unknown until the end
+            self.compressor = _Compressor(self.encoding)
+            await self.send({**self.start, "headers": self._start_headers(None)})
+
+        data = self.compressor.chunk(body) if more_body else self.compressor.finish(body)
+        await self.send({"type": "http.response.body", "body": data, "more_body": more_body})
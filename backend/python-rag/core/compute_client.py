@@ -0,0 +1,244 @@
+"""Client for the Rust compute service.
+
+Arrays are sent to ``/compute/math`` as packed little-endian tensors
+(``application/x-penknife-tensor``) instead of JSON float lists, so the cost
+of a call is one memory copy per array rather than text encoding and parsing
+of every float. The layout matches ``src/tensor.rs`` in the Rust service:
+
+    b"PKT1", u32 count, then per tensor:
+    u8 dtype (1=f32, 2=f64, 3=u32), u8 ndim, u16 pad, u32 dims[ndim], data
+
+Calls reuse a pooled keep-alive session. Inputs below
+``COMPUTE_OFFLOAD_MIN_ELEMENTS`` are computed locally with numpy, where a
+round trip would cost more than it saves, and so is everything when the
+service is unreachable and ``COMPUTE_LOCAL_FALLBACK`` is on.
+"""
+
+from typing import Dict, List, Optional, Sequence, Tuple
+import logging
+import os
+import struct
+import threading
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+TENSOR_CONTENT_TYPE = "application/x-penknife-tensor"
+
+_MAGIC = b"PKT1"
+_HEADER = struct.Struct("<4sI")
+_TENSOR_HEADER = struct.Struct("<BBH")
+_DTYPES = {1: np.dtype("<f4"), 2: np.dtype("<f8"), 3: np.dtype("<u4")}
+_DTYPE_CODES = {dtype: code for code, dtype in _DTYPES.items()}
+
+
+def pack_tensors(arrays: Sequence[np.ndarray]) -> bytes:
+    """Encode arrays as a tensor payload; other dtypes are sent as float32."""
+    parts = [_HEADER.pack(_MAGIC, len(arrays))]
+    for array in arrays:
+        array = np.asarray(array)
+        dtype = array.dtype.newbyteorder("<")
+        if dtype not in _DTYPE_CODES:
+            dtype = _DTYPES[1]
+        # Not ascontiguousarray, which turns 0-d arrays into shape (1,)
+        array = np.asarray(array, dtype=dtype, order="C")
+        parts.append(_TENSOR_HEADER.pack(_DTYPE_CODES[dtype], array.ndim, 0))
+        parts.append(struct.pack(f"<{array.ndim}I", *array.shape))
+        parts.append(memoryview(array.reshape(-1).view(np.uint8)))
+    return b"".join(parts)
+
+
+def unpack_tensors(payload: bytes) -> List[np.ndarray]:
+    """
+    Decode a tensor payload into read-only arrays that share its buffer.
+
+    Raises:
+        ValueError: If the payload is truncated or malformed
+    """
+    try:
+        magic, count = _HEADER.unpack_from(payload, 0)
+        if magic != _MAGIC:
+            raise ValueError("Bad tensor payload magic")
+        offset = _HEADER.size
+        arrays = []
+        for _ in range(count):
+            code, ndim, _ = _TENSOR_HEADER.unpack_from(payload, offset)
+            offset += _TENSOR_HEADER.size
+            shape = struct.unpack_from(f"<{ndim}I", payload, offset)
+            offset += 4 * ndim
+            dtype = _DTYPES.get(code)
+            if dtype is None:
+                raise ValueError(f"Unknown tensor dtype: {code}")
+            size = int(np.prod(shape, dtype=np.int64))
+            if offset + size * dtype.itemsize > len(payload):
+                raise ValueError("Truncated tensor payload")
+            if size == 0:
+                arrays.append(np.empty(shape, dtype=dtype))
+                continue
+            arrays.append(np.frombuffer(payload, dtype=dtype, count=size, offset=offset).reshape(shape))
+            offset += size * dtype.itemsize
+    except struct.error:
+        raise ValueError("Truncated tensor payload") from None
+    return arrays
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+def _scores(queries: np.ndarray, documents: np.ndarray, metric: str) -> np.ndarray:
+    if metric == "cosine":
+        return _normalize(queries) @ _normalize(documents).T
+    return queries @ documents.T
+
+
+def _as_matrix(array) -> np.ndarray:
+    return np.atleast_2d(np.asarray(array, dtype=np.float32))
+
+
+class RustComputeClient:
+    """
+    Offloads batched vector math to the Rust compute service.
+
+    Args:
+        base_url: Service URL, e.g. ``http://rust-wasm-compute:8080``
+        timeout: Per-request timeout in seconds
+        min_elements: Inputs with fewer elements in total are computed locally
+        local_fallback: Compute locally if the service call fails
+        pool_size: Maximum pooled keep-alive connections
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        timeout: float = 30.0,
+        min_elements: int = 65536,
+        local_fallback: bool = True,
+        pool_size: int = 16,
+    ):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.min_elements = min_elements
+        self.local_fallback = local_fallback
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.stats = {"remote": 0, "local": 0, "failures": 0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, key: str) -> None:
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def call(self, operation: str, arrays: Sequence[np.ndarray], **params) -> List[np.ndarray]:
+        """
+        Run a tensor operation on the service.
+
+        Args:
+            operation: "similarity", "pairwise", "top_k", or an element-wise op
+            arrays: Input arrays
+            **params: Extra query parameters (``k``, ``metric``)
+
+        Returns:
+            Output arrays
+        """
+        query = {"operation": operation}
+        query.update({k: v for k, v in params.items() if v is not None})
+        response = self.session.post(
+            f"{self.base_url}/compute/math",
+            params=query,
+            data=pack_tensors(arrays),
+            headers={"Content-Type": TENSOR_CONTENT_TYPE, "Accept": TENSOR_CONTENT_TYPE},
+            timeout=self.timeout
+        )
+        if response.status_code != 200:
+            raise RuntimeError(f"Compute service returned {response.status_code}: {response.text[:200]}")
+        return unpack_tensors(response.content)
+
+    def _run(self, operation: str, arrays: Sequence[np.ndarray], local, **params) -> List[np.ndarray]:
+        if sum(a.size for a in arrays) < self.min_elements:
+            self._count("local")
+            return local()
+        try:
+            result = self.call(operation, arrays, **params)
+            self._count("remote")
+            return result
+        except Exception as e:
+            self._count("failures")
+            if not self.local_fallback:
+                raise
+            logger.warning(f"Compute offload of {operation} failed, computing locally: {e}")
+            self._count("local")
+            return local()
+
+    def similarity(self, queries, documents, metric: str = "cosine") -> np.ndarray:
+        """(m, n) similarity matrix of query rows against document rows."""
+        q, d = _as_matrix(queries), _as_matrix(documents)
+        return self._run("similarity", [q, d], lambda: [_scores(q, d, metric)], metric=metric)[0]
+
+    def pairwise(self, a, b, metric: str = "cosine") -> np.ndarray:
+        """Similarity of each row of ``a`` with the same row of ``b``."""
+        a, b = _as_matrix(a), _as_matrix(b)
+
+        def local():
+            if metric == "cosine":
+                return [np.einsum("ij,ij->i", _normalize(a), _normalize(b))]
+            return [np.einsum("ij,ij->i", a, b)]
+
+        return self._run("pairwise", [a, b], local, metric=metric)[0]
+
+    def top_k(self, queries, documents, k: int = 10, metric: str = "cosine") -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Best ``k`` documents for each query.
+
+        Returns:
+            Tuple of (indices, scores), both shaped (m, k), best first
+        """
+        q, d = _as_matrix(queries), _as_matrix(documents)
+        k = min(k, d.shape[0])
+
+        def local():
+            scores = _scores(q, d, metric)
+            if k == 0:
+                empty = np.empty((scores.shape[0], 0))
+                return [empty.astype(np.uint32), empty.astype(np.float32)]
+            if k < scores.shape[1]:
+                top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            else:
+                top = np.tile(np.arange(scores.shape[1]), (scores.shape[0], 1))
+            top_scores = np.take_along_axis(scores, top, axis=1)
+            order = np.argsort(-top_scores, axis=1, kind="stable")
+            return [
+                np.take_along_axis(top, order, axis=1).astype(np.uint32),
+                np.take_along_axis(top_scores, order, axis=1)
+            ]
+
+        indices, scores = self._run("top_k", [q, d], local, k=k, metric=metric)
+        return indices, scores
+
+
+_client: Optional[RustComputeClient] = None
+
+
+def get_compute_client() -> RustComputeClient:
+    """Get the process-wide client for ``RUST_COMPUTE_URL``, creating it on first use."""
+    global _client
+    if _client is None:
+        _client = RustComputeClient(
+            os.getenv("RUST_COMPUTE_URL", "http://rust-wasm-compute:8080"),
+            timeout=float(os.getenv("COMPUTE_TIMEOUT", "30")),
+            min_elements=int(os.getenv("COMPUTE_OFFLOAD_MIN_ELEMENTS", "65536")),
+            local_fallback=os.getenv("COMPUTE_LOCAL_FALLBACK", "true").lower() == "true",
+        )
+    return _client
+
+
+def compute_stats() -> Dict[str, int]:
+    """Remote/local/failure call counts of the process-wide client."""
+    return dict(_client.stats) if _client is not None else {"remote": 0, "local": 0, "failures": 0}
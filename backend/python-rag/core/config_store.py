@@ -0,0 +1,196 @@
+"""Shared, versioned configuration store.
+
+Configuration lives in a SQLite database so every uvicorn worker (and every
+replica sharing the volume) sees the same settings. Each update is a new row
+with a monotonically increasing version. The latest version number is also
+mirrored into a small memory-mapped file, so the hot path only compares an
+8-byte counter with the version of its cached snapshot; SQLite is read only
+when the counter moves.
+"""
+
+from typing import Any, Callable, Dict, List, Optional
+import json
+import logging
+import mmap
+import os
+import sqlite3
+import struct
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_VERSION = struct.Struct("<q")
+
+
+class ConfigStore:
+    """
+    Versioned key/value configuration shared between processes.
+
+    ``get()`` returns a cached snapshot that must be treated as read-only;
+    copy it before modifying. Callbacks registered with ``subscribe`` run in
+    whichever process notices a new version, from ``get()`` or ``poll()``.
+    """
+
+    def __init__(self, path: str, defaults: Dict[str, Any], history: int = 100):
+        self.path = path
+        self.history = history
+        self._lock = threading.Lock()
+        self._subscribers: List[Callable[[Dict[str, Any], int], None]] = []
+        self._snapshot: Dict[str, Any] = dict(defaults)
+        self._version = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS config_versions ("
+            "version INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "data TEXT NOT NULL, "
+            "updated_at REAL NOT NULL)"
+        )
+        self._counter = self._open_counter(path + ".version")
+
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT MAX(version) FROM config_versions").fetchone()
+                if row[0] is None:
+                    self._conn.execute(
+                        "INSERT INTO config_versions (data, updated_at) VALUES (?, ?)",
+                        (json.dumps(defaults), time.time())
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._reload()
+            self._publish()
+
+    @staticmethod
+    def _open_counter(path: str) -> mmap.mmap:
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size < _VERSION.size:
+                os.ftruncate(fd, _VERSION.size)
+            return mmap.mmap(fd, _VERSION.size)
+        finally:
+            os.close(fd)
+
+    def _publish(self) -> None:
+        """Mirror the latest committed version into the shared counter. Caller holds the lock."""
+        # The write lock orders concurrent publishers, so the last one to
+        # run always writes the newest version.
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            latest = self._conn.execute("SELECT MAX(version) FROM config_versions").fetchone()[0]
+            _VERSION.pack_into(self._counter, 0, latest or 0)
+        finally:
+            self._conn.execute("COMMIT")
+
+    def _reload(self) -> bool:
+        """Load the latest version from SQLite. Caller holds the lock."""
+        row = self._conn.execute(
+            "SELECT version, data FROM config_versions ORDER BY version DESC LIMIT 1"
+        ).fetchone()
+        if row is None or row[0] == self._version:
+            return False
+        self._snapshot = json.loads(row[1])
+        self._version = row[0]
+        return True
+
+    def _notify(self) -> None:
+        snapshot, version = self._snapshot, self._version
+        for callback in list(self._subscribers):
+            try:
+                callback(snapshot, version)
+            except Exception as e:
+                logger.error(f"Config subscriber failed: {e}")
+
+    @property
+    def version(self) -> int:
+        """Version of the cached snapshot."""
+        return self._version
+
+    def get(self) -> Dict[str, Any]:
+        """
+        Current configuration.
+
+        Lock-free unless another process has published a newer version.
+
+        Returns:
+            Read-only snapshot of the configuration
+        """
+        if _VERSION.unpack_from(self._counter, 0)[0] != self._version:
+            self.poll()
+        return self._snapshot
+
+    def poll(self) -> bool:
+        """
+        Reload if a newer version exists and notify subscribers.
+
+        Returns:
+            True if the configuration changed
+        """
+        with self._lock:
+            changed = self._reload()
+        if changed:
+            self._notify()
+        return changed
+
+    def update(self, config: Dict[str, Any]) -> int:
+        """
+        Store a new configuration version.
+
+        Args:
+            config: Complete JSON-serializable configuration
+
+        Returns:
+            The new version number
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO config_versions (data, updated_at) VALUES (?, ?)",
+                (json.dumps(config), time.time())
+            )
+            version = cursor.lastrowid
+            self._conn.execute(
+                "DELETE FROM config_versions WHERE version <= ?",
+                (version - self.history,)
+            )
+            self._reload()
+            self._publish()
+        self._notify()
+        return version
+
+    def history_entries(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Most recent configuration versions, newest first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT version, data, updated_at FROM config_versions ORDER BY version DESC LIMIT ?",
+                (limit,)
+            ).fetchall()
+        return [{"version": v, "config": json.loads(d), "updated_at": t} for v, d, t in rows]
+
+    def subscribe(self, callback: Callable[[Dict[str, Any], int], None]) -> None:
+        """Register a callback invoked with (config, version) after each change."""
+        self._subscribers.append(callback)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+            self._counter.close()
+
+
+_store: Optional[ConfigStore] = None
+
+
+def get_config_store(defaults: Optional[Dict[str, Any]] = None) -> ConfigStore:
+    """Get the process-wide store at ``CONFIG_STORE_PATH``, creating it on first use."""
+    global _store
+    if _store is None:
+        path = os.getenv("CONFIG_STORE_PATH", "/tmp/ai-penknife/config.db")
+        _store = ConfigStore(path, defaults or {})
+    return _store
@@ -0,0 +1,205 @@
+"""Cold/warm model start classification and a keep-warm scheduler.
+
+The Docker Model Runner unloads a model after it has been idle for a while,
+and the next request to it pays for loading the weights before its first
+token. Mixing those TTFTs with warm ones makes TTFT histograms and model
+comparisons meaningless, so every generation is classified:
+
+* With load timing (the runner reports prefill time in ``timings``), the
+  part of TTFT not spent on prefill is loading and connection overhead; a
+  request is cold when that overhead is at least ``load_seconds``.
+* Otherwise it is compared with the model's warm TTFT baseline (a moving
+  average over warm requests): cold when TTFT is both ``ttft_factor`` times
+  the baseline and ``load_seconds`` above it.
+* Before a baseline exists, a TTFT of at least ``load_seconds`` after the
+  model has been idle for ``idle_unload`` seconds (or never used by this
+  worker) counts as cold.
+
+``KeepWarmScheduler`` sends a one-token request to each selected model that
+has had no traffic for the configured interval, so it stays loaded. Pings
+are classified too (a cold ping means the model had been unloaded) but do
+not feed the baseline, since their prompts are much shorter than real ones.
+Each worker tracks its own traffic, so with several workers a model may be
+pinged once per worker.
+"""
+
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import asyncio
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+COLD = "cold"
+WARM = "warm"
+
+# Idle time after which the runner unloads a model (Docker Model Runner: 5 minutes)
+MODEL_IDLE_UNLOAD_SECONDS = float(os.getenv("MODEL_IDLE_UNLOAD_SECONDS", "300"))
+# Unexplained TTFT that indicates a model load
+COLD_START_MIN_SECONDS = float(os.getenv("COLD_START_MIN_SECONDS", "1.0"))
+COLD_START_TTFT_FACTOR = float(os.getenv("COLD_START_TTFT_FACTOR", "3.0"))
+KEEPWARM_TICK_SECONDS = float(os.getenv("KEEPWARM_TICK_SECONDS", "5"))
+
+_BASELINE_ALPHA = 0.2
+
+
+class StartClassifier:
+    """
+    Classifies generations as cold or warm starts and tracks when each model was last used.
+
+    Args:
+        idle_unload: Seconds of idleness after which the runner unloads a model
+        load_seconds: Extra TTFT that indicates a model load
+        ttft_factor: Multiple of the warm baseline TTFT that indicates a model load
+    """
+
+    def __init__(
+        self,
+        idle_unload: float = MODEL_IDLE_UNLOAD_SECONDS,
+        load_seconds: float = COLD_START_MIN_SECONDS,
+        ttft_factor: float = COLD_START_TTFT_FACTOR,
+    ):
+        self.idle_unload = idle_unload
+        self.load_seconds = load_seconds
+        self.ttft_factor = ttft_factor
+        self._last_used: Dict[str, float] = {}
+        self._baseline: Dict[str, float] = {}
+        self._counts: Dict[str, Dict[str, int]] = {}
+
+    def idle_seconds(self, model: str, now: Optional[float] = None) -> Optional[float]:
+        """Seconds since the model last finished a request in this worker; None if never."""
+        last = self._last_used.get(model)
+        if last is None:
+            return None
+        return (time.monotonic() if now is None else now) - last
+
+    def touch(self, model: str, now: Optional[float] = None) -> None:
+        """Record use of a model by a request that has no TTFT to classify."""
+        self._last_used[model] = time.monotonic() if now is None else now
+
+    def classify(
+        self,
+        model: str,
+        ttft: Optional[float],
+        prefill_seconds: Optional[float] = None,
+        update_baseline: bool = True,
+        now: Optional[float] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Classify one generation and record the model as used.
+
+        Args:
+            model: Model name
+            ttft: Time to first token in seconds; None records use only
+            prefill_seconds: Prefill time reported by the runner, if any
+            update_baseline: Whether a warm TTFT should update the model's baseline
+            now: ``time.monotonic()`` of the request's completion (for tests)
+
+        Returns:
+            Dictionary with state (cold/warm), reason, idle seconds and the
+            baseline used, or None without a TTFT
+        """
+        now = time.monotonic() if now is None else now
+        idle = self.idle_seconds(model, now)
+        self.touch(model, now)
+        if ttft is None:
+            return None
+
+        baseline = self._baseline.get(model)
+        if prefill_seconds is not None:
+            cold = ttft - prefill_seconds >= self.load_seconds
+            reason = "load_timing"
+        elif baseline is not None:
+            cold = ttft >= max(baseline * self.ttft_factor, baseline + self.load_seconds)
+            reason = "ttft_baseline"
+        else:
+            cold = ttft >= self.load_seconds and (idle is None or idle >= self.idle_unload)
+            reason = "idle"
+
+        state = COLD if cold else WARM
+        if not cold and update_baseline:
+            self._baseline[model] = ttft if baseline is None else baseline + _BASELINE_ALPHA * (ttft - baseline)
+        counts = self._counts.setdefault(model, {COLD: 0, WARM: 0})
+        counts[state] += 1
+        return {"state": state, "reason": reason, "idle_seconds": idle, "baseline_ttft": baseline}
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        now = time.monotonic()
+        return {
+            model: {
+                "idle_seconds": now - last,
+                "baseline_ttft": self._baseline.get(model),
+                **self._counts.get(model, {COLD: 0, WARM: 0}),
+            }
+            for model, last in self._last_used.items()
+        }
+
+
+class KeepWarmScheduler:
+    """
+    Pings selected models that have been idle for the configured interval.
+
+    Args:
+        classifier: Shared with the query path, so real traffic postpones pings
+        ping: Sends a minimal generation to a model; returns (ttft, prefill_seconds)
+        settings: Returns the models to keep warm and the interval in seconds
+        busy: Returns True while pings should wait (e.g. user requests queued)
+        on_ping: Called with (model, status, classification) per ping;
+            status is cold, warm, skipped or error
+        tick: Seconds between checks
+    """
+
+    def __init__(
+        self,
+        classifier: StartClassifier,
+        ping: Callable[[str], Awaitable[Tuple[Optional[float], Optional[float]]]],
+        settings: Callable[[], Tuple[List[str], float]],
+        busy: Optional[Callable[[], bool]] = None,
+        on_ping: Optional[Callable[[str, str, Optional[Dict[str, Any]]], None]] = None,
+        tick: float = KEEPWARM_TICK_SECONDS,
+    ):
+        self.classifier = classifier
+        self.ping = ping
+        self.settings = settings
+        self.busy = busy
+        self.on_ping = on_ping
+        self.tick = tick
+        self.last_ping: Dict[str, Dict[str, Any]] = {}
+
+    def _record(self, model: str, status: str, classification: Optional[Dict[str, Any]] = None,
+                error: Optional[str] = None) -> None:
+        self.last_ping[model] = {"status": status, "at": time.time(), "error": error, "start": classification}
+        if self.on_ping is not None:
+            self.on_ping(model, status, classification)
+
+    async def run_once(self) -> None:
+        """Ping every selected model that has been idle for at least the interval."""
+        models, interval = self.settings()
+        if interval <= 0:
+            return
+        for model in models:
+            idle = self.classifier.idle_seconds(model)
+            if idle is not None and idle < interval:
+                continue
+            if self.busy is not None and self.busy():
+                self._record(model, "skipped")
+                continue
+            try:
+                ttft, prefill_seconds = await self.ping(model)
+            except Exception as e:
+                logger.warning(f"Keep-warm ping to {model} failed: {e}")
+                # Try again next interval rather than on every tick
+                self.classifier.touch(model)
+                self._record(model, "error", error=str(e)[:200])
+                continue
+            classification = self.classifier.classify(model, ttft, prefill_seconds, update_baseline=False)
+            self._record(model, classification["state"] if classification else WARM, classification)
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"Keep-warm scheduler error: {e}")
+            await asyncio.sleep(self.tick)
@@ -0,0 +1,132 @@
+"""Prompt templates ordered for KV-cache reuse.
+
+llama.cpp-based runners keep the KV cache of the previous prompt in a slot
+and only prefill the tokens after the longest common prefix. Prompts are
+therefore built from the least to the most volatile part:
+
+1. system text and answering instructions (identical for every request)
+2. retrieved passages, in a canonical order (source, then position in the
+   source) rather than by score, so requests that retrieve the same or an
+   overlapping set of passages share the longest possible prefix
+3. the question
+
+The runner is asked to keep the prompt in its cache (``cache_prompt``), and
+``parse_cache_usage`` reads back how many prompt tokens it served from the
+cache and how long prefill took, from llama.cpp ``timings`` or OpenAI-style
+``usage.prompt_tokens_details``.
+"""
+
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence
+import json
+import os
+
+DEFAULT_SYSTEM_PROMPT = (
+    "You are a helpful assistant. Answer questions accurately and concisely."
+)
+DEFAULT_INSTRUCTIONS = (
+    "Use the numbered context passages when they are relevant to the question. "
+    "If the context does not contain the answer, say so instead of guessing."
+)
+
+PROMPT_SYSTEM = os.getenv("PROMPT_SYSTEM", DEFAULT_SYSTEM_PROMPT)
+PROMPT_CACHE_ENABLED = os.getenv("PROMPT_CACHE_ENABLED", "true").lower() == "true"
+
+
+class PromptCacheUsage(NamedTuple):
+    """Prompt-cache accounting reported by the runner for one request."""
+    prompt_tokens: int
+    cached_tokens: int
+    prefill_seconds: Optional[float]
+
+    @property
+    def cached_share(self) -> float:
+        return self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+
+
+def passage_text(payload: Dict[str, Any]) -> str:
+    """Text of a retrieved point: its ``text`` field, else the payload as canonical JSON."""
+    text = payload.get("text")
+    if isinstance(text, str):
+        return text.strip()
+    return json.dumps(payload, sort_keys=True, ensure_ascii=False)
+
+
+def canonical_passages(payloads: Sequence[Dict[str, Any]]) -> List[str]:
+    """Distinct passage texts in a score-independent order: by source, then position."""
+    def key(payload):
+        return (str(payload.get("source", "")), payload.get("unit", 0), payload.get("chunk_index", 0), passage_text(payload))
+
+    passages = []
+    seen = set()
+    for payload in sorted(payloads, key=key):
+        text = passage_text(payload)
+        if text and text not in seen:
+            seen.add(text)
+            passages.append(text)
+    return passages
+
+
+class PromptTemplate:
+    """
+    Builds chat messages or a flat prompt with a stable prefix.
+
+    Args:
+        system: System prompt, identical across requests
+        instructions: How to use the context, identical across requests
+    """
+
+    def __init__(self, system: str = PROMPT_SYSTEM, instructions: str = DEFAULT_INSTRUCTIONS):
+        self.system = system
+        self.instructions = instructions
+
+    def _system_text(self, with_context: bool) -> str:
+        return f"{self.system}\n\n{self.instructions}" if with_context else self.system
+
+    @staticmethod
+    def _context_text(passages: Sequence[str]) -> str:
+        return "\n\n".join(f"[{i}] {p}" for i, p in enumerate(passages, 1))
+
+    def messages(self, question: str, passages: Sequence[str] = ()) -> List[Dict[str, str]]:
+        """Chat messages: system, then a user turn with the context before the question."""
+        if passages:
+            user = f"Context:\n{self._context_text(passages)}\n\nQuestion: {question.strip()}"
+        else:
+            user = question.strip()
+        return [
+            {"role": "system", "content": self._system_text(bool(passages))},
+            {"role": "user", "content": user},
+        ]
+
+    def text(self, question: str, passages: Sequence[str] = ()) -> str:
+        """The same prompt as one string, for completion-style runners."""
+        parts = [self._system_text(bool(passages))]
+        if passages:
+            parts.append(f"Context:\n{self._context_text(passages)}")
+        parts.append(f"Question: {question.strip()}\n\nAnswer:")
+        return "\n\n".join(parts)
+
+
+def cache_options() -> Dict[str, Any]:
+    """Request fields that ask a llama.cpp runner to reuse the cached prompt prefix."""
+    return {"cache_prompt": True} if PROMPT_CACHE_ENABLED else {}
+
+
+def parse_cache_usage(data: Dict[str, Any]) -> Optional[PromptCacheUsage]:
+    """
+    Read prompt-cache accounting from a completion response or final stream chunk.
+
+    Returns:
+        Usage, or None when the runner reported neither ``timings`` nor cached tokens
+    """
+    timings = data.get("timings") or {}
+    usage = data.get("usage") or {}
+    if "cache_n" in timings:
+        # llama.cpp: prompt_n counts only the tokens that had to be prefilled
+        cached = int(timings["cache_n"])
+        prompt_tokens = cached + int(timings.get("prompt_n", 0))
+        prefill_ms = timings.get("prompt_ms")
+        return PromptCacheUsage(prompt_tokens, cached, prefill_ms / 1000 if prefill_ms is not None else None)
+    details = usage.get("prompt_tokens_details") or {}
+    if "cached_tokens" in details:
+        return PromptCacheUsage(int(usage.get("prompt_tokens", 0)), int(details["cached_tokens"] or 0), None)
+    return None
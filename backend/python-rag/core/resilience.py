@@ -0,0 +1,283 @@
+"""Deadlines, retries and circuit breakers for calls to dependencies.
+
+A ``Deadline`` is created once per request and passed down to every call
+it makes (vector search, generation). Each call takes its timeout from the
+remaining budget rather than a fixed constant, so a slow first stage leaves
+less time for the next one instead of stacking timeouts.
+
+``call_with_retries`` retries only errors that are likely to succeed on a
+second attempt (connection errors, timeouts, 429/502/503/504) and only while
+the backoff still fits in the remaining budget.
+
+A ``CircuitBreaker`` per dependency counts consecutive failures. After
+``failure_threshold`` of them it opens and rejects calls immediately with
+``CircuitOpen`` for ``reset_seconds``. It then lets one probe call through
+(half-open) and closes again if that call succeeds. Errors the dependency is
+not to blame for (a 400 for a bad request) do not count as failures; errors
+that are neither a known dependency failure nor a client error are not
+judged either way.
+"""
+
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional
+import logging
+import os
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", "30"))
+RETRY_ATTEMPTS = int(os.getenv("RETRY_ATTEMPTS", "2"))
+RETRY_BACKOFF_SECONDS = float(os.getenv("RETRY_BACKOFF_SECONDS", "0.25"))
+
+RETRIABLE_STATUSES = {429, 502, 503, 504}
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+# Gauge values for Prometheus
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class DeadlineExceeded(Exception):
+    """The request's time budget ran out."""
+
+
+class CircuitOpen(Exception):
+    """A dependency's circuit breaker is rejecting calls."""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} is unavailable (circuit open)")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class DependencyError(Exception):
+    """The dependency failed (e.g. a 500); counts against its breaker but is not retried."""
+
+    def __init__(self, status_code: int, message: Optional[str] = None):
+        super().__init__(message or f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+class RetriableStatus(DependencyError):
+    """A response status worth retrying (429/502/503/504)."""
+
+
+class Deadline:
+    """
+    Absolute point in ``time.monotonic()`` time by which a request must finish.
+
+    Args:
+        seconds: Budget from now; None for no deadline
+    """
+
+    def __init__(self, seconds: Optional[float] = None):
+        self.at = time.monotonic() + seconds if seconds is not None else None
+
+    def remaining(self) -> Optional[float]:
+        return self.at - time.monotonic() if self.at is not None else None
+
+    @property
+    def expired(self) -> bool:
+        remaining = self.remaining()
+        return remaining is not None and remaining <= 0
+
+    def timeout(self, cap: float) -> float:
+        """
+        Timeout for the next call: the remaining budget, at most ``cap``.
+
+        Raises:
+            DeadlineExceeded: No budget is left
+        """
+        remaining = self.remaining()
+        if remaining is None:
+            return cap
+        if remaining <= 0:
+            raise DeadlineExceeded("Request deadline exceeded")
+        return min(cap, remaining)
+
+    def bounded(self, items: Iterable[Any]) -> Iterator[Any]:
+        """Iterate, raising DeadlineExceeded once the budget is gone (e.g. over a token stream)."""
+        for item in items:
+            if self.expired:
+                raise DeadlineExceeded("Request deadline exceeded while streaming")
+            yield item
+
+
+def is_retriable(error: BaseException) -> bool:
+    """Connection failures, timeouts and overload statuses; not client errors."""
+    if isinstance(error, RetriableStatus):
+        return True
+    import requests
+    return isinstance(error, (requests.ConnectionError, requests.Timeout))
+
+
+def is_dependency_failure(error: BaseException) -> bool:
+    """Server-side failures raised as DependencyError; they count against the breaker."""
+    return isinstance(error, DependencyError)
+
+
+def is_client_error(error: BaseException) -> bool:
+    """4xx responses (other than overload): the request was at fault, not the dependency."""
+    status = getattr(error, "status_code", None)
+    return isinstance(status, int) and 400 <= status < 500 and status not in RETRIABLE_STATUSES
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker; thread-safe.
+
+    Args:
+        name: Dependency name, used in errors and metrics
+        failure_threshold: Consecutive failures that open the circuit
+        reset_seconds: How long the circuit stays open before a probe call
+        on_state_change: Called with (name, state) on every transition
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+        reset_seconds: float = BREAKER_RESET_SECONDS,
+        on_state_change: Optional[Callable[[str, str], None]] = None,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.on_state_change = on_state_change
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self.rejected = 0
+        self.last_error: Optional[str] = None
+
+    def _transition(self, state: str) -> None:
+        if state == self._state:
+            return
+        logger.warning(f"Circuit breaker {self.name}: {self._state} -> {state}")
+        self._state = state
+        if self.on_state_change is not None:
+            self.on_state_change(self.name, state)
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_seconds:
+                return HALF_OPEN
+            return self._state
+
+    def before_call(self) -> None:
+        """
+        Admit a call or reject it.
+
+        Raises:
+            CircuitOpen: The circuit is open, or half-open with its probe in flight
+        """
+        with self._lock:
+            if self._state == CLOSED:
+                return
+            waited = time.monotonic() - self._opened_at
+            if self._state == OPEN and waited >= self.reset_seconds:
+                self._transition(HALF_OPEN)
+            if self._state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return
+            self.rejected += 1
+            raise CircuitOpen(self.name, max(self.reset_seconds - waited, 1.0))
+
+    def release_probe(self) -> None:
+        """Give back an admitted call that never reached the dependency, without judging it."""
+        with self._lock:
+            self._probing = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._probing = False
+            self._transition(CLOSED)
+
+    def record_failure(self, error: Optional[BaseException] = None) -> None:
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if error is not None:
+                self.last_error = str(error)[:200]
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+                self._transition(OPEN)
+
+    def snapshot(self) -> Dict[str, Any]:
+        state = self.state
+        with self._lock:
+            return {
+                "state": state,
+                "consecutive_failures": self._failures,
+                "rejected": self.rejected,
+                "last_error": self.last_error,
+            }
+
+
+def call_with_retries(
+    fn: Callable[[float], Any],
+    breaker: CircuitBreaker,
+    deadline: Deadline,
+    timeout_cap: float,
+    attempts: int = RETRY_ATTEMPTS,
+    backoff: float = RETRY_BACKOFF_SECONDS,
+    retriable: Callable[[BaseException], bool] = is_retriable,
+    failure: Callable[[BaseException], bool] = is_dependency_failure,
+) -> Any:
+    """
+    Call ``fn(timeout)`` through a breaker, retrying retriable errors within the deadline.
+
+    ``fn`` should raise ``RetriableStatus`` for overload responses and
+    ``DependencyError`` for other server-side failures.
+
+    Args:
+        fn: Makes one attempt with the given timeout in seconds
+        breaker: Breaker of the dependency being called
+        deadline: Budget of the request the call belongs to
+        timeout_cap: Longest timeout for a single attempt
+        attempts: Attempts in total, including the first
+        backoff: Base delay before a retry, doubled per attempt and jittered
+        retriable: Classifies errors worth retrying (default: connection errors, timeouts, overload)
+        failure: Classifies other errors that are the dependency's fault (default: DependencyError)
+
+    Raises:
+        CircuitOpen: The breaker rejected the call
+        DeadlineExceeded: The budget ran out before or between attempts
+    """
+    for attempt in range(attempts):
+        breaker.before_call()
+        try:
+            timeout = deadline.timeout(timeout_cap)
+        except DeadlineExceeded:
+            breaker.release_probe()
+            raise
+        try:
+            result = fn(timeout)
+        except Exception as e:
+            if not retriable(e):
+                if failure(e):
+                    breaker.record_failure(e)
+                elif is_client_error(e):
+                    # The dependency answered; the request itself was at fault
+                    breaker.record_success()
+                else:
+                    breaker.release_probe()
+                raise
+            breaker.record_failure(e)
+            delay = backoff * (2 ** attempt) * (0.5 + random.random() / 2)
+            remaining = deadline.remaining()
+            if attempt == attempts - 1 or (remaining is not None and remaining <= delay):
+                raise
+            logger.info(f"Retrying {breaker.name} after {e} (attempt {attempt + 1}/{attempts})")
+            time.sleep(delay)
+        else:
+            breaker.record_success()
+            return result
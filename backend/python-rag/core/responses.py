@@ -0,0 +1,158 @@
+"""Response classes and bulk result formats.
+
+``FastJSONResponse`` renders compact JSON with orjson when it is installed
+(the standard library otherwise) and handles numpy scalars and arrays.
+Returning it directly from an endpoint also skips FastAPI's
+``jsonable_encoder`` walk over the result, which dominates for large nested
+results.
+
+``bulk_response`` serves a list of result rows in the format the client
+asked for, via ``?format=`` or the ``Accept`` header:
+
+* ``json``: one document with the rows under ``results`` (default)
+* ``ndjson``: one row per line, streamed as rows are encoded
+* ``arrow``: an Arrow IPC stream with nested fields flattened to dotted
+  columns, for dataframes (needs pyarrow)
+
+Response-level fields that are not rows (totals, ids) go in the JSON
+document, in an ``X-Result-Meta`` header for NDJSON, and in the schema
+metadata for Arrow.
+"""
+
+from typing import Any, Dict, Iterator, List, Optional
+import json
+
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+BULK_FORMATS = {"json": "application/json", "ndjson": NDJSON_MEDIA_TYPE, "arrow": ARROW_MEDIA_TYPE}
+
+
+def _default(value: Any) -> Any:
+    """Fallback for types neither encoder handles natively."""
+    if hasattr(value, "tolist"):
+        # numpy arrays and scalars
+        return value.tolist()
+    if hasattr(value, "dict"):
+        return value.dict()
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    return str(value)
+
+
+def dumps(content: Any) -> bytes:
+    """Compact JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(
+            content,
+            default=_default,
+            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        )
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson (or compact stdlib JSON)."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def negotiate_format(requested: Optional[str], accept: Optional[str]) -> str:
+    """
+    Bulk format from an explicit ``format`` parameter or the Accept header.
+
+    Raises:
+        ValueError: Unknown format, or Arrow without pyarrow installed
+    """
+    fmt = (requested or "").lower()
+    if not fmt:
+        accept = (accept or "").lower()
+        fmt = next((name for name, media in BULK_FORMATS.items() if name != "json" and media in accept), "json")
+    if fmt not in BULK_FORMATS:
+        raise ValueError(f"Unknown format {fmt!r}; use one of {sorted(BULK_FORMATS)}")
+    if fmt == "arrow":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ValueError("Arrow responses need pyarrow installed")
+    return fmt
+
+
+def flatten(row: Dict[str, Any], prefix: str = "") -> Dict[str, Any]:
+    """Nested dicts to dotted keys; lists and scalars are kept as values."""
+    flat: Dict[str, Any] = {}
+    for key, value in row.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict) and value:
+            flat.update(flatten(value, f"{name}."))
+        else:
+            flat[name] = value
+    return flat
+
+
+def _column_kind(value: Any) -> str:
+    if isinstance(value, bool):
+        return "bool"
+    if isinstance(value, (int, float)):
+        return "number"
+    return type(value).__name__
+
+
+def to_columns(rows: List[Dict[str, Any]]) -> Dict[str, List[Any]]:
+    """
+    Flattened rows as columns, missing fields as None.
+
+    Columns whose values mix types (a score that is sometimes an error
+    string) are JSON-encoded, so every column has one Arrow type.
+    """
+    flat = [flatten(row) for row in rows]
+    names: Dict[str, None] = {}
+    for row in flat:
+        names.update(dict.fromkeys(row))
+    columns = {}
+    for name in names:
+        values = [row.get(name) for row in flat]
+        kinds = {_column_kind(v) for v in values if v is not None}
+        if len(kinds) > 1 or kinds & {"list", "dict"}:
+            values = [dumps(v).decode("utf-8") if v is not None else None for v in values]
+        columns[name] = values
+    return columns
+
+
+def _ndjson_lines(rows: List[Dict[str, Any]]) -> Iterator[bytes]:
+    for row in rows:
+        yield dumps(row) + b"\n"
+
+
+def bulk_response(rows: List[Dict[str, Any]], fmt: str, meta: Optional[Dict[str, Any]] = None) -> Response:
+    """
+    Serve result rows in a negotiated format (see ``negotiate_format``).
+
+    Args:
+        rows: One dictionary per result
+        fmt: "json", "ndjson" or "arrow"
+        meta: Response-level fields
+    """
+    meta = meta or {}
+    if fmt == "ndjson":
+        return StreamingResponse(
+            _ndjson_lines(rows),
+            media_type=NDJSON_MEDIA_TYPE,
+            headers={"X-Result-Meta": dumps(meta).decode("utf-8")}
+        )
+    if fmt == "arrow":
+        import pyarrow as pa
+
+        table = pa.table(to_columns(rows)).replace_schema_metadata({"meta": dumps(meta)})
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return Response(content=sink.getvalue().to_pybytes(), media_type=ARROW_MEDIA_TYPE)
+    return FastJSONResponse({**meta, "results": rows})
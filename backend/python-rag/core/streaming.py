@@ -0,0 +1,154 @@
+"""Decoder for OpenAI-compatible server-sent event (SSE) streams.
+
+``StreamDecoder`` is fed the lines of a streaming chat completion. It
+collects content deltas in a list that is joined once, parses payloads
+with orjson when installed (falling back to the standard library), stops at
+``data: [DONE]``, and raises ``StreamError`` when the runner sends an error
+event instead of silently dropping it.
+
+Every content delta is timestamped on arrival, so the decoder can report
+the inter-token latency (ITL) distribution of a request, stalls (gaps of
+at least ``STREAM_STALL_SECONDS``) and the decode rate after the first
+token, which is what TPOT averages hide.
+"""
+
+from typing import Any, Dict, Iterable, List, Optional
+import json
+import logging
+import os
+import time
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+
+logger = logging.getLogger(__name__)
+
+STREAM_STALL_SECONDS = float(os.getenv("STREAM_STALL_SECONDS", "0.5"))
+
+_DATA_PREFIX = b"data:"
+_DONE = b"[DONE]"
+
+
+class StreamError(Exception):
+    """The runner reported an error in the stream or the stream was malformed."""
+
+
+def _percentile(ordered: List[float], q: float) -> float:
+    return ordered[min(int(q / 100 * len(ordered)), len(ordered) - 1)]
+
+
+class StreamDecoder:
+    """
+    Accumulates one SSE chat-completion stream.
+
+    Args:
+        start: ``time.perf_counter()`` value when the request was sent
+    """
+
+    def __init__(self, start: Optional[float] = None):
+        self.start = time.perf_counter() if start is None else start
+        self.parts: List[str] = []
+        self.arrivals: List[float] = []
+        self.final: Dict[str, Any] = {}
+        self.finish_reason: Optional[str] = None
+        self.done = False
+        self.events = 0
+        self.parse_errors = 0
+
+    def feed(self, line: bytes) -> bool:
+        """
+        Decode one line of the stream.
+
+        Returns:
+            False once ``[DONE]`` has been received
+        """
+        if not line.startswith(_DATA_PREFIX):
+            # Blank separators, comments (": keep-alive") and event/id fields
+            return not self.done
+        data = line[len(_DATA_PREFIX):].strip()
+        if data == _DONE:
+            self.done = True
+            return False
+        now = time.perf_counter()
+        try:
+            payload = _loads(data)
+        except ValueError:
+            self.parse_errors += 1
+            logger.debug(f"Unparseable stream event: {data[:200]!r}")
+            return True
+        if not isinstance(payload, dict):
+            self.parse_errors += 1
+            return True
+        self.events += 1
+        if payload.get("error"):
+            error = payload["error"]
+            message = error.get("message", str(error)) if isinstance(error, dict) else str(error)
+            raise StreamError(f"Model runner stream error: {message}")
+
+        choices = payload.get("choices") or ()
+        if choices:
+            choice = choices[0]
+            content = (choice.get("delta") or {}).get("content")
+            if content:
+                self.parts.append(content)
+                self.arrivals.append(now)
+            if choice.get("finish_reason"):
+                self.finish_reason = choice["finish_reason"]
+        if "usage" in payload or "timings" in payload:
+            # Usage/timings arrive with the final chunk
+            self.final = payload
+        return True
+
+    def decode(self, lines: Iterable[bytes]) -> "StreamDecoder":
+        """Feed lines until ``[DONE]`` or the end of the stream."""
+        for line in lines:
+            if not self.feed(line):
+                break
+        return self
+
+    @property
+    def text(self) -> str:
+        return "".join(self.parts)
+
+    @property
+    def ttft(self) -> Optional[float]:
+        return self.arrivals[0] - self.start if self.arrivals else None
+
+    @property
+    def truncated(self) -> bool:
+        """The stream ended without ``[DONE]`` or a finish reason."""
+        return not self.done and self.finish_reason is None
+
+    def gaps(self) -> List[float]:
+        """Inter-token latencies: seconds between consecutive content deltas."""
+        arrivals = self.arrivals
+        return [b - a for a, b in zip(arrivals, arrivals[1:])]
+
+    def stats(self, stall_seconds: float = STREAM_STALL_SECONDS) -> Dict[str, Any]:
+        """
+        Timing summary of the stream.
+
+        Returns:
+            Dictionary with TTFT, ITL percentiles, stalls and decode rate
+            (content deltas per second after the first one)
+        """
+        gaps = self.gaps()
+        ordered = sorted(gaps)
+        stalls = [g for g in gaps if g >= stall_seconds]
+        decode_seconds = self.arrivals[-1] - self.arrivals[0] if len(self.arrivals) > 1 else 0.0
+        return {
+            "ttft": self.ttft,
+            "chunks": len(self.arrivals),
+            "itl_p50": _percentile(ordered, 50) if ordered else None,
+            "itl_p99": _percentile(ordered, 99) if ordered else None,
+            "itl_max": ordered[-1] if ordered else None,
+            "stalls": len(stalls),
+            "stall_seconds": sum(stalls),
+            "decode_rate": len(gaps) / decode_seconds if decode_seconds > 0 else None,
+            "finish_reason": self.finish_reason,
+            "truncated": self.truncated,
+            "parse_errors": self.parse_errors,
+        }
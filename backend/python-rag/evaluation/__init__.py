@@ -1,14 +1,17 @@
 """Evaluation module for LLM testing and metrics."""
 
 from .ragas_evaluator import evaluate_ragas
-from .bleu_rouge import evaluate_bleu_rouge
-from .bertscore import evaluate_bertscore
-from .exact_match import evaluate_exact_match
+from .bleu_rouge import evaluate_bleu_rouge, evaluate_bleu_rouge_batch
+from .bertscore import evaluate_bertscore, evaluate_bertscore_batch
+from .exact_match import evaluate_exact_match, evaluate_token_f1
 
 __all__ = [
     "evaluate_ragas",
     "evaluate_bleu_rouge",
+    "evaluate_bleu_rouge_batch",
     "evaluate_bertscore",
+    "evaluate_bertscore_batch",
     "evaluate_exact_match",
+    "evaluate_token_f1",
 ]
 
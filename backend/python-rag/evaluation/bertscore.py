@@ -1,10 +1,30 @@
 """BERTScore evaluation for semantic similarity."""
 
-from typing import Dict
+from typing import Any, Dict, List
 import logging
 
+from .cache import cache_key, cached_evaluator, evaluator_version, get_evaluation_cache
+
 logger = logging.getLogger(__name__)
 
+# Cache revision of BERTScore results; pairs scored singly and in batches share entries
+BERTSCORE_REVISION = "1"
+BERTSCORE_PACKAGES = ("bert-score", "sentence-transformers")
+
+_fallback_model = None
+
+def _fallback_similarities(generated: List[str], references: List[str]):
+    """Cosine similarity of aligned sentence-transformer embeddings, offloaded for large batches."""
+    global _fallback_model
+    from sentence_transformers import SentenceTransformer
+    from core.compute_client import get_compute_client
+    
+    if _fallback_model is None:
+        _fallback_model = SentenceTransformer('all-MiniLM-L6-v2')
+    embeddings = _fallback_model.encode(list(generated) + list(references), batch_size=64)
+    return get_compute_client().pairwise(embeddings[:len(generated)], embeddings[len(generated):])
+
+@cached_evaluator("bertscore", BERTSCORE_REVISION, packages=BERTSCORE_PACKAGES)
 def evaluate_bertscore(generated: str, reference: str) -> Dict[str, float]:
     """
     Evaluate semantic similarity using BERTScore.
@@ -29,15 +49,7 @@ def evaluate_bertscore(generated: str, reference: str) -> Dict[str, float]:
     except ImportError:
         logger.warning("bert-score not installed, using sentence-transformers fallback")
         try:
-            from sentence_transformers import SentenceTransformer
-            from sklearn.metrics.pairwise import cosine_similarity
-            import numpy as np
-            
-            model = SentenceTransformer('all-MiniLM-L6-v2')
-            gen_embedding = model.encode([generated])
-            ref_embedding = model.encode([reference])
-            
-            similarity = cosine_similarity(gen_embedding, ref_embedding)[0][0]
+            similarity = _fallback_similarities([generated], [reference])[0]
             
             return {
                 "precision": float(similarity),
@@ -63,3 +75,93 @@ def evaluate_bertscore(generated: str, reference: str) -> Dict[str, float]:
             "error": str(e)
         }
 
+
+def evaluate_bertscore_batch(generated: List[str], references: List[str]) -> Dict[str, Any]:
+    """
+    Evaluate many generations at once using BERTScore.
+    
+    Pairs already in the evaluation cache are not scored again.
+    
+    Args:
+        generated: Generated texts
+        references: Reference texts, aligned with generated
+    
+    Returns:
+        Dictionary with per-pair scores and mean F1
+    """
+    cache = get_evaluation_cache()
+    if cache is None:
+        return _score_batch(generated, references)
+    
+    version = evaluator_version(BERTSCORE_REVISION, BERTSCORE_PACKAGES)
+    keys = [
+        cache_key("bertscore", version, {"generated": g, "reference": r})
+        for g, r in zip(generated, references)
+    ]
+    try:
+        found = cache.get_many("bertscore", keys)
+    except Exception as e:
+        logger.warning(f"Evaluation cache lookup failed: {e}")
+        return _score_batch(generated, references)
+    
+    missing = [i for i, key in enumerate(keys) if key not in found]
+    note = None
+    if missing:
+        result = _score_batch([generated[i] for i in missing], [references[i] for i in missing])
+        if "error" in result:
+            return result
+        scored = {keys[i]: score for i, score in zip(missing, result["scores"])}
+        try:
+            cache.put_many("bertscore", version, scored)
+        except Exception as e:
+            logger.warning(f"Evaluation cache write failed: {e}")
+        found.update(scored)
+        note = result.get("note")
+    
+    scores = [found[key] for key in keys]
+    merged = {
+        "scores": scores,
+        "mean_f1": sum(s["f1"] for s in scores) / len(scores) if scores else 0.0,
+        "count": len(scores),
+        "cached": len(keys) - len(missing)
+    }
+    if note:
+        merged["note"] = note
+    return merged
+
+
+def _score_batch(generated: List[str], references: List[str]) -> Dict[str, Any]:
+    """Score all pairs with bert-score, or the sentence-transformers fallback."""
+    try:
+        from bert_score import score
+        
+        P, R, F1 = score(list(generated), list(references), lang='en', verbose=False)
+        scores = [
+            {"precision": float(p), "recall": float(r), "f1": float(f)}
+            for p, r, f in zip(P.tolist(), R.tolist(), F1.tolist())
+        ]
+        note = None
+    except ImportError:
+        logger.warning("bert-score not installed, using sentence-transformers fallback")
+        try:
+            similarities = _fallback_similarities(generated, references)
+            scores = [
+                {"precision": float(s), "recall": float(s), "f1": float(s), "similarity": float(s)}
+                for s in similarities
+            ]
+            note = "Using sentence-transformers as fallback"
+        except Exception as e:
+            logger.error(f"Error in batch BERTScore fallback: {e}")
+            return {"scores": [], "mean_f1": 0.0, "count": 0, "error": str(e)}
+    except Exception as e:
+        logger.error(f"Error in batch BERTScore evaluation: {e}")
+        return {"scores": [], "mean_f1": 0.0, "count": 0, "error": str(e)}
+    
+    result = {
+        "scores": scores,
+        "mean_f1": sum(s["f1"] for s in scores) / len(scores) if scores else 0.0,
+        "count": len(scores)
+    }
+    if note:
+        result["note"] = note
+    return result
@@ -0,0 +1,278 @@
+"""Persistent cache of evaluation results.
+
+RAGAS (an LLM judge per metric) and BERTScore (a transformer forward pass)
+are the most expensive calls in the backend, and re-runs score the same
+(query, context, answer, ground truth) tuples again and again. Results are
+stored in SQLite, keyed by a SHA-256 of the metric, the evaluator version and
+the canonical JSON of the inputs. The version includes the installed
+versions of the scoring packages, so upgrading ragas or bert-score misses
+the cache instead of serving stale scores.
+
+The database is shared by all workers like the ingestion manifest. When it
+grows past ``EVAL_CACHE_MAX_MB``, the least recently used entries are
+evicted down to 90% of the limit. Results carrying an ``error`` are never
+cached. The cache is best-effort: a failing lookup or write is logged and
+the evaluator runs as if the cache were off.
+"""
+
+from functools import lru_cache, wraps
+from typing import Any, Callable, Dict, List, Optional, Sequence
+import hashlib
+import inspect
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+EVAL_CACHE_ENABLED = os.getenv("EVAL_CACHE_ENABLED", "true").lower() == "true"
+EVAL_CACHE_PATH = os.getenv("EVAL_CACHE_PATH", "/tmp/ai-penknife/eval_cache.db")
+EVAL_CACHE_MAX_MB = float(os.getenv("EVAL_CACHE_MAX_MB", "512"))
+
+# Writes between checks of the total size
+_EVICTION_CHECK_INTERVAL = 64
+# Eviction frees space down to this share of the limit
+_EVICTION_TARGET = 0.9
+
+
+@lru_cache(maxsize=None)
+def evaluator_version(revision: str, packages: Sequence[str] = ()) -> str:
+    """
+    Version string of an evaluator: our own revision plus installed package versions.
+
+    Args:
+        revision: Bumped by hand when the scoring code changes
+        packages: Distributions whose version changes the scores ("missing" if not installed)
+    """
+    from importlib.metadata import PackageNotFoundError, version
+
+    parts = [revision]
+    for package in packages:
+        try:
+            parts.append(f"{package}={version(package)}")
+        except PackageNotFoundError:
+            parts.append(f"{package}=missing")
+    return ";".join(parts)
+
+
+def cache_key(metric: str, version: str, inputs: Dict[str, Any]) -> str:
+    """SHA-256 of the metric, evaluator version and canonical JSON of the inputs."""
+    payload = json.dumps([metric, version, inputs], sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class EvaluationCache:
+    """
+    SQLite store of evaluation results with size-based LRU eviction.
+
+    Args:
+        path: Database file
+        max_bytes: Size of stored results above which old entries are evicted
+        on_lookup: Called with (metric, hit) on every lookup, e.g. for metrics
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_bytes: int,
+        on_lookup: Optional[Callable[[str, bool], None]] = None,
+    ):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.on_lookup = on_lookup
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.hits: Dict[str, int] = {}
+        self.misses: Dict[str, int] = {}
+        self.evicted = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "key TEXT PRIMARY KEY, "
+            "metric TEXT NOT NULL, "
+            "version TEXT NOT NULL, "
+            "value TEXT NOT NULL, "
+            "size INTEGER NOT NULL, "
+            "created_at REAL NOT NULL, "
+            "last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)")
+
+    def _count(self, metric: str, hits: int, misses: int) -> None:
+        self.hits[metric] = self.hits.get(metric, 0) + hits
+        self.misses[metric] = self.misses.get(metric, 0) + misses
+        if self.on_lookup is not None:
+            for _ in range(hits):
+                self.on_lookup(metric, True)
+            for _ in range(misses):
+                self.on_lookup(metric, False)
+
+    def get_many(self, metric: str, keys: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Cached results of the given keys that are present, refreshing their LRU position."""
+        found: Dict[str, Dict[str, Any]] = {}
+        unique = list(dict.fromkeys(keys))
+        with self._lock:
+            for start in range(0, len(unique), 500):
+                batch = unique[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, value FROM results WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, value in rows:
+                    found[key] = json.loads(value)
+                if rows:
+                    self._conn.execute(
+                        f"UPDATE results SET last_used = ? WHERE key IN ({placeholders})",
+                        [time.time(), *batch]
+                    )
+        hits = sum(1 for key in keys if key in found)
+        self._count(metric, hits, len(keys) - hits)
+        return found
+
+    def get(self, metric: str, key: str) -> Optional[Dict[str, Any]]:
+        return self.get_many(metric, [key]).get(key)
+
+    def put_many(self, metric: str, version: str, results: Dict[str, Dict[str, Any]]) -> None:
+        """Store results by key; results with an ``error`` are skipped."""
+        now = time.time()
+        rows = []
+        for key, result in results.items():
+            if "error" in result:
+                continue
+            value = json.dumps(result, separators=(",", ":"))
+            rows.append((key, metric, version, value, len(value) + len(key), now, now))
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO results (key, metric, version, value, size, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            previous = self._writes
+            self._writes += len(rows)
+            if previous == 0 or previous // _EVICTION_CHECK_INTERVAL != self._writes // _EVICTION_CHECK_INTERVAL:
+                self._evict()
+
+    def put(self, metric: str, version: str, key: str, result: Dict[str, Any]) -> None:
+        self.put_many(metric, version, {key: result})
+
+    def _evict(self) -> None:
+        """Delete least recently used entries until the total is below the target. Holds the lock."""
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        to_free = total - self.max_bytes * _EVICTION_TARGET
+        keys = []
+        for key, size in self._conn.execute("SELECT key, size FROM results ORDER BY last_used, rowid"):
+            keys.append(key)
+            to_free -= size
+            if to_free <= 0:
+                break
+        for start in range(0, len(keys), 500):
+            batch = keys[start:start + 500]
+            self._conn.execute(f"DELETE FROM results WHERE key IN ({','.join('?' * len(batch))})", batch)
+        self.evicted += len(keys)
+        logger.info(f"Evaluation cache evicted {len(keys)} entries ({total} bytes over {self.max_bytes})")
+
+    def clear(self, metric: Optional[str] = None) -> int:
+        """Delete all entries, or those of one metric; returns the number deleted."""
+        with self._lock:
+            if metric:
+                cursor = self._conn.execute("DELETE FROM results WHERE metric = ?", (metric,))
+            else:
+                cursor = self._conn.execute("DELETE FROM results")
+        return cursor.rowcount
+
+    def stats(self) -> Dict[str, Any]:
+        """Entries and bytes per metric, plus this worker's hits, misses and hit rates."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT metric, COUNT(*), COALESCE(SUM(size), 0) FROM results GROUP BY metric"
+            ).fetchall()
+        metrics = {metric: {"entries": count, "bytes": size} for metric, count, size in rows}
+        for metric in set(self.hits) | set(self.misses):
+            hits, misses = self.hits.get(metric, 0), self.misses.get(metric, 0)
+            entry = metrics.setdefault(metric, {"entries": 0, "bytes": 0})
+            entry.update({"hits": hits, "misses": misses, "hit_rate": hits / (hits + misses) if hits + misses else 0.0})
+        return {
+            "path": self.path,
+            "max_bytes": self.max_bytes,
+            "bytes": sum(m["bytes"] for m in metrics.values()),
+            "evicted": self.evicted,
+            "metrics": metrics,
+        }
+
+
+_cache: Optional[EvaluationCache] = None
+_cache_failed = False
+_on_lookup: Optional[Callable[[str, bool], None]] = None
+
+
+def set_lookup_callback(callback: Callable[[str, bool], None]) -> None:
+    """Register the (metric, hit) callback of the process-wide cache, before or after it is created."""
+    global _on_lookup
+    _on_lookup = callback
+    if _cache is not None:
+        _cache.on_lookup = callback
+
+
+def get_evaluation_cache() -> Optional[EvaluationCache]:
+    """Get the process-wide cache at ``EVAL_CACHE_PATH``; None when disabled or unavailable."""
+    global _cache, _cache_failed
+    if _cache is None and not _cache_failed and EVAL_CACHE_ENABLED and EVAL_CACHE_MAX_MB > 0:
+        try:
+            _cache = EvaluationCache(EVAL_CACHE_PATH, int(EVAL_CACHE_MAX_MB * 1024 * 1024), on_lookup=_on_lookup)
+        except (OSError, sqlite3.Error) as e:
+            logger.warning(f"Evaluation cache unavailable, evaluating without it: {e}")
+            _cache_failed = True
+    return _cache
+
+
+def cached_evaluator(metric: str, revision: str, packages: Sequence[str] = ()) -> Callable:
+    """
+    Decorator serving an evaluator's results from the cache.
+
+    The key covers all arguments (defaults included), so the decorated
+    function must be deterministic in them and return a JSON-serializable dict.
+
+    Args:
+        metric: Metric name, used in keys and hit-rate metrics
+        revision: Bumped by hand when the evaluator's scoring changes
+        packages: Distributions whose installed version is part of the key
+    """
+    def decorator(fn: Callable[..., Dict[str, Any]]) -> Callable[..., Dict[str, Any]]:
+        signature = inspect.signature(fn)
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            cache = get_evaluation_cache()
+            if cache is None:
+                return fn(*args, **kwargs)
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            version = evaluator_version(revision, tuple(packages))
+            key = cache_key(metric, version, dict(bound.arguments))
+            try:
+                result = cache.get(metric, key)
+            except sqlite3.Error as e:
+                logger.warning(f"Evaluation cache lookup failed: {e}")
+                return fn(*args, **kwargs)
+            if result is not None:
+                return result
+            result = fn(*args, **kwargs)
+            try:
+                cache.put(metric, version, key, result)
+            except (sqlite3.Error, TypeError, ValueError) as e:
+                logger.warning(f"Evaluation cache write failed: {e}")
+            return result
+
+        return wrapper
+    return decorator
@@ -0,0 +1,406 @@
+"""Concurrency-sweep capacity planning for model runners.
+
+A sweep drives an OpenAI-compatible chat endpoint directly (bypassing
+retrieval) with a closed loop of ``concurrency`` clients that each send
+streaming requests back to back for a fixed time. For every combination of
+prompt length and max output tokens, concurrency is ramped through the
+given levels and each level records output-token throughput plus TTFT,
+TPOT and end-to-end latency percentiles. A ramp stops early once the error
+rate or p99 TTFT exceeds its limit: the runner is past saturation.
+
+Each curve gets a knee: the concurrency after which adding clients stops
+paying for itself in throughput (Kneedle on log2 concurrency vs.
+throughput), next to the concurrency where throughput reaches 90% of its
+maximum and the one where p99 TTFT blows up relative to a single client.
+The recommended concurrency is the smallest of those.
+
+Sweeps are stored in SQLite so curves of different models and runner
+versions can be compared later.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence
+import json
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from core.streaming import StreamDecoder
+
+logger = logging.getLogger(__name__)
+
+CAPACITY_DB_PATH = os.getenv("CAPACITY_DB_PATH", "/tmp/ai-penknife/capacity.db")
+
+MAX_CONCURRENCY = 256
+SATURATION_SHARE = 0.9
+TTFT_BLOWUP_FACTOR = 3.0
+
+# Filler vocabulary for synthetic prompts; roughly one token per word
+_WORDS = (
+    "system latency model token cache request stream vector index query answer "
+    "context memory batch thread kernel queue server client packet buffer"
+).split()
+
+
+def synthetic_prompt(tokens: int, nonce: Optional[str] = None) -> str:
+    """
+    Prompt of roughly ``tokens`` tokens.
+
+    A leading nonce makes every prompt distinct, so prefix caching cannot
+    skip prefill and the sweep measures the uncached cost.
+    """
+    words = [_WORDS[i % len(_WORDS)] for i in range(max(tokens - 16, 1))]
+    head = f"Request {nonce}. " if nonce else ""
+    return f"{head}Summarize the following text in one paragraph: {' '.join(words)}"
+
+
+def percentile(values: Sequence[float], q: float) -> Optional[float]:
+    """Linear-interpolated percentile (q in [0, 100]); None for no values."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    low = math.floor(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+def find_knee(xs: Sequence[float], ys: Sequence[float]) -> Optional[float]:
+    """
+    Knee of a concave, increasing curve (Kneedle).
+
+    x is taken on a log2 scale, since concurrency levels are usually powers
+    of two. Both axes are normalized to [0, 1]; the knee is the point
+    furthest above the diagonal.
+
+    Returns:
+        The x of the knee, or None for fewer than three points or a flat curve
+    """
+    if len(xs) < 3:
+        return None
+    lx = [math.log2(x) for x in xs]
+    x_span = lx[-1] - lx[0]
+    y_low, y_high = min(ys), max(ys)
+    if x_span <= 0 or y_high <= y_low:
+        return None
+    differences = [
+        (y - y_low) / (y_high - y_low) - (x - lx[0]) / x_span
+        for x, y in zip(lx, ys)
+    ]
+    best = max(range(len(xs)), key=lambda i: differences[i])
+    return xs[best] if differences[best] > 0 else None
+
+
+def analyze_curve(points: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Knee, saturation and TTFT blow-up concurrency of one ramp."""
+    measured = [p for p in points if p["throughput_tokens_per_second"] is not None]
+    if not measured:
+        return {"knee_concurrency": None, "saturation_concurrency": None,
+                "ttft_blowup_concurrency": None, "recommended_concurrency": None,
+                "max_throughput_tokens_per_second": None}
+    xs = [p["concurrency"] for p in measured]
+    ys = [p["throughput_tokens_per_second"] for p in measured]
+    peak = max(ys)
+    saturation = next(x for x, y in zip(xs, ys) if y >= SATURATION_SHARE * peak)
+
+    blowup = None
+    baseline = measured[0]["ttft_p99"]
+    if baseline:
+        blowup = next(
+            (p["concurrency"] for p in measured[1:]
+             if p["ttft_p99"] is not None and p["ttft_p99"] > TTFT_BLOWUP_FACTOR * baseline),
+            None
+        )
+
+    knee = find_knee(xs, ys)
+    candidates = [c for c in (knee, saturation) if c is not None]
+    if blowup is not None:
+        # The last level before TTFT blew up
+        below = [x for x in xs if x < blowup]
+        if below:
+            candidates.append(below[-1])
+    return {
+        "knee_concurrency": knee,
+        "saturation_concurrency": saturation,
+        "ttft_blowup_concurrency": blowup,
+        "recommended_concurrency": min(candidates) if candidates else None,
+        "max_throughput_tokens_per_second": peak,
+    }
+
+
+def stream_request(session, url: str, model: str, prompt: str, max_tokens: int, timeout: float) -> Dict[str, Any]:
+    """
+    One streaming chat completion.
+
+    Returns:
+        Dictionary with ttft, latency, output_tokens, or error
+    """
+    decoder = StreamDecoder()
+    try:
+        response = session.post(
+            url,
+            json={
+                "model": model,
+                "messages": [{"role": "user", "content": prompt}],
+                "max_tokens": max_tokens,
+                "temperature": 0.0,
+                "stream": True,
+                "stream_options": {"include_usage": True},
+            },
+            timeout=timeout,
+            stream=True
+        )
+        if response.status_code != 200:
+            return {"error": f"HTTP {response.status_code}", "latency": time.perf_counter() - decoder.start}
+        decoder.decode(response.iter_lines())
+    except Exception as e:
+        return {"error": str(e), "latency": time.perf_counter() - decoder.start}
+    latency = time.perf_counter() - decoder.start
+    ttft = decoder.ttft
+    usage = decoder.final.get("usage") or {}
+    tokens = usage.get("completion_tokens") or len(decoder.arrivals)
+    tpot = (latency - ttft) / (tokens - 1) if ttft is not None and tokens > 1 else None
+    return {"ttft": ttft, "latency": latency, "output_tokens": tokens, "tpot": tpot}
+
+
+class CapacitySweep:
+    """
+    Ramps concurrency against one model for each prompt/output length.
+
+    Args:
+        url: Chat completions URL of the runner
+        model: Model name sent with each request
+        concurrency_levels: Client counts to ramp through, ascending
+        prompt_tokens: Prompt lengths to sweep
+        max_tokens: Output lengths to sweep
+        level_seconds: How long each level runs
+        timeout: Per-request timeout in seconds
+        max_error_rate: Stop ramping once a level's error rate exceeds this
+        ttft_limit_seconds: Stop ramping once a level's p99 TTFT exceeds this
+        session_factory: Creates one HTTP session per client (default: requests.Session)
+    """
+
+    def __init__(
+        self,
+        url: str,
+        model: str,
+        concurrency_levels: Sequence[int] = (1, 2, 4, 8, 16, 32),
+        prompt_tokens: Sequence[int] = (256,),
+        max_tokens: Sequence[int] = (128,),
+        level_seconds: float = 20.0,
+        timeout: float = 120.0,
+        max_error_rate: float = 0.1,
+        ttft_limit_seconds: float = 30.0,
+        session_factory: Optional[Callable[[], Any]] = None,
+    ):
+        levels = sorted(set(concurrency_levels))
+        if not levels or levels[0] < 1 or levels[-1] > MAX_CONCURRENCY:
+            raise ValueError(f"Concurrency levels must be between 1 and {MAX_CONCURRENCY}")
+        if not prompt_tokens or not max_tokens or min(prompt_tokens) < 1 or min(max_tokens) < 1:
+            raise ValueError("prompt_tokens and max_tokens must be positive")
+        self.url = url
+        self.model = model
+        self.concurrency_levels = levels
+        self.prompt_tokens = list(prompt_tokens)
+        self.max_tokens = list(max_tokens)
+        self.level_seconds = level_seconds
+        self.timeout = timeout
+        self.max_error_rate = max_error_rate
+        self.ttft_limit_seconds = ttft_limit_seconds
+        self.session_factory = session_factory
+        self.progress = {"levels_done": 0, "levels_total": len(levels) * len(self.prompt_tokens) * len(self.max_tokens)}
+
+    def _session(self):
+        if self.session_factory is not None:
+            return self.session_factory()
+        import requests
+        return requests.Session()
+
+    def run_level(self, concurrency: int, prompt_tokens: int, max_tokens: int) -> Dict[str, Any]:
+        """Closed loop of ``concurrency`` clients for ``level_seconds``; every client sends at least once."""
+        results: List[Dict[str, Any]] = []
+        lock = threading.Lock()
+        deadline = time.perf_counter() + self.level_seconds
+
+        def client(index: int) -> None:
+            session = self._session()
+            sent = 0
+            while sent == 0 or time.perf_counter() < deadline:
+                prompt = synthetic_prompt(prompt_tokens, f"{index}-{sent}-{uuid.uuid4().hex[:8]}")
+                result = stream_request(session, self.url, self.model, prompt, max_tokens, self.timeout)
+                with lock:
+                    results.append(result)
+                sent += 1
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            list(pool.map(client, range(concurrency)))
+        wall = time.perf_counter() - started
+
+        ok = [r for r in results if "error" not in r]
+        ttfts = [r["ttft"] for r in ok if r["ttft"] is not None]
+        tpots = [r["tpot"] for r in ok if r["tpot"] is not None]
+        latencies = [r["latency"] for r in ok]
+        output_tokens = sum(r["output_tokens"] for r in ok)
+        errors = [r["error"] for r in results if "error" in r]
+        return {
+            "concurrency": concurrency,
+            "requests": len(results),
+            "errors": len(errors),
+            "error_rate": len(errors) / len(results) if results else 0.0,
+            "sample_error": errors[0] if errors else None,
+            "wall_seconds": wall,
+            "requests_per_second": len(ok) / wall if wall > 0 else None,
+            "throughput_tokens_per_second": output_tokens / wall if ok and wall > 0 else None,
+            "ttft_p50": percentile(ttfts, 50),
+            "ttft_p99": percentile(ttfts, 99),
+            "tpot_p50": percentile(tpots, 50),
+            "tpot_p99": percentile(tpots, 99),
+            "latency_p50": percentile(latencies, 50),
+            "latency_p99": percentile(latencies, 99),
+        }
+
+    def run(self) -> List[Dict[str, Any]]:
+        """
+        Sweep all prompt/output lengths.
+
+        Returns:
+            One curve per (prompt_tokens, max_tokens): its points and knee analysis
+        """
+        # Load the model first so the single-client level doesn't include a cold start
+        stream_request(self._session(), self.url, self.model, synthetic_prompt(16), 1, self.timeout)
+
+        curves = []
+        for prompt_tokens in self.prompt_tokens:
+            for max_tokens in self.max_tokens:
+                points = []
+                stopped = None
+                for concurrency in self.concurrency_levels:
+                    point = self.run_level(concurrency, prompt_tokens, max_tokens)
+                    points.append(point)
+                    self.progress["levels_done"] += 1
+                    logger.info(
+                        f"Capacity sweep {self.model} p={prompt_tokens} m={max_tokens} c={concurrency}: "
+                        f"{point['throughput_tokens_per_second']} tok/s, p99 TTFT {point['ttft_p99']}"
+                    )
+                    if point["error_rate"] > self.max_error_rate:
+                        stopped = f"error rate {point['error_rate']:.2f} at concurrency {concurrency}"
+                    elif point["ttft_p99"] is not None and point["ttft_p99"] > self.ttft_limit_seconds:
+                        stopped = f"p99 TTFT {point['ttft_p99']:.1f}s at concurrency {concurrency}"
+                    if stopped:
+                        skipped = len(self.concurrency_levels) - len(points)
+                        self.progress["levels_done"] += skipped
+                        break
+                curves.append({
+                    "prompt_tokens": prompt_tokens,
+                    "max_tokens": max_tokens,
+                    "points": points,
+                    "stopped": stopped,
+                    **analyze_curve(points),
+                })
+        return curves
+
+
+class CapacityStore:
+    """Stored sweeps, for comparison across models and runner versions."""
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sweeps ("
+            "id TEXT PRIMARY KEY, "
+            "model TEXT NOT NULL, "
+            "runner_version TEXT NOT NULL, "
+            "status TEXT NOT NULL, "
+            "started_at REAL NOT NULL, "
+            "finished_at REAL, "
+            "config TEXT NOT NULL, "
+            "curves TEXT, "
+            "error TEXT)"
+        )
+
+    def create(self, model: str, runner_version: str, config: Dict[str, Any]) -> str:
+        sweep_id = uuid.uuid4().hex[:12]
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO sweeps (id, model, runner_version, status, started_at, config) VALUES (?, ?, ?, ?, ?, ?)",
+                (sweep_id, model, runner_version, "running", time.time(), json.dumps(config))
+            )
+        return sweep_id
+
+    def finish(self, sweep_id: str, curves: Optional[List[Dict[str, Any]]] = None, error: Optional[str] = None) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE sweeps SET status = ?, finished_at = ?, curves = ?, error = ? WHERE id = ?",
+                ("failed" if error else "completed", time.time(),
+                 json.dumps(curves) if curves is not None else None, error, sweep_id)
+            )
+
+    @staticmethod
+    def _row(row) -> Dict[str, Any]:
+        keys = ("id", "model", "runner_version", "status", "started_at", "finished_at", "config", "curves", "error")
+        sweep = dict(zip(keys, row))
+        sweep["config"] = json.loads(sweep["config"])
+        sweep["curves"] = json.loads(sweep["curves"]) if sweep["curves"] else None
+        return sweep
+
+    def get(self, sweep_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM sweeps WHERE id = ?", (sweep_id,)).fetchone()
+        return self._row(row) if row else None
+
+    def list(self, model: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        """Most recent sweeps, with only the knee summary of each curve."""
+        query = "SELECT * FROM sweeps"
+        params: List[Any] = []
+        if model:
+            query += " WHERE model = ?"
+            params.append(model)
+        with self._lock:
+            rows = self._conn.execute(query + " ORDER BY started_at DESC LIMIT ?", params + [limit]).fetchall()
+        sweeps = []
+        for row in rows:
+            sweep = self._row(row)
+            sweep["curves"] = [
+                {k: v for k, v in curve.items() if k != "points"} for curve in sweep["curves"] or []
+            ]
+            sweeps.append(sweep)
+        return sweeps
+
+    def compare(self, sweep_ids: Sequence[str]) -> Dict[str, Any]:
+        """Knee summaries of several sweeps, grouped by prompt/output length."""
+        by_shape: Dict[str, List[Dict[str, Any]]] = {}
+        missing = []
+        for sweep_id in sweep_ids:
+            sweep = self.get(sweep_id)
+            if sweep is None or not sweep["curves"]:
+                missing.append(sweep_id)
+                continue
+            for curve in sweep["curves"]:
+                by_shape.setdefault(f"p{curve['prompt_tokens']}_m{curve['max_tokens']}", []).append({
+                    "sweep_id": sweep_id,
+                    "model": sweep["model"],
+                    "runner_version": sweep["runner_version"],
+                    **{k: v for k, v in curve.items() if k not in ("points", "prompt_tokens", "max_tokens")},
+                })
+        return {"shapes": by_shape, "missing": missing}
+
+
+_store: Optional[CapacityStore] = None
+
+
+def get_capacity_store() -> CapacityStore:
+    """Get the process-wide store at ``CAPACITY_DB_PATH``, creating it on first use."""
+    global _store
+    if _store is None:
+        _store = CapacityStore(CAPACITY_DB_PATH)
+    return _store
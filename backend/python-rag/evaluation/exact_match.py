@@ -3,6 +3,10 @@
 from typing import Dict
 import re
 
+from .lexical import token_f1
+
+_PUNCT_RE = re.compile(r'[^\w\s]')
+
 def evaluate_exact_match(generated: str, reference: str, normalize: bool = True) -> Dict[str, float]:
     """
     Evaluate exact match for fact-based QA.
@@ -17,8 +21,8 @@ def evaluate_exact_match(generated: str, reference: str, normalize: bool = True)
     """
     if normalize:
         # Normalize: lowercase, remove punctuation, strip whitespace
-        gen_normalized = re.sub(r'[^\w\s]', '', generated.lower().strip())
-        ref_normalized = re.sub(r'[^\w\s]', '', reference.lower().strip())
+        gen_normalized = _PUNCT_RE.sub('', generated.lower().strip())
+        ref_normalized = _PUNCT_RE.sub('', reference.lower().strip())
         
         exact_match = 1.0 if gen_normalized == ref_normalized else 0.0
     else:
@@ -29,3 +33,16 @@ def evaluate_exact_match(generated: str, reference: str, normalize: bool = True)
         "match": bool(exact_match == 1.0)
     }
 
+
+def evaluate_token_f1(generated: str, reference: str) -> Dict[str, float]:
+    """
+    Evaluate SQuAD-style token overlap F1 for fact-based QA.
+    
+    Args:
+        generated: Generated answer
+        reference: Reference answer
+    
+    Returns:
+        Dictionary with token precision, recall and F1
+    """
+    return token_f1(generated, reference)
@@ -0,0 +1,240 @@
+"""Fast in-house lexical metrics: BLEU, ROUGE-1/2/L and token F1.
+
+Tokenizers are precompiled regexes, n-grams are counted with ``Counter`` and
+ROUGE-L uses a bit-parallel LCS, so scoring large batches needs no per-call
+NLTK or rouge-score setup. Scores follow the NLTK ``sentence_bleu`` (with
+smoothing method1) and rouge-score definitions.
+"""
+
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, Iterable, List, Sequence, Tuple
+import math
+import re
+import string
+
+# Approximates NLTK word_tokenize: words (with contractions) and punctuation
+_BLEU_TOKEN_RE = re.compile(r"\w+(?:'\w+)?|[^\w\s]")
+# Same as rouge-score: lowercase alphanumeric runs
+_ROUGE_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_ARTICLES_RE = re.compile(r"\b(a|an|the)\b")
+_PUNCT_TABLE = str.maketrans("", "", string.punctuation)
+
+BLEU_MAX_ORDER = 4
+BLEU_EPSILON = 0.1
+
+_stemmer = None
+_stemmer_loaded = False
+
+
+def _get_stemmer():
+    """Load the Porter stemmer once; None if NLTK is not installed."""
+    global _stemmer, _stemmer_loaded
+    if not _stemmer_loaded:
+        try:
+            from nltk.stem.porter import PorterStemmer
+            _stemmer = PorterStemmer()
+        except ImportError:
+            _stemmer = None
+        _stemmer_loaded = True
+    return _stemmer
+
+
+@lru_cache(maxsize=65536)
+def _stem(token: str) -> str:
+    stemmer = _get_stemmer()
+    if stemmer is None or len(token) <= 3:
+        return token
+    return stemmer.stem(token)
+
+
+def bleu_tokenize(text: str) -> List[str]:
+    """Lowercase word/punctuation tokenization used for BLEU."""
+    return _BLEU_TOKEN_RE.findall(text.lower())
+
+
+def rouge_tokenize(text: str, stem: bool = True) -> List[str]:
+    """Lowercase alphanumeric tokenization, optionally Porter-stemmed, used for ROUGE."""
+    tokens = _ROUGE_TOKEN_RE.findall(text.lower())
+    if stem and _get_stemmer() is not None:
+        return [_stem(t) for t in tokens]
+    return tokens
+
+
+def ngram_counts(tokens: Sequence[str], n: int) -> Counter:
+    """Count the n-grams of a token sequence."""
+    if n == 1:
+        return Counter(tokens)
+    return Counter(zip(*[tokens[i:] for i in range(n)]))
+
+
+def _overlap(a: Counter, b: Counter) -> int:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(min(count, b[gram]) for gram, count in a.items() if gram in b)
+
+
+def _bleu_stats(hypothesis: Sequence[str], reference: Sequence[str]) -> List[int]:
+    """Clipped matches and totals per order, plus hypothesis/reference lengths."""
+    stats = []
+    for n in range(1, BLEU_MAX_ORDER + 1):
+        hyp_counts = ngram_counts(hypothesis, n)
+        stats.append(_overlap(hyp_counts, ngram_counts(reference, n)))
+        stats.append(max(len(hypothesis) - n + 1, 0))
+    stats.append(len(hypothesis))
+    stats.append(len(reference))
+    return stats
+
+
+def _bleu_from_stats(stats: Sequence[int]) -> float:
+    hyp_len, ref_len = stats[-2], stats[-1]
+    if hyp_len == 0 or stats[0] == 0:
+        return 0.0
+    log_precision = 0.0
+    for n in range(BLEU_MAX_ORDER):
+        matches, total = stats[2 * n], max(stats[2 * n + 1], 1)
+        numerator = matches if matches > 0 else BLEU_EPSILON
+        log_precision += math.log(numerator / total) / BLEU_MAX_ORDER
+    brevity = 1.0 if hyp_len > ref_len else math.exp(1 - ref_len / hyp_len)
+    return brevity * math.exp(log_precision)
+
+
+def sentence_bleu(hypothesis: Sequence[str], reference: Sequence[str]) -> float:
+    """Sentence BLEU-4 with uniform weights and epsilon smoothing."""
+    return _bleu_from_stats(_bleu_stats(hypothesis, reference))
+
+
+def corpus_bleu(pairs: Iterable[Tuple[Sequence[str], Sequence[str]]]) -> float:
+    """Corpus BLEU-4: n-gram statistics are summed before the geometric mean."""
+    totals = [0] * (2 * BLEU_MAX_ORDER + 2)
+    for hypothesis, reference in pairs:
+        for i, value in enumerate(_bleu_stats(hypothesis, reference)):
+            totals[i] += value
+    return _bleu_from_stats(totals)
+
+
+def _f_measure(overlap: int, hyp_total: int, ref_total: int) -> float:
+    if overlap == 0 or hyp_total == 0 or ref_total == 0:
+        return 0.0
+    precision = overlap / hyp_total
+    recall = overlap / ref_total
+    return 2 * precision * recall / (precision + recall)
+
+
+def rouge_n(hypothesis: Sequence[str], reference: Sequence[str], n: int) -> float:
+    """ROUGE-N F-measure."""
+    hyp_counts = ngram_counts(hypothesis, n)
+    ref_counts = ngram_counts(reference, n)
+    return _f_measure(
+        _overlap(hyp_counts, ref_counts),
+        max(len(hypothesis) - n + 1, 0),
+        max(len(reference) - n + 1, 0),
+    )
+
+
+def lcs_length(a: Sequence[str], b: Sequence[str]) -> int:
+    """
+    Length of the longest common subsequence of two token sequences.
+
+    Uses the bit-parallel algorithm of Hyyrö (2004) on Python integers, which
+    is O(len(a) * len(b) / wordsize) and stays fast for long texts.
+    """
+    if len(a) < len(b):
+        a, b = b, a
+    if not b:
+        return 0
+    masks: Dict[str, int] = {}
+    for i, token in enumerate(b):
+        masks[token] = masks.get(token, 0) | (1 << i)
+    full = (1 << len(b)) - 1
+    v = full
+    for token in a:
+        u = v & masks.get(token, 0)
+        v = ((v + u) | (v - u)) & full
+    return len(b) - v.bit_count()
+
+
+def rouge_l(hypothesis: Sequence[str], reference: Sequence[str]) -> float:
+    """ROUGE-L F-measure."""
+    return _f_measure(lcs_length(hypothesis, reference), len(hypothesis), len(reference))
+
+
+def normalize_answer(text: str) -> str:
+    """SQuAD answer normalization: lowercase, strip punctuation, articles and extra whitespace."""
+    text = text.lower().translate(_PUNCT_TABLE)
+    return " ".join(_ARTICLES_RE.sub(" ", text).split())
+
+
+def token_f1(generated: str, reference: str) -> Dict[str, float]:
+    """SQuAD-style token precision, recall and F1 over normalized answers."""
+    gen_tokens = normalize_answer(generated).split()
+    ref_tokens = normalize_answer(reference).split()
+    if not gen_tokens or not ref_tokens:
+        score = float(gen_tokens == ref_tokens)
+        return {"precision": score, "recall": score, "f1": score}
+    overlap = _overlap(Counter(gen_tokens), Counter(ref_tokens))
+    if overlap == 0:
+        return {"precision": 0.0, "recall": 0.0, "f1": 0.0}
+    precision = overlap / len(gen_tokens)
+    recall = overlap / len(ref_tokens)
+    return {
+        "precision": precision,
+        "recall": recall,
+        "f1": 2 * precision * recall / (precision + recall),
+    }
+
+
+def score_pair(generated: str, reference: str, stem: bool = True) -> Dict[str, float]:
+    """BLEU and ROUGE-1/2/L for one generated/reference pair."""
+    gen_rouge = rouge_tokenize(generated, stem)
+    ref_rouge = rouge_tokenize(reference, stem)
+    return {
+        "bleu": sentence_bleu(bleu_tokenize(generated), bleu_tokenize(reference)),
+        "rouge_1": rouge_n(gen_rouge, ref_rouge, 1),
+        "rouge_2": rouge_n(gen_rouge, ref_rouge, 2),
+        "rouge_l": rouge_l(gen_rouge, ref_rouge),
+    }
+
+
+def score_batch(
+    generated: Sequence[str],
+    references: Sequence[str],
+    stem: bool = True,
+) -> Dict[str, object]:
+    """
+    Score many pairs at once.
+
+    Args:
+        generated: Generated texts
+        references: Reference texts, aligned with ``generated``
+        stem: Whether to Porter-stem ROUGE tokens (when NLTK is available)
+
+    Returns:
+        Dictionary with per-pair scores, their means and corpus BLEU
+    """
+    if len(generated) != len(references):
+        raise ValueError("generated and references must have the same length")
+
+    scores = []
+    bleu_pairs = []
+    for gen, ref in zip(generated, references):
+        gen_bleu, ref_bleu = bleu_tokenize(gen), bleu_tokenize(ref)
+        gen_rouge, ref_rouge = rouge_tokenize(gen, stem), rouge_tokenize(ref, stem)
+        bleu_pairs.append((gen_bleu, ref_bleu))
+        scores.append({
+            "bleu": sentence_bleu(gen_bleu, ref_bleu),
+            "rouge_1": rouge_n(gen_rouge, ref_rouge, 1),
+            "rouge_2": rouge_n(gen_rouge, ref_rouge, 2),
+            "rouge_l": rouge_l(gen_rouge, ref_rouge),
+        })
+
+    count = max(len(scores), 1)
+    return {
+        "scores": scores,
+        "mean": {
+            key: sum(s[key] for s in scores) / count
+            for key in ("bleu", "rouge_1", "rouge_2", "rouge_l")
+        },
+        "corpus_bleu": corpus_bleu(bleu_pairs),
+        "count": len(scores),
+    }
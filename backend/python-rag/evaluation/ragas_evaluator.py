@@ -2,9 +2,39 @@
 
 from typing import List, Dict, Any
 import logging
+import os
+
+from .cache import cached_evaluator
 
 logger = logging.getLogger(__name__)
 
+# Judge LLM and embeddings behind the RAGAS scores (OpenAI-compatible); unset
+# values keep ragas' defaults, which read OPENAI_BASE_URL themselves
+RAGAS_JUDGE_MODEL = os.getenv("RAGAS_JUDGE_MODEL", "")
+RAGAS_EMBEDDING_MODEL = os.getenv("RAGAS_EMBEDDING_MODEL", "")
+RAGAS_JUDGE_BASE_URL = os.getenv("RAGAS_JUDGE_BASE_URL") or os.getenv("OPENAI_BASE_URL", "")
+
+# The judge produces the scores, so it is part of the cache revision:
+# switching model or endpoint stops serving the previous judge's results
+RAGAS_REVISION = (
+    f"1;judge={RAGAS_JUDGE_MODEL or 'default'}"
+    f";embeddings={RAGAS_EMBEDDING_MODEL or 'default'}"
+    f";endpoint={RAGAS_JUDGE_BASE_URL or 'default'}"
+)
+
+def _judge_models() -> Dict[str, Any]:
+    """LLM/embeddings arguments for ragas.evaluate from the configured judge."""
+    models: Dict[str, Any] = {}
+    base_url = RAGAS_JUDGE_BASE_URL or None
+    if RAGAS_JUDGE_MODEL:
+        from langchain_openai import ChatOpenAI
+        models["llm"] = ChatOpenAI(model=RAGAS_JUDGE_MODEL, base_url=base_url, temperature=0)
+    if RAGAS_EMBEDDING_MODEL:
+        from langchain_openai import OpenAIEmbeddings
+        models["embeddings"] = OpenAIEmbeddings(model=RAGAS_EMBEDDING_MODEL, base_url=base_url)
+    return models
+
+@cached_evaluator("ragas", RAGAS_REVISION, packages=("ragas",))
 def evaluate_ragas(
     query: str,
     context: List[str],
@@ -52,7 +82,7 @@ def evaluate_ragas(
             metrics.extend([context_precision, context_recall])
         
         # Evaluate
-        result = evaluate(dataset, metrics=metrics)
+        result = evaluate(dataset, metrics=metrics, **_judge_models())
         
         scores = result.to_dict()
         
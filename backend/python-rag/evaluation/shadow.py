@@ -0,0 +1,268 @@
+"""Shadow traffic: mirror sampled /query requests to candidate models.
+
+Before switching the configured model, candidates can be tried on real
+traffic. When ``shadow_models`` and ``shadow_sample_rate`` are set in the
+configuration, a sampled fraction of /query requests is re-run against each
+candidate after the primary response has been sent. Each mirrored run is
+recorded next to the primary one in a SQLite side store: latency, TTFT,
+output tokens and, optionally, lexical agreement (ROUGE-L and token F1 of
+the candidate's answer against the primary answer).
+
+Users never wait for shadow work. At most ``SHADOW_MAX_CONCURRENCY``
+mirrored requests run at a time per worker; a mirror that finds no free
+slot, or a runner with requests queued, is dropped rather than queued.
+Shadow requests use batch priority, so they never take the runner slots
+reserved for interactive traffic.
+"""
+
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+import hashlib
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+
+from .capacity import percentile
+from .lexical import score_pair, token_f1
+
+logger = logging.getLogger(__name__)
+
+SHADOW_DB_PATH = os.getenv("SHADOW_DB_PATH", "/tmp/ai-penknife/shadow.db")
+SHADOW_MAX_CONCURRENCY = int(os.getenv("SHADOW_MAX_CONCURRENCY", "1"))
+SHADOW_AGREEMENT = os.getenv("SHADOW_AGREEMENT", "true").lower() == "true"
+# Budget of one mirrored request, admission wait included
+SHADOW_DEADLINE_SECONDS = float(os.getenv("SHADOW_DEADLINE_SECONDS", "120"))
+
+_COLUMNS = (
+    "id", "created_at", "request_id", "query_hash", "primary_model", "candidate_model", "status", "error",
+    "primary_latency", "candidate_latency", "primary_ttft", "candidate_ttft",
+    "primary_output_tokens", "candidate_output_tokens", "rouge_l", "token_f1",
+)
+
+
+def shadow_candidates(config: Dict[str, Any]) -> List[str]:
+    """Candidate models to mirror a request to under this configuration, after sampling."""
+    candidates = [m for m in config.get("shadow_models") or [] if m and m != config.get("model")]
+    rate = config.get("shadow_sample_rate") or 0.0
+    if not candidates or rate <= 0 or random.random() >= rate:
+        return []
+    return candidates
+
+
+def agreement(candidate: str, primary: str) -> Dict[str, float]:
+    """Lexical agreement of a candidate answer with the primary answer."""
+    return {
+        "rouge_l": score_pair(candidate, primary)["rouge_l"],
+        "token_f1": token_f1(candidate, primary)["f1"],
+    }
+
+
+class ShadowStore:
+    """Mirrored runs next to the primary runs they shadowed."""
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS shadow_runs ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "created_at REAL NOT NULL, "
+            "request_id TEXT, "
+            "query_hash TEXT NOT NULL, "
+            "primary_model TEXT NOT NULL, "
+            "candidate_model TEXT NOT NULL, "
+            "status TEXT NOT NULL, "
+            "error TEXT, "
+            "primary_latency REAL, "
+            "candidate_latency REAL, "
+            "primary_ttft REAL, "
+            "candidate_ttft REAL, "
+            "primary_output_tokens INTEGER, "
+            "candidate_output_tokens INTEGER, "
+            "rouge_l REAL, "
+            "token_f1 REAL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS shadow_runs_candidate ON shadow_runs (candidate_model, created_at)"
+        )
+
+    def record(self, run: Dict[str, Any]) -> None:
+        columns = [c for c in _COLUMNS[1:] if c in run]
+        with self._lock:
+            self._conn.execute(
+                f"INSERT INTO shadow_runs ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                [run[c] for c in columns]
+            )
+
+    def recent(self, candidate: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        query = f"SELECT {', '.join(_COLUMNS)} FROM shadow_runs"
+        params: List[Any] = []
+        if candidate:
+            query += " WHERE candidate_model = ?"
+            params.append(candidate)
+        query += " ORDER BY id DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [dict(zip(_COLUMNS, row)) for row in rows]
+
+    def summary(self, since: Optional[float] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Per candidate (and primary model): runs, error rate, latency percentiles and agreement.
+
+        Args:
+            since: Only runs recorded after this Unix time
+        """
+        query = f"SELECT {', '.join(_COLUMNS)} FROM shadow_runs"
+        params: List[Any] = []
+        if since is not None:
+            query += " WHERE created_at >= ?"
+            params.append(since)
+        with self._lock:
+            rows = [dict(zip(_COLUMNS, row)) for row in self._conn.execute(query, params).fetchall()]
+
+        groups: Dict[str, List[Dict[str, Any]]] = {}
+        for row in rows:
+            groups.setdefault(f"{row['candidate_model']} vs {row['primary_model']}", []).append(row)
+
+        summary = {}
+        for name, runs in groups.items():
+            ok = [r for r in runs if r["status"] == "ok"]
+
+            def values(column: str) -> List[float]:
+                return [r[column] for r in ok if r[column] is not None]
+
+            ratios = [
+                r["candidate_latency"] / r["primary_latency"]
+                for r in ok if r["primary_latency"] and r["candidate_latency"] is not None
+            ]
+            summary[name] = {
+                "candidate_model": runs[0]["candidate_model"],
+                "primary_model": runs[0]["primary_model"],
+                "runs": len(runs),
+                "errors": len(runs) - len(ok),
+                "error_rate": (len(runs) - len(ok)) / len(runs),
+                "candidate_latency_p50": percentile(values("candidate_latency"), 50),
+                "candidate_latency_p95": percentile(values("candidate_latency"), 95),
+                "primary_latency_p50": percentile(values("primary_latency"), 50),
+                "primary_latency_p95": percentile(values("primary_latency"), 95),
+                "latency_ratio_p50": percentile(ratios, 50),
+                "candidate_ttft_p50": percentile(values("candidate_ttft"), 50),
+                "primary_ttft_p50": percentile(values("primary_ttft"), 50),
+                "candidate_output_tokens_mean": _mean(values("candidate_output_tokens")),
+                "primary_output_tokens_mean": _mean(values("primary_output_tokens")),
+                "rouge_l_mean": _mean(values("rouge_l")),
+                "token_f1_mean": _mean(values("token_f1")),
+            }
+        return summary
+
+
+def _mean(values: List[float]) -> Optional[float]:
+    return sum(values) / len(values) if values else None
+
+
+class ShadowMirror:
+    """
+    Runs mirrored requests with a hard cap on concurrency, dropping what doesn't fit.
+
+    Args:
+        store: Where mirrored runs are recorded (default: the process-wide store)
+        max_concurrency: Mirrored requests in flight at once in this worker
+        with_agreement: Whether to score lexical agreement with the primary answer
+        on_result: Called with (candidate, status) for each mirror: ok, error or dropped
+    """
+
+    def __init__(
+        self,
+        store: Optional[ShadowStore] = None,
+        max_concurrency: int = SHADOW_MAX_CONCURRENCY,
+        with_agreement: bool = SHADOW_AGREEMENT,
+        on_result: Optional[Callable[[str, str], None]] = None,
+    ):
+        self.store = store
+        self.max_concurrency = max_concurrency
+        self.with_agreement = with_agreement
+        self.on_result = on_result
+        self.active = 0
+        self.counts = {"ok": 0, "error": 0, "dropped": 0}
+
+    def _count(self, candidate: str, status: str) -> None:
+        self.counts[status] += 1
+        if self.on_result is not None:
+            self.on_result(candidate, status)
+
+    async def mirror(
+        self,
+        query: str,
+        primary: Dict[str, Any],
+        candidates: List[str],
+        run: Callable[[str], Awaitable[Dict[str, Any]]],
+        busy: Optional[Callable[[], bool]] = None,
+    ) -> None:
+        """
+        Re-run a query against each candidate in turn and record the results.
+
+        Args:
+            query: The user query, stored only as a hash
+            primary: The primary /query response
+            candidates: Candidate model names
+            run: Runs the query against a candidate and returns its /query response
+            busy: Returns True while the primary path needs the runner (e.g. requests queued)
+        """
+        query_hash = hashlib.sha256(query.encode("utf-8")).hexdigest()[:16]
+        for candidate in candidates:
+            if self.active >= self.max_concurrency or (busy is not None and busy()):
+                self._count(candidate, "dropped")
+                continue
+            self.active += 1
+            record = {
+                "created_at": time.time(),
+                "request_id": primary.get("request_id"),
+                "query_hash": query_hash,
+                "primary_model": primary.get("model", "unknown"),
+                "candidate_model": candidate,
+                "primary_latency": primary.get("latency", {}).get("total"),
+                "primary_ttft": primary.get("latency", {}).get("ttft"),
+                "primary_output_tokens": primary.get("tokens", {}).get("output"),
+            }
+            try:
+                result = await run(candidate)
+                record.update({
+                    "status": "ok",
+                    "candidate_latency": result.get("latency", {}).get("total"),
+                    "candidate_ttft": result.get("latency", {}).get("ttft"),
+                    "candidate_output_tokens": result.get("tokens", {}).get("output"),
+                })
+                if self.with_agreement:
+                    scores = agreement(result.get("response", ""), primary.get("response", ""))
+                    record.update(scores)
+            except Exception as e:
+                logger.info(f"Shadow request to {candidate} failed: {e}")
+                record.update({"status": "error", "error": str(e)[:500]})
+            finally:
+                self.active -= 1
+            try:
+                (self.store or get_shadow_store()).record(record)
+            except sqlite3.Error as e:
+                logger.warning(f"Failed to record shadow run: {e}")
+            self._count(candidate, record["status"])
+
+    def stats(self) -> Dict[str, Any]:
+        return {"active": self.active, "max_concurrency": self.max_concurrency, **self.counts}
+
+
+_store: Optional[ShadowStore] = None
+
+
+def get_shadow_store() -> ShadowStore:
+    """Get the process-wide store at ``SHADOW_DB_PATH``, creating it on first use."""
+    global _store
+    if _store is None:
+        _store = ShadowStore(SHADOW_DB_PATH)
+    return _store
@@ -33,6 +33,10 @@ echo "Installing optional dependencies..."
 pip install --no-cache-dir --timeout=300 --retries=3 deepchecks==0.17.5 || echo "deepchecks install failed, continuing..."
 pip install --no-cache-dir --timeout=300 --retries=3 pytest>=7.4.0 pytest-asyncio>=0.21.0 || echo "pytest install failed, continuing..."
 pip install --no-cache-dir --timeout=300 --retries=3 lm-eval>=0.4.0 || echo "lm-eval install failed, continuing..."
+pip install --no-cache-dir --timeout=300 --retries=3 orjson>=3.9.10 || echo "orjson install failed, continuing (stdlib json used for streams)..."
+pip install --no-cache-dir --timeout=300 --retries=3 zstandard>=0.22.0 || echo "zstandard install failed, continuing (gzip only)..."
+pip install --no-cache-dir --timeout=300 --retries=3 pyarrow>=14.0.1 || echo "pyarrow install failed, continuing (Arrow results disabled)..."
+pip install --no-cache-dir --timeout=300 --retries=3 pypdf>=3.17.0 || echo "pypdf install failed, continuing (PDF ingestion disabled)..."
 
 echo "Dependencies installation complete!"
 
@@ -1,30 +1,126 @@
-from fastapi import FastAPI, HTTPException
+# Time every import from here on; reported by /ready
+from observability.startup import startup_tracker
+startup_tracker.begin()
+
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 import os
 import requests
 import numpy as np
-from prometheus_client import Counter, Histogram, Gauge, generate_latest, CONTENT_TYPE_LATEST
-from fastapi.responses import Response
-from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams, PointStruct
+from fastapi.responses import Response, JSONResponse
 import time
-import concurrent.futures
+import uuid
+import asyncio
+import hmac
+import functools
+import math
+from concurrent.futures import ThreadPoolExecutor
 
 # Evaluation imports
 from evaluation import (
     evaluate_ragas,
     evaluate_bleu_rouge,
+    evaluate_bleu_rouge_batch,
     evaluate_bertscore,
-    evaluate_exact_match
+    evaluate_bertscore_batch,
+    evaluate_exact_match,
+    evaluate_token_f1
 )
 from evaluation.lm_eval_harness import (
     run_lm_eval_benchmark,
     get_available_benchmarks
 )
+from evaluation.capacity import CapacitySweep, get_capacity_store
+from evaluation.cache import get_evaluation_cache, set_lookup_callback
+from evaluation.shadow import SHADOW_DEADLINE_SECONDS, ShadowMirror, get_shadow_store, shadow_candidates
+from sandbox import get_sandbox_pool, shutdown_sandbox_pool
+from core import get_config_store
+from core.compute_client import compute_stats
+from core.prompts import PromptTemplate, cache_options, canonical_passages, parse_cache_usage
+from core.streaming import StreamDecoder
+from core.compression import CompressionMiddleware
+from core.admission import BATCH, INTERACTIVE, PRIORITY_CLASSES, AdmissionController, Overloaded
+from core.keepwarm import COLD, KeepWarmScheduler, StartClassifier
+from core.resilience import (
+    RETRIABLE_STATUSES,
+    STATE_VALUES,
+    CircuitBreaker,
+    CircuitOpen,
+    Deadline,
+    DeadlineExceeded,
+    DependencyError,
+    RetriableStatus,
+    call_with_retries,
+    is_dependency_failure,
+    is_retriable
+)
+from core.responses import FastJSONResponse, bulk_response, negotiate_format
+from retrieval import get_local_index
+from retrieval.ingest import IngestionPipeline, shutdown_chunk_pool
+from retrieval.manifest import get_manifest
+from retrieval.filters import to_qdrant_filter, validate_filters, validate_index_fields
+from observability import (
+    request_count,
+    request_latency,
+    tokens_per_second,
+    ttft_histogram,
+    tpot_histogram,
+    itl_histogram,
+    decode_rate_histogram,
+    stream_stalls_total,
+    input_tokens_total,
+    output_tokens_total,
+    prefill_histogram,
+    prompt_cache_share,
+    prompt_cached_tokens_total,
+    cold_start_ttft_histogram,
+    model_starts_total,
+    keepwarm_pings_total,
+    admission_queue_depth,
+    admission_queue_seconds,
+    admission_rejected_total,
+    circuit_breaker_state,
+    circuit_breaker_rejections_total,
+    evaluation_cache_lookups_total,
+    model_cpu_seconds_total,
+    model_energy_joules_total,
+    model_peak_rss_bytes,
+    shadow_requests_total,
+    vector_query_latency,
+    vector_search_latency,
+    error_count,
+    NULL_METRIC,
+    observe,
+    mark_process_dead,
+    mark_dead_workers,
+    render_metrics,
+    histogram_mean,
+    histogram_means_by,
+    counter_totals_by
+)
+from observability.profiler import profiler, build_report
+from observability.tracing import Trace, SPAN_KIND_CLIENT
+from observability.drift import drift_monitor
+from observability.resources import (
+    COST_PER_CPU_HOUR,
+    COST_PER_KWH,
+    efficiency,
+    estimate_cost,
+    resource_sampler
+)
+from observability.metrics import (
+    SLOW_TTFT_SECONDS,
+    SLOW_TPOT_SECONDS,
+    SLOW_ITL_SECONDS,
+    SLOW_TPS,
+    SLOW_REQUEST_SECONDS
+)
+
+startup_tracker.mark("imports_done")
 
-app = FastAPI(title="AI Pen Knife - Python RAG Backend")
+app = FastAPI(title="AI Pen Knife - Python RAG Backend", default_response_class=FastJSONResponse)
 
 # CORS middleware
 app.add_middleware(
@@ -33,88 +129,145 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Result-Meta"],
 )
 
+# gzip/zstd for large JSON/NDJSON responses, negotiated from Accept-Encoding
+app.add_middleware(CompressionMiddleware)
+
 # Environment variables
 QDRANT_URL = os.getenv("QDRANT_URL", "http://qdrant-db:6333")
 # Docker Model Runner - accessible via host.docker.internal from container
 # Or use localhost from host machine
 DOCKER_MODEL_RUNNER_URL = os.getenv("DOCKER_MODEL_RUNNER_URL", "http://host.docker.internal:11434")
 RUST_COMPUTE_URL = os.getenv("RUST_COMPUTE_URL", "http://rust-wasm-compute:8080")
+# Backend URL exposed to custom test code (the only host it may connect to)
+CUSTOM_TEST_API_URL = os.getenv("API_URL", "http://localhost:8000")
+
+# In-process vector index: "off", "fallback" (mirror ingestion, search it when
+# Qdrant fails) or "local" (serve search from it and skip Qdrant entirely)
+LOCAL_INDEX_MODE = os.getenv("LOCAL_INDEX_MODE", "off")
+
+# File ingestion (/documents/files) only reads paths below this directory
+INGEST_ROOT = os.path.realpath(os.getenv("INGEST_ROOT", "/data/corpus"))
+EMBEDDING_DIM = 384
+
+# On-demand profiling (/debug/profile): off unless enabled, optionally token-protected
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN")
+PROFILING_MAX_SECONDS = float(os.getenv("PROFILING_MAX_SECONDS", "60"))
 
 # Local model configuration (comma-separated list of model URLs)
 # Format: "name:url,name2:url2" or just URLs for auto-detection
 LOCAL_MODELS = os.getenv("LOCAL_MODELS", "").split(",") if os.getenv("LOCAL_MODELS") else []
 
-# Initialize Qdrant client
-qdrant_client = QdrantClient(url=QDRANT_URL)
+# Qdrant client, created on first use (or by warmup) to keep startup fast
+_qdrant_client = None
 
-# Prometheus metrics
-request_count = Counter(
-    "python_rag_requests_total",
-    "Total number of requests",
-    ["method", "endpoint"]
-)
+def get_qdrant_client():
+    global _qdrant_client
+    if _qdrant_client is None:
+        from qdrant_client import QdrantClient
+        _qdrant_client = QdrantClient(url=QDRANT_URL, timeout=10)
+    return _qdrant_client
 
-request_latency = Histogram(
-    "python_rag_request_duration_seconds",
-    "Request latency in seconds",
-    ["method", "endpoint"]
-)
+# Background warmup before the worker reports ready. Comma-separated task
+# names; tasks listed in WARMUP_REQUIRED keep the worker unready if they fail.
+WARMUP_TASKS = [t.strip() for t in os.getenv("WARMUP_TASKS", "qdrant,lexical,evaluators").split(",") if t.strip()]
+WARMUP_REQUIRED = [t.strip() for t in os.getenv("WARMUP_REQUIRED", "").split(",") if t.strip()]
 
-tokens_per_second = Gauge(
-    "python_rag_tokens_per_second",
-    "Tokens generated per second"
-)
+# Configuration storage: shared between workers/replicas via CONFIG_STORE_PATH
+DEFAULT_CONFIG = {
+    "model": "llama3.1",
+    "model_runner": "docker-model-runner",  # "docker-model-runner" or "local"
+    "local_model_url": None,  # URL for local model if using local runner
+    "temperature": 0.7,
+    "top_p": 0.9,
+    "bias_threshold": 0.1,
+    "drift_sensitivity": 0.05,
+    "shadow_models": [],  # Candidate models that sampled /query traffic is mirrored to
+    "shadow_sample_rate": 0.0,  # Fraction of /query requests mirrored
+    "keep_warm_models": [],  # Docker Model Runner models pinged so they stay loaded
+    "keep_warm_interval": 240.0  # Seconds of idleness before a ping (below the runner's unload timeout)
+}
+config_store = get_config_store(DEFAULT_CONFIG)
+CONFIG_POLL_INTERVAL = float(os.getenv("CONFIG_POLL_INTERVAL", "1.0"))
 
-# Speed metrics
-ttft_histogram = Histogram(
-    "python_rag_ttft_seconds",
-    "Time to first token in seconds",
-    ["model"]
-)
+# Seconds between deepchecks drift runs on the sampled /query traffic (0 disables)
+DRIFT_SUITE_INTERVAL = float(os.getenv("DRIFT_SUITE_INTERVAL", "3600"))
 
-tpot_gauge = Gauge(
-    "python_rag_tpot_seconds",
-    "Time per output token in seconds",
-    ["model"]
-)
+# Prompts put static text first so the runner can reuse its KV cache
+prompt_template = PromptTemplate()
 
-# Token tracking
-input_tokens_total = Counter(
-    "python_rag_input_tokens_total",
-    "Total input tokens",
-    ["model"]
+# Concurrent generations per model runner; overrides as "runner=limit,runner2=limit"
+RUNNER_CONCURRENCY_LIMITS = {
+    name.strip(): int(limit)
+    for name, _, limit in (item.partition("=") for item in os.getenv("RUNNER_CONCURRENCY_LIMITS", "").split(","))
+    if name.strip() and limit.strip()
+}
+admission = AdmissionController(
+    limits=RUNNER_CONCURRENCY_LIMITS,
+    on_queue_change=lambda runner, priority, queued: admission_queue_depth.labels(runner=runner, priority=priority).set(queued)
 )
 
-output_tokens_total = Counter(
-    "python_rag_output_tokens_total",
-    "Total output tokens",
-    ["model"]
-)
+# Time budget of a /query request without deadline_seconds, shared by retrieval and
+# generation; each call's timeout is the remaining budget capped at its own limit
+QUERY_DEADLINE_SECONDS = float(os.getenv("QUERY_DEADLINE_SECONDS", "120"))
+QDRANT_TIMEOUT_SECONDS = float(os.getenv("QDRANT_TIMEOUT_SECONDS", "10"))
+MODEL_RUNNER_TIMEOUT_SECONDS = float(os.getenv("MODEL_RUNNER_TIMEOUT_SECONDS", "60"))
 
-# Vector DB latency
-vector_query_latency = Histogram(
-    "python_rag_vector_query_seconds",
-    "Vector database query latency in seconds"
+# Circuit breakers per dependency: "qdrant" and one per model runner
+breakers: Dict[str, CircuitBreaker] = {}
+
+def get_breaker(name: str) -> CircuitBreaker:
+    if name not in breakers:
+        breakers[name] = CircuitBreaker(
+            name,
+            on_state_change=lambda dependency, state: circuit_breaker_state.labels(dependency=dependency).set(STATE_VALUES[state])
+        )
+        circuit_breaker_state.labels(dependency=name).set(0)
+    return breakers[name]
+
+def check_runner_response(response):
+    """Raise for model runner statuses that are the runner's fault; other statuses are returned"""
+    if response.status_code in RETRIABLE_STATUSES:
+        response.close()
+        raise RetriableStatus(response.status_code)
+    if response.status_code >= 500 and response.status_code != 501:
+        response.close()
+        raise DependencyError(response.status_code, f"Model runner returned status {response.status_code}")
+    return response
+
+def is_qdrant_retriable(error: BaseException) -> bool:
+    """Qdrant connection errors, timeouts and overload statuses"""
+    from qdrant_client.http.exceptions import ResponseHandlingException, UnexpectedResponse
+    if isinstance(error, UnexpectedResponse):
+        return error.status_code in RETRIABLE_STATUSES
+    return isinstance(error, ResponseHandlingException) or is_retriable(error)
+
+def is_qdrant_failure(error: BaseException) -> bool:
+    """Qdrant server errors (5xx) that count against its circuit breaker"""
+    from qdrant_client.http.exceptions import UnexpectedResponse
+    if isinstance(error, UnexpectedResponse):
+        return error.status_code is not None and error.status_code >= 500
+    return is_dependency_failure(error)
+
+# Hit rates of the persistent evaluation result cache (evaluation/cache.py)
+set_lookup_callback(
+    lambda metric, hit: evaluation_cache_lookups_total.labels(metric=metric, result="hit" if hit else "miss").inc()
 )
 
-error_count = Counter(
-    "python_rag_errors_total",
-    "Total number of errors",
-    ["error_type"]
+# Shadow traffic: sampled /query requests re-run against candidate models after responding
+shadow_mirror = ShadowMirror(
+    on_result=lambda candidate, status: shadow_requests_total.labels(candidate=candidate, status=status).inc()
 )
 
-# Configuration storage
-current_config = {
-    "model": "llama3.1",
-    "model_runner": "docker-model-runner",  # "docker-model-runner" or "local"
-    "local_model_url": None,  # URL for local model if using local runner
-    "temperature": 0.7,
-    "top_p": 0.9,
-    "bias_threshold": 0.1,
-    "drift_sensitivity": 0.05
-}
+# Cold/warm start classification of generations; shared with the keep-warm scheduler
+start_classifier = StartClassifier()
+KEEPWARM_MIN_INTERVAL_SECONDS = 10.0
+
+# Long-running background tasks started on startup
+background_tasks = []
 
 # Model runner registry
 model_runners = {
@@ -134,14 +287,53 @@ class ModelConfig(BaseModel):
     top_p: float
     bias_threshold: float
     drift_sensitivity: float
+    shadow_models: List[str] = []  # Candidate models to mirror sampled /query traffic to
+    shadow_sample_rate: float = 0.0  # Fraction of /query requests mirrored
+    keep_warm_models: List[str] = []  # Models pinged so the runner doesn't unload them
+    keep_warm_interval: float = 240.0  # Seconds of idleness before a keep-warm ping
 
 class QueryRequest(BaseModel):
     query: str
     use_rag: bool = True
+    collection_name: str = "default"
+    filters: Optional[Dict[str, Any]] = None  # Payload filter, see retrieval/filters.py
+    limit: int = 3
+    deadline_seconds: Optional[float] = None  # Shed with 429 if generation can't start in time
+    priority: str = INTERACTIVE  # "interactive" or "batch" (fills only idle runner capacity)
 
 class DocumentRequest(BaseModel):
     documents: List[str]
     collection_name: str = "default"
+    ids: Optional[List[str]] = None  # Stable document ids (default: position in the list)
+    prune: bool = False  # Delete previously ingested documents missing from this request
+    force: bool = False  # Re-embed even if the manifest says a document is unchanged
+    metadata: Optional[List[Dict[str, Any]]] = None  # Payload fields per document, for filtering
+    index_fields: Dict[str, str] = {}  # Payload indexes to create: field -> keyword/integer/float/bool
+
+class FileIngestionRequest(BaseModel):
+    paths: List[str]  # Files or directories, relative to INGEST_ROOT
+    collection_name: str = "default"
+    chunk_tokens: int = 256
+    chunk_overlap: int = 32
+    batch_size: int = 128
+    prune: bool = False  # Delete previously ingested files below `paths` that no longer exist
+    force: bool = False
+    metadata: Dict[str, Any] = {}  # Payload fields added to every chunk
+    index_fields: Dict[str, str] = {}
+
+class PayloadIndexRequest(BaseModel):
+    fields: Dict[str, str]  # field -> keyword/integer/float/bool
+
+class IVFBuildRequest(BaseModel):
+    nlist: int = 64
+    iterations: int = 10
+
+class VectorSearchBenchmarkRequest(BaseModel):
+    collection_name: str = "default"
+    queries: int = 100
+    limit: int = 10
+    nprobe: Optional[int] = None  # Also benchmark IVF search when the local index has partitions
+    filters: Optional[Dict[str, Any]] = None  # Benchmark filtered search
 
 class RAGASEvaluationRequest(BaseModel):
     query: str
@@ -153,10 +345,18 @@ class BLEUROUGEEvaluationRequest(BaseModel):
     generated: str
     reference: str
 
+class BLEUROUGEBatchEvaluationRequest(BaseModel):
+    generated: List[str]
+    references: List[str]
+
 class BERTScoreEvaluationRequest(BaseModel):
     generated: str
     reference: str
 
+class BERTScoreBatchEvaluationRequest(BaseModel):
+    generated: List[str]
+    references: List[str]
+
 class ExactMatchEvaluationRequest(BaseModel):
     generated: str
     reference: str
@@ -168,55 +368,165 @@ class ComprehensiveEvaluationRequest(BaseModel):
     answer: str
     ground_truth: Optional[str] = None
     model: Optional[str] = None
-    include_metrics: Optional[List[str]] = None  # ["ragas", "bleu", "rouge", "bertscore", "exact_match"]
+    include_metrics: Optional[List[str]] = None  # ["ragas", "bleu", "rouge", "bertscore", "exact_match", "f1"]
+
+class BatchEvaluationRequest(BaseModel):
+    cases: List[ComprehensiveEvaluationRequest]
+
+@app.middleware("http")
+async def profile_matching_requests(request: Request, call_next):
+    """Gate path-scoped profiling sessions on matching requests being in flight"""
+    if not profiler.busy or not profiler.matches(request.url.path):
+        return await call_next(request)
+    session = profiler.request_started()
+    try:
+        return await call_next(request)
+    finally:
+        profiler.request_finished(session)
+
+async def watch_config():
+    """Pick up config changes from other workers even while idle, so subscribers are notified"""
+    while True:
+        await asyncio.sleep(CONFIG_POLL_INTERVAL)
+        config_store.get()
+
+async def watch_drift():
+    """Periodically run the full drift suite on the sampled traffic, off the request path"""
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(DRIFT_SUITE_INTERVAL)
+        bias_threshold = config_store.get()["bias_threshold"]
+        await loop.run_in_executor(None, drift_monitor.run_suite, bias_threshold)
+
+def warm_qdrant():
+    get_qdrant_client().get_collections()
+
+def warm_lexical():
+    result = evaluate_bleu_rouge("warmup generated text", "warmup reference text")
+    if "error" in result:
+        raise RuntimeError(result["error"])
+
+def warm_evaluators():
+    missing = []
+    for module in ("datasets", "ragas", "bert_score", "sentence_transformers"):
+        try:
+            startup_tracker.imports.import_module(module)
+        except ImportError:
+            missing.append(module)
+    if missing:
+        raise RuntimeError(f"Not installed: {', '.join(missing)}")
+
+def warm_bertscore_model():
+    # Loads the scoring model weights, which dominates the first BERTScore call
+    # (bypassing the evaluation cache, which would answer without loading them)
+    result = evaluate_bertscore.__wrapped__("warmup", "warmup")
+    if "error" in result:
+        raise RuntimeError(result["error"])
+
+WARMUP_FUNCTIONS = {
+    "qdrant": warm_qdrant,
+    "lexical": warm_lexical,
+    "evaluators": warm_evaluators,
+    "bertscore_model": warm_bertscore_model,
+}
+
+@app.on_event("startup")
+async def startup():
+    startup_tracker.mark("app_startup")
+    # Workers that were killed never cleaned up their live gauges
+    mark_dead_workers()
+    # Pre-start sandbox workers so the first custom test doesn't pay for it
+    get_sandbox_pool().start()
+    background_tasks.append(asyncio.create_task(watch_config()))
+    background_tasks.append(asyncio.create_task(keep_warm.run()))
+    if DRIFT_SUITE_INTERVAL > 0:
+        background_tasks.append(asyncio.create_task(watch_drift()))
+    
+    for name in WARMUP_TASKS:
+        if name in WARMUP_FUNCTIONS:
+            startup_tracker.add_task(name, WARMUP_FUNCTIONS[name], required=name in WARMUP_REQUIRED)
+    background_tasks.append(asyncio.create_task(startup_tracker.run_warmup()))
+
+@app.on_event("shutdown")
+async def shutdown():
+    for task in background_tasks:
+        task.cancel()
+    shutdown_sandbox_pool()
+    shutdown_chunk_pool()
+    capacity_executor.shutdown(wait=False, cancel_futures=True)
+    mark_process_dead()
 
 @app.get("/")
 async def root():
     return {"message": "AI Pen Knife - Python RAG Backend", "status": "running"}
 
+@app.get("/ready")
+async def ready():
+    """Readiness: 200 once background warmup has finished, 503 before"""
+    report = startup_tracker.report()
+    if not report["ready"]:
+        return JSONResponse(status_code=503, content=report)
+    return report
+
 @app.get("/health")
 async def health():
     try:
         # Check Qdrant connection
-        collections = qdrant_client.get_collections()
+        collections = get_qdrant_client().get_collections()
         # Check Docker Model Runner connection
         model_runner_health = requests.get(f"{DOCKER_MODEL_RUNNER_URL}/v1/models", timeout=5)
         return {
             "status": "healthy",
             "qdrant": "connected",
-            "docker_model_runner": "connected" if model_runner_health.status_code == 200 else "disconnected"
+            "docker_model_runner": "connected" if model_runner_health.status_code == 200 else "disconnected",
+            "circuit_breakers": {name: breaker.snapshot() for name, breaker in breakers.items()}
         }
     except Exception as e:
-        return {"status": "unhealthy", "error": str(e)}
+        return {
+            "status": "unhealthy",
+            "error": str(e),
+            "circuit_breakers": {name: breaker.snapshot() for name, breaker in breakers.items()}
+        }
 
-async def query_local_model(url: str, prompt: str, temperature: float, top_p: float) -> str:
+async def query_local_model(
+    url: str,
+    prompt: str,
+    temperature: float,
+    top_p: float,
+    messages: Optional[List[Dict[str, str]]] = None,
+    timeout: float = 60
+) -> str:
     """Query a local model service (OpenAI-compatible or custom API)"""
+    loop = asyncio.get_running_loop()
     try:
         # Try OpenAI-compatible API first
-        response = requests.post(
+        response = await loop.run_in_executor(None, functools.partial(
+            requests.post,
             f"{url}/v1/chat/completions",
             json={
                 "model": "default",
-                "messages": [{"role": "user", "content": prompt}],
+                "messages": messages or [{"role": "user", "content": prompt}],
                 "temperature": temperature,
-                "top_p": top_p
+                "top_p": top_p,
+                **cache_options()
             },
-            timeout=60
-        )
+            timeout=timeout
+        ))
         if response.status_code == 200:
             data = response.json()
             return data.get("choices", [{}])[0].get("message", {}).get("content", "")
         
         # Try custom API format
-        response = requests.post(
+        response = await loop.run_in_executor(None, functools.partial(
+            requests.post,
             f"{url}/generate",
             json={
                 "prompt": prompt,
                 "temperature": temperature,
                 "top_p": top_p
             },
-            timeout=60
-        )
+            timeout=timeout
+        ))
         if response.status_code == 200:
             data = response.json()
             return data.get("response", data.get("text", ""))
@@ -227,6 +537,53 @@ async def query_local_model(url: str, prompt: str, temperature: float, top_p: fl
     except Exception as e:
         raise Exception(f"Error querying local model: {str(e)}")
 
+async def ping_model(model: str) -> Tuple[Optional[float], Optional[float]]:
+    """Send a one-token generation so the runner keeps a model loaded; returns (ttft, prefill_seconds)"""
+    runner = "docker-model-runner"
+    loop = asyncio.get_running_loop()
+    deadline = Deadline(MODEL_RUNNER_TIMEOUT_SECONDS)
+    
+    def post(timeout: float):
+        return check_runner_response(requests.post(
+            f"{DOCKER_MODEL_RUNNER_URL}/engines/v1/chat/completions",
+            json={
+                "model": model,
+                "messages": [{"role": "user", "content": "ping"}],
+                "max_tokens": 1,
+                "stream": True,
+                "stream_options": {"include_usage": True}
+            },
+            timeout=timeout,
+            stream=True
+        ))
+    
+    async with admission.slot(runner, model, deadline.at, BATCH):
+        decoder = StreamDecoder()
+        response = await loop.run_in_executor(
+            None, functools.partial(call_with_retries, post, get_breaker(runner), deadline,
+                                    MODEL_RUNNER_TIMEOUT_SECONDS, attempts=1)
+        )
+        try:
+            if response.status_code != 200:
+                raise Exception(f"Docker Model Runner returned status {response.status_code}")
+            await loop.run_in_executor(None, decoder.decode, deadline.bounded(response.iter_lines()))
+        finally:
+            response.close()
+    usage = parse_cache_usage(decoder.final)
+    return decoder.ttft, usage.prefill_seconds if usage is not None else None
+
+def keep_warm_settings() -> Tuple[List[str], float]:
+    current_config = config_store.get()
+    return current_config.get("keep_warm_models") or [], float(current_config.get("keep_warm_interval") or 0)
+
+keep_warm = KeepWarmScheduler(
+    start_classifier,
+    ping_model,
+    keep_warm_settings,
+    busy=lambda: admission.waiting("docker-model-runner") > 0,
+    on_ping=lambda model, status, start: keepwarm_pings_total.labels(model=model, status=status).inc()
+)
+
 @app.get("/models")
 async def get_models():
     """Fetch available models from Docker Model Runner"""
@@ -278,233 +635,663 @@ async def get_models():
 @app.post("/config")
 async def update_config(config: ModelConfig):
     """Update model and test configuration"""
-    global current_config
-    current_config = config.dict()
-    return {"message": "Configuration updated", "config": current_config}
+    if not 0.0 <= config.shadow_sample_rate <= 1.0:
+        raise HTTPException(status_code=400, detail="shadow_sample_rate must be between 0 and 1")
+    if config.keep_warm_models and config.keep_warm_interval < KEEPWARM_MIN_INTERVAL_SECONDS:
+        raise HTTPException(status_code=400, detail=f"keep_warm_interval must be at least {KEEPWARM_MIN_INTERVAL_SECONDS:g} seconds")
+    version = config_store.update(config.dict())
+    return {"message": "Configuration updated", "config": config_store.get(), "version": version}
+
+@app.get("/models/warmth")
+async def get_model_warmth():
+    """Get per-model idle time, warm TTFT baseline, cold/warm counts and the last keep-warm pings"""
+    models, interval = keep_warm_settings()
+    return {
+        "models": start_classifier.snapshot(),
+        "keep_warm": {"models": models, "interval": interval, "last_ping": keep_warm.last_ping}
+    }
 
 @app.get("/config")
 async def get_config():
     """Get current configuration"""
-    return current_config
+    return config_store.get()
+
+@app.get("/config/history")
+async def get_config_history(limit: int = 20):
+    """Get recent configuration versions"""
+    return {"current_version": config_store.version, "versions": config_store.history_entries(limit)}
+
+def search_vectors(
+    collection_name: str,
+    query_vector: List[float],
+    limit: int,
+    filters: Optional[Dict[str, Any]] = None,
+    deadline: Optional[Deadline] = None,
+    shadow: bool = False
+):
+    """
+    Search Qdrant, or the local index when configured or when Qdrant fails; returns (hits, backend)
+
+    Qdrant calls go through its circuit breaker and are retried on transient
+    errors within the deadline; an open circuit goes straight to the local
+    index in fallback mode. Searches for shadow runs record no metrics.
+    """
+    def metric(m):
+        return NULL_METRIC if shadow else m
+    
+    filtered = "true" if filters else "false"
+    if LOCAL_INDEX_MODE != "local":
+        start = time.perf_counter()
+        try:
+            results = call_with_retries(
+                lambda timeout: get_qdrant_client().search(
+                    collection_name=collection_name,
+                    query_vector=query_vector,
+                    query_filter=to_qdrant_filter(filters),
+                    limit=limit,
+                    timeout=max(1, math.ceil(timeout))
+                ),
+                get_breaker("qdrant"),
+                deadline or Deadline(),
+                QDRANT_TIMEOUT_SECONDS,
+                retriable=is_qdrant_retriable,
+                failure=is_qdrant_failure
+            )
+            metric(vector_search_latency).labels(
+                backend="qdrant", collection=collection_name, filtered=filtered
+            ).observe(time.perf_counter() - start)
+            return results, "qdrant"
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            if isinstance(e, CircuitOpen):
+                metric(circuit_breaker_rejections_total).labels(dependency="qdrant").inc()
+            if LOCAL_INDEX_MODE != "fallback":
+                raise
+            metric(error_count).labels(error_type="qdrant_search_fallback").inc()
+    
+    start = time.perf_counter()
+    results = get_local_index().search(collection_name, query_vector, limit, filters=filters)
+    metric(vector_search_latency).labels(
+        backend="local", collection=collection_name, filtered=filtered
+    ).observe(time.perf_counter() - start)
+    return results, "local"
+
+# Qdrant collections known to exist, so upserts skip the existence check
+_qdrant_collections = set()
+
+def ensure_qdrant_collection(collection_name: str, dim: int):
+    """Create a Qdrant collection if it doesn't exist"""
+    if collection_name in _qdrant_collections:
+        return
+    from qdrant_client.models import Distance, VectorParams
+    qdrant_client = get_qdrant_client()
+    try:
+        qdrant_client.get_collection(collection_name)
+    except:
+        qdrant_client.create_collection(
+            collection_name=collection_name,
+            vectors_config=VectorParams(size=dim, distance=Distance.COSINE)
+        )
+    _qdrant_collections.add(collection_name)
+
+def create_payload_indexes(collection_name: str, fields: Dict[str, str]):
+    """
+    Index payload fields for filtered search, creating the collection if needed.
+
+    Qdrant builds filter-aware HNSW links for indexed fields, so filters are
+    applied during graph traversal instead of dropping hits afterwards;
+    creating the indexes before points are uploaded avoids a rebuild.
+    """
+    if not fields:
+        return
+    if LOCAL_INDEX_MODE != "off":
+        collection = get_local_index().get(collection_name, dim=EMBEDDING_DIM)
+        for field in fields:
+            collection.create_payload_index(field)
+    if LOCAL_INDEX_MODE == "local":
+        return
+    
+    from qdrant_client.models import PayloadSchemaType
+    ensure_qdrant_collection(collection_name, EMBEDDING_DIM)
+    for field, field_type in fields.items():
+        get_qdrant_client().create_payload_index(
+            collection_name=collection_name,
+            field_name=field,
+            field_schema=PayloadSchemaType(field_type)
+        )
+
+def upsert_points(collection_name: str, ids: List[Any], vectors: List[List[float]], payloads: List[Dict[str, Any]]):
+    """Write points to Qdrant and/or the local index, depending on LOCAL_INDEX_MODE"""
+    if not ids:
+        return
+    if LOCAL_INDEX_MODE != "off":
+        get_local_index().upsert(collection_name, ids, vectors, payloads)
+    if LOCAL_INDEX_MODE == "local":
+        return
+    
+    from qdrant_client.models import PointStruct
+    ensure_qdrant_collection(collection_name, len(vectors[0]))
+    get_qdrant_client().upsert(
+        collection_name=collection_name,
+        points=[
+            PointStruct(id=point_id, vector=vector, payload=payload)
+            for point_id, vector, payload in zip(ids, vectors, payloads)
+        ]
+    )
+
+def delete_points(collection_name: str, ids: List[Any]):
+    """Remove points from Qdrant and/or the local index, depending on LOCAL_INDEX_MODE"""
+    if not ids:
+        return
+    if LOCAL_INDEX_MODE != "off":
+        collection = get_local_index().get(collection_name)
+        if collection is not None:
+            collection.delete(ids)
+    if LOCAL_INDEX_MODE == "local":
+        return
+    
+    from qdrant_client.models import PointIdsList
+    get_qdrant_client().delete(
+        collection_name=collection_name,
+        points_selector=PointIdsList(points=ids)
+    )
+
+def ingestion_pipeline(collection_name: str, index_fields: Dict[str, str], **options) -> IngestionPipeline:
+    """Pipeline writing to a collection, diffing against the ingestion manifest"""
+    try:
+        validate_index_fields(index_fields)
+        return IngestionPipeline(
+            embed=embed_texts,
+            upsert=lambda ids, vectors, payloads: upsert_points(collection_name, ids, vectors, payloads),
+            delete=lambda ids: delete_points(collection_name, ids),
+            manifest=get_manifest(),
+            collection=collection_name,
+            **options
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def embed_texts(texts: List[str]) -> List[List[float]]:
+    """Embed texts (placeholder - in production, call the embedding service)"""
+    return np.random.rand(len(texts), EMBEDDING_DIM).tolist()
 
 @app.post("/query")
-async def query(request: QueryRequest):
+async def query(request: QueryRequest, http_request: Request, background_tasks: BackgroundTasks):
     """Execute a query with optional RAG"""
+    try:
+        validate_filters(request.filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if request.limit < 1:
+        raise HTTPException(status_code=400, detail="limit must be at least 1")
+    if request.deadline_seconds is not None and request.deadline_seconds <= 0:
+        raise HTTPException(status_code=400, detail="deadline_seconds must be positive")
+    if request.priority not in PRIORITY_CLASSES:
+        raise HTTPException(status_code=400, detail=f"priority must be one of {list(PRIORITY_CLASSES)}")
+    current_config = config_store.get()
+    result = await execute_query(request, current_config, traceparent=http_request.headers.get("traceparent"))
+    candidates = shadow_candidates(current_config)
+    if candidates:
+        # Runs after the response has been sent
+        background_tasks.add_task(mirror_query, request, result, current_config, candidates)
+    return result
+
+async def mirror_query(
+    request: QueryRequest,
+    primary: Dict[str, Any],
+    current_config: Dict[str, Any],
+    candidates: List[str]
+) -> None:
+    """Re-run a query against candidate models as low-priority shadow traffic"""
+    runner = current_config.get("model_runner", "docker-model-runner")
+    if runner == "local" and not current_config.get("local_model_url"):
+        runner = "docker-model-runner"
+    shadow_request = QueryRequest(**{**request.dict(), "priority": BATCH, "deadline_seconds": SHADOW_DEADLINE_SECONDS})
+    await shadow_mirror.mirror(
+        request.query,
+        primary,
+        candidates,
+        run=lambda candidate: execute_query(shadow_request, {**current_config, "model": candidate}, shadow=True),
+        # Skip while user requests are waiting for the runner
+        busy=lambda: admission.waiting(runner) > 0
+    )
+
+async def execute_query(
+    request: QueryRequest,
+    current_config: Dict[str, Any],
+    traceparent: Optional[str] = None,
+    shadow: bool = False
+) -> Dict[str, Any]:
+    """
+    Run a query against the given configuration snapshot
+
+    Shadow runs (mirrored to candidate models) are recorded only in the shadow
+    store, so they leave the /query series, per-model metrics and drift untouched.
+    """
+    def metric(m):
+        return NULL_METRIC if shadow else m
+    
     start_time = time.time()
-    request_count.labels(method="POST", endpoint="/query").inc()
+    deadline = Deadline(request.deadline_seconds or QUERY_DEADLINE_SECONDS)
+    request_id = uuid.uuid4().hex
+    metric(request_count).labels(method="POST", endpoint="/query").inc()
+    trace = Trace("POST /query", traceparent, request_id=request_id, use_rag=request.use_rag, priority=request.priority,
+                  shadow=shadow)
+    resource_run = None
     
     try:
         if request.use_rag:
             # RAG pipeline: search Qdrant, then query LLM with context
             # For now, simplified implementation
-            vector_search_start = time.time()
-            results = qdrant_client.search(
-                collection_name="default",
-                query_vector=np.random.rand(384).tolist(),  # Placeholder embedding
-                limit=3
-            )
-            vector_latency = time.time() - vector_search_start
-            vector_query_latency.observe(vector_latency)
+            with trace.span("embed"):
+                query_vector = embed_texts([request.query])[0]  # Placeholder embedding
+            
+            with trace.span("vector_search", SPAN_KIND_CLIENT, collection=request.collection_name,
+                            limit=request.limit, filtered=bool(request.filters)) as span:
+                vector_search_start = time.time()
+                results, span.attributes["backend"] = await asyncio.get_running_loop().run_in_executor(
+                    None, search_vectors, request.collection_name, query_vector, request.limit, request.filters, deadline,
+                    shadow
+                )
+                vector_latency = time.time() - vector_search_start
+                metric(vector_query_latency).observe(vector_latency)
             
-            context = " ".join([str(r.payload) for r in results])
-            prompt = f"Context: {context}\n\nQuestion: {request.query}\n\nAnswer:"
+            with trace.span("context_build", documents=len(results)):
+                passages = canonical_passages([r.payload or {} for r in results])
         else:
-            prompt = request.query
+            passages = []
+        messages = prompt_template.messages(request.query, passages)
+        prompt = prompt_template.text(request.query, passages)
         
         # Query model based on configured runner
         model_runner = current_config.get("model_runner", "docker-model-runner")
+        model_name = current_config.get("model", "unknown")
+        trace.set_attribute("model", model_name)
+        # CPU, memory and energy used from here until the response is read count towards the model
+        if resource_sampler is not None:
+            resource_run = resource_sampler.start(model_name)
         response_text = ""
+        first_token_time = None
+        cache_usage = None
+        stream_stats = None
+        loop = asyncio.get_running_loop()
         
         if model_runner == "local" and current_config.get("local_model_url"):
             # Query local model
-            response_text = await query_local_model(
-                current_config["local_model_url"],
-                prompt,
-                current_config["temperature"],
-                current_config["top_p"]
-            )
+            async with admission.slot("local", model_name, deadline.at, request.priority) as queue_seconds:
+                metric(admission_queue_seconds).labels(runner="local", model=model_name, priority=request.priority).observe(queue_seconds)
+                query_start = time.time()
+                breaker = get_breaker("local")
+                breaker.before_call()
+                with trace.span("generate", SPAN_KIND_CLIENT, runner="local", queue_seconds=queue_seconds):
+                    try:
+                        response_text = await query_local_model(
+                            current_config["local_model_url"],
+                            prompt,
+                            current_config["temperature"],
+                            current_config["top_p"],
+                            messages=messages,
+                            timeout=deadline.timeout(MODEL_RUNNER_TIMEOUT_SECONDS)
+                        )
+                    except Exception as e:
+                        breaker.record_failure(e)
+                        raise
+                    breaker.record_success()
         else:
             # Query Docker Model Runner (OpenAI-compatible API)
             # Docker Model Runner uses OpenAI-compatible endpoints
-            model_name = current_config.get("model", "unknown")
-            query_start = time.time()
-            first_token_time = None
-            
-            # Try streaming first to get TTFT
-            try:
-                stream_response = requests.post(
-                    f"{DOCKER_MODEL_RUNNER_URL}/engines/v1/chat/completions",
-                    json={
-                        "model": current_config["model"],
-                        "messages": [{"role": "user", "content": prompt}],
-                        "temperature": current_config["temperature"],
-                        "top_p": current_config["top_p"],
-                        "stream": True
-                    },
-                    timeout=60,
-                    stream=True
+            breaker = get_breaker(model_runner)
+            queue_start_ns = time.time_ns()
+            # Wait for a runner slot; the slot is held until the response is fully read
+            async with admission.slot(model_runner, model_name, deadline.at, request.priority) as queue_seconds:
+                metric(admission_queue_seconds).labels(runner=model_runner, model=model_name, priority=request.priority).observe(queue_seconds)
+                if queue_seconds:
+                    trace.add_span("queue", queue_start_ns, time.time_ns())
+                query_start = time.time()
+                query_start_ns = time.time_ns()
+                
+                def post_completion(stream: bool, timeout: float):
+                    response = requests.post(
+                        f"{DOCKER_MODEL_RUNNER_URL}/engines/v1/chat/completions",
+                        json={
+                            "model": current_config["model"],
+                            "messages": messages,
+                            "temperature": current_config["temperature"],
+                            "top_p": current_config["top_p"],
+                            "stream": stream,
+                            **({"stream_options": {"include_usage": True}} if stream else {}),
+                            **cache_options()
+                        },
+                        headers={"traceparent": trace.traceparent},
+                        timeout=timeout,
+                        stream=stream
+                    )
+                    return check_runner_response(response)
+                
+                # Stream to get TTFT and inter-token latencies. Blocking I/O runs in the
+                # executor so queued requests can still be admitted or shed meanwhile.
+                decoder = StreamDecoder()
+                stream_response = await loop.run_in_executor(
+                    None, call_with_retries, functools.partial(post_completion, True),
+                    breaker, deadline, MODEL_RUNNER_TIMEOUT_SECONDS
                 )
+                headers_ns = time.time_ns()
+                trace.add_span("connect", query_start_ns, headers_ns, SPAN_KIND_CLIENT,
+                               status_code=stream_response.status_code)
                 
                 if stream_response.status_code == 200:
-                    response_text = ""
-                    first_chunk = True
-                    for line in stream_response.iter_lines():
-                        if line:
-                            if first_chunk:
-                                first_token_time = time.time() - query_start
-                                first_chunk = False
-                            # Parse SSE format
-                            if line.startswith(b"data: "):
-                                data = line[6:]
-                                if data == b"[DONE]":
-                                    break
-                                try:
-                                    import json
-                                    chunk_data = json.loads(data)
-                                    delta = chunk_data.get("choices", [{}])[0].get("delta", {})
-                                    content = delta.get("content", "")
-                                    if content:
-                                        response_text += content
-                                except:
-                                    pass
-                    
-                    if first_token_time:
-                        ttft_histogram.labels(model=model_name).observe(first_token_time)
-            except:
-                # Fallback to non-streaming
-                model_response = requests.post(
-                    f"{DOCKER_MODEL_RUNNER_URL}/engines/v1/chat/completions",
-                    json={
-                        "model": current_config["model"],
-                        "messages": [{"role": "user", "content": prompt}],
-                        "temperature": current_config["temperature"],
-                        "top_p": current_config["top_p"],
-                        "stream": False
-                    },
-                    timeout=60
-                )
+                    try:
+                        await loop.run_in_executor(None, decoder.decode, deadline.bounded(stream_response.iter_lines()))
+                    except requests.RequestException as e:
+                        # Dropped mid-stream: the tokens so far are spent, so don't re-issue the generation
+                        breaker.record_failure(e)
+                        raise
+                    finally:
+                        stream_response.close()
+                    response_text = decoder.text
+                    cache_usage = parse_cache_usage(decoder.final)
+                    stream_stats = decoder.stats()
+                    if decoder.parse_errors:
+                        metric(error_count).labels(error_type="stream_parse_error").inc(decoder.parse_errors)
                 
-                if model_response.status_code == 200:
-                    data = model_response.json()
-                    response_text = data.get("choices", [{}])[0].get("message", {}).get("content", "")
-                    # Estimate TTFT as 20% of total time (rough approximation)
-                    first_token_time = (time.time() - query_start) * 0.2
-                    ttft_histogram.labels(model=model_name).observe(first_token_time)
+                    first_token_time = stream_stats["ttft"]
+                    if first_token_time is not None:
+                        # first_token covers prefill after the headers arrived
+                        first_chunk_ns = max(query_start_ns + int(first_token_time * 1e9), headers_ns)
+                        trace.add_span("first_token", headers_ns, first_chunk_ns)
+                        trace.add_span("decode", first_chunk_ns, time.time_ns(),
+                                       chunks=stream_stats["chunks"], stalls=stream_stats["stalls"])
+                        itl = metric(itl_histogram).labels(model=model_name)
+                        for gap in decoder.gaps():
+                            observe(itl, gap, request_id, slow=gap >= SLOW_ITL_SECONDS)
+                        if stream_stats["stalls"]:
+                            metric(stream_stalls_total).labels(model=model_name).inc(stream_stats["stalls"])
+                        if stream_stats["decode_rate"] is not None:
+                            metric(decode_rate_histogram).labels(model=model_name).observe(stream_stats["decode_rate"])
                 else:
-                    error_count.labels(error_type="model_runner_error").inc()
-                    raise HTTPException(status_code=500, detail=f"Docker Model Runner request failed: {model_response.status_code}")
-            
+                    # The runner rejected streaming: fall back to a non-streaming request
+                    stream_response.close()
+                    trace.set_attribute("stream_error", f"HTTP {stream_response.status_code}")
+                    with trace.span("generate", SPAN_KIND_CLIENT, stream=False):
+                        model_response = await loop.run_in_executor(
+                            None, call_with_retries, functools.partial(post_completion, False),
+                            breaker, deadline, MODEL_RUNNER_TIMEOUT_SECONDS
+                        )
+                
+                    if model_response.status_code == 200:
+                        data = model_response.json()
+                        response_text = data.get("choices", [{}])[0].get("message", {}).get("content", "")
+                        cache_usage = parse_cache_usage(data)
+                        # Estimate TTFT as 20% of total time (rough approximation)
+                        first_token_time = (time.time() - query_start) * 0.2
+                    else:
+                        metric(error_count).labels(error_type="model_runner_error").inc()
+                        raise HTTPException(status_code=500, detail=f"Docker Model Runner request failed: {model_response.status_code}")
+        
+        with trace.span("post_process"):
             # Calculate metrics
-            total_latency = time.time() - start_time
             query_latency = time.time() - query_start
+            resources = resource_sampler.stop(resource_run) if resource_run is not None else None
+            
+            # Requests that waited for a model load get their own TTFT series
+            model_start = start_classifier.classify(
+                model_name, first_token_time, cache_usage.prefill_seconds if cache_usage is not None else None
+            )
+            cold_start = model_start is not None and model_start["state"] == COLD
+            if model_start is not None:
+                metric(model_starts_total).labels(model=model_name, state=model_start["state"]).inc()
+                trace.set_attribute("model_start", model_start["state"])
+                if cold_start:
+                    metric(cold_start_ttft_histogram).labels(model=model_name).observe(first_token_time)
+                else:
+                    observe(
+                        metric(ttft_histogram).labels(model=model_name),
+                        first_token_time,
+                        request_id,
+                        slow=first_token_time >= SLOW_TTFT_SECONDS
+                    )
             
             # Estimate token counts (rough approximation - count words)
             # In production, use actual tokenizer
             input_tokens = len(prompt.split())
             output_tokens = len(response_text.split())
             
+            if cache_usage is not None:
+                if cache_usage.prompt_tokens:
+                    input_tokens = cache_usage.prompt_tokens
+                metric(prompt_cached_tokens_total).labels(model=model_name).inc(cache_usage.cached_tokens)
+                metric(prompt_cache_share).labels(model=model_name).observe(cache_usage.cached_share)
+                if cache_usage.prefill_seconds is not None:
+                    metric(prefill_histogram).labels(model=model_name).observe(cache_usage.prefill_seconds)
+                trace.set_attribute("cached_tokens", cache_usage.cached_tokens)
+            
             # Track tokens
-            input_tokens_total.labels(model=model_name).inc(input_tokens)
-            output_tokens_total.labels(model=model_name).inc(output_tokens)
+            metric(input_tokens_total).labels(model=model_name).inc(input_tokens)
+            metric(output_tokens_total).labels(model=model_name).inc(output_tokens)
             
             # Calculate TPOT
             if output_tokens > 0 and query_latency > 0:
                 tpot = query_latency / output_tokens
-                tpot_gauge.labels(model=model_name).set(tpot)
+                observe(metric(tpot_histogram).labels(model=model_name), tpot, request_id, slow=tpot >= SLOW_TPOT_SECONDS)
             else:
                 tpot = 0
             
             tps = output_tokens / query_latency if query_latency > 0 else 0
             
-            tokens_per_second.set(tps)
-            request_latency.labels(method="POST", endpoint="/query").observe(total_latency)
+            if output_tokens > 0:
+                observe(metric(tokens_per_second).labels(model=model_name), tps, request_id, slow=tps <= SLOW_TPS)
             
-            return {
-                "response": response_text,
-                "tokens": {
-                    "input": input_tokens,
-                    "output": output_tokens,
-                    "total": input_tokens + output_tokens
-                },
-                "latency": {
-                    "total": total_latency,
-                    "query": query_latency,
-                    "ttft": first_token_time if first_token_time else None
-                },
-                "tokens_per_second": tps,
-                "tpot": tpot,
-                "model_runner": model_runner,
-                "model": model_name
-            }
+            if resources is not None:
+                if not shadow:
+                    record_resources(model_name, resources)
+                resources.update(efficiency(resources, output_tokens))
             
+            drift_alerts = None if shadow else drift_monitor.observe(
+                model_name,
+                request.query,
+                response_text,
+                query_latency,
+                None if cold_start else first_token_time,
+                current_config["drift_sensitivity"],
+                decode_rate=stream_stats["decode_rate"] if stream_stats else None
+            )
+        
+        total_latency = time.time() - start_time
+        observe(
+            metric(request_latency).labels(method="POST", endpoint="/query"),
+            total_latency,
+            request_id,
+            slow=total_latency >= SLOW_REQUEST_SECONDS
+        )
+        trace.set_attribute("output_tokens", output_tokens)
+        trace.finish()
+        
+        return {
+            "response": response_text,
+            "tokens": {
+                "input": input_tokens,
+                "output": output_tokens,
+                "total": input_tokens + output_tokens
+            },
+            "latency": {
+                "total": total_latency,
+                "query": query_latency,
+                "queue": queue_seconds,
+                "ttft": first_token_time if first_token_time else None
+            },
+            "model_start": model_start,
+            "stream": stream_stats,
+            "resources": resources,
+            "prompt_cache": {
+                "prompt_tokens": cache_usage.prompt_tokens,
+                "cached_tokens": cache_usage.cached_tokens,
+                "cached_share": cache_usage.cached_share,
+                "prefill_seconds": cache_usage.prefill_seconds
+            } if cache_usage is not None else None,
+            "timings": trace.timings(),
+            "tokens_per_second": tps,
+            "tpot": tpot,
+            "model_runner": model_runner,
+            "model": model_name,
+            "request_id": request_id,
+            "trace_id": trace.trace_id,
+            "config_version": config_store.version,
+            "drift_alerts": drift_alerts
+        }
+        
+    except Overloaded as e:
+        metric(admission_rejected_total).labels(
+            runner=model_runner, model=model_name, priority=request.priority, reason=e.reason
+        ).inc()
+        metric(request_latency).labels(method="POST", endpoint="/query").observe(time.time() - start_time)
+        trace.finish(error=str(e))
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(math.ceil(e.retry_after))})
+    except CircuitOpen as e:
+        metric(circuit_breaker_rejections_total).labels(dependency=e.name).inc()
+        metric(request_latency).labels(method="POST", endpoint="/query").observe(time.time() - start_time)
+        trace.finish(error=str(e))
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(math.ceil(e.retry_after))})
+    except DeadlineExceeded as e:
+        metric(error_count).labels(error_type="deadline_exceeded").inc()
+        metric(request_latency).labels(method="POST", endpoint="/query").observe(time.time() - start_time)
+        trace.finish(error=str(e))
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
-        error_count.labels(error_type="query_error").inc()
-        request_latency.labels(method="POST", endpoint="/query").observe(time.time() - start_time)
+        metric(error_count).labels(error_type="query_error").inc()
+        metric(request_latency).labels(method="POST", endpoint="/query").observe(time.time() - start_time)
+        trace.finish(error=str(e))
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if resource_run is not None:
+            # No-op when the run was already stopped after a successful generation
+            resource_sampler.stop(resource_run)
+
+def record_resources(model: str, usage: Dict[str, Any]) -> None:
+    """Export a run's sampled CPU time, peak memory and energy under its model"""
+    for process, seconds in usage["cpu_seconds"].items():
+        model_cpu_seconds_total.labels(model=model, process=process).inc(seconds)
+    for process, rss_bytes in usage["peak_rss_bytes"].items():
+        model_peak_rss_bytes.labels(model=model, process=process).set(rss_bytes)
+    if usage["energy_joules"] is not None:
+        model_energy_joules_total.labels(model=model).inc(usage["energy_joules"])
 
 @app.post("/documents")
 async def ingest_documents(request: DocumentRequest):
-    """Ingest documents into the vector database"""
+    """Ingest documents into the vector database, embedding only new or changed chunks"""
     request_count.labels(method="POST", endpoint="/documents").inc()
     start_time = time.time()
+    ids = request.ids if request.ids is not None else [str(i) for i in range(len(request.documents))]
+    if len(ids) != len(request.documents) or len(set(ids)) != len(ids):
+        raise HTTPException(status_code=400, detail="ids must be unique and match documents")
+    if request.metadata is not None and len(request.metadata) != len(request.documents):
+        raise HTTPException(status_code=400, detail="metadata must match documents")
+    pipeline = ingestion_pipeline(request.collection_name, request.index_fields, force=request.force)
+    
+    def run():
+        create_payload_indexes(request.collection_name, request.index_fields)
+        return pipeline.run_documents(list(zip(ids, request.documents)), request.prune, request.metadata)
     
     try:
-        # Create collection if it doesn't exist
-        try:
-            qdrant_client.get_collection(request.collection_name)
-        except:
-            qdrant_client.create_collection(
-                collection_name=request.collection_name,
-                vectors_config=VectorParams(size=384, distance=Distance.COSINE)
-            )
-        
-        # Generate embeddings (simplified - in production, use proper embedding model)
         vector_start = time.time()
-        points = []
-        for i, doc in enumerate(request.documents):
-            # Placeholder embedding - in production, call embedding service
-            embedding = np.random.rand(384).tolist()
-            points.append(
-                PointStruct(
-                    id=i,
-                    vector=embedding,
-                    payload={"text": doc}
-                )
-            )
-        
-        qdrant_client.upsert(
-            collection_name=request.collection_name,
-            points=points
-        )
+        stats = await asyncio.get_running_loop().run_in_executor(None, run)
         
         vector_latency = time.time() - vector_start
         vector_query_latency.observe(vector_latency)
         
         request_latency.labels(method="POST", endpoint="/documents").observe(time.time() - start_time)
-        return {"message": f"Ingested {len(request.documents)} documents", "collection": request.collection_name}
+        return {
+            "message": f"Ingested {len(request.documents)} documents",
+            "collection": request.collection_name,
+            **stats
+        }
         
     except Exception as e:
         error_count.labels(error_type="ingestion_error").inc()
         request_latency.labels(method="POST", endpoint="/documents").observe(time.time() - start_time)
         raise HTTPException(status_code=500, detail=str(e))
 
+def resolve_ingest_path(path: str) -> str:
+    """Resolve a path against INGEST_ROOT, rejecting anything outside it"""
+    resolved = os.path.realpath(os.path.join(INGEST_ROOT, path))
+    if resolved != INGEST_ROOT and not resolved.startswith(INGEST_ROOT + os.sep):
+        raise HTTPException(status_code=400, detail=f"Path outside ingest root: {path}")
+    if not os.path.exists(resolved):
+        raise HTTPException(status_code=404, detail=f"Path not found: {path}")
+    return resolved
+
+@app.post("/documents/files")
+async def ingest_files(request: FileIngestionRequest):
+    """Parse, chunk, embed and upsert text/markdown/HTML/PDF files from INGEST_ROOT"""
+    request_count.labels(method="POST", endpoint="/documents/files").inc()
+    start_time = time.time()
+    paths = [resolve_ingest_path(p) for p in request.paths]
+    pipeline = ingestion_pipeline(
+        request.collection_name,
+        request.index_fields,
+        chunk_tokens=request.chunk_tokens,
+        overlap=request.chunk_overlap,
+        batch_size=request.batch_size,
+        force=request.force,
+        metadata=request.metadata
+    )
+    
+    def run():
+        create_payload_indexes(request.collection_name, request.index_fields)
+        return pipeline.run(paths, request.prune)
+    
+    try:
+        stats = await asyncio.get_running_loop().run_in_executor(None, run)
+        request_latency.labels(method="POST", endpoint="/documents/files").observe(time.time() - start_time)
+        return {"collection": request.collection_name, **stats}
+        
+    except Exception as e:
+        error_count.labels(error_type="ingestion_error").inc()
+        request_latency.labels(method="POST", endpoint="/documents/files").observe(time.time() - start_time)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/collections/{collection_name}/payload-indexes")
+async def create_collection_payload_indexes(collection_name: str, request: PayloadIndexRequest):
+    """Index payload fields of a collection for filtered /query searches"""
+    try:
+        validate_index_fields(request.fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        await asyncio.get_running_loop().run_in_executor(
+            None, create_payload_indexes, collection_name, request.fields
+        )
+        return {"collection": collection_name, "indexed_fields": request.fields}
+    except Exception as e:
+        error_count.labels(error_type="payload_index_error").inc()
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/documents/manifest/{collection_name}")
+async def get_ingestion_manifest(collection_name: str):
+    """Documents and chunks recorded as ingested into a collection"""
+    return get_manifest().summary(collection_name)
+
 @app.get("/metrics")
 async def get_metrics():
     """Get current performance metrics"""
     try:
-        # This would typically query Prometheus, but for simplicity, return current gauge values
+        # Mean over all models and workers; per-model distributions are in Prometheus
         return {
-            "tokensPerSecond": tokens_per_second._value.get() if hasattr(tokens_per_second, '_value') else 0,
+            "tokensPerSecond": histogram_mean("python_rag_output_tokens_per_second"),
+            "promptCacheShare": histogram_mean("python_rag_prompt_cache_share"),
+            "prefillSeconds": histogram_mean("python_rag_prefill_seconds"),
             "latency": 0,  # Would be calculated from histogram
-            "errorRate": 0  # Would be calculated from counters
+            "errorRate": 0,  # Would be calculated from counters
+            "computeOffload": compute_stats()
         }
     except Exception as e:
         return {"error": str(e)}
 
 @app.get("/metrics/prometheus")
-async def prometheus_metrics():
-    """Expose Prometheus metrics"""
-    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
+async def prometheus_metrics(request: Request):
+    """Expose Prometheus metrics (OpenMetrics with exemplars when requested)"""
+    content, content_type = render_metrics(request.headers.get("accept"))
+    return Response(content=content, media_type=content_type)
 
 # Service definitions with ports
 # Note: Health checks from inside container use internal hostnames, but URLs are for external access
@@ -678,6 +1465,26 @@ async def evaluate_bleu_rouge_endpoint(request: BLEUROUGEEvaluationRequest):
         error_count.labels(error_type="evaluation_error").inc()
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/evaluate/bleu-rouge/batch")
+async def evaluate_bleu_rouge_batch_endpoint(request: BLEUROUGEBatchEvaluationRequest):
+    """Evaluate many generations using BLEU and ROUGE, including corpus-level BLEU"""
+    request_count.labels(method="POST", endpoint="/evaluate/bleu-rouge/batch").inc()
+    start_time = time.time()
+    
+    if len(request.generated) != len(request.references):
+        raise HTTPException(status_code=400, detail="generated and references must have the same length")
+    
+    try:
+        result = evaluate_bleu_rouge_batch(
+            generated=request.generated,
+            references=request.references
+        )
+        request_latency.labels(method="POST", endpoint="/evaluate/bleu-rouge/batch").observe(time.time() - start_time)
+        return result
+    except Exception as e:
+        error_count.labels(error_type="evaluation_error").inc()
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.post("/evaluate/bertscore")
 async def evaluate_bertscore_endpoint(request: BERTScoreEvaluationRequest):
     """Evaluate semantic similarity using BERTScore"""
@@ -695,6 +1502,25 @@ async def evaluate_bertscore_endpoint(request: BERTScoreEvaluationRequest):
         error_count.labels(error_type="evaluation_error").inc()
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/evaluate/bertscore/batch")
+async def evaluate_bertscore_batch_endpoint(request: BERTScoreBatchEvaluationRequest):
+    """Evaluate many generations using BERTScore in one batch"""
+    request_count.labels(method="POST", endpoint="/evaluate/bertscore/batch").inc()
+    start_time = time.time()
+    
+    if len(request.generated) != len(request.references):
+        raise HTTPException(status_code=400, detail="generated and references must have the same length")
+    
+    try:
+        result = await asyncio.get_running_loop().run_in_executor(
+            None, evaluate_bertscore_batch, request.generated, request.references
+        )
+        request_latency.labels(method="POST", endpoint="/evaluate/bertscore/batch").observe(time.time() - start_time)
+        return result
+    except Exception as e:
+        error_count.labels(error_type="evaluation_error").inc()
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.post("/evaluate/exact-match")
 async def evaluate_exact_match_endpoint(request: ExactMatchEvaluationRequest):
     """Evaluate exact match for fact-based QA"""
@@ -713,6 +1539,62 @@ async def evaluate_exact_match_endpoint(request: ExactMatchEvaluationRequest):
         error_count.labels(error_type="evaluation_error").inc()
         raise HTTPException(status_code=500, detail=str(e))
 
+def run_comprehensive_evaluation(request: ComprehensiveEvaluationRequest) -> Dict[str, Any]:
+    """Run the selected metrics for one query/answer pair"""
+    start_time = time.time()
+    metrics_to_include = request.include_metrics or ["ragas", "bleu", "rouge", "bertscore", "exact_match", "f1"]
+    results = {}
+    
+    # RAGAS
+    if "ragas" in metrics_to_include and request.ground_truth:
+        results["ragas"] = evaluate_ragas(
+            query=request.query,
+            context=request.context,
+            answer=request.answer,
+            ground_truth=request.ground_truth
+        )
+    
+    # BLEU/ROUGE
+    if "bleu" in metrics_to_include or "rouge" in metrics_to_include:
+        if request.ground_truth:
+            results["bleu_rouge"] = evaluate_bleu_rouge(
+                generated=request.answer,
+                reference=request.ground_truth
+            )
+    
+    # BERTScore
+    if "bertscore" in metrics_to_include:
+        if request.ground_truth:
+            results["bertscore"] = evaluate_bertscore(
+                generated=request.answer,
+                reference=request.ground_truth
+            )
+    
+    # Exact Match
+    if "exact_match" in metrics_to_include:
+        if request.ground_truth:
+            results["exact_match"] = evaluate_exact_match(
+                generated=request.answer,
+                reference=request.ground_truth
+            )
+    
+    # Token F1
+    if "f1" in metrics_to_include:
+        if request.ground_truth:
+            results["token_f1"] = evaluate_token_f1(
+                generated=request.answer,
+                reference=request.ground_truth
+            )
+    
+    results["model"] = request.model
+    results["evaluation_time"] = time.time() - start_time
+    return results
+
+# Comprehensive evaluations (RAGAS, BERTScore) are CPU-bound and run in the thread
+# pool; at most this many at once per worker, so batches can't starve other requests
+EVALUATION_CONCURRENCY = int(os.getenv("EVALUATION_CONCURRENCY", "4"))
+evaluation_slots = asyncio.Semaphore(EVALUATION_CONCURRENCY)
+
 @app.post("/evaluate/comprehensive")
 async def evaluate_comprehensive(request: ComprehensiveEvaluationRequest):
     """Comprehensive evaluation with all metrics"""
@@ -720,58 +1602,85 @@ async def evaluate_comprehensive(request: ComprehensiveEvaluationRequest):
     start_time = time.time()
     
     try:
-        metrics_to_include = request.include_metrics or ["ragas", "bleu", "rouge", "bertscore", "exact_match"]
-        results = {}
-        
-        # RAGAS
-        if "ragas" in metrics_to_include and request.ground_truth:
-            results["ragas"] = evaluate_ragas(
-                query=request.query,
-                context=request.context,
-                answer=request.answer,
-                ground_truth=request.ground_truth
-            )
-        
-        # BLEU/ROUGE
-        if "bleu" in metrics_to_include or "rouge" in metrics_to_include:
-            if request.ground_truth:
-                results["bleu_rouge"] = evaluate_bleu_rouge(
-                    generated=request.answer,
-                    reference=request.ground_truth
-                )
-        
-        # BERTScore
-        if "bertscore" in metrics_to_include:
-            if request.ground_truth:
-                results["bertscore"] = evaluate_bertscore(
-                    generated=request.answer,
-                    reference=request.ground_truth
-                )
-        
-        # Exact Match
-        if "exact_match" in metrics_to_include:
-            if request.ground_truth:
-                results["exact_match"] = evaluate_exact_match(
-                    generated=request.answer,
-                    reference=request.ground_truth
-                )
-        
-        results["model"] = request.model
-        results["evaluation_time"] = time.time() - start_time
-        
+        async with evaluation_slots:
+            results = await asyncio.get_running_loop().run_in_executor(None, run_comprehensive_evaluation, request)
         request_latency.labels(method="POST", endpoint="/evaluate/comprehensive").observe(time.time() - start_time)
-        return results
+        # Returned directly to skip FastAPI's jsonable_encoder pass over the nested result
+        return FastJSONResponse(results)
     except Exception as e:
         error_count.labels(error_type="evaluation_error").inc()
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/evaluate/batch")
+async def evaluate_batch(request: BatchEvaluationRequest, http_request: Request, format: Optional[str] = None):
+    """Comprehensive evaluation of many cases in one request, with per-case errors (?format=json|ndjson|arrow)"""
+    request_count.labels(method="POST", endpoint="/evaluate/batch").inc()
+    start_time = time.time()
+    try:
+        result_format = negotiate_format(format, http_request.headers.get("accept"))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    loop = asyncio.get_running_loop()
+    
+    async def evaluate_case(case: ComprehensiveEvaluationRequest) -> Dict[str, Any]:
+        async with evaluation_slots:
+            case_start = time.time()
+            try:
+                result = await loop.run_in_executor(None, run_comprehensive_evaluation, case)
+                return {"status": "ok", "result": result, "duration": time.time() - case_start}
+            except Exception as e:
+                error_count.labels(error_type="evaluation_error").inc()
+                return {"status": "error", "error": str(e), "duration": time.time() - case_start}
+    
+    results = await asyncio.gather(*[evaluate_case(case) for case in request.cases])
+    request_latency.labels(method="POST", endpoint="/evaluate/batch").observe(time.time() - start_time)
+    return bulk_response(list(results), result_format, {"total_time": time.time() - start_time})
+
+@app.get("/shadow/results")
+async def get_shadow_results(candidate: Optional[str] = None, limit: int = 50):
+    """Get recent mirrored runs, optionally for one candidate model"""
+    runs = await asyncio.get_running_loop().run_in_executor(
+        None, functools.partial(get_shadow_store().recent, candidate, limit)
+    )
+    return {"runs": runs, "count": len(runs)}
+
+@app.get("/shadow/summary")
+async def get_shadow_summary(hours: Optional[float] = None):
+    """Compare candidate models with the primary on mirrored traffic (latency, errors, agreement)"""
+    since = time.time() - hours * 3600 if hours else None
+    summary = await asyncio.get_running_loop().run_in_executor(None, get_shadow_store().summary, since)
+    current_config = config_store.get()
+    return {
+        "candidates": summary,
+        "shadow_models": current_config.get("shadow_models") or [],
+        "shadow_sample_rate": current_config.get("shadow_sample_rate") or 0.0,
+        "mirror": shadow_mirror.stats()
+    }
+
+@app.get("/evaluate/cache")
+async def get_evaluation_cache_stats():
+    """Get entries and size of the evaluation result cache, and this worker's hit rates"""
+    cache = get_evaluation_cache()
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
+
+@app.delete("/evaluate/cache")
+async def clear_evaluation_cache(metric: Optional[str] = None):
+    """Delete cached evaluation results, optionally only those of one metric"""
+    cache = get_evaluation_cache()
+    if cache is None:
+        return {"enabled": False, "deleted": 0}
+    return {"enabled": True, "deleted": cache.clear(metric)}
+
 # ==================== Speed Metrics Endpoints ====================
 
 @app.get("/metrics/ttft")
 async def get_ttft_metrics(model: Optional[str] = None):
     """Get Time To First Token metrics"""
     return {
-        "ttft_seconds": 0.0,
+        "ttft_seconds": histogram_mean("python_rag_ttft_seconds", {"model": model} if model else None),
         "model": model or "all",
         "note": "Query Prometheus for detailed metrics"
     }
@@ -780,11 +1689,28 @@ async def get_ttft_metrics(model: Optional[str] = None):
 async def get_tpot_metrics(model: Optional[str] = None):
     """Get Time Per Output Token metrics"""
     return {
-        "tpot_seconds": 0.0,
+        "tpot_seconds": histogram_mean("python_rag_tpot_seconds", {"model": model} if model else None),
+        "model": model or "all",
+        "note": "Query Prometheus for detailed metrics"
+    }
+
+@app.get("/metrics/itl")
+async def get_itl_metrics(model: Optional[str] = None):
+    """Get inter-token latency, decode rate and stall metrics of streamed responses"""
+    labels = {"model": model} if model else None
+    return {
+        "itl_seconds": histogram_mean("python_rag_inter_token_latency_seconds", labels),
+        "decode_tokens_per_second": histogram_mean("python_rag_decode_tokens_per_second", labels),
+        "decode_rate_by_model": histogram_means_by("python_rag_decode_tokens_per_second", "model"),
         "model": model or "all",
         "note": "Query Prometheus for detailed metrics"
     }
 
+@app.get("/metrics/admission")
+async def get_admission_metrics():
+    """Get model runner slots in use, queue depths and shed requests in this worker"""
+    return admission.stats()
+
 @app.get("/metrics/throughput")
 async def get_throughput_metrics():
     """Get throughput metrics (requests per second)"""
@@ -797,7 +1723,8 @@ async def get_throughput_metrics():
 async def get_vector_latency():
     """Get Vector DB query latency metrics"""
     return {
-        "latency_seconds": 0.0,
+        "latency_seconds": histogram_mean("python_rag_vector_query_seconds"),
+        "by_collection": histogram_means_by("python_rag_vector_search_seconds", "collection"),
         "note": "Query Prometheus for detailed metrics"
     }
 
@@ -814,7 +1741,7 @@ async def get_token_metrics(model: Optional[str] = None):
 
 @app.get("/metrics/cost")
 async def get_cost_metrics(model: Optional[str] = None):
-    """Get cost metrics (simulated)"""
+    """Get cost estimated from the CPU time and energy sampled during each model's runs"""
     model_pricing = {
         "deepseek-r1-distill-llama": {"input": 0.1, "output": 0.3},
         "gpt-oss": {"input": 0.5, "output": 1.5},
@@ -826,11 +1753,29 @@ async def get_cost_metrics(model: Optional[str] = None):
     
     pricing = model_pricing.get(model or "llama3.1", {"input": 0.1, "output": 0.3})
     
+    cpu_seconds = counter_totals_by("python_rag_model_cpu_seconds", "model")
+    energy_joules = counter_totals_by("python_rag_model_energy_joules", "model")
+    output_tokens = counter_totals_by("python_rag_output_tokens", "model")
+    models = [model] if model else sorted(set(cpu_seconds) | set(output_tokens))
+    per_model = {
+        name: estimate_cost(cpu_seconds.get(name, 0.0), energy_joules.get(name), output_tokens.get(name, 0.0))
+        for name in models
+    }
+    
+    total = estimate_cost(
+        sum(usage["cpu_seconds"] for usage in per_model.values()),
+        sum(usage["energy_joules"] or 0.0 for usage in per_model.values()) or None,
+        sum(usage["output_tokens"] for usage in per_model.values())
+    )
     return {
         "model": model or "all",
         "pricing_per_1m_tokens": pricing,
-        "estimated_cost": 0.0,
-        "note": "Cost simulation - actual costs may vary"
+        **total,
+        "models": per_model,
+        "rates": {"cpu_hour": COST_PER_CPU_HOUR, "kwh": COST_PER_KWH},
+        "sampler": resource_sampler.describe() if resource_sampler is not None else None,
+        "note": "Estimated from sampled CPU time and RAPL energy at the configured rates; "
+                "pricing_per_1m_tokens is hosted API pricing for comparison"
     }
 
 # ==================== Test Runner Endpoints ====================
@@ -844,31 +1789,32 @@ class TestRunRequest(BaseModel):
     config: Optional[Dict[str, Any]] = None
 
 @app.post("/tests/run")
-async def run_tests(request: TestRunRequest):
-    """Run tests on multiple models"""
+async def run_tests(request: TestRunRequest, http_request: Request, format: Optional[str] = None):
+    """Run tests on multiple models (?format=json|ndjson|arrow)"""
     request_count.labels(method="POST", endpoint="/tests/run").inc()
     start_time = time.time()
+    try:
+        result_format = negotiate_format(format, http_request.headers.get("accept"))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     results = []
-    metrics_to_include = request.metrics or ["ragas", "bleu", "rouge", "bertscore", "exact_match"]
+    metrics_to_include = request.metrics or ["ragas", "bleu", "rouge", "bertscore", "exact_match", "f1"]
     
     for model_name in request.models:
         try:
-            # Set model in config temporarily
-            original_model = current_config.get("model")
-            current_config["model"] = model_name
-            
-            # Run query
-            query_result = await query(QueryRequest(
-                query=request.prompt,
-                use_rag=request.use_rag
-            ))
+            # Query with this model without touching the shared config
+            query_result = await execute_query(
+                QueryRequest(query=request.prompt, use_rag=request.use_rag, priority=BATCH),
+                {**config_store.get(), "model": model_name}
+            )
             
             model_result = {
                 "model": model_name,
                 "response": query_result.get("response", ""),
                 "latency": query_result.get("latency", {}),
                 "tokens": query_result.get("tokens", {}),
+                "resources": query_result.get("resources"),
                 "metrics": {}
             }
             
@@ -902,12 +1848,15 @@ async def run_tests(request: TestRunRequest):
                         generated=answer,
                         reference=request.ground_truth
                     )
+                
+                if "f1" in metrics_to_include:
+                    model_result["metrics"]["token_f1"] = evaluate_token_f1(
+                        generated=answer,
+                        reference=request.ground_truth
+                    )
             
             results.append(model_result)
             
-            # Restore original model
-            current_config["model"] = original_model
-            
         except Exception as e:
             results.append({
                 "model": model_name,
@@ -916,12 +1865,11 @@ async def run_tests(request: TestRunRequest):
     
     request_latency.labels(method="POST", endpoint="/tests/run").observe(time.time() - start_time)
     
-    return {
+    return bulk_response(results, result_format, {
         "test_id": f"test_{int(time.time())}",
         "models_tested": len(request.models),
-        "results": results,
         "total_time": time.time() - start_time
-    }
+    })
 
 @app.get("/tests/compare")
 async def compare_models(models: str):
@@ -946,55 +1894,19 @@ async def run_custom_test(request: CustomTestRequest):
     start_time = time.time()
     
     try:
-        # Execute custom test code in a safe environment
-        # Note: In production, use a sandboxed execution environment
-        import subprocess
-        import tempfile
-        import json
-        
-        results = []
-        
-        # Create temporary test file
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False) as f:
-            test_file = f.name
-            # Wrap test code with necessary imports and context
-            wrapped_code = f"""
-import sys
-import os
-sys.path.insert(0, os.path.dirname(__file__))
-import requests
-import json
-
-API_URL = os.getenv("API_URL", "http://localhost:18001")
-MODELS = {json.dumps(request.models)}
-CONFIG = {json.dumps(request.config or {})}
-
-# User test code
-{request.test_code}
-
-# Expected: test should define a 'results' variable
-if 'results' not in locals():
-    results = {{"error": "Test code must define a 'results' variable"}}
-"""
-            f.write(wrapped_code)
+        # Each model gets its own sandboxed execution, fanned out in parallel
+        # over the warm worker pool. The test code must define 'results'.
+        pool = get_sandbox_pool()
+        results = await pool.run_for_models(
+            code=request.test_code,
+            models=request.models,
+            config=request.config or {},
+            api_url=CUSTOM_TEST_API_URL
+        )
         
-        try:
-            # Run pytest on the custom test file
-            # For now, return a placeholder - full implementation would use subprocess
-            # or a proper test execution framework
-            results = {
-                "status": "custom_test_executed",
-                "models": request.models,
-                "test_code_length": len(request.test_code),
-                "note": "Custom test execution - results would be generated by test code",
-                "warning": "Full custom test execution requires sandboxed environment"
-            }
-        finally:
-            # Clean up temp file
-            try:
-                os.unlink(test_file)
-            except:
-                pass
+        failed = sum(1 for r in results.values() if r.get("status") != "completed")
+        if failed:
+            error_count.labels(error_type="custom_test_error").inc(failed)
         
         request_latency.labels(method="POST", endpoint="/tests/custom").observe(time.time() - start_time)
         
@@ -1045,6 +1957,221 @@ async def get_lm_eval_benchmarks():
         "total": len(benchmarks)
     }
 
+# ==================== Capacity Planning Endpoints ====================
+
+class CapacitySweepRequest(BaseModel):
+    model: str
+    concurrency_levels: List[int] = [1, 2, 4, 8, 16, 32]
+    prompt_tokens: List[int] = [128, 1024]
+    max_tokens: List[int] = [64, 256]
+    level_seconds: float = 20.0
+    runner_version: Optional[str] = None
+    max_error_rate: float = 0.1
+    ttft_limit_seconds: float = 30.0
+
+# Sweeps in progress, by id, for progress reporting
+capacity_sweeps: Dict[str, CapacitySweep] = {}
+# A sweep holds its thread for minutes; it gets its own so the default executor
+# that /query uses for vector search and token streams is never tied up
+capacity_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="capacity-sweep")
+
+def run_capacity_sweep(sweep_id: str, sweep: CapacitySweep):
+    store = get_capacity_store()
+    try:
+        store.finish(sweep_id, curves=sweep.run())
+    except Exception as e:
+        error_count.labels(error_type="capacity_sweep_error").inc()
+        store.finish(sweep_id, error=str(e))
+    finally:
+        capacity_sweeps.pop(sweep_id, None)
+
+@app.post("/capacity/sweeps")
+async def start_capacity_sweep(request: CapacitySweepRequest):
+    """Start a concurrency sweep against a model; poll GET /capacity/sweeps/{id} for the curves"""
+    request_count.labels(method="POST", endpoint="/capacity/sweeps").inc()
+    if capacity_sweeps:
+        raise HTTPException(status_code=409, detail=f"Sweep {next(iter(capacity_sweeps))} is still running on this worker")
+    try:
+        sweep = CapacitySweep(
+            f"{DOCKER_MODEL_RUNNER_URL}/engines/v1/chat/completions",
+            request.model,
+            concurrency_levels=request.concurrency_levels,
+            prompt_tokens=request.prompt_tokens,
+            max_tokens=request.max_tokens,
+            level_seconds=request.level_seconds,
+            max_error_rate=request.max_error_rate,
+            ttft_limit_seconds=request.ttft_limit_seconds
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    runner_version = request.runner_version or os.getenv("MODEL_RUNNER_VERSION", "unknown")
+    sweep_id = get_capacity_store().create(request.model, runner_version, request.dict(exclude={"model", "runner_version"}))
+    capacity_sweeps[sweep_id] = sweep
+    # Runs for minutes; keep it off the event loop and out of the request
+    asyncio.get_running_loop().run_in_executor(capacity_executor, run_capacity_sweep, sweep_id, sweep)
+    return {"id": sweep_id, "status": "running", "levels": sweep.progress["levels_total"]}
+
+@app.get("/capacity/sweeps")
+async def list_capacity_sweeps(model: Optional[str] = None, limit: int = 50):
+    """Recent sweeps with the knee of each curve"""
+    return {"sweeps": get_capacity_store().list(model=model, limit=limit)}
+
+@app.get("/capacity/sweeps/{sweep_id}")
+async def get_capacity_sweep(sweep_id: str):
+    """A sweep with its full throughput/TTFT/TPOT curves"""
+    sweep = get_capacity_store().get(sweep_id)
+    if sweep is None:
+        raise HTTPException(status_code=404, detail=f"Sweep {sweep_id} not found")
+    running = capacity_sweeps.get(sweep_id)
+    if running is not None:
+        sweep["progress"] = dict(running.progress)
+    return sweep
+
+@app.get("/capacity/compare")
+async def compare_capacity_sweeps(ids: str):
+    """Compare the knees of several sweeps (comma-separated ids), per prompt/output length"""
+    return get_capacity_store().compare([i.strip() for i in ids.split(",") if i.strip()])
+
+# ==================== Local Index Endpoints ====================
+
+@app.get("/index/local")
+async def get_local_index_status():
+    """Collections held in the in-process vector index"""
+    return {"mode": LOCAL_INDEX_MODE, "collections": get_local_index().collections()}
+
+@app.post("/index/local/{collection_name}/ivf")
+async def build_local_ivf(collection_name: str, request: IVFBuildRequest):
+    """Train IVF partitions for a local collection"""
+    collection = get_local_index().get(collection_name)
+    if collection is None:
+        raise HTTPException(status_code=404, detail="Collection not found in local index")
+    try:
+        return await asyncio.get_running_loop().run_in_executor(
+            None, collection.build_ivf, request.nlist, request.iterations
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def run_vector_search_benchmark(request: VectorSearchBenchmarkRequest) -> Dict[str, Any]:
+    """Time exact local, IVF and Qdrant search on random queries; recall is relative to exact search"""
+    collection = get_local_index().get(request.collection_name)
+    if collection is None:
+        raise HTTPException(status_code=404, detail="Collection not found in local index")
+    
+    try:
+        filters = validate_filters(request.filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    queries = np.random.default_rng().standard_normal((request.queries, collection.dim)).astype(np.float32)
+    backends = {"local_exact": lambda q: collection.search(q, request.limit, filters=filters)}
+    if request.nprobe and collection.centroids is not None:
+        backends["local_ivf"] = lambda q: collection.search(q, request.limit, nprobe=request.nprobe, filters=filters)
+    if LOCAL_INDEX_MODE != "local":
+        backends["qdrant"] = lambda q: get_qdrant_client().search(
+            collection_name=request.collection_name,
+            query_vector=q.tolist(),
+            query_filter=to_qdrant_filter(filters),
+            limit=request.limit
+        )
+    
+    latencies = {name: [] for name in backends}
+    recalls = {name: [] for name in backends}
+    errors = {}
+    for q in queries:
+        truth = None
+        for name, search in backends.items():
+            if name in errors:
+                continue
+            start = time.perf_counter()
+            try:
+                hits = search(q)
+            except Exception as e:
+                errors[name] = str(e)
+                continue
+            latencies[name].append(time.perf_counter() - start)
+            ids = {h.id for h in hits}
+            if truth is None:
+                truth = ids
+            recalls[name].append(len(ids & truth) / len(truth) if truth else 1.0)
+    
+    results = {}
+    for name, samples in latencies.items():
+        if not samples:
+            continue
+        ms = np.array(samples) * 1000
+        results[name] = {
+            "mean_ms": float(ms.mean()),
+            "p50_ms": float(np.percentile(ms, 50)),
+            "p95_ms": float(np.percentile(ms, 95)),
+            "p99_ms": float(np.percentile(ms, 99)),
+            f"recall_at_{request.limit}": float(np.mean(recalls[name]))
+        }
+    return {"collection": collection.stats(), "queries": request.queries, "results": results, "errors": errors}
+
+@app.post("/benchmarks/vector-search")
+async def benchmark_vector_search(request: VectorSearchBenchmarkRequest):
+    """Compare Qdrant against the local index on latency and recall"""
+    return await asyncio.get_running_loop().run_in_executor(None, run_vector_search_benchmark, request)
+
+# ==================== Drift Monitoring Endpoints ====================
+
+@app.get("/monitoring/drift")
+async def get_drift_status():
+    """Online drift statistics, recent alerts and the last drift suite run"""
+    return drift_monitor.state()
+
+@app.post("/monitoring/drift/run")
+async def run_drift_suite():
+    """Run the deepchecks drift suite on the sampled traffic now"""
+    bias_threshold = config_store.get()["bias_threshold"]
+    return await asyncio.get_running_loop().run_in_executor(None, drift_monitor.run_suite, bias_threshold)
+
+@app.post("/monitoring/drift/reset")
+async def reset_drift_reference(model: Optional[str] = None):
+    """Start a new reference window for one model, or all models"""
+    drift_monitor.reset(model)
+    return {"status": "reset", "model": model}
+
+# ==================== Debug Endpoints ====================
+
+@app.get("/debug/profile")
+async def debug_profile(
+    request: Request,
+    seconds: float = 10.0,
+    view: str = "top",
+    interval_ms: float = 10.0,
+    path: Optional[str] = None,
+    include_idle: bool = False,
+    top: int = 30
+):
+    """Sample this worker's stacks for a number of seconds and report where time goes"""
+    if not PROFILING_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiling is disabled (set PROFILING_ENABLED=true)")
+    if PROFILING_TOKEN and not hmac.compare_digest(request.headers.get("x-profile-token", ""), PROFILING_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid profiling token")
+    if view not in ("top", "collapsed", "flamegraph", "all"):
+        raise HTTPException(status_code=400, detail="view must be one of: top, collapsed, flamegraph, all")
+    
+    seconds = min(max(seconds, 0.1), PROFILING_MAX_SECONDS)
+    interval = max(interval_ms, 1.0) / 1000
+    if not profiler.start(interval, include_idle=include_idle, path_prefix=path):
+        raise HTTPException(status_code=409, detail="A profiling session is already running on this worker")
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        sampler, matched_requests = profiler.stop()
+    
+    report = build_report(sampler, view, top)
+    if view == "collapsed":
+        return Response(content=report["collapsed"], media_type="text/plain")
+    report["worker_pid"] = os.getpid()
+    if path:
+        report["path"] = path
+        report["matched_requests"] = matched_requests
+    return report
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,85 @@
+"""Metrics and runtime observability for the RAG backend."""
+
+from .metrics import (
+    request_count,
+    request_latency,
+    tokens_per_second,
+    ttft_histogram,
+    tpot_histogram,
+    itl_histogram,
+    decode_rate_histogram,
+    stream_stalls_total,
+    input_tokens_total,
+    output_tokens_total,
+    prefill_histogram,
+    prompt_cache_share,
+    prompt_cached_tokens_total,
+    cold_start_ttft_histogram,
+    model_starts_total,
+    keepwarm_pings_total,
+    admission_queue_depth,
+    admission_queue_seconds,
+    admission_rejected_total,
+    circuit_breaker_state,
+    circuit_breaker_rejections_total,
+    evaluation_cache_lookups_total,
+    model_cpu_seconds_total,
+    model_energy_joules_total,
+    model_peak_rss_bytes,
+    shadow_requests_total,
+    drift_score_gauge,
+    drift_alerts_total,
+    vector_query_latency,
+    vector_search_latency,
+    error_count,
+    NULL_METRIC,
+    observe,
+    mark_process_dead,
+    mark_dead_workers,
+    render_metrics,
+    histogram_mean,
+    histogram_means_by,
+    counter_totals_by,
+)
+
+__all__ = [
+    "request_count",
+    "request_latency",
+    "tokens_per_second",
+    "ttft_histogram",
+    "tpot_histogram",
+    "itl_histogram",
+    "decode_rate_histogram",
+    "stream_stalls_total",
+    "input_tokens_total",
+    "output_tokens_total",
+    "prefill_histogram",
+    "prompt_cache_share",
+    "prompt_cached_tokens_total",
+    "cold_start_ttft_histogram",
+    "model_starts_total",
+    "keepwarm_pings_total",
+    "admission_queue_depth",
+    "admission_queue_seconds",
+    "admission_rejected_total",
+    "circuit_breaker_state",
+    "circuit_breaker_rejections_total",
+    "evaluation_cache_lookups_total",
+    "model_cpu_seconds_total",
+    "model_energy_joules_total",
+    "model_peak_rss_bytes",
+    "shadow_requests_total",
+    "drift_score_gauge",
+    "drift_alerts_total",
+    "vector_query_latency",
+    "vector_search_latency",
+    "error_count",
+    "NULL_METRIC",
+    "observe",
+    "mark_process_dead",
+    "mark_dead_workers",
+    "render_metrics",
+    "histogram_mean",
+    "histogram_means_by",
+    "counter_totals_by",
+]
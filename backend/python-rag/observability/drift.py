@@ -0,0 +1,410 @@
+"""Online drift monitoring of /query traffic.
+
+Every request updates per-model running statistics in O(1) time with respect
+to history:
+
+* Welford mean/variance of each feature (prompt and response length,
+  latency, TTFT, streamed decode rate, and distance of the prompt/response embedding to the
+  reference centroid) over a reference window of the first requests. The
+  centroid distances are only known once the window closes; they are then
+  scored for the reference reservoir against the frozen centroids.
+* An exponentially weighted mean of the same features after the window.
+* Reservoir samples of reference and recent requests.
+
+A feature drifts when its recent EWMA moves away from the reference mean by
+more than a z critical value, using the EWMA's standard error.
+``drift_sensitivity`` is the false-alarm probability per EWMA window
+(about ``1 / DRIFT_EWMA_ALPHA`` requests) across all features, so the
+per-request level is Bonferroni-corrected for the window and the features. Embeddings are
+hashed bags of words, so they need no model and cost O(text length).
+
+The full deepchecks property-drift check runs only periodically on the two
+reservoirs, off the request path. Properties whose drift score exceeds
+``bias_threshold`` are reported as alerts.
+"""
+
+from statistics import NormalDist
+from typing import Any, Dict, List, Optional
+import logging
+import math
+import os
+import random
+import re
+import threading
+import time
+import zlib
+
+import numpy as np
+
+from .metrics import drift_alerts_total, drift_score_gauge
+
+logger = logging.getLogger(__name__)
+
+REFERENCE_SIZE = int(os.getenv("DRIFT_REFERENCE_SIZE", "200"))
+EWMA_ALPHA = float(os.getenv("DRIFT_EWMA_ALPHA", "0.05"))
+RESERVOIR_SIZE = int(os.getenv("DRIFT_RESERVOIR_SIZE", "500"))
+EMBEDDING_DIM = int(os.getenv("DRIFT_EMBEDDING_DIM", "256"))
+
+_TOKEN_RE = re.compile(r"\w+")
+
+class RunningStats:
+    """Welford's online mean and variance."""
+
+    __slots__ = ("count", "mean", "m2")
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def update(self, value: float) -> None:
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    @property
+    def variance(self) -> float:
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.variance)
+
+
+class Reservoir:
+    """Uniform sample of a stream (Vitter's algorithm R)."""
+
+    def __init__(self, size: int, seed: Optional[int] = None):
+        self.size = size
+        self.items: List[Dict[str, Any]] = []
+        self.seen = 0
+        self._rng = random.Random(seed)
+
+    def add(self, item: Dict[str, Any]) -> None:
+        self.seen += 1
+        if len(self.items) < self.size:
+            self.items.append(item)
+            return
+        index = self._rng.randrange(self.seen)
+        if index < self.size:
+            self.items[index] = item
+
+    def reset(self) -> None:
+        self.items = []
+        self.seen = 0
+
+
+def hashed_embedding(text: str, dim: int = EMBEDDING_DIM) -> np.ndarray:
+    """Unit-length signed feature-hashing embedding of the words in text."""
+    vector = np.zeros(dim, dtype=np.float32)
+    for token in _TOKEN_RE.findall(text.lower()):
+        h = zlib.crc32(token.encode())
+        vector[h % dim] += 1.0 if h & 0x80000000 else -1.0
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm else vector
+
+
+FEATURES = (
+    "prompt_length",
+    "response_length",
+    "latency",
+    "ttft",
+    "decode_rate",
+    "prompt_centroid_distance",
+    "response_centroid_distance",
+)
+
+
+_z_cache: Dict[tuple, float] = {}
+
+
+def critical_z(sensitivity: float, alpha: float = EWMA_ALPHA) -> float:
+    """Two-sided z critical value for a false-alarm rate per EWMA window over all features."""
+    key = (sensitivity, alpha)
+    z = _z_cache.get(key)
+    if z is None:
+        level = min(max(sensitivity, 1e-6), 0.5) * alpha / len(FEATURES)
+        z = NormalDist().inv_cdf(1 - level / 2)
+        _z_cache[key] = z
+    return z
+
+
+class FeatureDrift:
+    """Reference statistics and recent EWMA of one feature."""
+
+    __slots__ = ("reference", "recent", "observed", "score", "alerting")
+
+    def __init__(self):
+        self.reference = RunningStats()
+        self.recent: Optional[float] = None
+        self.observed = 0
+        self.score = 0.0
+        self.alerting = False
+
+    def update(self, value: float, in_reference: bool, alpha: float, z_crit: float) -> bool:
+        """Add a value; returns True when the feature starts drifting."""
+        if in_reference:
+            self.reference.update(value)
+            return False
+        # The EWMA starts at the reference mean, so its variance grows towards
+        # the steady state sigma^2 * alpha / (2 - alpha) as values arrive
+        mean = self.reference.mean
+        previous = mean if self.recent is None else self.recent
+        self.recent = previous + alpha * (value - previous)
+        self.observed += 1
+        std = max(self.reference.std, 1e-6 + 1e-3 * abs(mean))
+        decay = 1 - (1 - alpha) ** (2 * self.observed)
+        standard_error = std * math.sqrt(alpha / (2 - alpha) * decay)
+        self.score = (self.recent - mean) / standard_error
+        # Hysteresis: an alert clears only once the shift has mostly receded
+        if self.alerting:
+            self.alerting = abs(self.score) > z_crit / 2
+            return False
+        self.alerting = abs(self.score) > z_crit
+        return self.alerting
+
+    def state(self) -> Dict[str, Any]:
+        return {
+            "reference_mean": self.reference.mean,
+            "reference_std": self.reference.std,
+            "recent_mean": self.recent,
+            "score": self.score,
+            "drifting": self.alerting,
+        }
+
+
+class ModelMonitor:
+    """Drift state of one model."""
+
+    def __init__(self, model: str, reference_size: int = REFERENCE_SIZE, alpha: float = EWMA_ALPHA):
+        self.model = model
+        self.reference_size = reference_size
+        self.alpha = alpha
+        self.requests = 0
+        self.features = {name: FeatureDrift() for name in FEATURES}
+        self.prompt_centroid = np.zeros(EMBEDDING_DIM, dtype=np.float64)
+        self.response_centroid = np.zeros(EMBEDDING_DIM, dtype=np.float64)
+        self.reference_samples = Reservoir(RESERVOIR_SIZE)
+        self.recent_samples = Reservoir(RESERVOIR_SIZE)
+        self.alerts: List[Dict[str, Any]] = []
+
+    @property
+    def in_reference(self) -> bool:
+        return self.requests <= self.reference_size
+
+    def _distance(self, centroid: np.ndarray, embedding: np.ndarray) -> float:
+        norm = float(np.linalg.norm(centroid))
+        if not norm:
+            return 0.0
+        return 1.0 - float(centroid @ embedding) / norm
+
+    def observe(
+        self,
+        prompt: str,
+        response: str,
+        latency: float,
+        ttft: Optional[float],
+        sensitivity: float,
+        decode_rate: Optional[float] = None,
+    ) -> List[str]:
+        """
+        Update statistics with one request.
+
+        Returns:
+            Features that started drifting with this request
+        """
+        self.requests += 1
+        in_reference = self.in_reference
+        prompt_embedding = hashed_embedding(prompt)
+        response_embedding = hashed_embedding(response)
+        values = {
+            "prompt_length": float(len(prompt)),
+            "response_length": float(len(response)),
+            "latency": latency,
+            "ttft": ttft,
+            "decode_rate": decode_rate,
+            "prompt_centroid_distance": None,
+            "response_centroid_distance": None,
+        }
+        if in_reference:
+            # Centroids are frozen once the reference window is complete
+            self.prompt_centroid += prompt_embedding
+            self.response_centroid += response_embedding
+        else:
+            values["prompt_centroid_distance"] = self._distance(self.prompt_centroid, prompt_embedding)
+            values["response_centroid_distance"] = self._distance(self.response_centroid, response_embedding)
+
+        z_crit = critical_z(sensitivity, self.alpha)
+        started = []
+        for name, value in values.items():
+            if value is None:
+                continue
+            feature = self.features[name]
+            if feature.update(value, in_reference, self.alpha, z_crit):
+                started.append(name)
+                drift_alerts_total.labels(model=self.model, feature=name).inc()
+                self.alerts.append({"feature": name, "score": feature.score, "time": time.time(), "source": "online"})
+            if not in_reference:
+                drift_score_gauge.labels(model=self.model, feature=name).set(abs(feature.score))
+        del self.alerts[:-100]
+
+        sample = {"prompt": prompt, "response": response, "latency": latency}
+        (self.reference_samples if in_reference else self.recent_samples).add(sample)
+        if in_reference and self.requests == self.reference_size:
+            self._score_reference_distances()
+        return started
+
+    def _score_reference_distances(self) -> None:
+        """Reference stats of the centroid distances, measured against the frozen centroids."""
+        # Distances taken during the window would be against a partial centroid
+        # and come out too large. Each sample is left out of the centroid it is
+        # scored against, as requests after the window are.
+        for name, centroid, key in (
+            ("prompt_centroid_distance", self.prompt_centroid, "prompt"),
+            ("response_centroid_distance", self.response_centroid, "response"),
+        ):
+            stats = self.features[name].reference
+            for sample in self.reference_samples.items:
+                embedding = hashed_embedding(sample[key])
+                stats.update(self._distance(centroid - embedding, embedding))
+
+    def state(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "reference_complete": not self.in_reference,
+            "features": {name: f.state() for name, f in self.features.items()},
+            "reference_samples": len(self.reference_samples.items),
+            "recent_samples": len(self.recent_samples.items),
+            "alerts": self.alerts[-20:],
+        }
+
+
+def _text_properties(samples: List[Dict[str, Any]]):
+    import pandas as pd
+
+    return pd.DataFrame({
+        "prompt_length": [len(s["prompt"]) for s in samples],
+        "response_length": [len(s["response"]) for s in samples],
+        "response_words": [len(s["response"].split()) for s in samples],
+        "latency": [s["latency"] for s in samples],
+    })
+
+
+def run_deepchecks_property_drift(
+    reference: List[Dict[str, Any]],
+    recent: List[Dict[str, Any]],
+    bias_threshold: float,
+) -> Dict[str, Any]:
+    """
+    Run deepchecks' NLP property drift check on two reservoirs.
+
+    Args:
+        reference: Samples from the reference window
+        recent: Samples since the previous run
+        bias_threshold: Drift score above which a property is flagged
+
+    Returns:
+        Dictionary with per-property drift scores and flagged properties
+    """
+    try:
+        from deepchecks.nlp import TextData
+        from deepchecks.nlp.checks import PropertyDrift
+    except ImportError:
+        return {"error": "deepchecks not installed"}
+
+    train = TextData(
+        raw_text=[s["response"] for s in reference],
+        task_type="other",
+        properties=_text_properties(reference)
+    )
+    test = TextData(
+        raw_text=[s["response"] for s in recent],
+        task_type="other",
+        properties=_text_properties(recent)
+    )
+    result = PropertyDrift().run(train_dataset=train, test_dataset=test)
+    scores = {}
+    for name, value in (result.value or {}).items():
+        score = value.get("Drift score") if isinstance(value, dict) else value
+        if isinstance(score, (int, float)):
+            scores[name] = float(score)
+    return {
+        "scores": scores,
+        "flagged": sorted(name for name, score in scores.items() if score > bias_threshold),
+    }
+
+
+class DriftMonitor:
+    """Per-model monitors plus the periodic deepchecks run."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.models: Dict[str, ModelMonitor] = {}
+        self.last_suite: Dict[str, Any] = {}
+
+    def observe(
+        self,
+        model: str,
+        prompt: str,
+        response: str,
+        latency: float,
+        ttft: Optional[float],
+        sensitivity: float,
+        decode_rate: Optional[float] = None,
+    ) -> List[str]:
+        with self._lock:
+            monitor = self.models.get(model)
+            if monitor is None:
+                monitor = self.models[model] = ModelMonitor(model)
+            return monitor.observe(prompt, response, latency, ttft, sensitivity, decode_rate)
+
+    def reset(self, model: Optional[str] = None) -> None:
+        """Start a new reference window for one or all models."""
+        with self._lock:
+            if model is None:
+                self.models.clear()
+            else:
+                self.models.pop(model, None)
+
+    def run_suite(self, bias_threshold: float) -> Dict[str, Any]:
+        """Run deepchecks on every model with enough samples, then start a new recent reservoir."""
+        with self._lock:
+            work = [
+                (name, list(m.reference_samples.items), list(m.recent_samples.items))
+                for name, m in self.models.items()
+                if len(m.reference_samples.items) >= 20 and len(m.recent_samples.items) >= 20
+            ]
+            for name, _, _ in work:
+                self.models[name].recent_samples.reset()
+
+        results = {}
+        for name, reference, recent in work:
+            try:
+                outcome = run_deepchecks_property_drift(reference, recent, bias_threshold)
+            except Exception as e:
+                logger.warning(f"Deepchecks drift suite failed for {name}: {e}")
+                outcome = {"error": str(e)}
+            results[name] = outcome
+            for prop in outcome.get("flagged", []):
+                drift_alerts_total.labels(model=name, feature=f"suite:{prop}").inc()
+                with self._lock:
+                    if name in self.models:
+                        self.models[name].alerts.append({
+                            "feature": prop,
+                            "score": outcome["scores"][prop],
+                            "time": time.time(),
+                            "source": "deepchecks",
+                        })
+        self.last_suite = {"time": time.time(), "results": results}
+        return self.last_suite
+
+    def state(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "models": {name: m.state() for name, m in self.models.items()},
+                "last_suite": self.last_suite,
+            }
+
+
+drift_monitor = DriftMonitor()
@@ -0,0 +1,441 @@
+"""Prometheus metrics for the RAG backend.
+
+Metrics work both in a single process and under several uvicorn workers.
+When ``PROMETHEUS_MULTIPROC_DIR`` is set, every worker writes its samples to
+memory-mapped files in that directory and ``render_metrics`` aggregates them,
+so any worker can answer a scrape with the same numbers. Gauges defined here
+must therefore pass a ``multiprocess_mode``; gauges of per-worker state use a
+live mode, so a worker's values leave the aggregate once it is marked dead
+(on shutdown, or by ``mark_dead_workers`` after a crash).
+
+Exemplars attach request ids to slow observations. The multiprocess value
+store cannot hold them, so they are only recorded in single-process mode and
+only exposed in the OpenMetrics format.
+"""
+
+from typing import Dict, List, Optional, Tuple
+import glob
+import os
+import re
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    REGISTRY,
+    generate_latest,
+)
+from prometheus_client.openmetrics import exposition as openmetrics
+
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+MULTIPROCESS = bool(MULTIPROC_DIR)
+if MULTIPROCESS:
+    os.makedirs(MULTIPROC_DIR, exist_ok=True)
+
+# Buckets sized for local LLM serving: TTFT from tens of ms (warm, short
+# prompt) to a minute (cold load), decode rates from a few to a few hundred
+# tokens/s, and per-token gaps from a few ms to multi-second stalls.
+TTFT_BUCKETS = (0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0, 20.0, 30.0, 60.0)
+TPS_BUCKETS = (1, 2, 5, 10, 15, 20, 25, 30, 40, 50, 75, 100, 150, 200, 300, 500)
+TPOT_BUCKETS = (0.002, 0.005, 0.01, 0.015, 0.02, 0.03, 0.04, 0.05, 0.075, 0.1, 0.15, 0.2, 0.3, 0.5, 1.0)
+ITL_BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.015, 0.02, 0.03, 0.05, 0.075, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0)
+VECTOR_SEARCH_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+PREFILL_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 2.0, 5.0, 10.0, 30.0)
+CACHE_SHARE_BUCKETS = (0.0, 0.1, 0.25, 0.5, 0.75, 0.9, 0.95, 0.99, 1.0)
+COLD_START_BUCKETS = (0.5, 1.0, 2.0, 3.0, 5.0, 7.5, 10.0, 15.0, 20.0, 30.0, 45.0, 60.0, 90.0, 120.0)
+QUEUE_BUCKETS = (0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 60.0)
+REQUEST_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+
+# Observations beyond these thresholds carry a request id exemplar
+SLOW_TTFT_SECONDS = float(os.getenv("EXEMPLAR_SLOW_TTFT_SECONDS", "2.0"))
+SLOW_TPOT_SECONDS = float(os.getenv("EXEMPLAR_SLOW_TPOT_SECONDS", "0.1"))
+SLOW_ITL_SECONDS = float(os.getenv("EXEMPLAR_SLOW_ITL_SECONDS", "0.5"))
+SLOW_TPS = float(os.getenv("EXEMPLAR_SLOW_TPS", "5.0"))
+SLOW_REQUEST_SECONDS = float(os.getenv("EXEMPLAR_SLOW_REQUEST_SECONDS", "10.0"))
+
+request_count = Counter(
+    "python_rag_requests_total",
+    "Total number of requests",
+    ["method", "endpoint"]
+)
+
+request_latency = Histogram(
+    "python_rag_request_duration_seconds",
+    "Request latency in seconds",
+    ["method", "endpoint"],
+    buckets=REQUEST_BUCKETS
+)
+
+# Speed metrics
+tokens_per_second = Histogram(
+    "python_rag_output_tokens_per_second",
+    "Output tokens generated per second of generation time",
+    ["model"],
+    buckets=TPS_BUCKETS
+)
+
+ttft_histogram = Histogram(
+    "python_rag_ttft_seconds",
+    "Time to first token in seconds",
+    ["model"],
+    buckets=TTFT_BUCKETS
+)
+
+tpot_histogram = Histogram(
+    "python_rag_tpot_seconds",
+    "Time per output token in seconds",
+    ["model"],
+    buckets=TPOT_BUCKETS
+)
+
+itl_histogram = Histogram(
+    "python_rag_inter_token_latency_seconds",
+    "Time between consecutive streamed content tokens in seconds",
+    ["model"],
+    buckets=ITL_BUCKETS
+)
+
+decode_rate_histogram = Histogram(
+    "python_rag_decode_tokens_per_second",
+    "Streamed content tokens per second after the first token",
+    ["model"],
+    buckets=TPS_BUCKETS
+)
+
+stream_stalls_total = Counter(
+    "python_rag_stream_stalls_total",
+    "Inter-token gaps of at least STREAM_STALL_SECONDS",
+    ["model"]
+)
+
+# Token tracking
+input_tokens_total = Counter(
+    "python_rag_input_tokens_total",
+    "Total input tokens",
+    ["model"]
+)
+
+output_tokens_total = Counter(
+    "python_rag_output_tokens_total",
+    "Total output tokens",
+    ["model"]
+)
+
+# Prompt (KV) cache reuse, when the runner reports it
+prefill_histogram = Histogram(
+    "python_rag_prefill_seconds",
+    "Prompt prefill time reported by the model runner in seconds",
+    ["model"],
+    buckets=PREFILL_BUCKETS
+)
+
+prompt_cache_share = Histogram(
+    "python_rag_prompt_cache_share",
+    "Share of prompt tokens served from the runner's KV cache per request",
+    ["model"],
+    buckets=CACHE_SHARE_BUCKETS
+)
+
+prompt_cached_tokens_total = Counter(
+    "python_rag_prompt_cached_tokens_total",
+    "Total prompt tokens served from the runner's KV cache",
+    ["model"]
+)
+
+# Model loads: TTFT of requests classified as cold starts (ttft_histogram keeps warm ones)
+cold_start_ttft_histogram = Histogram(
+    "python_rag_cold_start_ttft_seconds",
+    "Time to first token of generations that waited for a model load in seconds",
+    ["model"],
+    buckets=COLD_START_BUCKETS
+)
+
+model_starts_total = Counter(
+    "python_rag_model_starts_total",
+    "Generations by model and start state (cold, warm)",
+    ["model", "state"]
+)
+
+keepwarm_pings_total = Counter(
+    "python_rag_keepwarm_pings_total",
+    "Keep-warm pings by model and outcome (warm, cold, skipped, error)",
+    ["model", "status"]
+)
+
+# Admission control in front of the model runners
+admission_queue_depth = Gauge(
+    "python_rag_admission_queue_depth",
+    "Generations waiting for a model runner slot by priority class",
+    ["runner", "priority"],
+    multiprocess_mode="livesum"
+)
+
+admission_queue_seconds = Histogram(
+    "python_rag_admission_queue_seconds",
+    "Time generations waited for a model runner slot in seconds by priority class",
+    ["runner", "model", "priority"],
+    buckets=QUEUE_BUCKETS
+)
+
+admission_rejected_total = Counter(
+    "python_rag_admission_rejected_total",
+    "Generations shed by admission control (queue_full, deadline, timeout)",
+    ["runner", "model", "priority", "reason"]
+)
+
+# Circuit breakers per dependency (qdrant, model runners)
+circuit_breaker_state = Gauge(
+    "python_rag_circuit_breaker_state",
+    "Circuit breaker state per dependency (0 closed, 1 half-open, 2 open)",
+    ["dependency"],
+    multiprocess_mode="livemax"
+)
+
+circuit_breaker_rejections_total = Counter(
+    "python_rag_circuit_breaker_rejections_total",
+    "Calls rejected without reaching the dependency because its circuit was open",
+    ["dependency"]
+)
+
+# Persistent evaluation result cache (RAGAS, BERTScore)
+evaluation_cache_lookups_total = Counter(
+    "python_rag_evaluation_cache_lookups_total",
+    "Evaluation result cache lookups by metric and result (hit, miss)",
+    ["metric", "result"]
+)
+
+# Shadow traffic mirrored to candidate models (evaluation/shadow.py)
+shadow_requests_total = Counter(
+    "python_rag_shadow_requests_total",
+    "Mirrored /query requests by candidate model and status (ok, error, dropped)",
+    ["candidate", "status"]
+)
+
+# Resources used by runs of each model (observability/resources.py)
+model_cpu_seconds_total = Counter(
+    "python_rag_model_cpu_seconds_total",
+    "CPU seconds attributed to runs of each model by process (backend, runner)",
+    ["model", "process"]
+)
+
+model_energy_joules_total = Counter(
+    "python_rag_model_energy_joules_total",
+    "RAPL package energy in joules attributed to runs of each model",
+    ["model"]
+)
+
+model_peak_rss_bytes = Gauge(
+    "python_rag_model_peak_rss_bytes",
+    "Peak resident memory during the latest run of each model by process",
+    ["model", "process"],
+    multiprocess_mode="livemax"
+)
+
+# Online drift of /query traffic (observability/drift.py)
+drift_score_gauge = Gauge(
+    "python_rag_drift_score",
+    "Standardized shift of a monitored feature from its reference",
+    ["model", "feature"],
+    multiprocess_mode="livemax"
+)
+
+drift_alerts_total = Counter(
+    "python_rag_drift_alerts_total",
+    "Number of times a monitored feature started drifting",
+    ["model", "feature"]
+)
+
+# Vector DB latency
+vector_query_latency = Histogram(
+    "python_rag_vector_query_seconds",
+    "Vector database query latency in seconds"
+)
+
+vector_search_latency = Histogram(
+    "python_rag_vector_search_seconds",
+    "Vector search latency in seconds by backend (qdrant, local), collection and whether a payload filter was applied",
+    ["backend", "collection", "filtered"],
+    buckets=VECTOR_SEARCH_BUCKETS
+)
+
+error_count = Counter(
+    "python_rag_errors_total",
+    "Total number of errors",
+    ["error_type"]
+)
+
+
+class _NullMetric:
+    """Accepts the metric calls used in this backend and records nothing."""
+
+    def labels(self, *args, **kwargs) -> "_NullMetric":
+        return self
+
+    def inc(self, amount: float = 1, exemplar: Optional[Dict[str, str]] = None) -> None:
+        pass
+
+    def observe(self, amount: float, exemplar: Optional[Dict[str, str]] = None) -> None:
+        pass
+
+    def set(self, value: float) -> None:
+        pass
+
+
+# Stand-in for metrics that must not record, e.g. from mirrored shadow traffic
+NULL_METRIC = _NullMetric()
+
+
+def observe(histogram, value: float, request_id: Optional[str] = None, slow: bool = False) -> None:
+    """
+    Record an observation, attaching the request id as an exemplar when slow.
+
+    Args:
+        histogram: Histogram (or labeled child) to observe into
+        value: Observed value
+        request_id: Id of the request that produced the value
+        slow: Whether the observation is slow enough to be worth linking
+    """
+    if slow and request_id and not MULTIPROCESS:
+        histogram.observe(value, exemplar={"request_id": request_id})
+    else:
+        histogram.observe(value)
+
+
+def collector_registry():
+    """Registry to scrape: aggregated over workers in multiprocess mode."""
+    if not MULTIPROCESS:
+        return REGISTRY
+    from prometheus_client import multiprocess
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+_LIVE_GAUGE_FILE_RE = re.compile(r"gauge_live\w+?_(\d+)\.db$")
+
+
+def mark_process_dead(pid: Optional[int] = None) -> None:
+    """Drop a worker's live gauges from the multiprocess aggregates (default: this process)."""
+    if not MULTIPROCESS:
+        return
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(os.getpid() if pid is None else pid, MULTIPROC_DIR)
+
+
+def mark_dead_workers() -> List[int]:
+    """
+    Drop live gauges of workers that exited without cleaning up (killed or crashed).
+
+    Returns:
+        Process ids that were marked dead
+    """
+    if not MULTIPROCESS:
+        return []
+    dead = set()
+    for path in glob.glob(os.path.join(MULTIPROC_DIR, "gauge_live*.db")):
+        match = _LIVE_GAUGE_FILE_RE.search(os.path.basename(path))
+        if not match:
+            continue
+        pid = int(match.group(1))
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            dead.add(pid)
+        except PermissionError:
+            pass
+    for pid in dead:
+        mark_process_dead(pid)
+    return sorted(dead)
+
+
+def render_metrics(accept: Optional[str] = None) -> Tuple[bytes, str]:
+    """
+    Render all metrics for a scrape.
+
+    Args:
+        accept: The scraper's Accept header; OpenMetrics (with exemplars)
+            is used when it asks for it
+
+    Returns:
+        Tuple of payload and content type
+    """
+    registry = collector_registry()
+    if accept and "application/openmetrics-text" in accept:
+        return openmetrics.generate_latest(registry), openmetrics.CONTENT_TYPE_LATEST
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def histogram_mean(histogram_name: str, labels: Optional[dict] = None) -> float:
+    """
+    Mean of a histogram from the scrape registry, optionally for one label set.
+
+    Args:
+        histogram_name: Metric name without the _sum/_count suffix
+        labels: Label values that samples must match
+
+    Returns:
+        sum / count over matching samples, or 0.0 without observations
+    """
+    total = count = 0.0
+    for family in collector_registry().collect():
+        if family.name != histogram_name:
+            continue
+        for sample in family.samples:
+            if labels and any(sample.labels.get(k) != v for k, v in labels.items()):
+                continue
+            if sample.name == f"{histogram_name}_sum":
+                total += sample.value
+            elif sample.name == f"{histogram_name}_count":
+                count += sample.value
+    return total / count if count else 0.0
+
+
+def histogram_means_by(histogram_name: str, label: str) -> Dict[str, float]:
+    """
+    Means of a histogram from the scrape registry, grouped by one label.
+
+    Args:
+        histogram_name: Metric name without the _sum/_count suffix
+        label: Label to group samples by
+
+    Returns:
+        Mapping of label value to sum / count
+    """
+    totals: Dict[str, List[float]] = {}
+    for family in collector_registry().collect():
+        if family.name != histogram_name:
+            continue
+        for sample in family.samples:
+            if label not in sample.labels:
+                continue
+            entry = totals.setdefault(sample.labels[label], [0.0, 0.0])
+            if sample.name == f"{histogram_name}_sum":
+                entry[0] += sample.value
+            elif sample.name == f"{histogram_name}_count":
+                entry[1] += sample.value
+    return {value: total / count for value, (total, count) in totals.items() if count}
+
+
+def counter_totals_by(counter_name: str, label: str) -> Dict[str, float]:
+    """
+    Totals of a counter from the scrape registry, grouped by one label.
+
+    Args:
+        counter_name: Metric name without the _total suffix
+        label: Label to group samples by
+
+    Returns:
+        Mapping of label value to the summed count
+    """
+    totals: Dict[str, float] = {}
+    for family in collector_registry().collect():
+        if family.name != counter_name:
+            continue
+        for sample in family.samples:
+            if sample.name == f"{counter_name}_total" and label in sample.labels:
+                totals[sample.labels[label]] = totals.get(sample.labels[label], 0.0) + sample.value
+    return totals
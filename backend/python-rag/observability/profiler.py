@@ -0,0 +1,261 @@
+"""Low-overhead sampling profiler for the running worker.
+
+A background thread periodically snapshots every thread's Python stack with
+``sys._current_frames()`` and counts identical stacks. Nothing is hooked into
+function calls, so the cost is one stack walk per thread per interval and
+the profiler can stay available in production behind ``PROFILING_ENABLED``.
+
+Reports come as collapsed stacks (the input format of flamegraph.pl and
+speedscope), a nested flamegraph tree (d3-flame-graph JSON) and a table of
+top functions by self and inclusive samples.
+"""
+
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import os
+import sys
+import threading
+import time
+
+# Leaf frames of threads that are merely waiting; dropped unless include_idle
+IDLE_LEAVES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+    ("connection.py", "poll"),
+    ("connection.py", "_poll"),
+    ("profiler.py", "_run"),
+}
+
+
+class StackSampler:
+    """
+    Samples the Python stacks of all other threads at a fixed interval.
+
+    Args:
+        interval: Seconds between samples
+        max_depth: Deepest stack recorded; deeper frames are truncated
+        include_idle: Keep samples of threads blocked in waits/selects
+        gate: Optional callable; samples are only taken while it returns True
+    """
+
+    def __init__(
+        self,
+        interval: float = 0.01,
+        max_depth: int = 128,
+        include_idle: bool = False,
+        gate: Optional[Callable[[], bool]] = None,
+    ):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.include_idle = include_idle
+        self.gate = gate
+        self.counts: Counter = Counter()
+        self.ticks = 0
+        self._labels: Dict[Any, str] = {}
+        self._idle_codes: Dict[Any, bool] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._started = 0.0
+        self._elapsed = 0.0
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            label = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+            self._labels[code] = label
+        return label
+
+    def _is_idle(self, code) -> bool:
+        idle = self._idle_codes.get(code)
+        if idle is None:
+            idle = (os.path.basename(code.co_filename), code.co_name) in IDLE_LEAVES
+            self._idle_codes[code] = idle
+        return idle
+
+    def _sample(self, own_ident: int) -> None:
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+            if not self.include_idle and self._is_idle(frame.f_code):
+                continue
+            stack: List[str] = []
+            while frame is not None and len(stack) < self.max_depth:
+                stack.append(self._label(frame.f_code))
+                frame = frame.f_back
+            stack.reverse()
+            self.counts[tuple(stack)] += 1
+
+    def _run(self) -> None:
+        own_ident = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            if self.gate is not None and not self.gate():
+                continue
+            self.ticks += 1
+            self._sample(own_ident)
+
+    def start(self) -> None:
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._elapsed = time.perf_counter() - self._started
+
+    def collapsed(self) -> str:
+        """Stacks in collapsed format: ``frame;frame;frame count`` per line."""
+        return "\n".join(
+            f"{';'.join(stack)} {count}"
+            for stack, count in self.counts.most_common()
+        )
+
+    def flamegraph(self) -> Dict[str, Any]:
+        """Nested ``{name, value, children}`` tree for d3-flame-graph."""
+        root: Dict[str, Any] = {"name": "all", "value": 0, "children": {}}
+        for stack, count in self.counts.items():
+            root["value"] += count
+            node = root
+            for frame in stack:
+                child = node["children"].get(frame)
+                if child is None:
+                    child = {"name": frame, "value": 0, "children": {}}
+                    node["children"][frame] = child
+                child["value"] += count
+                node = child
+
+        def finish(node: Dict[str, Any]) -> Dict[str, Any]:
+            children = sorted(node["children"].values(), key=lambda c: -c["value"])
+            return {"name": node["name"], "value": node["value"], "children": [finish(c) for c in children]}
+
+        return finish(root)
+
+    def top_functions(self, limit: int = 30) -> List[Dict[str, Any]]:
+        """Functions ranked by self samples, with inclusive samples alongside."""
+        own: Counter = Counter()
+        inclusive: Counter = Counter()
+        for stack, count in self.counts.items():
+            if not stack:
+                continue
+            own[stack[-1]] += count
+            for frame in set(stack):
+                inclusive[frame] += count
+        total = sum(self.counts.values()) or 1
+        ranked = sorted(inclusive, key=lambda f: (-own[f], -inclusive[f]))[:limit]
+        return [
+            {
+                "function": frame,
+                "self_samples": own[frame],
+                "self_percent": 100.0 * own[frame] / total,
+                "total_samples": inclusive[frame],
+                "total_percent": 100.0 * inclusive[frame] / total,
+            }
+            for frame in ranked
+        ]
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "duration": self._elapsed,
+            "interval": self.interval,
+            "ticks": self.ticks,
+            "samples": sum(self.counts.values()),
+            "unique_stacks": len(self.counts),
+        }
+
+
+class ProfilerController:
+    """
+    Runs at most one profiling session per worker.
+
+    A session either samples everything for a fixed time, or, when given a
+    path prefix, only samples while requests on that path are in flight.
+    The HTTP middleware reports request start/end through ``request_started``
+    and ``request_finished``; both are no-ops unless a path session is armed.
+    A request only counts for the session it started in, so requests still
+    in flight from an earlier session cannot unbalance the current count.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sampler: Optional[StackSampler] = None
+        self._path_prefix: Optional[str] = None
+        self._active_requests = 0
+        self._matched_requests = 0
+
+    @property
+    def busy(self) -> bool:
+        return self._sampler is not None
+
+    def matches(self, path: str) -> bool:
+        prefix = self._path_prefix
+        return prefix is not None and path.startswith(prefix)
+
+    def request_started(self) -> Optional[StackSampler]:
+        """Count a matching request; returns the session to pass to ``request_finished``."""
+        with self._lock:
+            if self._sampler is None:
+                return None
+            self._active_requests += 1
+            self._matched_requests += 1
+            return self._sampler
+
+    def request_finished(self, session: Optional[StackSampler]) -> None:
+        with self._lock:
+            if session is not None and session is self._sampler:
+                self._active_requests -= 1
+
+    def start(
+        self,
+        interval: float,
+        include_idle: bool = False,
+        path_prefix: Optional[str] = None,
+    ) -> bool:
+        """Arm a session; returns False if one is already running."""
+        with self._lock:
+            if self._sampler is not None:
+                return False
+            gate = (lambda: self._active_requests > 0) if path_prefix else None
+            self._sampler = StackSampler(interval=interval, include_idle=include_idle, gate=gate)
+            self._path_prefix = path_prefix
+            self._active_requests = 0
+            self._matched_requests = 0
+        self._sampler.start()
+        return True
+
+    def stop(self) -> Tuple[StackSampler, int]:
+        """End the session; returns the sampler and how many requests matched."""
+        sampler = self._sampler
+        sampler.stop()
+        with self._lock:
+            matched = self._matched_requests
+            self._sampler = None
+            self._path_prefix = None
+        return sampler, matched
+
+
+profiler = ProfilerController()
+
+
+def build_report(sampler: StackSampler, report_format: str, top: int = 30) -> Dict[str, Any]:
+    """
+    Assemble a profile report.
+
+    Args:
+        sampler: Stopped sampler
+        report_format: "top", "collapsed", "flamegraph" or "all"
+        top: Number of functions in the top table
+
+    Returns:
+        Dictionary with the summary and the requested views
+    """
+    report: Dict[str, Any] = sampler.summary()
+    if report_format in ("top", "all"):
+        report["top_functions"] = sampler.top_functions(top)
+    if report_format in ("collapsed", "all"):
+        report["collapsed"] = sampler.collapsed()
+    if report_format in ("flamegraph", "all"):
+        report["flamegraph"] = sampler.flamegraph()
+    return report
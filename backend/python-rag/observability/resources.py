@@ -0,0 +1,294 @@
+"""Per-run resource sampling: CPU time, memory and energy attributed to models.
+
+While a query or test job runs, ``resource_sampler`` periodically reads:
+
+- CPU time and RSS of the backend process from procfs (``/proc/self``)
+- the same for the model runner, when it is visible from this process:
+  ``RUNNER_PIDS`` (procfs, e.g. with a shared PID namespace) or
+  ``RUNNER_CGROUP_PATH`` (a cgroup v2 or v1 directory mounted into the
+  container). Docker Desktop's built-in runner is usually not visible, and
+  then only the backend is measured.
+- package energy from Intel RAPL (``/sys/class/powercap/intel-rapl:N``)
+  where the counters exist and are readable
+
+Each reading's deltas are split evenly between the runs active in this
+process during that interval, so overlapping queries do not count the same
+CPU second twice. RAPL energy is machine-wide and the runner is shared, so
+with several workers running generations at once their attributions
+overlap; per-model figures are then an upper bound.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+import glob
+import logging
+import os
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+RESOURCE_SAMPLING_ENABLED = os.getenv("RESOURCE_SAMPLING_ENABLED", "true").lower() == "true"
+RESOURCE_SAMPLE_INTERVAL = float(os.getenv("RESOURCE_SAMPLE_INTERVAL", "0.25"))
+RUNNER_PIDS = [int(p) for p in os.getenv("RUNNER_PIDS", "").split(",") if p.strip()]
+RUNNER_CGROUP_PATH = os.getenv("RUNNER_CGROUP_PATH")
+RAPL_PATH = os.getenv("RAPL_PATH", "/sys/class/powercap")
+# Cost rates: amortized hardware per CPU hour and electricity per kWh
+COST_PER_CPU_HOUR = float(os.getenv("COST_PER_CPU_HOUR", "0.02"))
+COST_PER_KWH = float(os.getenv("COST_PER_KWH", "0.15"))
+
+_CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+_RAPL_DOMAIN_RE = re.compile(r"intel-rapl:\d+$")
+
+
+class ProcessSource:
+    """CPU time (user + system) and RSS of processes from procfs."""
+
+    def __init__(self, pids: List[Any], proc_root: str = "/proc"):
+        self.pids = pids
+        self.proc_root = proc_root
+
+    def read(self) -> Tuple[float, int]:
+        cpu_seconds = 0.0
+        rss_bytes = 0
+        for pid in self.pids:
+            with open(os.path.join(self.proc_root, str(pid), "stat")) as f:
+                # The command name may contain spaces; fields resume after its closing parenthesis
+                fields = f.read().rsplit(")", 1)[1].split()
+            cpu_seconds += (int(fields[11]) + int(fields[12])) / _CLOCK_TICKS
+            with open(os.path.join(self.proc_root, str(pid), "statm")) as f:
+                rss_bytes += int(f.read().split()[1]) * _PAGE_SIZE
+        return cpu_seconds, rss_bytes
+
+
+class CgroupSource:
+    """CPU time and memory of a cgroup (v2 ``cpu.stat``/``memory.current``, or v1 equivalents)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.v2 = os.path.exists(os.path.join(path, "cpu.stat"))
+
+    def _read(self, name: str) -> str:
+        with open(os.path.join(self.path, name)) as f:
+            return f.read()
+
+    def read(self) -> Tuple[float, int]:
+        if self.v2:
+            stats = dict(line.split() for line in self._read("cpu.stat").splitlines() if line.strip())
+            return int(stats["usage_usec"]) / 1e6, int(self._read("memory.current"))
+        return int(self._read("cpuacct.usage")) / 1e9, int(self._read("memory.usage_in_bytes"))
+
+
+class RaplReader:
+    """Cumulative package energy in joules from RAPL, corrected for counter wrap-around."""
+
+    def __init__(self, root: str = RAPL_PATH):
+        self.domains = [
+            path for path in sorted(glob.glob(os.path.join(root, "intel-rapl:*")))
+            if _RAPL_DOMAIN_RE.search(path)
+        ]
+        self._last: Dict[str, int] = {}
+        self._ranges: Dict[str, int] = {}
+        self._total_uj = 0
+
+    def available(self) -> bool:
+        try:
+            self.read()
+            return bool(self.domains)
+        except OSError:
+            return False
+
+    def read(self) -> float:
+        for domain in self.domains:
+            with open(os.path.join(domain, "energy_uj")) as f:
+                value = int(f.read())
+            if domain not in self._ranges:
+                try:
+                    with open(os.path.join(domain, "max_energy_range_uj")) as f:
+                        self._ranges[domain] = int(f.read())
+                except OSError:
+                    self._ranges[domain] = 0
+            last = self._last.get(domain)
+            if last is not None:
+                delta = value - last
+                if delta < 0:
+                    delta += self._ranges[domain]
+                self._total_uj += max(delta, 0)
+            self._last[domain] = value
+        return self._total_uj / 1e6
+
+
+class _Run:
+    def __init__(self, model: str, sources: List[str]):
+        self.model = model
+        self.started = time.monotonic()
+        self.cpu_seconds = {name: 0.0 for name in sources}
+        self.peak_rss_bytes = {name: 0 for name in sources}
+        self.energy_joules = 0.0
+
+
+class ResourceSampler:
+    """
+    Samples resource sources while runs are active and attributes the deltas to them.
+
+    Args:
+        sources: Named sources ("backend", "runner") with ``read() -> (cpu_seconds, rss_bytes)``
+        rapl: Energy reader, or None where RAPL is unavailable
+        interval: Seconds between samples while any run is active
+    """
+
+    def __init__(self, sources: Dict[str, Any], rapl: Optional[RaplReader] = None,
+                 interval: float = RESOURCE_SAMPLE_INTERVAL):
+        self.sources = sources
+        self.rapl = rapl
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._runs: Dict[int, _Run] = {}
+        self._next_id = 0
+        self._last_cpu: Dict[str, float] = {}
+        self._last_energy: Optional[float] = None
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _sample(self) -> None:
+        """Read every source and split the deltas between active runs. Holds the lock."""
+        readings = {}
+        for name, source in list(self.sources.items()):
+            try:
+                readings[name] = source.read()
+            except (OSError, ValueError, IndexError, KeyError) as e:
+                # A runner process that exited or a cgroup that went away: stop sampling it
+                logger.warning(f"Resource source {name} unreadable, dropping it: {e}")
+                del self.sources[name]
+        energy = None
+        if self.rapl is not None:
+            try:
+                energy = self.rapl.read()
+            except OSError as e:
+                logger.warning(f"RAPL energy unreadable, dropping it: {e}")
+                self.rapl = None
+
+        runs = list(self._runs.values())
+        for name, (cpu_seconds, rss_bytes) in readings.items():
+            last = self._last_cpu.get(name)
+            self._last_cpu[name] = cpu_seconds
+            for run in runs:
+                if last is not None and name in run.cpu_seconds:
+                    run.cpu_seconds[name] += max(cpu_seconds - last, 0.0) / len(runs)
+                run.peak_rss_bytes[name] = max(run.peak_rss_bytes.get(name, 0), rss_bytes)
+        if energy is not None:
+            if self._last_energy is not None:
+                for run in runs:
+                    run.energy_joules += (energy - self._last_energy) / len(runs)
+            self._last_energy = energy
+
+    def _loop(self) -> None:
+        while True:
+            self._wake.wait()
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._runs:
+                    self._wake.clear()
+                    continue
+                self._sample()
+
+    def start(self, model: str) -> int:
+        """Begin attributing resource use to a run of ``model``; returns its id."""
+        with self._lock:
+            # Close the previous interval so it goes to the runs that were active in it
+            self._sample()
+            run_id = self._next_id
+            self._next_id += 1
+            self._runs[run_id] = _Run(model, list(self.sources))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="resource-sampler", daemon=True)
+                self._thread.start()
+            self._wake.set()
+        return run_id
+
+    def stop(self, run_id: int) -> Optional[Dict[str, Any]]:
+        """
+        End a run and return what it used; None if it was already stopped.
+
+        Returns:
+            Dictionary with wall time, CPU seconds and peak RSS per source, total
+            CPU seconds and energy in joules (None without RAPL)
+        """
+        with self._lock:
+            if run_id not in self._runs:
+                return None
+            self._sample()
+            run = self._runs.pop(run_id)
+        return {
+            "model": run.model,
+            "wall_seconds": time.monotonic() - run.started,
+            "cpu_seconds": run.cpu_seconds,
+            "cpu_seconds_total": sum(run.cpu_seconds.values()),
+            "peak_rss_bytes": run.peak_rss_bytes,
+            "energy_joules": run.energy_joules if self.rapl is not None else None,
+        }
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "sources": sorted(self.sources),
+            "energy": "rapl" if self.rapl is not None else None,
+            "interval": self.interval,
+            "active_runs": len(self._runs),
+        }
+
+
+def efficiency(usage: Dict[str, Any], output_tokens: int) -> Dict[str, Optional[float]]:
+    """Output tokens per CPU second and per joule of a run's usage."""
+    cpu = usage.get("cpu_seconds_total") or 0.0
+    energy = usage.get("energy_joules")
+    return {
+        "tokens_per_cpu_second": output_tokens / cpu if cpu > 0 else None,
+        "tokens_per_joule": output_tokens / energy if energy else None,
+    }
+
+
+def estimate_cost(
+    cpu_seconds: float,
+    energy_joules: Optional[float],
+    output_tokens: float,
+    cost_per_cpu_hour: float = COST_PER_CPU_HOUR,
+    cost_per_kwh: float = COST_PER_KWH,
+) -> Dict[str, Optional[float]]:
+    """
+    Cost of measured resource use, in total and per million output tokens.
+
+    Args:
+        cpu_seconds: CPU seconds attributed to the model
+        energy_joules: Energy attributed to the model; None without RAPL
+        output_tokens: Output tokens generated in the same runs
+        cost_per_cpu_hour: Amortized hardware cost of one CPU hour
+        cost_per_kwh: Electricity price
+    """
+    cost = cpu_seconds / 3600 * cost_per_cpu_hour
+    if energy_joules:
+        cost += energy_joules / 3.6e6 * cost_per_kwh
+    return {
+        "cpu_seconds": cpu_seconds,
+        "energy_joules": energy_joules,
+        "output_tokens": output_tokens,
+        "estimated_cost": cost,
+        "cost_per_1m_output_tokens": cost / output_tokens * 1e6 if output_tokens else None,
+        "tokens_per_cpu_second": output_tokens / cpu_seconds if cpu_seconds > 0 else None,
+        "tokens_per_joule": output_tokens / energy_joules if energy_joules else None,
+    }
+
+
+def _default_sampler() -> Optional[ResourceSampler]:
+    if not RESOURCE_SAMPLING_ENABLED or not os.path.exists("/proc/self/stat"):
+        return None
+    sources: Dict[str, Any] = {"backend": ProcessSource(["self"])}
+    if RUNNER_CGROUP_PATH:
+        sources["runner"] = CgroupSource(RUNNER_CGROUP_PATH)
+    elif RUNNER_PIDS:
+        sources["runner"] = ProcessSource(RUNNER_PIDS)
+    rapl = RaplReader()
+    return ResourceSampler(sources, rapl if rapl.available() else None)
+
+
+resource_sampler = _default_sampler()
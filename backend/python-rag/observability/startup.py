@@ -0,0 +1,156 @@
+"""Startup instrumentation, background warmup and readiness.
+
+``startup_tracker.begin()`` is called at the top of ``main.py``. From then
+until warmup finishes, every first-time import is timed (nested imports are
+attributed to the import that triggered them), so slow modules show up in
+``/ready`` even when they are imported lazily by a warmup task. Imports by
+name must go through ``startup_tracker.imports.import_module``, since
+``importlib`` bypasses the ``__import__`` hook.
+
+Warmup tasks are registered with ``add_task`` and run one after another in
+a background thread once the server is up. ``ready`` turns true when every
+task has finished; failed tasks are reported but do not block readiness
+unless they were registered as required.
+"""
+
+from typing import Any, Callable, Dict, List, Optional
+import asyncio
+import builtins
+import importlib
+import logging
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class ImportTimer:
+    """Times first-time imports by wrapping ``builtins.__import__``."""
+
+    def __init__(self):
+        self.timings: Dict[str, float] = {}
+        self._local = threading.local()
+        self._original = None
+        self._lock = threading.Lock()
+
+    def install(self) -> None:
+        if self._original is None:
+            self._original = builtins.__import__
+            builtins.__import__ = self._import
+
+    def uninstall(self) -> None:
+        # Bound methods are created on each access, so compare with == rather than is
+        if self._original is not None and builtins.__import__ == self._import:
+            builtins.__import__ = self._original
+            self._original = None
+
+    def _timed(self, name: str, load: Callable[[], Any]) -> Any:
+        """Run ``load`` and record its time under ``name`` unless nested in a timed import."""
+        if name in sys.modules or getattr(self._local, "depth", 0):
+            return load()
+        self._local.depth = 1
+        start = time.perf_counter()
+        try:
+            return load()
+        finally:
+            self._local.depth = 0
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.timings[name] = self.timings.get(name, 0.0) + elapsed
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        original = self._original or builtins.__import__
+        if level:
+            return original(name, globals, locals, fromlist, level)
+        return self._timed(name, lambda: original(name, globals, locals, fromlist, level))
+
+    def import_module(self, name: str) -> Any:
+        """
+        ``importlib.import_module`` with timing.
+
+        ``importlib`` does not go through ``builtins.__import__``, so modules
+        imported by name (e.g. in warmup tasks) must use this to be timed.
+        """
+        return self._timed(name, lambda: importlib.import_module(name))
+
+    def slowest(self, limit: int = 20) -> List[Dict[str, Any]]:
+        ranked = sorted(self.timings.items(), key=lambda item: -item[1])[:limit]
+        return [{"module": name, "seconds": seconds} for name, seconds in ranked]
+
+
+class StartupTracker:
+    """Tracks startup phases, warmup tasks and readiness of this worker."""
+
+    def __init__(self):
+        self.started = time.time()
+        self.imports = ImportTimer()
+        self.phases: Dict[str, float] = {}
+        self.tasks: Dict[str, Dict[str, Any]] = {}
+        self._functions: Dict[str, Callable[[], Any]] = {}
+        self.ready_at: Optional[float] = None
+
+    def begin(self) -> None:
+        """Start timing imports."""
+        self.imports.install()
+
+    def mark(self, phase: str) -> None:
+        """Record the time since process start at which a phase was reached."""
+        self.phases[phase] = time.time() - self.started
+
+    def add_task(self, name: str, function: Callable[[], Any], required: bool = False) -> None:
+        """Register a warmup task to run in the background after startup."""
+        self._functions[name] = function
+        self.tasks[name] = {"status": "pending", "required": required}
+
+    @property
+    def ready(self) -> bool:
+        return self.ready_at is not None
+
+    def _run_task(self, name: str) -> None:
+        task = self.tasks[name]
+        task["status"] = "running"
+        start = time.perf_counter()
+        try:
+            self._functions[name]()
+            task["status"] = "done"
+        except Exception as e:
+            task["status"] = "failed"
+            task["error"] = str(e)
+            logger.warning(f"Warmup task {name} failed: {e}")
+        task["seconds"] = time.perf_counter() - start
+
+    def _run_all(self) -> None:
+        for name in list(self._functions):
+            self._run_task(name)
+
+    async def run_warmup(self) -> None:
+        """Run all warmup tasks off the event loop, then mark the worker ready."""
+        self.mark("warmup_started")
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self._run_all)
+        finally:
+            self.imports.uninstall()
+            self.mark("warmup_finished")
+        blocking = [
+            name for name, task in self.tasks.items()
+            if task["required"] and task["status"] != "done"
+        ]
+        if blocking:
+            logger.error(f"Required warmup tasks failed, staying unready: {', '.join(blocking)}")
+            return
+        self.ready_at = time.time()
+        logger.info(f"Ready {self.ready_at - self.started:.2f}s after start")
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "uptime": time.time() - self.started,
+            "time_to_ready": self.ready_at - self.started if self.ready_at else None,
+            "phases": self.phases,
+            "warmup": self.tasks,
+            "slowest_imports": self.imports.slowest(),
+        }
+
+
+startup_tracker = StartupTracker()
@@ -0,0 +1,250 @@
+"""Per-request tracing with OpenTelemetry-compatible export.
+
+Each request gets a ``Trace`` whose stages are recorded as spans, either with
+the ``span()`` context manager or, for stages only known after the fact
+(e.g. inside a streaming loop), with ``add_span()``. Finished traces are
+queued and written by a background thread as OTLP/JSON
+``ExportTraceServiceRequest`` lines to ``TRACE_EXPORT_PATH``, and posted to
+``OTEL_EXPORTER_OTLP_ENDPOINT`` (``/v1/traces``) when one is configured, so
+any OpenTelemetry collector can ingest them.
+"""
+
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+import json
+import logging
+import os
+import queue
+import re
+import secrets
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "python-rag")
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH", "/tmp/ai-penknife/traces.jsonl")
+TRACE_EXPORT_MAX_MB = float(os.getenv("TRACE_EXPORT_MAX_MB", "50"))
+OTLP_ENDPOINT = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "")
+
+_TRACEPARENT_RE = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+# OTLP span kinds
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+
+
+def _attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+class Span:
+    """One timed stage of a trace."""
+
+    __slots__ = ("name", "span_id", "parent_id", "start_ns", "end_ns", "attributes", "kind", "error")
+
+    def __init__(self, name: str, parent_id: Optional[str], kind: int = SPAN_KIND_INTERNAL):
+        self.name = name
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes: Dict[str, Any] = {}
+        self.kind = kind
+        self.error: Optional[str] = None
+
+    @property
+    def duration(self) -> float:
+        end = self.end_ns if self.end_ns is not None else time.time_ns()
+        return (end - self.start_ns) / 1e9
+
+    def to_otlp(self, trace_id: str) -> Dict[str, Any]:
+        span = {
+            "traceId": trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or self.start_ns),
+            "attributes": [_attribute(k, v) for k, v in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+class Trace:
+    """
+    Spans of one request, rooted at a server span.
+
+    Args:
+        name: Root span name, e.g. "POST /query"
+        traceparent: Incoming W3C ``traceparent`` header to continue
+        attributes: Attributes of the root span
+    """
+
+    def __init__(self, name: str, traceparent: Optional[str] = None, **attributes: Any):
+        parent_id = None
+        match = _TRACEPARENT_RE.match(traceparent or "")
+        # All-zero ids are invalid per W3C Trace Context; start a new trace instead
+        if match and int(match.group(1), 16) and int(match.group(2), 16):
+            self.trace_id, parent_id = match.group(1), match.group(2)
+        else:
+            self.trace_id = secrets.token_hex(16)
+        self.root = Span(name, parent_id, SPAN_KIND_SERVER)
+        self.root.attributes.update(attributes)
+        self.spans: List[Span] = [self.root]
+        self._current = self.root
+
+    @property
+    def traceparent(self) -> str:
+        """``traceparent`` header for downstream calls made within the current span."""
+        return f"00-{self.trace_id}-{self._current.span_id}-01"
+
+    @contextmanager
+    def span(self, name: str, kind: int = SPAN_KIND_INTERNAL, **attributes: Any) -> Iterator[Span]:
+        """Time a stage as a child of the current span."""
+        span = Span(name, self._current.span_id, kind)
+        span.attributes.update(attributes)
+        self.spans.append(span)
+        previous, self._current = self._current, span
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span.end_ns = time.time_ns()
+            self._current = previous
+
+    def add_span(self, name: str, start_ns: int, end_ns: int, kind: int = SPAN_KIND_INTERNAL, **attributes: Any) -> Span:
+        """Record a stage whose boundaries were measured elsewhere."""
+        span = Span(name, self._current.span_id, kind)
+        span.start_ns = start_ns
+        span.end_ns = end_ns
+        span.attributes.update(attributes)
+        self.spans.append(span)
+        return span
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.root.attributes[key] = value
+
+    def timings(self) -> Dict[str, float]:
+        """Seconds per stage (summed when a stage repeats) plus the total so far."""
+        timings: Dict[str, float] = {}
+        for span in self.spans[1:]:
+            timings[span.name] = timings.get(span.name, 0.0) + span.duration
+        timings["total"] = self.root.duration
+        return timings
+
+    def finish(self, error: Optional[str] = None) -> None:
+        """End the root span and hand the trace to the exporter."""
+        if self.root.end_ns is None:
+            self.root.end_ns = time.time_ns()
+        if error:
+            self.root.error = error
+        exporter.submit(self)
+
+
+class SpanExporter:
+    """Background batch exporter to a JSONL file and/or an OTLP/HTTP collector."""
+
+    def __init__(self, path: str, endpoint: str, max_bytes: int, batch_size: int = 256, flush_interval: float = 1.0):
+        self.path = path
+        self.endpoint = endpoint.rstrip("/")
+        self.max_bytes = max_bytes
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue[Trace]" = queue.Queue(maxsize=10000)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path or self.endpoint)
+
+    def submit(self, trace: Trace) -> None:
+        if not self.enabled:
+            return
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            self.dropped += 1
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                if self.path and os.path.dirname(self.path):
+                    os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+                self._thread.start()
+
+    def _payload(self, traces: List[Trace]) -> Dict[str, Any]:
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [
+                    _attribute("service.name", SERVICE_NAME),
+                    _attribute("process.pid", os.getpid()),
+                ]},
+                "scopeSpans": [{
+                    "scope": {"name": "python-rag.tracing"},
+                    "spans": [s.to_otlp(t.trace_id) for t in traces for s in t.spans],
+                }],
+            }]
+        }
+
+    def _write_file(self, line: str) -> None:
+        if os.path.exists(self.path) and os.path.getsize(self.path) > self.max_bytes:
+            os.replace(self.path, self.path + ".1")
+        with open(self.path, "a") as f:
+            f.write(line + "\n")
+
+    def _post(self, body: str) -> None:
+        import requests
+
+        requests.post(
+            f"{self.endpoint}/v1/traces",
+            data=body,
+            headers={"Content-Type": "application/json"},
+            timeout=5
+        )
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            body = json.dumps(self._payload(batch), separators=(",", ":"))
+            try:
+                if self.path:
+                    self._write_file(body)
+                if self.endpoint:
+                    self._post(body)
+            except Exception as e:
+                logger.warning(f"Span export failed: {e}")
+
+
+exporter = SpanExporter(
+    TRACE_EXPORT_PATH,
+    OTLP_ENDPOINT,
+    int(TRACE_EXPORT_MAX_MB * 1024 * 1024)
+)
@@ -0,0 +1,9 @@
+"""Document retrieval: local vector index and ingestion helpers."""
+
+from .local_index import LocalHit, LocalVectorIndex, get_local_index
+
+__all__ = [
+    "LocalHit",
+    "LocalVectorIndex",
+    "get_local_index",
+]
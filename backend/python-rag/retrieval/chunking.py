@@ -0,0 +1,209 @@
+"""Document parsing and token-window chunking.
+
+Files are split into work units that a worker process can handle on its
+own: plain text and markdown by byte range (cut at line starts, so a unit
+never needs to see its neighbours), PDFs by page range, and HTML as a whole
+file. Each unit is parsed and cut into sliding windows of ``chunk_tokens``
+tokens that overlap by ``overlap`` tokens. Tokens are word and punctuation
+runs, which tracks subword tokenizer counts closely enough to size chunks.
+Chunk text is always an exact slice of the parsed text.
+
+Chunk ids are derived from the source, the chunk text and any metadata
+attached to the document, so an unchanged chunk keeps its id when the
+document is re-ingested.
+"""
+
+from html.parser import HTMLParser
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+import hashlib
+import json
+import os
+import re
+import time
+import uuid
+
+TEXT_EXTENSIONS = {".txt", ".text", ".md", ".markdown", ".rst"}
+HTML_EXTENSIONS = {".html", ".htm"}
+PDF_EXTENSIONS = {".pdf"}
+SUPPORTED_EXTENSIONS = TEXT_EXTENSIONS | HTML_EXTENSIONS | PDF_EXTENSIONS
+
+# Size of a text work unit; bounds the memory each worker uses per task
+SEGMENT_BYTES = int(os.getenv("CHUNK_SEGMENT_MB", "4")) * 1024 * 1024
+PDF_PAGES_PER_UNIT = 16
+
+CHUNK_NAMESPACE = uuid.UUID("6f1c2a52-3b0e-4d55-9a7e-1f2d3c4b5a69")
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+_BLANK_RE = re.compile(r"[ \t]*\n[ \t]*\n\s*")
+
+
+class WorkUnit(NamedTuple):
+    """A piece of one file: a byte range for text, a page range for PDF."""
+    path: str
+    kind: str
+    start: int
+    end: int
+
+
+def chunk_id(source: str, text: str, metadata: Optional[Dict[str, Any]] = None) -> str:
+    """Stable point id for a chunk of a source."""
+    digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    if metadata:
+        source = f"{source}\0{json.dumps(metadata, sort_keys=True)}"
+    return str(uuid.uuid5(CHUNK_NAMESPACE, f"{source}\0{digest}"))
+
+
+def file_kind(path: str) -> str:
+    ext = os.path.splitext(path)[1].lower()
+    if ext in HTML_EXTENSIONS:
+        return "html"
+    if ext in PDF_EXTENSIONS:
+        return "pdf"
+    return "text"
+
+
+def plan_units(path: str, segment_bytes: int = SEGMENT_BYTES) -> List[WorkUnit]:
+    """Split a file into independently processable work units."""
+    kind = file_kind(path)
+    if kind == "pdf":
+        from pypdf import PdfReader
+
+        pages = len(PdfReader(path).pages)
+        return [
+            WorkUnit(path, kind, start, min(start + PDF_PAGES_PER_UNIT, pages))
+            for start in range(0, pages, PDF_PAGES_PER_UNIT)
+        ]
+    size = os.path.getsize(path)
+    if kind == "html" or size <= segment_bytes:
+        return [WorkUnit(path, kind, 0, size)]
+    return [WorkUnit(path, kind, start, min(start + segment_bytes, size)) for start in range(0, size, segment_bytes)]
+
+
+class _TextExtractor(HTMLParser):
+    SKIP = {"script", "style", "noscript", "template", "svg", "head"}
+    BLOCK = {"p", "div", "br", "li", "tr", "h1", "h2", "h3", "h4", "h5", "h6",
+             "section", "article", "pre", "blockquote", "table", "ul", "ol"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: List[str] = []
+        self._skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP:
+            self._skip += 1
+        elif tag in self.BLOCK:
+            self.parts.append("\n\n")
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP and self._skip:
+            self._skip -= 1
+        elif tag in self.BLOCK:
+            self.parts.append("\n\n")
+
+    def handle_data(self, data):
+        if not self._skip:
+            self.parts.append(data)
+
+
+def html_to_text(html: str) -> str:
+    parser = _TextExtractor()
+    parser.feed(html)
+    parser.close()
+    return _BLANK_RE.sub("\n\n", "".join(parser.parts)).strip()
+
+
+def read_text_segment(path: str, start: int, end: int) -> str:
+    """Lines of a file that begin within [start, end)."""
+    with open(path, "rb") as f:
+        if start > 0:
+            # A line starting exactly at `start` belongs to this segment
+            f.seek(start - 1)
+            f.readline()
+        data = f.read(max(0, end - f.tell()))
+        if data and not data.endswith(b"\n"):
+            # Finish the last line, which started before `end`
+            data += f.readline()
+    return data.decode("utf-8", errors="replace")
+
+
+def read_unit(unit: WorkUnit) -> str:
+    if unit.kind == "pdf":
+        from pypdf import PdfReader
+
+        reader = PdfReader(unit.path)
+        return "\n\n".join(reader.pages[i].extract_text() or "" for i in range(unit.start, unit.end))
+    if unit.kind == "html":
+        with open(unit.path, "rb") as f:
+            return html_to_text(f.read().decode("utf-8", errors="replace"))
+    return read_text_segment(unit.path, unit.start, unit.end)
+
+
+def token_windows(text: str, chunk_tokens: int, overlap: int) -> Iterator[Tuple[int, int, int]]:
+    """
+    Sliding token windows over text.
+
+    Yields:
+        (char_start, char_end, token_count) of each window
+    """
+    if chunk_tokens < 1:
+        raise ValueError("chunk_tokens must be at least 1")
+    if overlap < 0:
+        raise ValueError("overlap must not be negative")
+    if overlap >= chunk_tokens:
+        raise ValueError("overlap must be smaller than chunk_tokens")
+    spans = [m.span() for m in _TOKEN_RE.finditer(text)]
+    step = chunk_tokens - overlap
+    for first in range(0, len(spans), step):
+        last = min(first + chunk_tokens, len(spans))
+        yield spans[first][0], spans[last - 1][1], last - first
+        if last == len(spans):
+            break
+
+
+def chunk_text(
+    text: str,
+    source: str,
+    chunk_tokens: int = 256,
+    overlap: int = 32,
+    unit: int = 0,
+    metadata: Optional[Dict[str, Any]] = None
+) -> List[Dict[str, Any]]:
+    """Cut text into overlapping token windows, as point-ready chunk dictionaries."""
+    chunks = []
+    for index, (char_start, char_end, tokens) in enumerate(token_windows(text, chunk_tokens, overlap)):
+        window = text[char_start:char_end]
+        chunks.append({
+            **(metadata or {}),
+            "id": chunk_id(source, window, metadata),
+            "text": window,
+            "source": source,
+            "unit": unit,
+            "chunk_index": index,
+            "tokens": tokens,
+        })
+    return chunks
+
+
+def chunk_unit(
+    unit: WorkUnit,
+    chunk_tokens: int = 256,
+    overlap: int = 32,
+    metadata: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """
+    Parse and chunk one work unit; runs in a worker process.
+
+    Returns:
+        Dictionary with the unit's chunks and how long parsing and chunking took
+    """
+    started = time.perf_counter()
+    text = read_unit(unit)
+    parsed = time.perf_counter()
+    chunks = chunk_text(text, os.path.abspath(unit.path), chunk_tokens, overlap, unit.start, metadata)
+    return {
+        "chunks": chunks,
+        "chars": len(text),
+        "parse_seconds": parsed - started,
+        "chunk_seconds": time.perf_counter() - parsed,
+    }
@@ -0,0 +1,99 @@
+"""Payload filters for vector search.
+
+A filter maps payload fields to conditions, all of which must hold:
+
+    {"tenant": "acme"}                    equal to a value
+    {"lang": ["en", "de"]}                equal to any of the values
+    {"year": {"gte": 2020, "lt": 2024}}   within a range (gt, gte, lt, lte)
+
+Nested fields use dots (``"meta.author"``). The same filter is translated
+to a Qdrant ``Filter``, applied during HNSW traversal, and to a SQL
+condition over the local index's payloads, where payload indexes are
+expression indexes on the same ``json_extract`` terms.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+import re
+
+# Field types a payload index can be declared with, as Qdrant schema names
+PAYLOAD_INDEX_TYPES = {"keyword", "integer", "float", "bool"}
+
+RANGE_OPERATORS = {"gt": ">", "gte": ">=", "lt": "<", "lte": "<="}
+
+_FIELD_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*)*$")
+# Qdrant matches exact values of keyword, integer and bool fields only
+_SCALARS = (str, int, bool)
+
+
+def validate_field(field: str) -> str:
+    if not _FIELD_RE.match(field):
+        raise ValueError(f"Invalid payload field name: {field!r}")
+    return field
+
+
+def validate_filters(filters: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Check a filter's shape; raises ValueError with the offending field."""
+    for field, condition in (filters or {}).items():
+        validate_field(field)
+        if isinstance(condition, dict):
+            unknown = set(condition) - set(RANGE_OPERATORS)
+            if not condition or unknown:
+                raise ValueError(f"Range on {field!r} must use {sorted(RANGE_OPERATORS)}")
+            if not all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in condition.values()):
+                raise ValueError(f"Range bounds on {field!r} must be numbers")
+        elif isinstance(condition, list):
+            if not condition or not all(isinstance(v, (str, int)) and not isinstance(v, bool) for v in condition):
+                raise ValueError(f"Values for {field!r} must be a non-empty list of strings or integers")
+        elif not isinstance(condition, _SCALARS):
+            raise ValueError(f"Unsupported condition on {field!r}")
+    return filters or {}
+
+
+def validate_index_fields(fields: Optional[Dict[str, str]]) -> Dict[str, str]:
+    """Check declared payload index fields ({field: type})."""
+    for field, field_type in (fields or {}).items():
+        validate_field(field)
+        if field_type not in PAYLOAD_INDEX_TYPES:
+            raise ValueError(f"Index type of {field!r} must be one of {sorted(PAYLOAD_INDEX_TYPES)}")
+    return fields or {}
+
+
+def to_qdrant_filter(filters: Dict[str, Any]):
+    """Qdrant ``Filter`` for a validated filter, or None when empty."""
+    if not filters:
+        return None
+    from qdrant_client.models import FieldCondition, Filter, MatchAny, MatchValue, Range
+
+    conditions = []
+    for field, condition in filters.items():
+        if isinstance(condition, dict):
+            conditions.append(FieldCondition(key=field, range=Range(**condition)))
+        elif isinstance(condition, list):
+            conditions.append(FieldCondition(key=field, match=MatchAny(any=condition)))
+        else:
+            conditions.append(FieldCondition(key=field, match=MatchValue(value=condition)))
+    return Filter(must=conditions)
+
+
+def json_path(field: str) -> str:
+    """SQL expression for a payload field; identical text lets SQLite use the expression index."""
+    return f"json_extract(payload, '$.{validate_field(field)}')"
+
+
+def to_sql(filters: Dict[str, Any]) -> Tuple[str, List[Any]]:
+    """SQL condition over the ``payload`` JSON column, with its parameters."""
+    clauses: List[str] = []
+    params: List[Any] = []
+    for field, condition in filters.items():
+        expr = json_path(field)
+        if isinstance(condition, dict):
+            for op, bound in condition.items():
+                clauses.append(f"{expr} {RANGE_OPERATORS[op]} ?")
+                params.append(bound)
+        elif isinstance(condition, list):
+            clauses.append(f"{expr} IN ({','.join('?' * len(condition))})")
+            params.extend(condition)
+        else:
+            clauses.append(f"{expr} = ?")
+            params.append(condition)
+    return " AND ".join(clauses) or "1", params
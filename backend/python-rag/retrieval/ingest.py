@@ -0,0 +1,454 @@
+"""Streaming, incremental ingestion pipeline.
+
+Stages:
+
+1. plan: walk the inputs, skip documents the manifest says are unchanged,
+   and split the rest into work units (in this thread)
+2. parse + chunk: work units run in a process pool
+3. embed: new chunks are batched and passed to the caller's embed function
+4. upsert: embedded batches go to the caller's upsert function
+
+Stage 2 yields chunks as units finish, while stages 3 and 4 consume them in
+this thread, so parsing overlaps with embedding and upserting. At most
+``max_in_flight`` units are submitted at once and chunks are handed on in
+fixed-size batches, so memory stays bounded by a few work units regardless
+of corpus size. Per-stage busy time and throughput are reported at the end.
+
+With a manifest, chunks whose ids were already stored for the document are
+not embedded again, and once all of a document's chunks are upserted the
+ids it no longer produces are deleted in bulk and the manifest is updated.
+A document that failed is left as it was, so the next run retries it.
+Metadata is stored in every chunk's payload (for filtered search) and is
+part of the document hash, so changing it re-ingests the document.
+"""
+
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+
+from .chunking import SUPPORTED_EXTENSIONS, WorkUnit, chunk_text, chunk_unit, plan_units
+from .manifest import IngestManifest, ManifestEntry, file_hash, text_hash
+
+logger = logging.getLogger(__name__)
+
+CHUNK_WORKERS = int(os.getenv("CHUNK_WORKERS") or max(1, (os.cpu_count() or 2) - 1))
+
+# Sources of documents ingested as text (not files) are namespaced by this prefix
+DOCUMENT_SOURCE_PREFIX = "doc:"
+
+# Length of a hex sha256, after which a manifest hash may carry a metadata tag
+_HASH_LENGTH = 64
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def get_chunk_pool() -> ProcessPoolExecutor:
+    """Process pool for parsing and chunking, started on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: forking a threaded server process is unsafe
+            _pool = ProcessPoolExecutor(CHUNK_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def shutdown_chunk_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def iter_files(paths: Iterable[str]) -> Iterator[str]:
+    """Supported files among the given files and directories (recursively), in sorted order."""
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    if os.path.splitext(name)[1].lower() in SUPPORTED_EXTENSIONS:
+                        yield os.path.join(root, name)
+        elif os.path.isfile(path):
+            yield path
+
+
+class StageStats:
+    """Busy time and item counts of one pipeline stage."""
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.items = 0
+
+    def report(self, unit: str) -> Dict[str, Any]:
+        return {
+            "seconds": self.seconds,
+            unit: self.items,
+            f"{unit}_per_second": self.items / self.seconds if self.seconds > 0 else None,
+        }
+
+
+class _Document:
+    """Progress of one new or changed document through the pipeline."""
+
+    def __init__(self, entry: ManifestEntry, previous: Optional[ManifestEntry], units: int):
+        self.entry = entry
+        self.old_ids: Set[str] = set(previous.chunk_ids) if previous else set()
+        self.new_ids: Set[str] = set()
+        self.is_new = previous is None
+        self.pending_units = units
+        self.failed = False
+
+
+class IngestionPipeline:
+    """
+    Ingest files or texts into a vector store through caller-supplied stages.
+
+    Args:
+        embed: Maps a list of chunk texts to a list of vectors
+        upsert: Receives (ids, vectors, payloads) for one batch
+        delete: Receives the ids of stale points to remove
+        manifest: Manifest to diff against and update; without one, everything is ingested
+        collection: Collection the manifest entries belong to
+        chunk_tokens: Tokens per chunk
+        overlap: Tokens shared by consecutive chunks
+        batch_size: Chunks per embed/upsert call
+        max_in_flight: Work units submitted to the pool at once
+        pool: Process pool for parsing/chunking (default: the shared pool)
+        force: Ignore recorded hashes and re-embed every document
+        metadata: Payload fields added to every chunk of the ingested files
+    """
+
+    def __init__(
+        self,
+        embed: Callable[[List[str]], Any],
+        upsert: Callable[[List[str], Any, List[Dict[str, Any]]], None],
+        delete: Optional[Callable[[List[str]], None]] = None,
+        manifest: Optional[IngestManifest] = None,
+        collection: str = "default",
+        chunk_tokens: int = 256,
+        overlap: int = 32,
+        batch_size: int = 128,
+        max_in_flight: Optional[int] = None,
+        pool: Optional[ProcessPoolExecutor] = None,
+        force: bool = False,
+        metadata: Optional[Dict[str, Any]] = None,
+    ):
+        if chunk_tokens < 1:
+            raise ValueError("chunk_tokens must be at least 1")
+        if overlap < 0:
+            raise ValueError("chunk_overlap must not be negative")
+        if overlap >= chunk_tokens:
+            raise ValueError("chunk_overlap must be smaller than chunk_tokens")
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+        self.embed = embed
+        self.upsert = upsert
+        self.delete = delete
+        self.manifest = manifest
+        self.collection = collection
+        self.chunk_tokens = chunk_tokens
+        self.overlap = overlap
+        self.batch_size = batch_size
+        self.pool = pool
+        self.max_in_flight = max_in_flight or 2 * CHUNK_WORKERS
+        self.force = force
+        self.metadata = metadata or None
+        self.stats = {
+            "plan": StageStats(),
+            "parse": StageStats(),
+            "chunk": StageStats(),
+            "embed": StageStats(),
+            "upsert": StageStats(),
+            "delete": StageStats(),
+        }
+        self.documents = 0
+        self.bytes = 0
+        self.failed: List[Dict[str, Any]] = []
+        self.waiting = 0.0
+        self.diff = {
+            "added": 0,
+            "changed": 0,
+            "unchanged": 0,
+            "removed": 0,
+            "chunks_embedded": 0,
+            "chunks_reused": 0,
+            "points_deleted": 0,
+        }
+        self._documents: Dict[str, _Document] = {}
+        self._completed: List[str] = []
+        self._refreshed: List[ManifestEntry] = []
+        self._seen: Set[str] = set()
+
+    @staticmethod
+    def _metadata_tag(metadata: Optional[Dict[str, Any]]) -> str:
+        """Suffix of a document hash recording its metadata."""
+        return ":" + text_hash(json.dumps(metadata, sort_keys=True))[:16] if metadata else ""
+
+    def _previous(self, source: str) -> Optional[ManifestEntry]:
+        if self.manifest is None:
+            return None
+        return self.manifest.get(self.collection, source)
+
+    def _track(self, entry: ManifestEntry, previous: Optional[ManifestEntry], units: int) -> None:
+        self.documents += 1
+        self._documents[entry.source] = _Document(entry, previous, units)
+        if units == 0:
+            self._completed.append(entry.source)
+
+    def _unit_done(self, document: _Document) -> None:
+        document.pending_units -= 1
+        if document.pending_units == 0:
+            self._completed.append(document.entry.source)
+
+    def _accept(self, source: str, chunks: Sequence[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Chunks of one unit that need embedding; marks the document done after its last unit."""
+        document = self._documents[source]
+        for chunk in chunks:
+            # Identical windows of one document map to the same point
+            if chunk["id"] in document.new_ids:
+                continue
+            document.new_ids.add(chunk["id"])
+            if chunk["id"] in document.old_ids:
+                self.diff["chunks_reused"] += 1
+                continue
+            yield chunk
+        self._unit_done(document)
+
+    def _units(self, paths: Iterable[str]) -> Iterator[WorkUnit]:
+        plan = self.stats["plan"]
+        for path in iter_files(paths):
+            source = os.path.abspath(path)
+            if source in self._seen:
+                continue
+            self._seen.add(source)
+            start = time.perf_counter()
+            try:
+                stat = os.stat(path)
+                previous = self._previous(source)
+                tag = self._metadata_tag(self.metadata)
+                if previous is not None and not self.force:
+                    if (previous.size == stat.st_size and previous.mtime_ns == stat.st_mtime_ns
+                            and previous.content_hash[_HASH_LENGTH:] == tag):
+                        self.diff["unchanged"] += 1
+                        continue
+                    digest = file_hash(path) + tag
+                    if previous.content_hash == digest:
+                        # Touched but not modified: only the recorded mtime changes
+                        self._refreshed.append(previous._replace(size=stat.st_size, mtime_ns=stat.st_mtime_ns))
+                        self.diff["unchanged"] += 1
+                        continue
+                else:
+                    digest = file_hash(path) + tag if self.manifest is not None else ""
+                units = plan_units(path)
+            except Exception as e:
+                self.failed.append({"path": path, "error": str(e)})
+                continue
+            finally:
+                plan.seconds += time.perf_counter() - start
+            self.bytes += stat.st_size
+            plan.items += len(units)
+            self._track(ManifestEntry(source, digest, [], stat.st_size, stat.st_mtime_ns), previous, len(units))
+            yield from units
+
+    def file_chunks(self, paths: Iterable[str]) -> Iterator[Dict[str, Any]]:
+        """Chunks to embed, as work units complete; at most max_in_flight units are pending."""
+        pool = self.pool or get_chunk_pool()
+        units = self._units(paths)
+        pending = {}
+        exhausted = False
+        while pending or not exhausted:
+            while not exhausted and len(pending) < self.max_in_flight:
+                unit = next(units, None)
+                if unit is None:
+                    exhausted = True
+                    break
+                future = pool.submit(chunk_unit, unit, self.chunk_tokens, self.overlap, self.metadata)
+                pending[future] = unit
+            if not pending:
+                break
+            start = time.perf_counter()
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            self.waiting += time.perf_counter() - start
+            for future in done:
+                unit = pending.pop(future)
+                source = os.path.abspath(unit.path)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    self.failed.append({"path": unit.path, "unit": unit.start, "error": str(e)})
+                    self._documents[source].failed = True
+                    self._unit_done(self._documents[source])
+                    continue
+                self.stats["parse"].seconds += result["parse_seconds"]
+                self.stats["parse"].items += result["chars"]
+                self.stats["chunk"].seconds += result["chunk_seconds"]
+                self.stats["chunk"].items += len(result["chunks"])
+                yield from self._accept(source, result["chunks"])
+
+    def document_chunks(
+        self,
+        documents: Iterable[Tuple[str, str]],
+        metadata: Optional[Sequence[Optional[Dict[str, Any]]]] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """Chunks to embed for (document id, text) pairs, chunked in this thread."""
+        for i, (document_id, text) in enumerate(documents):
+            source = DOCUMENT_SOURCE_PREFIX + document_id
+            if source in self._seen:
+                raise ValueError(f"Duplicate document id: {document_id}")
+            self._seen.add(source)
+            document_metadata = metadata[i] if metadata else None
+            digest = text_hash(text) + self._metadata_tag(document_metadata)
+            previous = self._previous(source)
+            if previous is not None and previous.content_hash == digest and not self.force:
+                self.diff["unchanged"] += 1
+                continue
+            self.bytes += len(text)
+            self._track(ManifestEntry(source, digest, []), previous, 1)
+
+            start = time.perf_counter()
+            chunks = chunk_text(text, source, self.chunk_tokens, self.overlap, metadata=document_metadata)
+            self.stats["chunk"].seconds += time.perf_counter() - start
+            self.stats["chunk"].items += len(chunks)
+            yield from self._accept(source, chunks)
+
+    def _flush(self, batch: List[Dict[str, Any]]) -> None:
+        start = time.perf_counter()
+        vectors = self.embed([c["text"] for c in batch])
+        self.stats["embed"].seconds += time.perf_counter() - start
+        self.stats["embed"].items += len(batch)
+
+        start = time.perf_counter()
+        self.upsert(
+            [c["id"] for c in batch],
+            vectors,
+            [{k: v for k, v in c.items() if k != "id"} for c in batch]
+        )
+        self.stats["upsert"].seconds += time.perf_counter() - start
+        self.stats["upsert"].items += len(batch)
+        self.diff["chunks_embedded"] += len(batch)
+        self._commit()
+
+    def _delete(self, ids: List[str]) -> None:
+        if not ids or self.delete is None:
+            return
+        start = time.perf_counter()
+        self.delete(ids)
+        self.stats["delete"].seconds += time.perf_counter() - start
+        self.stats["delete"].items += len(ids)
+        self.diff["points_deleted"] += len(ids)
+
+    def _commit(self) -> None:
+        """
+        Delete stale points of completed documents and record them in the manifest.
+
+        Runs after an upsert: a document is only marked complete once all of its
+        chunks were appended to a batch, so they have all been stored by now.
+        """
+        entries = self._refreshed
+        stale: List[str] = []
+        for source in self._completed:
+            document = self._documents.pop(source)
+            if document.failed:
+                continue
+            stale.extend(document.old_ids - document.new_ids)
+            entries.append(document.entry._replace(chunk_ids=list(document.new_ids)))
+            self.diff["added" if document.is_new else "changed"] += 1
+        self._completed = []
+        self._refreshed = []
+        self._delete(stale)
+        if self.manifest is not None:
+            self.manifest.put(self.collection, entries)
+
+    def _prune(self, prefixes: Sequence[str]) -> None:
+        """Remove documents under the given source prefixes that this run did not see."""
+        if self.manifest is None:
+            return
+        gone = sorted({
+            source
+            for prefix in prefixes
+            for source in self.manifest.sources(self.collection, prefix)
+            if source not in self._seen
+        })
+        self._delete(self.manifest.remove(self.collection, gone))
+        self.diff["removed"] += len(gone)
+
+    def _consume(self, chunks: Iterator[Dict[str, Any]]) -> None:
+        batch: List[Dict[str, Any]] = []
+        for chunk in chunks:
+            batch.append(chunk)
+            if len(batch) >= self.batch_size:
+                self._flush(batch)
+                batch = []
+        if batch:
+            self._flush(batch)
+        else:
+            self._commit()
+
+    def run(self, paths: Sequence[str], prune: bool = False) -> Dict[str, Any]:
+        """
+        Ingest files and directories.
+
+        Args:
+            paths: Files and directories to ingest
+            prune: Also remove previously ingested files below ``paths`` that no longer exist
+
+        Returns:
+            Dictionary with the diff against the manifest, failures and per-stage throughput
+        """
+        started = time.perf_counter()
+        self._consume(self.file_chunks(paths))
+        if prune:
+            roots = [os.path.abspath(p) for p in paths]
+            self._prune([r + os.sep if os.path.isdir(r) else r for r in roots])
+        return self._report(time.perf_counter() - started)
+
+    def run_documents(
+        self,
+        documents: Sequence[Tuple[str, str]],
+        prune: bool = False,
+        metadata: Optional[Sequence[Optional[Dict[str, Any]]]] = None
+    ) -> Dict[str, Any]:
+        """
+        Ingest in-memory texts.
+
+        Args:
+            documents: (document id, text) pairs
+            prune: Also remove previously ingested documents missing from ``documents``
+            metadata: Payload fields for each document's chunks, parallel to ``documents``
+
+        Returns:
+            Dictionary with the diff against the manifest and per-stage throughput
+        """
+        started = time.perf_counter()
+        self._consume(self.document_chunks(documents, metadata))
+        if prune:
+            self._prune([DOCUMENT_SOURCE_PREFIX])
+        return self._report(time.perf_counter() - started)
+
+    def _report(self, wall: float) -> Dict[str, Any]:
+        return {
+            "documents": self.documents,
+            "bytes": self.bytes,
+            "chunks": self.stats["upsert"].items,
+            "diff": self.diff,
+            "failed": self.failed,
+            "wall_seconds": wall,
+            "mb_per_second": self.bytes / 1e6 / wall if wall > 0 else None,
+            "stages": {
+                "plan": self.stats["plan"].report("units"),
+                # Parse and chunk times of files are summed over worker processes
+                "parse": self.stats["parse"].report("chars"),
+                "chunk": self.stats["chunk"].report("chunks"),
+                "embed": self.stats["embed"].report("chunks"),
+                "upsert": self.stats["upsert"].report("points"),
+                "delete": self.stats["delete"].report("points"),
+                "wait_for_chunks_seconds": self.waiting,
+            },
+        }
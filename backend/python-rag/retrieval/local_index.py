@@ -0,0 +1,486 @@
+"""In-process vector index on memory-mapped matrices.
+
+Each collection is a directory holding an L2-normalized ``capacity x dim``
+matrix (float32, or int8 with a float32 scale per row) in a memory-mapped
+file, plus a SQLite table mapping point ids and payloads to rows. Search is
+exact cosine top-k: one matrix product over the rows in blocks, then
+``argpartition``. Only the k hits read their payloads from SQLite.
+
+For larger collections an IVF partitioning can be trained with
+``build_ivf``: spherical k-means centroids over a sample of the rows, after
+which a search only scans the rows of the ``nprobe`` nearest partitions.
+Exact search stays available as the recall reference for benchmarks.
+
+Filtered searches select candidate rows in SQLite first and score only
+those; ``create_payload_index`` adds an expression index on a payload field
+so that selection does not scan every payload.
+
+Several workers may share a collection: writes allocate rows inside a
+SQLite write transaction, and readers reload the row map when SQLite's
+``data_version`` shows another connection committed. IVF partitions are
+per process; rows added by other workers are assigned on reload.
+"""
+
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Sequence
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+
+import numpy as np
+
+from .filters import json_path, to_sql, validate_field
+
+logger = logging.getLogger(__name__)
+
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", "/tmp/ai-penknife/index")
+LOCAL_INDEX_DTYPE = os.getenv("LOCAL_INDEX_DTYPE", "float32")
+
+# Rows scored per matrix product, bounding the temporary score buffer
+SEARCH_BLOCK_ROWS = 65536
+INITIAL_CAPACITY = 1024
+
+
+class LocalHit(NamedTuple):
+    """Search hit with the same ``id``/``score``/``payload`` fields as a Qdrant ScoredPoint."""
+    id: Any
+    score: float
+    payload: Dict[str, Any]
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Column indices of the k largest scores, best first."""
+    k = min(k, scores.shape[0])
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k] if k < scores.shape[0] else np.arange(scores.shape[0])
+    return top[np.argsort(-scores[top], kind="stable")]
+
+
+class LocalCollection:
+    """
+    One collection of the local index.
+
+    Args:
+        path: Collection directory
+        dim: Vector dimension (only used when the collection is created)
+        dtype: "float32" or "int8" storage (only used when created)
+    """
+
+    def __init__(self, path: str, dim: Optional[int] = None, dtype: str = "float32"):
+        self.path = path
+        self._lock = threading.RLock()
+        meta_path = os.path.join(path, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+        else:
+            if dim is None:
+                raise ValueError(f"Collection at {path} does not exist")
+            if dtype not in ("float32", "int8"):
+                raise ValueError(f"Unsupported index dtype: {dtype}")
+            os.makedirs(path, exist_ok=True)
+            meta = {"dim": dim, "dtype": dtype, "capacity": INITIAL_CAPACITY}
+            with open(meta_path, "w") as f:
+                json.dump(meta, f)
+        self.dim = meta["dim"]
+        self.dtype = meta["dtype"]
+        self.capacity = meta["capacity"]
+
+        self._conn = sqlite3.connect(
+            os.path.join(path, "points.db"),
+            check_same_thread=False,
+            isolation_level=None,
+            timeout=30
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS points ("
+            "row INTEGER PRIMARY KEY, "
+            "id TEXT UNIQUE NOT NULL, "
+            "payload TEXT NOT NULL)"
+        )
+        self._open_matrix()
+
+        self.centroids: Optional[np.ndarray] = None
+        self._assignments: Optional[np.ndarray] = None
+        self._lists: Optional[List[np.ndarray]] = None
+        ivf_path = os.path.join(path, "ivf.npz")
+        if os.path.exists(ivf_path):
+            data = np.load(ivf_path)
+            self.centroids = data["centroids"]
+            self._assignments = np.full(self.capacity, -1, dtype=np.int32)
+            saved = data["assignments"][:self.capacity]
+            self._assignments[:len(saved)] = saved
+
+        self._data_version = None
+        self._refresh()
+
+    def _refresh(self) -> None:
+        """Reload the row map if another connection committed since the last look."""
+        version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if version == self._data_version:
+            return
+        self._data_version = version
+        with open(os.path.join(self.path, "meta.json")) as f:
+            capacity = json.load(f)["capacity"]
+        if capacity != self.capacity:
+            self._resize(capacity)
+        self._rows = {}
+        self._alive = np.zeros(self.capacity, dtype=bool)
+        for row, key in self._conn.execute("SELECT row, id FROM points"):
+            self._rows[key] = row
+            self._alive[row] = True
+        self.count = max(self._rows.values()) + 1 if self._rows else 0
+        if self.centroids is not None:
+            pending = np.flatnonzero(self._alive[:self.count] & (self._assignments[:self.count] < 0))
+            if len(pending):
+                self._assignments[pending] = np.argmax(self._dense(pending) @ self.centroids.T, axis=1)
+        self._lists = None
+
+    def _open_matrix(self) -> None:
+        storage = np.int8 if self.dtype == "int8" else np.float32
+        self.vectors = self._memmap("vectors.bin", storage, (self.capacity, self.dim))
+        self.scales = self._memmap("scales.bin", np.float32, (self.capacity,)) if self.dtype == "int8" else None
+
+    def _memmap(self, name: str, dtype, shape) -> np.memmap:
+        path = os.path.join(self.path, name)
+        size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        with open(path, "ab") as f:
+            if f.tell() < size:
+                f.truncate(size)
+        return np.memmap(path, dtype=dtype, mode="r+", shape=shape)
+
+    def _resize(self, capacity: int) -> None:
+        self.vectors.flush()
+        del self.vectors
+        if self.scales is not None:
+            self.scales.flush()
+            del self.scales
+        self.capacity = capacity
+        self._open_matrix()
+        self._alive = np.concatenate([self._alive, np.zeros(capacity - len(self._alive), dtype=bool)])
+        if self._assignments is not None:
+            grown = np.full(capacity, -1, dtype=np.int32)
+            grown[:len(self._assignments)] = self._assignments
+            self._assignments = grown
+
+    def _grow(self, needed: int) -> None:
+        capacity = self.capacity
+        while capacity < needed:
+            capacity *= 2
+        self._resize(capacity)
+        meta_path = os.path.join(self.path, "meta.json")
+        with open(meta_path + ".tmp", "w") as f:
+            json.dump({"dim": self.dim, "dtype": self.dtype, "capacity": capacity}, f)
+        os.replace(meta_path + ".tmp", meta_path)
+
+    def _write_rows(self, rows: np.ndarray, vectors: np.ndarray) -> None:
+        if self.scales is None:
+            self.vectors[rows] = vectors
+            return
+        peaks = np.abs(vectors).max(axis=1)
+        scales = np.where(peaks == 0, 1.0, peaks / 127.0).astype(np.float32)
+        self.vectors[rows] = np.round(vectors / scales[:, None]).astype(np.int8)
+        self.scales[rows] = scales
+
+    def _block_scores(self, queries: np.ndarray, start: int, end: int) -> np.ndarray:
+        block = self.vectors[start:end]
+        if self.scales is None:
+            return queries @ block.T
+        return (queries @ block.T.astype(np.float32)) * self.scales[start:end]
+
+    def _row_scores(self, query: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        block = self.vectors[rows]
+        if self.scales is None:
+            return block @ query
+        return (block.astype(np.float32) @ query) * self.scales[rows]
+
+    @property
+    def size(self) -> int:
+        return len(self._rows)
+
+    def upsert(self, ids: Sequence[Any], vectors, payloads: Sequence[Dict[str, Any]]) -> None:
+        """Insert or replace points; vectors are normalized for cosine similarity."""
+        vectors = _normalize(np.asarray(vectors, dtype=np.float32).reshape(len(ids), -1))
+        if vectors.shape[1] != self.dim:
+            raise ValueError(f"Expected {self.dim}-dimensional vectors, got {vectors.shape[1]}")
+        with self._lock, self._write():
+            rows = np.empty(len(ids), dtype=np.int64)
+            for i, point_id in enumerate(ids):
+                key = json.dumps(point_id)
+                row = self._rows.get(key)
+                if row is None:
+                    row = self._rows[key] = self.count
+                    self.count += 1
+                rows[i] = row
+            if self.count > self.capacity:
+                self._grow(self.count)
+            self._write_rows(rows, vectors)
+            self.vectors.flush()
+            self._alive[rows] = True
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO points (row, id, payload) VALUES (?, ?, ?)",
+                [(int(r), json.dumps(i), json.dumps(p)) for r, i, p in zip(rows, ids, payloads)]
+            )
+            if self.centroids is not None:
+                self._assignments[rows] = np.argmax(vectors @ self.centroids.T, axis=1)
+                self._lists = None
+
+    def delete(self, ids: Sequence[Any]) -> int:
+        """Remove points by id; returns how many existed."""
+        with self._lock, self._write():
+            keys = [json.dumps(i) for i in ids]
+            rows = [self._rows.pop(key) for key in keys if key in self._rows]
+            if rows:
+                self._alive[rows] = False
+                self._conn.executemany("DELETE FROM points WHERE row = ?", [(r,) for r in rows])
+                self.count = max(self._rows.values()) + 1 if self._rows else 0
+                self._lists = None
+            return len(rows)
+
+    @contextmanager
+    def _write(self) -> Iterator[None]:
+        """Write transaction that first catches up with other writers' rows."""
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._refresh()
+            yield
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            self._data_version = None
+            raise
+        self._conn.execute("COMMIT")
+
+    def _hits(self, rows: np.ndarray, scores: np.ndarray) -> List[LocalHit]:
+        if len(rows) == 0:
+            return []
+        placeholders = ",".join("?" * len(rows))
+        found = {
+            row: (json.loads(point_id), json.loads(payload))
+            for row, point_id, payload in self._conn.execute(
+                f"SELECT row, id, payload FROM points WHERE row IN ({placeholders})",
+                [int(r) for r in rows]
+            )
+        }
+        return [
+            LocalHit(found[int(r)][0], float(s), found[int(r)][1])
+            for r, s in zip(rows, scores) if int(r) in found
+        ]
+
+    def create_payload_index(self, field: str) -> None:
+        """Index a payload field for filtered search."""
+        name = "payload_" + validate_field(field).replace(".", "__")
+        with self._lock:
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON points ({json_path(field)})")
+
+    def payload_indexes(self) -> List[str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'points' AND name LIKE 'payload!_%' ESCAPE '!'"
+            ).fetchall()
+        return sorted(r[0][len("payload_"):].replace("__", ".") for r in rows)
+
+    def _filter_rows(self, filters: Dict[str, Any]) -> np.ndarray:
+        clause, params = to_sql(filters)
+        rows = self._conn.execute(f"SELECT row FROM points WHERE {clause}", params).fetchall()
+        return np.sort(np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows)))
+
+    def search(
+        self,
+        query,
+        limit: int = 10,
+        nprobe: Optional[int] = None,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[LocalHit]:
+        """
+        Top ``limit`` points by cosine similarity.
+
+        Args:
+            query: Query vector
+            limit: Number of hits
+            nprobe: Partitions to scan when an IVF partitioning exists;
+                None or 0 searches exhaustively
+            filters: Payload filter (see ``retrieval.filters``); only matching
+                points are scored
+
+        Returns:
+            Hits, best first
+        """
+        q = _normalize(np.asarray(query, dtype=np.float32).reshape(1, -1))
+        with self._lock:
+            self._refresh()
+            if filters:
+                rows = self._filter_rows(filters)
+                if nprobe and self.centroids is not None:
+                    rows = np.intersect1d(rows, self._probe(q[0], nprobe), assume_unique=True)
+                scores = np.empty(len(rows), dtype=np.float32)
+                for start in range(0, len(rows), SEARCH_BLOCK_ROWS):
+                    end = min(start + SEARCH_BLOCK_ROWS, len(rows))
+                    scores[start:end] = self._row_scores(q[0], rows[start:end])
+                top = _top_k(scores, limit)
+                return self._hits(rows[top], scores[top])
+
+            if nprobe and self.centroids is not None:
+                rows = self._probe(q[0], nprobe)
+                scores = self._row_scores(q[0], rows)
+                top = _top_k(scores, limit)
+                return self._hits(rows[top], scores[top])
+
+            count = self.count
+            scores = np.empty(count, dtype=np.float32)
+            for start in range(0, count, SEARCH_BLOCK_ROWS):
+                end = min(start + SEARCH_BLOCK_ROWS, count)
+                scores[start:end] = self._block_scores(q, start, end)[0]
+            scores[~self._alive[:count]] = -np.inf
+            top = _top_k(scores, min(limit, self.size))
+            return self._hits(top, scores[top])
+
+    def _probe(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        if self._lists is None:
+            count = self.count
+            assignments = np.where(self._alive[:count], self._assignments[:count], -1)
+            order = np.argsort(assignments, kind="stable")
+            bounds = np.searchsorted(assignments[order], np.arange(len(self.centroids) + 1))
+            self._lists = [order[bounds[c]:bounds[c + 1]] for c in range(len(self.centroids))]
+        probes = _top_k(self.centroids @ query, nprobe)
+        return np.concatenate([self._lists[c] for c in probes]) if len(probes) else np.empty(0, dtype=np.int64)
+
+    def build_ivf(self, nlist: int, iterations: int = 10, sample_size: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Train an IVF partitioning with spherical k-means and assign all rows.
+
+        Args:
+            nlist: Number of partitions
+            iterations: k-means iterations
+            sample_size: Rows used for training (default 64 per partition)
+
+        Returns:
+            Dictionary with partition size statistics
+        """
+        with self._lock:
+            self._refresh()
+            alive = np.flatnonzero(self._alive[:self.count])
+            if len(alive) < nlist:
+                raise ValueError(f"Need at least {nlist} points to build {nlist} partitions")
+            rng = np.random.default_rng(0)
+            sample = rng.choice(alive, size=min(len(alive), sample_size or 64 * nlist), replace=False)
+            sample.sort()
+            data = self._dense(sample)
+            centroids = data[rng.choice(len(data), size=nlist, replace=False)]
+            for _ in range(iterations):
+                labels = np.argmax(data @ centroids.T, axis=1)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, labels, data)
+                empty = np.bincount(labels, minlength=nlist) == 0
+                sums[empty] = data[rng.choice(len(data), size=int(empty.sum()))]
+                centroids = _normalize(sums)
+
+            assignments = np.full(self.capacity, -1, dtype=np.int32)
+            for start in range(0, self.count, SEARCH_BLOCK_ROWS):
+                end = min(start + SEARCH_BLOCK_ROWS, self.count)
+                rows = np.arange(start, end)
+                assignments[start:end] = np.argmax(self._dense(rows) @ centroids.T, axis=1)
+            self.centroids = centroids.astype(np.float32)
+            self._assignments = assignments
+            self._lists = None
+            np.savez(os.path.join(self.path, "ivf.npz"), centroids=self.centroids, assignments=assignments[:self.count])
+            sizes = np.bincount(assignments[alive], minlength=nlist)
+            return {"nlist": nlist, "points": int(len(alive)), "min_size": int(sizes.min()), "max_size": int(sizes.max())}
+
+    def _dense(self, rows: np.ndarray) -> np.ndarray:
+        block = self.vectors[rows]
+        if self.scales is None:
+            return np.asarray(block, dtype=np.float32)
+        return block.astype(np.float32) * self.scales[rows][:, None]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._refresh()
+        return {
+            "points": self.size,
+            "rows": self.count,
+            "capacity": self.capacity,
+            "dim": self.dim,
+            "dtype": self.dtype,
+            "ivf_partitions": len(self.centroids) if self.centroids is not None else 0,
+            "payload_indexes": self.payload_indexes(),
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self.vectors.flush()
+            self._conn.close()
+
+
+class LocalVectorIndex:
+    """Collections of the local index under one directory."""
+
+    def __init__(self, root: str, dtype: str = "float32"):
+        self.root = root
+        self.dtype = dtype
+        self._collections: Dict[str, LocalCollection] = {}
+        self._lock = threading.Lock()
+
+    def _path(self, name: str) -> str:
+        if not name or "/" in name or name.startswith("."):
+            raise ValueError(f"Invalid collection name: {name!r}")
+        return os.path.join(self.root, name)
+
+    def get(self, name: str, dim: Optional[int] = None) -> Optional[LocalCollection]:
+        """Open a collection; creates it when ``dim`` is given, otherwise None if missing."""
+        with self._lock:
+            collection = self._collections.get(name)
+            if collection is None:
+                path = self._path(name)
+                if dim is None and not os.path.exists(os.path.join(path, "meta.json")):
+                    return None
+                collection = self._collections[name] = LocalCollection(path, dim, self.dtype)
+            return collection
+
+    def upsert(self, name: str, ids: Sequence[Any], vectors, payloads: Sequence[Dict[str, Any]]) -> None:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        self.get(name, dim=vectors.shape[-1]).upsert(ids, vectors, payloads)
+
+    def search(
+        self,
+        name: str,
+        query,
+        limit: int = 10,
+        nprobe: Optional[int] = None,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[LocalHit]:
+        collection = self.get(name)
+        if collection is None:
+            raise KeyError(f"Collection {name} not found in local index")
+        return collection.search(query, limit, nprobe, filters)
+
+    def drop(self, name: str) -> None:
+        with self._lock:
+            collection = self._collections.pop(name, None)
+            if collection is not None:
+                collection.close()
+            shutil.rmtree(self._path(name), ignore_errors=True)
+
+    def collections(self) -> Dict[str, Dict[str, Any]]:
+        names = sorted(os.listdir(self.root)) if os.path.isdir(self.root) else []
+        return {name: self.get(name).stats() for name in names if self.get(name) is not None}
+
+
+_index: Optional[LocalVectorIndex] = None
+
+
+def get_local_index() -> LocalVectorIndex:
+    """Get the process-wide index at ``LOCAL_INDEX_DIR``, creating it on first use."""
+    global _index
+    if _index is None:
+        _index = LocalVectorIndex(LOCAL_INDEX_DIR, LOCAL_INDEX_DTYPE)
+    return _index
@@ -0,0 +1,161 @@
+"""Ingestion manifest: what is already in each collection.
+
+For every ingested document (a file path or a caller-supplied document id)
+the manifest records a content hash and the ids of the chunks stored for
+it. Re-ingestion compares against it to skip unchanged documents, embed
+only chunks whose ids are new, and delete the points of chunks that
+disappeared. Files additionally record size and mtime, so an untouched
+file is skipped without reading it.
+
+The manifest is a SQLite database (WAL mode), shared by all workers like
+the configuration store.
+"""
+
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+INGEST_MANIFEST_PATH = os.getenv("INGEST_MANIFEST_PATH", "/tmp/ai-penknife/manifest.db")
+
+_HASH_BLOCK = 1024 * 1024
+
+
+class ManifestEntry(NamedTuple):
+    source: str
+    content_hash: str
+    chunk_ids: List[str]
+    size: Optional[int] = None
+    mtime_ns: Optional[int] = None
+
+
+def file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(_HASH_BLOCK), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class IngestManifest:
+    """Per-collection record of ingested documents and their chunk ids."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            "collection TEXT NOT NULL, "
+            "source TEXT NOT NULL, "
+            "content_hash TEXT NOT NULL, "
+            "size INTEGER, "
+            "mtime_ns INTEGER, "
+            "chunk_ids TEXT NOT NULL, "
+            "updated_at REAL NOT NULL, "
+            "PRIMARY KEY (collection, source))"
+        )
+
+    def get(self, collection: str, source: str) -> Optional[ManifestEntry]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT source, content_hash, chunk_ids, size, mtime_ns FROM documents "
+                "WHERE collection = ? AND source = ?",
+                (collection, source)
+            ).fetchone()
+        if row is None:
+            return None
+        return ManifestEntry(row[0], row[1], json.loads(row[2]), row[3], row[4])
+
+    def put(self, collection: str, entries: Iterable[ManifestEntry]) -> None:
+        """Record documents as ingested, replacing earlier entries."""
+        now = time.time()
+        rows = [
+            (collection, e.source, e.content_hash, e.size, e.mtime_ns, json.dumps(sorted(e.chunk_ids)), now)
+            for e in entries
+        ]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO documents "
+                    "(collection, source, content_hash, size, mtime_ns, chunk_ids, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def sources(self, collection: str, prefix: str = "") -> List[str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT source FROM documents WHERE collection = ? AND substr(source, 1, ?) = ?",
+                (collection, len(prefix), prefix)
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    def remove(self, collection: str, sources: Sequence[str]) -> List[str]:
+        """Forget documents; returns the chunk ids that were stored for them."""
+        chunk_ids: List[str] = []
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for source in sources:
+                    row = self._conn.execute(
+                        "SELECT chunk_ids FROM documents WHERE collection = ? AND source = ?",
+                        (collection, source)
+                    ).fetchone()
+                    if row is None:
+                        continue
+                    chunk_ids.extend(json.loads(row[0]))
+                    self._conn.execute(
+                        "DELETE FROM documents WHERE collection = ? AND source = ?", (collection, source)
+                    )
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+        return chunk_ids
+
+    def summary(self, collection: str) -> Dict[str, object]:
+        with self._lock:
+            documents, chunks, updated_at = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(json_array_length(chunk_ids)), 0), MAX(updated_at) "
+                "FROM documents WHERE collection = ?",
+                (collection,)
+            ).fetchone()
+        return {"collection": collection, "documents": documents, "chunks": chunks, "updated_at": updated_at}
+
+    def drop(self, collection: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM documents WHERE collection = ?", (collection,))
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_manifest: Optional[IngestManifest] = None
+
+
+def get_manifest() -> IngestManifest:
+    """Get the process-wide manifest at ``INGEST_MANIFEST_PATH``, creating it on first use."""
+    global _manifest
+    if _manifest is None:
+        _manifest = IngestManifest(INGEST_MANIFEST_PATH)
+    return _manifest
@@ -0,0 +1,10 @@
+"""Sandboxed execution of user-supplied custom test code."""
+
+from .pool import SandboxPool, SandboxLimits, get_sandbox_pool, shutdown_sandbox_pool
+
+__all__ = [
+    "SandboxPool",
+    "SandboxLimits",
+    "get_sandbox_pool",
+    "shutdown_sandbox_pool",
+]
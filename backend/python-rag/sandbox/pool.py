@@ -0,0 +1,232 @@
+"""Pool of pre-started sandbox workers for custom test execution."""
+
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+import asyncio
+import concurrent.futures
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+
+from .worker import worker_main
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PRELOAD = ["json", "math", "statistics", "requests"]
+
+
+@dataclass(frozen=True)
+class SandboxLimits:
+    """Per-execution resource limits."""
+
+    cpu_seconds: int = 10
+    memory_mb: int = 512
+    wall_timeout: float = 30.0
+    file_size_mb: int = 10
+    max_output_bytes: int = 1_000_000
+
+    @classmethod
+    def from_env(cls) -> "SandboxLimits":
+        return cls(
+            cpu_seconds=int(os.getenv("SANDBOX_CPU_SECONDS", cls.cpu_seconds)),
+            memory_mb=int(os.getenv("SANDBOX_MEMORY_MB", cls.memory_mb)),
+            wall_timeout=float(os.getenv("SANDBOX_TIMEOUT_SECONDS", cls.wall_timeout)),
+            file_size_mb=int(os.getenv("SANDBOX_FILE_SIZE_MB", cls.file_size_mb)),
+            max_output_bytes=int(os.getenv("SANDBOX_MAX_OUTPUT_BYTES", cls.max_output_bytes)),
+        )
+
+
+def _endpoint(url: str) -> Tuple[str, int]:
+    parsed = urlparse(url)
+    port = parsed.port or (443 if parsed.scheme == "https" else 80)
+    return parsed.hostname or "localhost", port
+
+
+class _Worker:
+    """Handle on one worker process and its pipe."""
+
+    def __init__(self, ctx, endpoints: List[Tuple[str, int]], preload: List[str]):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=worker_main,
+            args=(child_conn, endpoints, preload),
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+
+    def alive(self) -> bool:
+        return self.process.is_alive()
+
+    def stop(self) -> None:
+        try:
+            self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(timeout=2)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join(timeout=2)
+        self.conn.close()
+
+
+class SandboxPool:
+    """
+    Fixed-size pool of warm worker processes.
+
+    Workers are spawned once with a clean interpreter and preloaded modules.
+    Each job runs in a child forked from a worker, so per-test startup cost is
+    a fork rather than a new interpreter, and a misbehaving test never
+    affects the worker that ran it.
+    """
+
+    def __init__(
+        self,
+        size: int = 4,
+        limits: Optional[SandboxLimits] = None,
+        allowed_urls: Optional[List[str]] = None,
+        preload: Optional[List[str]] = None,
+    ):
+        self.size = max(1, size)
+        self.limits = limits or SandboxLimits()
+        self.endpoints = [_endpoint(url) for url in (allowed_urls or [])]
+        self.preload = preload if preload is not None else DEFAULT_PRELOAD
+        self._ctx = multiprocessing.get_context("spawn")
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        self._workers: List[_Worker] = []
+        self._executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """Spawn the worker processes."""
+        with self._lock:
+            if self._executor is not None:
+                return
+            for _ in range(self.size):
+                worker = _Worker(self._ctx, self.endpoints, self.preload)
+                self._workers.append(worker)
+                self._idle.put(worker)
+            self._executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.size,
+                thread_name_prefix="sandbox",
+            )
+        logger.info(f"Sandbox pool started with {self.size} workers")
+
+    def close(self) -> None:
+        """Stop all workers."""
+        with self._lock:
+            if self._executor is None:
+                return
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            for worker in self._workers:
+                worker.stop()
+            self._workers = []
+            self._idle = queue.Queue()
+
+    def _replace(self, worker: _Worker) -> _Worker:
+        with self._lock:
+            worker.stop()
+            replacement = _Worker(self._ctx, self.endpoints, self.preload)
+            self._workers = [w for w in self._workers if w is not worker] + [replacement]
+        return replacement
+
+    def _execute(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        worker = self._idle.get()
+        try:
+            if not worker.alive():
+                worker = self._replace(worker)
+            worker.conn.send(job)
+            # The worker enforces the wall-clock limit itself; the extra
+            # grace only guards against a wedged worker.
+            if worker.conn.poll(self.limits.wall_timeout + 5):
+                return worker.conn.recv()
+            worker = self._replace(worker)
+            return {"status": "error", "error": "Sandbox worker did not respond"}
+        except (EOFError, OSError) as e:
+            worker = self._replace(worker)
+            return {"status": "error", "error": f"Sandbox worker failed: {e}"}
+        finally:
+            self._idle.put(worker)
+
+    async def run(self, code: str, globals_: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Run test code once in the sandbox.
+
+        Args:
+            code: Python source to execute
+            globals_: JSON-serializable names made available to the code
+
+        Returns:
+            Dictionary with status, results (or error), stdout and duration
+        """
+        self.start()
+        job = {"code": code, "globals": globals_, "limits": asdict(self.limits)}
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._execute, job)
+
+    async def run_for_models(
+        self,
+        code: str,
+        models: List[str],
+        config: Dict[str, Any],
+        api_url: str,
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Run test code once per model, in parallel.
+
+        Each execution sees ``MODEL`` set to its model and ``MODELS`` set to
+        ``[MODEL]``, so code written to loop over ``MODELS`` still works.
+        Repeated model names run once.
+
+        Returns:
+            Dictionary mapping model name to its execution outcome
+        """
+        models = list(dict.fromkeys(models))
+        start = time.perf_counter()
+        outcomes = await asyncio.gather(*[
+            self.run(code, {
+                "API_URL": api_url,
+                "MODEL": model,
+                "MODELS": [model],
+                "CONFIG": config,
+            })
+            for model in models
+        ])
+        logger.debug(f"Custom test ran on {len(models)} models in {time.perf_counter() - start:.3f}s")
+        return dict(zip(models, outcomes))
+
+
+_pool: Optional[SandboxPool] = None
+
+
+def get_sandbox_pool() -> SandboxPool:
+    """Get the process-wide sandbox pool, configured from the environment."""
+    global _pool
+    if _pool is None:
+        api_url = os.getenv("API_URL", "http://localhost:8000")
+        allowed = [api_url] + [
+            url.strip()
+            for url in os.getenv("SANDBOX_ALLOWED_URLS", "").split(",")
+            if url.strip()
+        ]
+        preload = os.getenv("SANDBOX_PRELOAD")
+        _pool = SandboxPool(
+            size=int(os.getenv("SANDBOX_WORKERS", min(4, os.cpu_count() or 1))),
+            limits=SandboxLimits.from_env(),
+            allowed_urls=allowed,
+            preload=preload.split(",") if preload else None,
+        )
+    return _pool
+
+
+def shutdown_sandbox_pool() -> None:
+    """Stop the process-wide sandbox pool if it was started."""
+    global _pool
+    if _pool is not None:
+        _pool.close()
+        _pool = None
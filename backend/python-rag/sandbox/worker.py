@@ -0,0 +1,362 @@
+"""Warm sandbox worker process.
+
+Each worker is started once by ``SandboxPool`` and pre-imports the modules
+custom tests usually need. For every job it forks a short-lived child from
+its already-warm interpreter, isolates the child, executes the test code and
+reports the ``results`` variable back as JSON. The worker itself never runs
+user code, so it stays clean and can be reused for the next job.
+
+Isolation is enforced by the kernel where the audit hook cannot reach:
+
+* When the worker runs as root, the child drops to ``SANDBOX_UID`` /
+  ``SANDBOX_GID`` (``nobody`` by default), so it cannot write the
+  application's files, read other processes' environments or regain
+  privileges. Deployments can firewall that uid (e.g. an iptables ``owner``
+  match) to enforce the network allowlist below the audit hook as well.
+* ``RLIMIT_NPROC`` is set to 0, so any fork, clone or exec path fails,
+  including raw ``_posixsubprocess.fork_exec`` or native code.
+* The child runs in a private scratch directory with a minimal environment,
+  so secrets in the backend's environment are not visible.
+
+The audit hook adds readable errors on top: it blocks process creation,
+native-code modules (``_posixsubprocess``, ``_posixshmem``, ``_ctypes``),
+writes outside the scratch directory, and connections or name lookups
+outside the allowed endpoints.
+"""
+
+from typing import Any, Dict, List, Tuple
+import importlib
+import io
+import json
+import logging
+import os
+import select
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import time
+import traceback
+
+logger = logging.getLogger(__name__)
+
+# Audit events that would let test code escape the sandbox (new processes
+# are not covered by the audit hook, native code bypasses it entirely).
+BLOCKED_EVENTS = {
+    "os.system",
+    "os.exec",
+    "os.fork",
+    "os.forkpty",
+    "os.posix_spawn",
+    "os.spawn",
+    "os.kill",
+    "os.killpg",
+    "subprocess.Popen",
+    "pty.spawn",
+    "ctypes.dlopen",
+    "ctypes.dlsym",
+}
+
+# Native modules that start processes or run arbitrary code without audit events
+BLOCKED_MODULES = {"_posixsubprocess", "_posixshmem", "_ctypes", "ctypes"}
+
+# Modules that hold references to the blocked ones; dropped from sys.modules in
+# the child so test code has to re-import them (and hits the import guard)
+_PURGED_PREFIXES = ("subprocess", "multiprocessing", "_multiprocessing", "concurrent.futures.process")
+
+# Audit events that modify the filesystem, with the positions of their path arguments
+_WRITE_EVENTS = {
+    "os.remove": (0,),
+    "os.rename": (0, 1),
+    "os.mkdir": (0,),
+    "os.rmdir": (0,),
+    "os.chmod": (0,),
+    "os.chown": (0,),
+    "os.symlink": (0, 1),
+    "os.link": (0, 1),
+    "os.truncate": (0,),
+    "os.utime": (0,),
+    "shutil.rmtree": (0,),
+}
+_WRITE_FLAGS = os.O_WRONLY | os.O_RDWR | os.O_CREAT | os.O_APPEND | os.O_TRUNC
+
+# Unprivileged identity of test code when the worker runs as root (nobody/nogroup)
+SANDBOX_UID = int(os.getenv("SANDBOX_UID", "65534"))
+SANDBOX_GID = int(os.getenv("SANDBOX_GID", "65534"))
+
+MAX_STDOUT_CHARS = 20_000
+
+
+def resolve_allowed_endpoints(endpoints: List[Tuple[str, int]]) -> Dict[str, Any]:
+    """
+    Resolve the allowed (host, port) pairs to every address they map to.
+
+    Args:
+        endpoints: Host/port pairs test code may connect to
+
+    Returns:
+        Dictionary with allowed hostnames and (address, port) pairs
+    """
+    hosts = set()
+    addresses = set()
+    for host, port in endpoints:
+        hosts.add(host)
+        addresses.add((host, port))
+        try:
+            for info in socket.getaddrinfo(host, port, proto=socket.IPPROTO_TCP):
+                ip = info[4][0]
+                hosts.add(ip)
+                addresses.add((ip, port))
+        except OSError as e:
+            logger.warning(f"Could not resolve sandbox endpoint {host}:{port}: {e}")
+    return {"hosts": hosts, "addresses": addresses}
+
+
+def _install_guard(allowed: Dict[str, Any], scratch: str) -> None:
+    """Install an audit hook restricting sockets, process creation, native modules and writes."""
+    hosts = frozenset(allowed["hosts"])
+    addresses = frozenset(allowed["addresses"])
+    scratch = os.path.realpath(scratch)
+
+    def _address_allowed(address: Any) -> bool:
+        if isinstance(address, tuple) and len(address) >= 2:
+            return (address[0], address[1]) in addresses
+        return False
+
+    def _check_write(path: Any) -> None:
+        # File descriptors were opened under the same rules
+        if isinstance(path, int) or path is None:
+            return
+        resolved = os.path.realpath(os.fsdecode(path))
+        if resolved != scratch and not resolved.startswith(scratch + os.sep):
+            raise PermissionError(f"Writing {resolved!r} is not allowed; use the working directory")
+
+    def hook(event: str, args: tuple) -> None:
+        if event in BLOCKED_EVENTS:
+            raise PermissionError(f"'{event}' is not allowed in custom tests")
+        if event == "import":
+            if args[0] in BLOCKED_MODULES:
+                raise PermissionError(f"Importing '{args[0]}' is not allowed in custom tests")
+        elif event == "open":
+            mode, flags = args[1], args[2]
+            if (isinstance(mode, str) and any(c in mode for c in "wax+")) or flags & _WRITE_FLAGS:
+                _check_write(args[0])
+        elif event in _WRITE_EVENTS:
+            for index in _WRITE_EVENTS[event]:
+                _check_write(args[index])
+        elif event == "socket.connect":
+            if not _address_allowed(args[1]):
+                raise PermissionError(f"Network access to {args[1]!r} is not allowed")
+        elif event in ("socket.sendto", "socket.sendmsg"):
+            if not _address_allowed(args[1]):
+                raise PermissionError(f"Network access to {args[1]!r} is not allowed")
+        elif event == "socket.getaddrinfo":
+            host = args[0].decode() if isinstance(args[0], bytes) else args[0]
+            if host not in hosts:
+                raise PermissionError(f"Name resolution for {host!r} is not allowed")
+        elif event in ("socket.gethostbyname", "socket.gethostbyname_ex"):
+            if args[0] not in hosts:
+                raise PermissionError(f"Name resolution for {args[0]!r} is not allowed")
+
+    sys.addaudithook(hook)
+
+
+def _apply_limits(limits: Dict[str, Any]) -> None:
+    """Apply CPU, memory and file size rlimits to the current process."""
+    import resource
+
+    cpu = int(limits["cpu_seconds"])
+    resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu + 1))
+    memory = int(limits["memory_mb"]) * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+    file_size = int(limits["file_size_mb"]) * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_FSIZE, (file_size, file_size))
+    resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+
+
+def _isolate(scratch: str) -> None:
+    """
+    Confine the child at the OS level: unprivileged uid, no new processes,
+    private working directory and a minimal environment.
+    """
+    import resource
+
+    if os.geteuid() == 0:
+        os.chown(scratch, SANDBOX_UID, SANDBOX_GID)
+        os.setgroups([])
+        os.setgid(SANDBOX_GID)
+        os.setuid(SANDBOX_UID)
+    # Not enforced for root; with the uid dropped, every fork/clone fails with EAGAIN
+    resource.setrlimit(resource.RLIMIT_NPROC, (0, 0))
+    os.chdir(scratch)
+    path = os.environ.get("PATH", os.defpath)
+    os.environ.clear()
+    os.environ.update({"PATH": path, "HOME": scratch, "TMPDIR": scratch, "LANG": "C.UTF-8"})
+    tempfile.tempdir = scratch
+    sys.dont_write_bytecode = True
+    for name in list(sys.modules):
+        if name in BLOCKED_MODULES or name.startswith(_PURGED_PREFIXES):
+            del sys.modules[name]
+
+
+def _run_child(job: Dict[str, Any], allowed: Dict[str, Any], scratch: str, write_fd: int) -> None:
+    """Execute the test code inside the forked child and write the outcome."""
+    stdout = io.StringIO()
+    start = time.perf_counter()
+    try:
+        os.setsid()
+        _apply_limits(job["limits"])
+        _isolate(scratch)
+        _install_guard(allowed, scratch)
+        sys.stdout = sys.stderr = stdout
+
+        namespace = {"__name__": "__custom_test__"}
+        namespace.update(job["globals"])
+        exec(compile(job["code"], "<custom_test>", "exec"), namespace)
+
+        if "results" in namespace:
+            payload = {"status": "completed", "results": namespace["results"]}
+        else:
+            payload = {
+                "status": "error",
+                "error": "Test code must define a 'results' variable",
+            }
+    except BaseException as e:
+        payload = {
+            "status": "error",
+            "error": f"{type(e).__name__}: {e}",
+            "traceback": traceback.format_exc(limit=5),
+        }
+
+    payload["stdout"] = stdout.getvalue()[-MAX_STDOUT_CHARS:]
+    payload["duration"] = time.perf_counter() - start
+    try:
+        data = json.dumps(payload, default=str).encode()
+    except BaseException as e:
+        data = json.dumps({
+            "status": "error",
+            "error": f"Could not serialize results: {e}",
+            "duration": payload["duration"],
+        }).encode()
+
+    view = memoryview(data)
+    while view:
+        written = os.write(write_fd, view)
+        view = view[written:]
+    os._exit(0)
+
+
+def _describe_exit(status: int) -> str:
+    """Translate a waitpid status of a child that sent no result."""
+    if os.WIFSIGNALED(status):
+        sig = os.WTERMSIG(status)
+        if sig == signal.SIGXCPU:
+            return "CPU time limit exceeded"
+        if sig == signal.SIGKILL:
+            return "Killed (CPU or memory limit exceeded)"
+        return f"Terminated by signal {sig}"
+    return f"Exited with status {os.WEXITSTATUS(status)} without results"
+
+
+def run_job(job: Dict[str, Any], allowed: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Fork a child from this warm interpreter and run one job in it.
+
+    Args:
+        job: Job with ``code``, ``globals`` and ``limits``
+        allowed: Resolved network endpoints from ``resolve_allowed_endpoints``
+
+    Returns:
+        Dictionary with status, results (or error), stdout and duration
+    """
+    limits = job["limits"]
+    start = time.perf_counter()
+    scratch = tempfile.mkdtemp(prefix="sandbox-")
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        _run_child(job, allowed, scratch, write_fd)
+
+    os.close(write_fd)
+    deadline = start + float(limits["wall_timeout"])
+    max_bytes = int(limits["max_output_bytes"])
+    chunks = []
+    received = 0
+    error = None
+    try:
+        while True:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                error = f"Wall-clock timeout after {limits['wall_timeout']}s"
+                break
+            ready, _, _ = select.select([read_fd], [], [], remaining)
+            if not ready:
+                continue
+            chunk = os.read(read_fd, 65536)
+            if not chunk:
+                break
+            received += len(chunk)
+            if received > max_bytes:
+                error = f"Results exceed {max_bytes} bytes"
+                break
+            chunks.append(chunk)
+    finally:
+        os.close(read_fd)
+
+    if error:
+        try:
+            os.killpg(pid, signal.SIGKILL)
+        except OSError:
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except OSError:
+                pass
+    _, status = os.waitpid(pid, 0)
+    shutil.rmtree(scratch, ignore_errors=True)
+
+    if error is None and chunks:
+        try:
+            return json.loads(b"".join(chunks))
+        except ValueError as e:
+            error = f"Invalid result payload: {e}"
+    if error is None:
+        error = _describe_exit(status)
+
+    return {
+        "status": "error",
+        "error": error,
+        "duration": time.perf_counter() - start,
+    }
+
+
+def worker_main(conn, endpoints: List[Tuple[str, int]], preload: List[str]) -> None:
+    """
+    Entry point of a pooled worker process.
+
+    Args:
+        conn: Pipe connection to the pool
+        endpoints: Host/port pairs test code may connect to
+        preload: Modules to import once so forked children start warm
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    for module in preload:
+        try:
+            importlib.import_module(module)
+        except Exception as e:
+            logger.warning(f"Sandbox worker could not preload {module}: {e}")
+    allowed = resolve_allowed_endpoints(endpoints)
+
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, OSError):
+            break
+        if job is None:
+            break
+        try:
+            result = run_job(job, allowed)
+        except Exception as e:
+            result = {"status": "error", "error": f"Sandbox failure: {e}"}
+        conn.send(result)
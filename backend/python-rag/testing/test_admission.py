@@ -0,0 +1,97 @@
+"""Test admission control: limits, queueing and shedding."""
+
+import asyncio
+import time
+
+import pytest
+
+from core.admission import AdmissionController, Overloaded
+
+def test_queue_is_fifo_and_bounded():
+    """Test that waiters get slots in order and a full queue rejects with a retry hint."""
+    async def scenario():
+        depths = []
+        controller = AdmissionController(runner_limit=1, queue_size=2, max_wait=5,
+                                         on_queue_change=lambda runner, priority, n: depths.append(n))
+        order = []
+
+        async def generate(name):
+            async with controller.slot("runner", "m") as queued:
+                order.append((name, queued > 0))
+                await asyncio.sleep(0.02)
+
+        tasks = [asyncio.create_task(generate(i)) for i in range(3)]
+        await asyncio.sleep(0.005)
+        with pytest.raises(Overloaded) as rejected:
+            await controller.acquire("runner", "m")
+        await asyncio.gather(*tasks)
+        return order, depths, rejected.value, controller.stats()
+
+    order, depths, rejected, stats = asyncio.run(scenario())
+    assert order == [(0, False), (1, True), (2, True)]
+    assert max(depths) == 2 and depths[-1] == 0
+    assert rejected.reason == "queue_full" and rejected.retry_after >= 1
+    assert stats["runners"]["runner"]["active"] == 0 and stats["rejected"] == {"queue_full": 1}
+
+def test_model_limit_does_not_block_other_models():
+    """Test that a waiter held back by its model's limit lets other models through."""
+    async def scenario():
+        controller = AdmissionController(runner_limit=3, model_limit=1, max_wait=5)
+        await controller.acquire("runner", "a")
+        blocked = asyncio.create_task(controller.acquire("runner", "a"))
+        await asyncio.sleep(0)
+        queued = await asyncio.wait_for(controller.acquire("runner", "b"), timeout=1)
+        assert not blocked.done()
+        controller.release("runner", "a")
+        await asyncio.wait_for(blocked, timeout=1)
+        return queued
+
+    assert asyncio.run(scenario()) == 0.0
+
+def test_deadline_and_timeout_shedding():
+    """Test rejecting requests that cannot start before their deadline."""
+    async def scenario():
+        controller = AdmissionController(runner_limit=1, max_wait=0.05)
+        await controller.acquire("runner", "m")
+        controller.release("runner", "m", held_seconds=10.0)
+        await controller.acquire("runner", "m")
+
+        with pytest.raises(Overloaded) as expected_too_long:
+            await controller.acquire("runner", "m", deadline=time.monotonic() + 1)
+        with pytest.raises(Overloaded) as waited_too_long:
+            await controller.acquire("runner", "m")
+        return expected_too_long.value, waited_too_long.value, controller.stats()
+
+    deadline, timeout, stats = asyncio.run(scenario())
+    assert deadline.reason == "deadline" and deadline.retry_after == 10.0
+    assert timeout.reason == "timeout"
+    assert stats["runners"]["runner"]["queued"] == 0
+
+def test_interactive_first_with_reserved_slots_and_aging():
+    """Test that batch work leaves reserved slots free, yields to interactive, and ages."""
+    async def scenario():
+        controller = AdmissionController(runner_limit=2, reserved=1, aging=0.05, max_wait=5)
+        await controller.acquire("runner", "m", priority="batch")
+        # The second slot is reserved: batch waits, interactive does not
+        batch = asyncio.create_task(controller.acquire("runner", "m", priority="batch"))
+        await asyncio.sleep(0)
+        assert await controller.acquire("runner", "m", priority="interactive") == 0.0
+        assert not batch.done()
+
+        # With both slots busy, a later interactive request is served before the waiting batch one
+        interactive = asyncio.create_task(controller.acquire("runner", "m"))
+        await asyncio.sleep(0)
+        controller.release("runner", "m", priority="batch")
+        await asyncio.wait_for(interactive, timeout=1)
+        assert not batch.done()
+
+        # Once aged, the batch request may take the reserved slot
+        await asyncio.sleep(0.06)
+        controller.release("runner", "m", priority="interactive")
+        await asyncio.wait_for(batch, timeout=1)
+        return controller.stats()
+
+    stats = asyncio.run(scenario())
+    classes = stats["runners"]["runner"]["classes"]
+    assert classes["batch"]["limit"] == 1 and classes["interactive"]["limit"] == 2
+    assert stats["promoted"] == 1
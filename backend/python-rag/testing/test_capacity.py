@@ -0,0 +1,100 @@
+"""Test capacity sweeps: knee detection, a sweep against a fake runner, and storage."""
+
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+
+from evaluation.capacity import CapacityStore, CapacitySweep, analyze_curve, find_knee
+
+def _point(concurrency, throughput, ttft):
+    return {"concurrency": concurrency, "throughput_tokens_per_second": throughput, "ttft_p99": ttft}
+
+def test_knee_of_saturating_curve():
+    """Test that the knee sits where throughput stops growing with concurrency."""
+    levels = [1, 2, 4, 8, 16, 32]
+    throughput = [100, 200, 380, 420, 430, 432]
+    assert find_knee(levels, throughput) == 4
+    assert find_knee(levels, [100] * 6) is None
+    assert find_knee([1, 2], [100, 200]) is None
+
+    analysis = analyze_curve([_point(c, t, 0.2 * c) for c, t in zip(levels, throughput)])
+    assert analysis["saturation_concurrency"] == 8
+    assert analysis["ttft_blowup_concurrency"] == 4
+    assert analysis["recommended_concurrency"] == 2
+
+class FakeResponse:
+    status_code = 200
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+
+    def iter_lines(self):
+        time.sleep(0.002)
+        for _ in range(self.tokens):
+            yield b"data: " + json.dumps({"choices": [{"delta": {"content": "x"}}]}).encode()
+        yield b"data: " + json.dumps({"choices": [], "usage": {"completion_tokens": self.tokens}}).encode()
+        yield b"data: [DONE]"
+
+class FakeSession:
+    def post(self, url, json, timeout, stream):
+        return FakeResponse(json["max_tokens"])
+
+def test_sweep_records_curves(tmp_path):
+    """Test a sweep against a fake runner and storing and comparing it."""
+    sweep = CapacitySweep(
+        "http://runner/v1/chat/completions", "m", concurrency_levels=[1, 2, 4],
+        prompt_tokens=[32], max_tokens=[8, 16], level_seconds=0.05, session_factory=FakeSession
+    )
+    curves = sweep.run()
+    assert [(c["prompt_tokens"], c["max_tokens"]) for c in curves] == [(32, 8), (32, 16)]
+    assert sweep.progress["levels_done"] == sweep.progress["levels_total"] == 6
+    point = curves[0]["points"][0]
+    assert point["errors"] == 0 and point["requests"] >= 1
+    assert point["throughput_tokens_per_second"] > 0 and point["tpot_p50"] is not None
+
+    store = CapacityStore(str(tmp_path / "capacity.db"))
+    sweep_id = store.create("m", "v1", {"level_seconds": 0.05})
+    store.finish(sweep_id, curves=curves)
+    assert store.get(sweep_id)["curves"] == curves
+    assert store.list(model="m")[0]["curves"][0].get("points") is None
+
+    comparison = store.compare([sweep_id, "missing"])
+    assert set(comparison["shapes"]) == {"p32_m8", "p32_m16"}
+    assert comparison["missing"] == ["missing"]
+
+def test_one_sweep_at_a_time_off_the_default_executor(tmp_path, monkeypatch):
+    """Test that a second sweep is refused with 409 and sweeps run on their own thread."""
+    main = pytest.importorskip("main")
+    from fastapi import HTTPException
+
+    release = threading.Event()
+    threads = []
+
+    def run(self):
+        threads.append(threading.current_thread().name)
+        release.wait(5)
+        return []
+
+    monkeypatch.setattr(CapacitySweep, "run", run)
+    monkeypatch.setattr(main, "get_capacity_store", lambda: CapacityStore(str(tmp_path / "capacity.db")))
+    request = main.CapacitySweepRequest(model="m", concurrency_levels=[1, 2], prompt_tokens=[32], max_tokens=[8])
+
+    async def scenario():
+        first = await main.start_capacity_sweep(request)
+        with pytest.raises(HTTPException) as refused:
+            await main.start_capacity_sweep(request)
+        release.set()
+        while main.capacity_sweeps:
+            await asyncio.sleep(0.01)
+        second = await main.start_capacity_sweep(request)
+        while main.capacity_sweeps:
+            await asyncio.sleep(0.01)
+        return first, refused.value, second
+
+    first, refused, second = asyncio.run(scenario())
+    assert refused.status_code == 409 and first["id"] in refused.detail
+    assert second["id"] != first["id"]
+    assert threads and all(name.startswith("capacity-sweep") for name in threads)
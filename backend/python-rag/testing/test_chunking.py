@@ -0,0 +1,56 @@
+"""Test document work-unit planning and token-window chunking."""
+
+import pytest
+
+from retrieval.chunking import (
+    WorkUnit, chunk_unit, html_to_text, plan_units, read_text_segment, token_windows
+)
+
+def _write_lines(tmp_path, n=2000):
+    path = tmp_path / "doc.txt"
+    path.write_text("".join(f"line {i} of the test document.\n" for i in range(n)))
+    return str(path)
+
+def test_text_segments_cover_file_once(tmp_path):
+    """Test that byte-range units cut at line starts and reassemble the file exactly."""
+    path = _write_lines(tmp_path)
+    units = plan_units(path, segment_bytes=1000)
+    assert len(units) > 10
+    text = "".join(read_text_segment(path, u.start, u.end) for u in units)
+    with open(path) as f:
+        assert text == f.read()
+    assert all(read_text_segment(path, u.start, u.end).startswith("line ") for u in units)
+
+def test_token_windows_overlap():
+    """Test that consecutive windows share `overlap` tokens and the last reaches the end."""
+    text = " ".join(f"w{i}" for i in range(100))
+    windows = list(token_windows(text, chunk_tokens=30, overlap=10))
+    assert [w[2] for w in windows] == [30, 30, 30, 30, 20]
+    second = text[windows[1][0]:windows[1][1]].split()
+    assert second[0] == "w20" and second[-1] == "w49"
+    assert windows[-1][1] == len(text)
+
+@pytest.mark.parametrize("chunk_tokens, overlap", [(0, -1), (10, -1), (10, 10), (0, 0)])
+def test_token_windows_reject_invalid_sizes(chunk_tokens, overlap):
+    """Test that windows which would skip tokens or end before they start are refused."""
+    with pytest.raises(ValueError):
+        list(token_windows("a b c d e", chunk_tokens, overlap))
+
+def test_chunk_ids_depend_on_content(tmp_path):
+    """Test that unchanged chunks keep their ids when a document is edited."""
+    path = _write_lines(tmp_path, 200)
+    unit = WorkUnit(path, "text", 0, len(open(path).read()))
+    before = chunk_unit(unit, chunk_tokens=64, overlap=0)["chunks"]
+
+    with open(path, "a") as f:
+        f.write("an appended line.\n")
+    unit = unit._replace(end=unit.end + len("an appended line.\n"))
+    after = chunk_unit(unit, chunk_tokens=64, overlap=0)["chunks"]
+
+    assert [c["id"] for c in before[:-1]] == [c["id"] for c in after[:len(before) - 1]]
+    assert before[-1]["id"] != after[len(before) - 1]["id"]
+
+def test_html_to_text_skips_scripts():
+    """Test that HTML extraction keeps body text and drops scripts and styles."""
+    html = "<html><head><style>p{}</style></head><body><script>x()</script><p>Fish &amp; chips</p><p>Peas</p></body></html>"
+    assert html_to_text(html) == "Fish & chips\n\nPeas"
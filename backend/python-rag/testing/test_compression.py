@@ -0,0 +1,56 @@
+"""Test Accept-Encoding negotiation and the compression middleware."""
+
+import asyncio
+import gzip
+
+from core.compression import CompressionMiddleware, negotiate_encoding
+
+def _app(chunks, content_type=b"application/json"):
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", content_type), (b"content-length", b"0")]})
+        for i, chunk in enumerate(chunks):
+            await send({"type": "http.response.body", "body": chunk, "more_body": i < len(chunks) - 1})
+    return app
+
+def _call(app, accept=b"gzip"):
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "headers": [(b"accept-encoding", accept)]}
+    asyncio.run(CompressionMiddleware(app, minimum_size=100)(scope, None, send))
+    headers = dict(messages[0]["headers"])
+    return headers, b"".join(m.get("body", b"") for m in messages[1:])
+
+def test_negotiate_encoding():
+    """Test q-values, wildcards and refusal."""
+    assert negotiate_encoding(None) is None
+    assert negotiate_encoding("gzip, deflate") == "gzip"
+    assert negotiate_encoding("gzip;q=0") is None
+    assert negotiate_encoding("identity") is None
+    assert negotiate_encoding("*") in ("gzip", "zstd")
+
+def test_complete_body_compressed_above_threshold():
+    """Test that only large compressible bodies are compressed, with a correct length."""
+    body = b'{"results": [' + b'{"score": 0.5},' * 50 + b'{}]}'
+    headers, data = _call(_app([body]))
+    assert headers[b"content-encoding"] == b"gzip"
+    assert headers[b"vary"] == b"Accept-Encoding"
+    assert int(headers[b"content-length"]) == len(data)
+    assert gzip.decompress(data) == body
+
+    headers, data = _call(_app([b'{"ok": true}']))
+    assert b"content-encoding" not in headers and data == b'{"ok": true}'
+
+    headers, data = _call(_app([body], content_type=b"text/event-stream"))
+    assert b"content-encoding" not in headers and data == body
+
+def test_streamed_body_flushes_each_chunk():
+    """Test that NDJSON streams stay decodable chunk by chunk."""
+    rows = [b'{"row": %d}\n' % i for i in range(5)]
+    headers, data = _call(_app(rows, content_type=b"application/x-ndjson"))
+    assert headers[b"content-encoding"] == b"gzip"
+    assert b"content-length" not in headers
+    assert gzip.decompress(data) == b"".join(rows)
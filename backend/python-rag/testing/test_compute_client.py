@@ -0,0 +1,74 @@
+"""Test the tensor wire format and local fallback of the compute client."""
+
+import struct
+
+import numpy as np
+import pytest
+
+from core.compute_client import RustComputeClient, pack_tensors, unpack_tensors
+
+def test_roundtrip_dtypes_and_shapes():
+    """Test that supported dtypes, 0-d and empty arrays survive a roundtrip."""
+    arrays = [
+        np.arange(12, dtype=np.float32).reshape(3, 4),
+        np.linspace(0, 1, 5, dtype=np.float64),
+        np.array([1, 2, 4_000_000_000], dtype=np.uint32),
+        np.float32(2.5),
+        np.empty((0, 384), dtype=np.float32),
+        np.empty(0, dtype=np.uint32),
+        np.arange(6, dtype=">f8").reshape(2, 3),
+        np.asfortranarray(np.arange(6, dtype=np.float32).reshape(2, 3)),
+    ]
+    decoded = unpack_tensors(pack_tensors(arrays))
+    assert len(decoded) == len(arrays)
+    for original, result in zip(arrays, decoded):
+        assert result.shape == np.shape(original)
+        assert result.dtype.itemsize == np.asarray(original).dtype.itemsize
+        np.testing.assert_array_equal(result, original)
+
+def test_unsupported_dtypes_sent_as_float32():
+    """Test that ints and bools are converted to float32 rather than rejected."""
+    (ints, flags) = unpack_tensors(pack_tensors([np.array([[1, -2]], dtype=np.int64), np.array([True, False])]))
+    assert ints.dtype == np.float32 and ints.tolist() == [[1.0, -2.0]]
+    assert flags.dtype == np.float32 and flags.tolist() == [1.0, 0.0]
+
+def test_malformed_payloads_rejected():
+    """Test that truncated or malformed payloads raise ValueError instead of misreading memory."""
+    payload = pack_tensors([np.arange(8, dtype=np.float32).reshape(2, 4)])
+    for cut in (0, 3, 8, 11, 16, len(payload) - 1):
+        with pytest.raises(ValueError, match="Truncated"):
+            unpack_tensors(payload[:cut])
+    with pytest.raises(ValueError, match="magic"):
+        unpack_tensors(b"NOPE" + payload[4:])
+    with pytest.raises(ValueError, match="dtype"):
+        unpack_tensors(payload[:8] + bytes([9]) + payload[9:])
+    # A header claiming more tensors than the payload holds
+    with pytest.raises(ValueError, match="Truncated"):
+        unpack_tensors(struct.pack("<4sI", b"PKT1", 2) + payload[8:])
+
+def test_local_fallback_when_service_down():
+    """Test that results are computed locally, and counted, when the service is unreachable."""
+    rng = np.random.default_rng(0)
+    queries, documents = rng.normal(size=(3, 8)), rng.normal(size=(20, 8))
+    client = RustComputeClient("http://127.0.0.1:9", timeout=2, min_elements=0)
+
+    scores = client.similarity(queries, documents)
+    q = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    d = documents / np.linalg.norm(documents, axis=1, keepdims=True)
+    np.testing.assert_allclose(scores, q @ d.T, rtol=1e-5)
+
+    indices, top_scores = client.top_k(queries, documents, k=5)
+    np.testing.assert_array_equal(indices, np.argsort(-(q @ d.T), axis=1)[:, :5])
+    assert top_scores.shape == (3, 5) and np.all(np.diff(top_scores, axis=1) <= 0)
+    assert client.stats == {"remote": 0, "local": 2, "failures": 2}
+
+    strict = RustComputeClient("http://127.0.0.1:9", timeout=2, min_elements=0, local_fallback=False)
+    with pytest.raises(Exception):
+        strict.pairwise(queries, queries)
+    assert strict.stats["failures"] == 1
+
+def test_small_inputs_stay_local():
+    """Test that inputs below the offload threshold never call the service."""
+    client = RustComputeClient("http://127.0.0.1:9", min_elements=1000, local_fallback=False)
+    np.testing.assert_allclose(client.pairwise([[1.0, 0.0]], [[2.0, 0.0]]), [1.0])
+    assert client.stats == {"remote": 0, "local": 1, "failures": 0}
@@ -0,0 +1,56 @@
+"""Test the shared configuration store."""
+
+import os
+
+from core.config_store import ConfigStore
+
+DEFAULTS = {"model": "llama3.1", "temperature": 0.7}
+
+def test_defaults_written_once(tmp_path):
+    """Test that the first store seeds defaults and later ones reuse them."""
+    path = os.path.join(tmp_path, "config.db")
+    first = ConfigStore(path, DEFAULTS)
+    second = ConfigStore(path, {"model": "ignored"})
+    assert first.get() == DEFAULTS
+    assert second.get() == DEFAULTS
+    assert first.version == second.version == 1
+
+def test_update_visible_to_other_store(tmp_path):
+    """Test that an update in one process is seen by another."""
+    path = os.path.join(tmp_path, "config.db")
+    writer = ConfigStore(path, DEFAULTS)
+    reader = ConfigStore(path, DEFAULTS)
+    snapshot = reader.get()
+
+    version = writer.update({"model": "mistral", "temperature": 0.2})
+    assert version == 2
+    assert reader.get() == {"model": "mistral", "temperature": 0.2}
+    assert reader.version == 2
+    assert snapshot == DEFAULTS
+
+def test_cached_snapshot_reused(tmp_path):
+    """Test that reads without changes return the same cached object."""
+    store = ConfigStore(os.path.join(tmp_path, "config.db"), DEFAULTS)
+    assert store.get() is store.get()
+
+def test_subscribers_notified(tmp_path):
+    """Test change notification across stores."""
+    path = os.path.join(tmp_path, "config.db")
+    writer = ConfigStore(path, DEFAULTS)
+    reader = ConfigStore(path, DEFAULTS)
+    seen = []
+    reader.subscribe(lambda config, version: seen.append((config["model"], version)))
+
+    writer.update({"model": "gpt-oss", "temperature": 0.1})
+    assert reader.poll() is True
+    assert reader.poll() is False
+    assert seen == [("gpt-oss", 2)]
+
+def test_history_is_bounded(tmp_path):
+    """Test that only the configured number of versions is kept."""
+    store = ConfigStore(os.path.join(tmp_path, "config.db"), DEFAULTS, history=3)
+    for i in range(5):
+        store.update({"model": f"m{i}", "temperature": 0.5})
+    entries = store.history_entries()
+    assert [e["version"] for e in entries] == [6, 5, 4]
+    assert entries[0]["config"]["model"] == "m4"
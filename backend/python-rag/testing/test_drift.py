@@ -0,0 +1,86 @@
+"""Test online drift detection on synthetic /query traffic."""
+
+import random
+
+import pytest
+
+from observability.drift import EWMA_ALPHA, ModelMonitor, hashed_embedding
+
+VOCABULARY = [f"word{i}" for i in range(300)]
+# Word frequencies of natural text follow Zipf's law
+ZIPF_VOCABULARY = [f"word{i}" for i in range(2000)]
+ZIPF_WEIGHTS = [1 / rank for rank in range(1, 2001)]
+SENSITIVITY = 0.05
+REFERENCE = 200
+
+def request(rng, latency_mean=1.0, response_words=(20, 40), zipf=False):
+    """Arguments of ModelMonitor.observe for one synthetic request."""
+    def text(length):
+        if zipf:
+            return " ".join(rng.choices(ZIPF_VOCABULARY, ZIPF_WEIGHTS, k=length))
+        return " ".join(rng.choice(VOCABULARY) for _ in range(length))
+
+    prompt = text(rng.randint(8, 16))
+    response = text(rng.randint(*response_words))
+    latency = max(0.05, rng.gauss(latency_mean, 0.2))
+    return {
+        "prompt": prompt,
+        "response": response,
+        "latency": latency,
+        "ttft": latency * 0.2,
+        "sensitivity": SENSITIVITY,
+        "decode_rate": rng.gauss(30, 3),
+    }
+
+def calibrated_monitor(rng, model, zipf=False):
+    monitor = ModelMonitor(model, reference_size=REFERENCE)
+    for _ in range(REFERENCE):
+        assert monitor.observe(**request(rng, zipf=zipf)) == []
+    return monitor
+
+@pytest.mark.parametrize("zipf", [False, True], ids=["uniform", "zipf"])
+def test_stationary_traffic_within_false_alarm_budget(zipf):
+    """Test that unchanged traffic alerts no more than the sensitivity allows."""
+    requests = alerts = 0
+    for seed in range(5):
+        rng = random.Random(seed)
+        monitor = calibrated_monitor(rng, "stationary", zipf)
+        for _ in range(2000):
+            alerts += len(monitor.observe(**request(rng, zipf=zipf)))
+            requests += 1
+    # drift_sensitivity is the false-alarm probability per EWMA window (~1 / alpha requests)
+    budget = requests * EWMA_ALPHA * SENSITIVITY
+    assert alerts <= budget
+
+def test_reference_distances_match_later_traffic():
+    """Test that reference centroid distances are distributed like those of later requests."""
+    for key in ("prompt", "response"):
+        shifts, spreads = [], []
+        for seed in range(20):
+            rng = random.Random(seed)
+            monitor = ModelMonitor("centroid", reference_size=50)
+            for _ in range(50):
+                monitor.observe(**request(rng, zipf=True))
+            centroid = getattr(monitor, f"{key}_centroid")
+            later = [monitor._distance(centroid, hashed_embedding(request(rng, zipf=True)[key])) for _ in range(1000)]
+            mean = sum(later) / len(later)
+            std = (sum((d - mean) ** 2 for d in later) / len(later)) ** 0.5
+            reference = monitor.features[f"{key}_centroid_distance"].reference
+            shifts.append((reference.mean - mean) / std)
+            spreads.append(reference.std / std)
+        # Averaged over seeds, neither the reference mean nor its spread is biased
+        assert abs(sum(shifts) / len(shifts)) < 0.06
+        assert abs(sum(spreads) / len(spreads) - 1) < 0.05
+
+def test_shifted_distributions_alert_quickly():
+    """Test that a one-sigma latency shift and longer responses alert within 50 requests."""
+    for seed in range(5):
+        rng = random.Random(seed)
+        latency_monitor = calibrated_monitor(rng, "latency-shift")
+        started = [latency_monitor.observe(**request(rng, latency_mean=1.2)) for _ in range(50)]
+        assert any("latency" in features for features in started)
+        assert latency_monitor.state()["features"]["latency"]["drifting"]
+
+        length_monitor = calibrated_monitor(rng, "length-shift")
+        started = [length_monitor.observe(**request(rng, response_words=(35, 55))) for _ in range(50)]
+        assert any("response_length" in features for features in started)
@@ -0,0 +1,73 @@
+"""Test the persistent evaluation result cache."""
+
+import importlib
+
+import evaluation.cache as eval_cache
+import evaluation.ragas_evaluator as ragas_evaluator
+from evaluation.cache import EvaluationCache, cache_key, cached_evaluator, evaluator_version
+
+def test_keys_cover_inputs_metric_and_version():
+    """Test that keys are stable and change with any input, the metric or the version."""
+    inputs = {"query": "q", "context": ["a", "b"], "answer": "x", "ground_truth": None}
+    key = cache_key("ragas", "1", inputs)
+    assert key == cache_key("ragas", "1", dict(reversed(list(inputs.items()))))
+    assert key != cache_key("ragas", "1", {**inputs, "context": ["b", "a"]})
+    assert key != cache_key("bertscore", "1", inputs)
+    assert key != cache_key("ragas", "2", inputs)
+
+def test_lru_eviction_by_size(tmp_path):
+    """Test that the least recently used entries go once the size limit is exceeded."""
+    lookups = []
+    cache = EvaluationCache(str(tmp_path / "cache.db"), max_bytes=1000,
+                            on_lookup=lambda metric, hit: lookups.append(hit))
+    cache.put_many("m", "1", {f"k{i}": {"score": i, "pad": "x" * 100} for i in range(5)})
+    cache.put("m", "1", "failed", {"score": 0.0, "error": "not installed"})
+    assert cache.get("m", "k0") == {"score": 0, "pad": "x" * 100}
+    assert cache.get("m", "failed") is None
+
+    cache._writes = eval_cache._EVICTION_CHECK_INTERVAL - 1
+    cache.put_many("m", "1", {f"n{i}": {"score": i, "pad": "x" * 100} for i in range(5)})
+    remaining = cache.get_many("m", [f"k{i}" for i in range(5)] + [f"n{i}" for i in range(5)])
+    # k0 was read recently, so the other old entries went first
+    assert "k0" in remaining and "k1" not in remaining and "n4" in remaining
+
+    stats = cache.stats()
+    assert stats["bytes"] <= 1000 and stats["evicted"] > 0
+    assert stats["metrics"]["m"]["hits"] == 1 + len(remaining)
+    assert lookups[:2] == [True, False]
+
+def test_decorated_evaluator_scores_once(tmp_path, monkeypatch):
+    """Test that repeated calls are served from the cache and errors are retried."""
+    monkeypatch.setattr(eval_cache, "_cache", EvaluationCache(str(tmp_path / "cache.db"), max_bytes=10 ** 6))
+    calls = []
+
+    @cached_evaluator("expensive", "1")
+    def evaluate(answer: str, reference: str = "ref"):
+        calls.append(answer)
+        return {"error": "judge unavailable"} if answer == "bad" else {"score": len(answer)}
+
+    assert evaluate("abc") == {"score": 3}
+    assert evaluate("abc", reference="ref") == {"score": 3}
+    assert evaluate("abc", "other") == {"score": 3}
+    evaluate("bad")
+    evaluate("bad")
+    assert calls == ["abc", "abc", "bad", "bad"]
+
+def test_ragas_key_follows_the_judge(tmp_path, monkeypatch):
+    """Test that cached RAGAS scores are only served for the judge that produced them."""
+    monkeypatch.setattr(eval_cache, "_cache", EvaluationCache(str(tmp_path / "cache.db"), max_bytes=10 ** 6))
+    inputs = {"query": "q", "context": ["c"], "answer": "a", "ground_truth": None}
+    try:
+        monkeypatch.setenv("RAGAS_JUDGE_MODEL", "judge-a")
+        judge_a = importlib.reload(ragas_evaluator)
+        version = evaluator_version(judge_a.RAGAS_REVISION, ("ragas",))
+        eval_cache._cache.put("ragas", version, cache_key("ragas", version, inputs), {"ragas_score": 0.9})
+        assert judge_a.evaluate_ragas("q", ["c"], "a") == {"ragas_score": 0.9}
+
+        monkeypatch.setenv("RAGAS_JUDGE_MODEL", "judge-b")
+        judge_b = importlib.reload(ragas_evaluator)
+        assert "judge=judge-b" in judge_b.RAGAS_REVISION
+        assert judge_b.evaluate_ragas("q", ["c"], "a") != {"ragas_score": 0.9}
+    finally:
+        monkeypatch.delenv("RAGAS_JUDGE_MODEL")
+        importlib.reload(ragas_evaluator)
@@ -0,0 +1,127 @@
+"""Test incremental ingestion against the content-hash manifest."""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from retrieval.ingest import IngestionPipeline
+from retrieval.manifest import IngestManifest
+
+class FakeStore:
+    """Records embedded texts and the points currently stored."""
+
+    def __init__(self):
+        self.points = {}
+        self.embedded = []
+
+    def embed(self, texts):
+        self.embedded.extend(texts)
+        return [[0.0] for _ in texts]
+
+    def upsert(self, ids, vectors, payloads):
+        self.points.update(zip(ids, payloads))
+
+    def delete(self, ids):
+        for point_id in ids:
+            self.points.pop(point_id, None)
+
+@pytest.fixture
+def store():
+    return FakeStore()
+
+@pytest.fixture
+def manifest(tmp_path):
+    manifest = IngestManifest(str(tmp_path / "manifest.db"))
+    yield manifest
+    manifest.close()
+
+def _pipeline(store, manifest, pool=None):
+    return IngestionPipeline(
+        store.embed, store.upsert, store.delete, manifest, "docs",
+        chunk_tokens=8, overlap=0, batch_size=4, pool=pool
+    )
+
+def _paragraphs(n, tag=""):
+    return " ".join(f"Sentence {i}{tag} has several words ." for i in range(n))
+
+def test_unchanged_documents_are_skipped(store, manifest):
+    """Test that a second identical run embeds nothing."""
+    documents = [("a", _paragraphs(10)), ("b", _paragraphs(5))]
+    first = _pipeline(store, manifest).run_documents(documents)
+    assert first["diff"]["added"] == 2
+    stored = dict(store.points)
+
+    store.embedded.clear()
+    second = _pipeline(store, manifest).run_documents(documents)
+    assert second["diff"]["unchanged"] == 2
+    assert store.embedded == []
+    assert store.points == stored
+
+def test_changed_document_embeds_only_new_chunks(store, manifest):
+    """Test that editing one chunk re-embeds it and deletes the point it replaced."""
+    _pipeline(store, manifest).run_documents([("a", _paragraphs(10))])
+    before = set(store.points)
+
+    edited = _paragraphs(10).replace("Sentence 4 has", "Sentence 4 had")
+    store.embedded.clear()
+    result = _pipeline(store, manifest).run_documents([("a", edited)])
+
+    assert result["diff"]["changed"] == 1
+    assert result["diff"]["chunks_embedded"] == 1
+    assert result["diff"]["points_deleted"] == 1
+    assert len(store.embedded) == 1 and "had" in store.embedded[0]
+    assert len(set(store.points) - before) == 1
+    assert manifest.summary("docs")["chunks"] == len(store.points)
+
+def test_metadata_is_stored_and_tracked(store, manifest):
+    """Test that metadata lands in every chunk payload and changing it re-ingests."""
+    text = _paragraphs(4)
+    _pipeline(store, manifest).run_documents([("a", text)], metadata=[{"tenant": "acme"}])
+    assert all(p["tenant"] == "acme" for p in store.points.values())
+
+    result = _pipeline(store, manifest).run_documents([("a", text)], metadata=[{"tenant": "globex"}])
+    assert result["diff"]["changed"] == 1
+    assert {p["tenant"] for p in store.points.values()} == {"globex"}
+
+def test_prune_removes_missing_documents(store, manifest):
+    """Test that pruning deletes the points of documents no longer present."""
+    _pipeline(store, manifest).run_documents([("a", _paragraphs(3)), ("b", _paragraphs(3, "b"))])
+    result = _pipeline(store, manifest).run_documents([("a", _paragraphs(3))], prune=True)
+
+    assert result["diff"]["removed"] == 1
+    assert {p["source"] for p in store.points.values()} == {"doc:a"}
+    assert manifest.sources("docs") == ["doc:a"]
+
+def test_files_touched_but_unmodified_are_not_reparsed(store, manifest, tmp_path):
+    """Test file re-ingestion: skipped on same content, partial on edit, pruned on delete."""
+    corpus = tmp_path / "corpus"
+    corpus.mkdir()
+    (corpus / "one.txt").write_text(_paragraphs(20))
+    (corpus / "two.md").write_text(_paragraphs(20, "x"))
+
+    with ThreadPoolExecutor(2) as pool:
+        first = _pipeline(store, manifest, pool).run([str(corpus)])
+        assert first["diff"]["added"] == 2 and first["failed"] == []
+
+        (corpus / "one.txt").write_text(_paragraphs(20))  # New mtime, same content
+        (corpus / "two.md").write_text(_paragraphs(21, "x"))
+        store.embedded.clear()
+        second = _pipeline(store, manifest, pool).run([str(corpus)])
+        assert second["diff"]["unchanged"] == 1 and second["diff"]["changed"] == 1
+        assert 0 < len(store.embedded) <= 2
+
+        (corpus / "two.md").unlink()
+        third = _pipeline(store, manifest, pool).run([str(corpus)], prune=True)
+        assert third["diff"]["removed"] == 1
+        assert {p["source"] for p in store.points.values()} == {str(corpus / "one.txt")}
+
+@pytest.mark.parametrize("options", [
+    {"chunk_tokens": 0, "overlap": -1},
+    {"chunk_tokens": 8, "overlap": -2},
+    {"chunk_tokens": 8, "overlap": 8},
+    {"chunk_tokens": 8, "overlap": 0, "batch_size": 0},
+])
+def test_invalid_chunking_options_rejected(store, manifest, options):
+    """Test that options which would drop tokens or never batch are refused up front."""
+    with pytest.raises(ValueError):
+        IngestionPipeline(store.embed, store.upsert, store.delete, manifest, "docs", **options)
@@ -0,0 +1,59 @@
+"""Test cold/warm start classification and the keep-warm scheduler."""
+
+import asyncio
+
+from core.keepwarm import KeepWarmScheduler, StartClassifier
+
+def test_classification_signals():
+    """Test classifying by load timing, by warm baseline, and by idle time before a baseline exists."""
+    classifier = StartClassifier(idle_unload=300, load_seconds=1.0, ttft_factor=3.0)
+    # No baseline yet: a slow first request to an unseen model is a load
+    assert classifier.classify("llama3.1", 6.0, now=0.0)["reason"] == "idle"
+    assert classifier.classify("llama3.1", 6.0, now=0.0)["state"] == "warm"  # used just now
+    assert classifier.classify("mistral", 0.4, now=0.0)["state"] == "warm"
+
+    # Warm baseline of 0.4s: 1.0s is not a load, 5s is
+    assert classifier.classify("mistral", 1.0, now=1.0)["state"] == "warm"
+    cold = classifier.classify("mistral", 5.0, now=400.0)
+    assert cold["state"] == "cold" and cold["reason"] == "ttft_baseline" and cold["idle_seconds"] == 399.0
+
+    # Runner-reported prefill explains a long TTFT; unexplained time is a load
+    assert classifier.classify("qwen3-coder", 4.0, prefill_seconds=3.8)["state"] == "warm"
+    assert classifier.classify("qwen3-coder", 4.0, prefill_seconds=0.2)["state"] == "cold"
+    assert classifier.classify("qwen3-coder", None) is None
+
+    snapshot = classifier.snapshot()
+    assert snapshot["mistral"]["cold"] == 1 and snapshot["mistral"]["warm"] == 2
+    assert 0.4 < snapshot["mistral"]["baseline_ttft"] < 1.0
+
+def test_scheduler_pings_only_idle_models():
+    """Test that pings go to idle models, skip while busy, and don't move the warm baseline."""
+    classifier = StartClassifier(load_seconds=1.0)
+    pinged, outcomes = [], []
+    busy = [False]
+
+    async def ping(model):
+        pinged.append(model)
+        if model == "gone":
+            raise RuntimeError("model not found")
+        return 8.0, 0.01
+
+    scheduler = KeepWarmScheduler(
+        classifier, ping, lambda: (["llama3.1", "mistral", "gone"], 60.0), busy=lambda: busy[0],
+        on_ping=lambda model, status, start: outcomes.append((model, status))
+    )
+    classifier.classify("mistral", 0.5)
+
+    asyncio.run(scheduler.run_once())
+    assert pinged == ["llama3.1", "gone"]
+    assert outcomes == [("llama3.1", "cold"), ("gone", "error")]
+    assert classifier.snapshot()["llama3.1"]["baseline_ttft"] is None
+
+    # Everything was just used or pinged: nothing to do until the interval passes
+    asyncio.run(scheduler.run_once())
+    assert len(pinged) == 2
+
+    busy[0] = True
+    scheduler.settings = lambda: (["qwen3-vl"], 60.0)
+    asyncio.run(scheduler.run_once())
+    assert outcomes[-1] == ("qwen3-vl", "skipped") and scheduler.last_ping["qwen3-vl"]["status"] == "skipped"
@@ -0,0 +1,68 @@
+"""Test the in-house lexical metric engine."""
+
+import random
+import pytest
+
+from evaluation.lexical import (
+    bleu_tokenize,
+    corpus_bleu,
+    lcs_length,
+    rouge_l,
+    rouge_n,
+    score_batch,
+    sentence_bleu,
+    token_f1,
+)
+
+def _dp_lcs(a, b):
+    """Reference O(n*m) LCS."""
+    table = [[0] * (len(b) + 1) for _ in range(len(a) + 1)]
+    for i, x in enumerate(a):
+        for j, y in enumerate(b):
+            table[i + 1][j + 1] = table[i][j] + 1 if x == y else max(table[i][j + 1], table[i + 1][j])
+    return table[-1][-1]
+
+def test_lcs_matches_dynamic_programming():
+    """Test bit-parallel LCS against the textbook algorithm."""
+    rng = random.Random(0)
+    vocab = ["a", "b", "c", "d", "e"]
+    for _ in range(200):
+        a = [rng.choice(vocab) for _ in range(rng.randint(0, 40))]
+        b = [rng.choice(vocab) for _ in range(rng.randint(0, 40))]
+        assert lcs_length(a, b) == _dp_lcs(a, b)
+
+def test_bleu_identical_and_disjoint():
+    """Test BLEU bounds."""
+    tokens = bleu_tokenize("The capital of France is Paris.")
+    assert sentence_bleu(tokens, tokens) == pytest.approx(1.0)
+    assert sentence_bleu(bleu_tokenize("nothing here"), tokens) == 0.0
+
+def test_bleu_brevity_penalty():
+    """Test that short hypotheses are penalized."""
+    reference = bleu_tokenize("the cat sat on the mat today")
+    assert sentence_bleu(reference[:4], reference) < sentence_bleu(reference, reference)
+
+def test_corpus_bleu_pools_statistics():
+    """Test corpus BLEU on identical pairs."""
+    pairs = [(bleu_tokenize(t), bleu_tokenize(t)) for t in ["a b c d e", "f g h i j k"]]
+    assert corpus_bleu(pairs) == pytest.approx(1.0)
+
+def test_rouge_scores():
+    """Test ROUGE-1/2/L on a hand-checked pair."""
+    hyp = ["the", "cat", "sat"]
+    ref = ["the", "cat", "was", "sat"]
+    assert rouge_n(hyp, ref, 1) == pytest.approx(2 * 1.0 * 0.75 / 1.75)
+    assert rouge_n(hyp, ref, 2) == pytest.approx(2 * 0.5 * (1 / 3) / (0.5 + 1 / 3))
+    assert rouge_l(hyp, ref) == pytest.approx(2 * 1.0 * 0.75 / 1.75)
+
+def test_token_f1_squad_normalization():
+    """Test SQuAD-style normalization and overlap F1."""
+    assert token_f1("The Eiffel Tower!", "eiffel tower")["f1"] == pytest.approx(1.0)
+    result = token_f1("Paris, France", "Paris")
+    assert result["precision"] == pytest.approx(0.5)
+    assert result["recall"] == pytest.approx(1.0)
+
+def test_score_batch_length_mismatch():
+    """Test that misaligned batches are rejected."""
+    with pytest.raises(ValueError):
+        score_batch(["a"], ["a", "b"])
@@ -0,0 +1,92 @@
+"""Test the in-process memory-mapped vector index."""
+
+import numpy as np
+import pytest
+
+from retrieval.local_index import LocalCollection, LocalVectorIndex
+
+def _vectors(n, dim=32, seed=0):
+    return np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+
+@pytest.mark.parametrize("dtype", ["float32", "int8"])
+def test_exact_search_finds_nearest(tmp_path, dtype):
+    """Test that a stored vector is its own nearest neighbour."""
+    index = LocalVectorIndex(str(tmp_path), dtype)
+    vectors = _vectors(3000)
+    index.upsert("docs", list(range(3000)), vectors, [{"text": str(i)} for i in range(3000)])
+
+    hits = index.search("docs", vectors[1234], limit=5)
+    assert len(hits) == 5
+    assert hits[0].id == 1234
+    assert hits[0].payload == {"text": "1234"}
+    assert hits[0].score == pytest.approx(1.0, abs=0.01)
+    assert [h.score for h in hits] == sorted((h.score for h in hits), reverse=True)
+
+def test_upsert_replaces_and_delete_removes(tmp_path):
+    """Test that ids are unique and deleted points are never returned."""
+    index = LocalVectorIndex(str(tmp_path))
+    vectors = _vectors(10)
+    index.upsert("docs", list(range(10)), vectors, [{}] * 10)
+    index.upsert("docs", [3], vectors[7:8], [{"replaced": True}])
+    collection = index.get("docs")
+    assert collection.size == 10
+
+    hits = index.search("docs", vectors[7], limit=2)
+    assert {h.id for h in hits} == {3, 7}
+
+    assert collection.delete([3, 7, 99]) == 2
+    assert collection.size == 8
+    assert all(h.id not in (3, 7) for h in index.search("docs", vectors[7], limit=10))
+
+def test_other_process_sees_writes(tmp_path):
+    """Test that a second handle on the same files picks up new points."""
+    index = LocalVectorIndex(str(tmp_path))
+    vectors = _vectors(2000)
+    index.upsert("docs", list(range(1000)), vectors[:1000], [{}] * 1000)
+    other = LocalCollection(str(tmp_path / "docs"))
+
+    index.upsert("docs", list(range(1000, 2000)), vectors[1000:], [{}] * 1000)
+    assert other.search(vectors[1500], limit=1)[0].id == 1500
+    assert other.capacity >= 2000
+
+def test_ivf_search_recall(tmp_path):
+    """Test that probing a quarter of the partitions keeps most exact neighbours."""
+    index = LocalVectorIndex(str(tmp_path))
+    vectors = _vectors(4000)
+    index.upsert("docs", list(range(4000)), vectors, [{}] * 4000)
+    collection = index.get("docs")
+    collection.build_ivf(nlist=16)
+
+    queries = _vectors(50, seed=1)
+    recall = []
+    for q in queries:
+        exact = {h.id for h in collection.search(q, limit=10)}
+        approx = {h.id for h in collection.search(q, limit=10, nprobe=4)}
+        recall.append(len(exact & approx) / 10)
+    assert np.mean(recall) > 0.5
+
+    # Points added after training are assigned to a partition
+    index.upsert("docs", [9999], queries[:1], [{}])
+    assert collection.search(queries[0], limit=1, nprobe=4)[0].id == 9999
+
+def test_filtered_search_uses_payload_index(tmp_path):
+    """Test that filtered search only returns matching points, via the payload index."""
+    index = LocalVectorIndex(str(tmp_path))
+    vectors = _vectors(1000)
+    payloads = [{"tenant": f"t{i % 4}", "year": 2000 + i % 30} for i in range(1000)]
+    index.upsert("docs", list(range(1000)), vectors, payloads)
+    collection = index.get("docs")
+    collection.create_payload_index("tenant")
+    assert collection.payload_indexes() == ["tenant"]
+
+    hits = collection.search(vectors[13], limit=10, filters={"tenant": "t1", "year": {"gte": 2010}})
+    assert hits[0].id == 13
+    assert all(h.payload["tenant"] == "t1" and h.payload["year"] >= 2010 for h in hits)
+    assert {h.id for h in collection.search(vectors[5], limit=10, filters={"tenant": ["t2", "t3"]})} <= {
+        i for i in range(1000) if i % 4 in (2, 3)
+    }
+
+    plan = collection._conn.execute(
+        "EXPLAIN QUERY PLAN SELECT row FROM points WHERE json_extract(payload, '$.tenant') = 't1'"
+    ).fetchall()
+    assert "payload_tenant" in str(plan)
@@ -0,0 +1,155 @@
+"""Test the metric helpers against temporary and multiprocess registries."""
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+from prometheus_client import CollectorRegistry, Counter, Histogram
+from prometheus_client.openmetrics import exposition as openmetrics
+
+from observability import metrics
+
+@pytest.fixture
+def registry(monkeypatch):
+    """Fresh registry that the helpers read instead of the process-wide one."""
+    registry = CollectorRegistry()
+    monkeypatch.setattr(metrics, "MULTIPROCESS", False)
+    monkeypatch.setattr(metrics, "collector_registry", lambda: registry)
+    return registry
+
+def test_helpers_single_process(registry):
+    """Test means and totals computed from a single-process registry."""
+    latency = Histogram("test_latency_seconds", "Latency", ["model", "stage"], registry=registry)
+    tokens = Counter("test_tokens", "Tokens", ["model"], registry=registry)
+    for model, stage, value in [("a", "x", 1.0), ("a", "y", 3.0), ("b", "x", 0.5), ("b", "x", 1.5)]:
+        metrics.observe(latency.labels(model=model, stage=stage), value)
+    tokens.labels(model="a").inc(10)
+    tokens.labels(model="b").inc(4)
+    tokens.labels(model="b").inc(1)
+
+    assert metrics.histogram_mean("test_latency_seconds") == pytest.approx(1.5)
+    assert metrics.histogram_mean("test_latency_seconds", {"model": "a"}) == pytest.approx(2.0)
+    assert metrics.histogram_mean("test_latency_seconds", {"model": "b", "stage": "x"}) == pytest.approx(1.0)
+    assert metrics.histogram_mean("test_latency_seconds", {"model": "c"}) == 0.0
+    assert metrics.histogram_mean("test_missing_seconds") == 0.0
+    assert metrics.histogram_means_by("test_latency_seconds", "model") == pytest.approx({"a": 2.0, "b": 1.0})
+    assert metrics.histogram_means_by("test_latency_seconds", "stage") == pytest.approx({"x": 1.0, "y": 3.0})
+    assert metrics.counter_totals_by("test_tokens", "model") == {"a": 10.0, "b": 5.0}
+    assert metrics.counter_totals_by("test_tokens", "stage") == {}
+
+def test_observe_exemplars(registry, monkeypatch):
+    """Test that only slow observations with a request id carry an exemplar."""
+    latency = Histogram("test_ttft_seconds", "TTFT", ["model"], buckets=(1.0, 5.0), registry=registry)
+    metrics.observe(latency.labels(model="a"), 0.5, request_id="fast-1")
+    metrics.observe(latency.labels(model="a"), 3.0, request_id="slow-1", slow=True)
+    metrics.observe(latency.labels(model="a"), 4.0, slow=True)
+    monkeypatch.setattr(metrics, "MULTIPROCESS", True)
+    metrics.observe(latency.labels(model="b"), 3.0, request_id="slow-2", slow=True)
+
+    exposition = openmetrics.generate_latest(registry).decode()
+    assert 'request_id="slow-1"' in exposition
+    assert "fast-1" not in exposition
+    assert "slow-2" not in exposition
+    assert metrics.histogram_means_by("test_ttft_seconds", "model") == pytest.approx({"a": 7.5 / 3, "b": 3.0})
+
+WORKER = """
+from observability.metrics import input_tokens_total, observe, ttft_histogram
+for model, value in {observations}:
+    observe(ttft_histogram.labels(model=model), value, request_id="r", slow=True)
+    input_tokens_total.labels(model=model).inc(10)
+"""
+
+SCRAPER = """
+import json
+from observability.metrics import MULTIPROCESS, counter_totals_by, histogram_mean, histogram_means_by, render_metrics
+payload, _ = render_metrics("application/openmetrics-text")
+print(json.dumps({
+    "multiprocess": MULTIPROCESS,
+    "mean": histogram_mean("python_rag_ttft_seconds"),
+    "mean_a": histogram_mean("python_rag_ttft_seconds", {"model": "a"}),
+    "by_model": histogram_means_by("python_rag_ttft_seconds", "model"),
+    "tokens": counter_totals_by("python_rag_input_tokens", "model"),
+    "exemplars": 'request_id="r"' in payload.decode(),
+}))
+"""
+
+GAUGE_WORKER = """
+import os
+from observability.metrics import admission_queue_depth, circuit_breaker_state, mark_process_dead
+admission_queue_depth.labels(runner="r", priority="interactive").set({depth})
+circuit_breaker_state.labels(dependency="qdrant").set({state})
+if {clean}:
+    mark_process_dead()
+print(os.getpid())
+"""
+
+GAUGE_SCRAPER = """
+import json
+from observability.metrics import admission_queue_depth, circuit_breaker_state, collector_registry, mark_dead_workers
+
+def gauges():
+    values = {}
+    for family in collector_registry().collect():
+        for sample in family.samples:
+            if sample.name in ("python_rag_admission_queue_depth", "python_rag_circuit_breaker_state"):
+                values[sample.name] = values.get(sample.name, 0) + sample.value
+    return values
+
+admission_queue_depth.labels(runner="r", priority="interactive").set(5)
+circuit_breaker_state.labels(dependency="qdrant").set(0)
+before = gauges()
+dead = mark_dead_workers()
+print(json.dumps({"before": before, "dead": dead, "after": gauges()}))
+"""
+
+def test_helpers_aggregate_across_workers(tmp_path):
+    """Test that with PROMETHEUS_MULTIPROC_DIR the helpers sum every worker's samples."""
+    backend = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(
+        os.environ,
+        PROMETHEUS_MULTIPROC_DIR=str(tmp_path),
+        PYTHONPATH=os.pathsep.join([backend] + sys.path),
+    )
+
+    def run(code):
+        return subprocess.run(
+            [sys.executable, "-c", code], env=env, cwd=backend,
+            capture_output=True, text=True, check=True, timeout=60,
+        ).stdout
+
+    run(WORKER.format(observations=[("a", 1.0), ("b", 4.0)]))
+    run(WORKER.format(observations=[("a", 3.0)]))
+    result = json.loads(run(SCRAPER))
+
+    assert result["multiprocess"]
+    assert result["mean"] == pytest.approx(8.0 / 3)
+    assert result["mean_a"] == pytest.approx(2.0)
+    assert result["by_model"] == pytest.approx({"a": 2.0, "b": 4.0})
+    assert result["tokens"] == {"a": 20.0, "b": 10.0}
+    # The multiprocess value store cannot hold exemplars
+    assert not result["exemplars"]
+
+def test_dead_workers_leave_live_gauges(tmp_path):
+    """Test that live gauges of workers that exited, cleanly or not, drop out of the aggregate."""
+    backend = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(
+        os.environ,
+        PROMETHEUS_MULTIPROC_DIR=str(tmp_path),
+        PYTHONPATH=os.pathsep.join([backend] + sys.path),
+    )
+
+    def run(code):
+        return subprocess.run(
+            [sys.executable, "-c", code], env=env, cwd=backend,
+            capture_output=True, text=True, check=True, timeout=60,
+        ).stdout
+
+    run(GAUGE_WORKER.format(depth=1, state=2, clean=True))
+    crashed = int(run(GAUGE_WORKER.format(depth=3, state=2, clean=False)))
+    result = json.loads(run(GAUGE_SCRAPER))
+
+    assert result["before"] == {"python_rag_admission_queue_depth": 8.0, "python_rag_circuit_breaker_state": 2.0}
+    assert result["dead"] == [crashed]
+    assert result["after"] == {"python_rag_admission_queue_depth": 5.0, "python_rag_circuit_breaker_state": 0.0}
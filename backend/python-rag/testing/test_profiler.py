@@ -0,0 +1,118 @@
+"""Test the sampling profiler and its per-path sessions."""
+
+import threading
+import time
+
+import pytest
+
+from observability.profiler import ProfilerController, StackSampler, build_report
+
+def busy_profiler_target(stop):
+    """Burn CPU until told to stop."""
+    total = 0
+    while not stop.is_set():
+        total += sum(i * i for i in range(1000))
+    return total
+
+@pytest.fixture
+def busy_thread():
+    """Thread spinning in busy_profiler_target for the duration of a test."""
+    stop = threading.Event()
+    thread = threading.Thread(target=busy_profiler_target, args=(stop,), daemon=True)
+    thread.start()
+    yield thread
+    stop.set()
+    thread.join()
+
+def test_sampler_reports_busy_function(busy_thread):
+    """Test that a busy thread's function shows up in every report view."""
+    sampler = StackSampler(interval=0.002)
+    sampler.start()
+    time.sleep(0.3)
+    sampler.stop()
+
+    summary = sampler.summary()
+    assert summary["ticks"] > 0 and summary["samples"] > 0
+    assert summary["duration"] >= 0.3
+
+    top = {row["function"]: row for row in sampler.top_functions(50)}
+    (label,) = [f for f in top if f.startswith("busy_profiler_target (test_profiler.py:")]
+    assert top[label]["total_samples"] > 0
+    assert 0 < top[label]["total_percent"] <= 100
+
+    lines = sampler.collapsed().splitlines()
+    assert any(label in line.rsplit(" ", 1)[0].split(";") for line in lines)
+    assert sum(int(line.rsplit(" ", 1)[1]) for line in lines) == summary["samples"]
+
+    def find(node):
+        if node["name"] == label:
+            return node
+        return next((hit for hit in map(find, node["children"]) if hit), None)
+
+    graph = sampler.flamegraph()
+    assert graph["value"] == summary["samples"]
+    assert find(graph)["value"] == top[label]["total_samples"]
+
+    report = build_report(sampler, "all", top=5)
+    assert len(report["top_functions"]) <= 5
+    assert {"collapsed", "flamegraph", "ticks"} <= set(report)
+
+def test_idle_threads_skipped():
+    """Test that threads blocked in a wait are dropped unless include_idle is set."""
+    stop = threading.Event()
+    waiter = threading.Thread(target=stop.wait, daemon=True)
+    waiter.start()
+    try:
+        samplers = [StackSampler(interval=0.002), StackSampler(interval=0.002, include_idle=True)]
+        for sampler in samplers:
+            sampler.start()
+        time.sleep(0.1)
+        for sampler in samplers:
+            sampler.stop()
+    finally:
+        stop.set()
+        waiter.join()
+    quiet, everything = samplers
+    assert not any(stack[-1].startswith("wait (threading.py") for stack in quiet.counts)
+    assert any(stack[-1].startswith("wait (threading.py") for stack in everything.counts)
+
+def test_path_session_samples_only_during_matching_requests(busy_thread):
+    """Test that a path-gated session takes no samples while no matching request is in flight."""
+    controller = ProfilerController()
+    assert not controller.matches("/query")
+    assert controller.start(interval=0.002, path_prefix="/query")
+    assert controller.busy
+    assert not controller.start(interval=0.002)
+    assert controller.matches("/query/stream") and not controller.matches("/health")
+
+    time.sleep(0.15)
+    sampler = controller._sampler
+    assert sampler.ticks == 0 and not sampler.counts
+
+    session = controller.request_started()
+    time.sleep(0.15)
+    controller.request_finished(session)
+    ticks = sampler.ticks
+    time.sleep(0.1)
+
+    sampler, matched = controller.stop()
+    assert matched == 1
+    assert 0 < sampler.ticks <= ticks + 1
+    assert any(row["function"].startswith("busy_profiler_target") for row in sampler.top_functions(50))
+    assert not controller.busy and not controller.matches("/query")
+
+def test_requests_from_earlier_session_do_not_unbalance_gate(busy_thread):
+    """Test that a request finishing after its session ended leaves the next session's gate intact."""
+    controller = ProfilerController()
+    controller.start(interval=0.002, path_prefix="/query")
+    straggler = controller.request_started()
+    controller.stop()
+
+    controller.start(interval=0.002, path_prefix="/query")
+    controller.request_finished(straggler)
+    session = controller.request_started()
+    time.sleep(0.15)
+    controller.request_finished(session)
+    sampler, matched = controller.stop()
+    assert matched == 1 and sampler.ticks > 0
+    assert controller.request_started() is None
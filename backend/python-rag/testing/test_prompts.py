@@ -0,0 +1,45 @@
+"""Test prefix-stable prompt templating and prompt-cache accounting."""
+
+import os
+
+from core.prompts import PromptTemplate, canonical_passages, parse_cache_usage
+
+def _common_prefix(a, b):
+    return len(os.path.commonprefix([a, b]))
+
+def test_static_text_comes_first():
+    """Test that two different questions share everything before the question."""
+    template = PromptTemplate(system="SYSTEM", instructions="RULES")
+    passages = ["alpha passage", "beta passage"]
+    first = template.text("What is alpha?", passages)
+    second = template.text("How about beta?", passages)
+    assert first.startswith("SYSTEM\n\nRULES\n\nContext:\n[1] alpha passage\n\n[2] beta passage")
+    assert _common_prefix(first, second) == first.index("Question:") + len("Question: ")
+
+    messages = template.messages("What is alpha?", passages)
+    assert messages[0] == {"role": "system", "content": "SYSTEM\n\nRULES"}
+    assert messages[1]["content"].endswith("Question: What is alpha?")
+
+def test_passage_order_ignores_scores():
+    """Test that the same hits in a different score order give the same context."""
+    hits = [
+        {"text": "b0", "source": "b.txt", "chunk_index": 0},
+        {"text": "a1", "source": "a.txt", "chunk_index": 1},
+        {"text": "a0", "source": "a.txt", "chunk_index": 0},
+        {"text": "a0", "source": "a.txt", "chunk_index": 0},
+    ]
+    assert canonical_passages(hits) == ["a0", "a1", "b0"]
+    assert canonical_passages(list(reversed(hits))) == ["a0", "a1", "b0"]
+    assert canonical_passages([{"id": 3, "kind": "note"}]) == ['{"id": 3, "kind": "note"}']
+
+def test_parse_cache_usage():
+    """Test reading cached-token counts from llama.cpp timings and OpenAI usage."""
+    llama = parse_cache_usage({"timings": {"cache_n": 300, "prompt_n": 100, "prompt_ms": 250.0}})
+    assert (llama.prompt_tokens, llama.cached_tokens, llama.prefill_seconds) == (400, 300, 0.25)
+    assert llama.cached_share == 0.75
+
+    openai = parse_cache_usage({"usage": {"prompt_tokens": 200, "prompt_tokens_details": {"cached_tokens": 50}}})
+    assert (openai.prompt_tokens, openai.cached_tokens, openai.prefill_seconds) == (200, 50, None)
+
+    assert parse_cache_usage({"usage": {"prompt_tokens": 200}}) is None
+    assert parse_cache_usage({"choices": []}) is None
@@ -0,0 +1,139 @@
+"""Test circuit breakers, retries and deadlines."""
+
+import time
+
+import pytest
+import requests
+
+from core.resilience import (
+    CircuitBreaker,
+    CircuitOpen,
+    Deadline,
+    DeadlineExceeded,
+    DependencyError,
+    RetriableStatus,
+    call_with_retries,
+)
+
+def test_breaker_opens_probes_and_closes():
+    """Test that consecutive failures open the circuit and one successful probe closes it."""
+    transitions = []
+    breaker = CircuitBreaker("qdrant", failure_threshold=2, reset_seconds=0.05,
+                             on_state_change=lambda name, state: transitions.append(state))
+    for _ in range(2):
+        breaker.before_call()
+        breaker.record_failure(requests.ConnectionError("refused"))
+    with pytest.raises(CircuitOpen) as rejected:
+        breaker.before_call()
+    assert rejected.value.retry_after >= 1
+
+    time.sleep(0.06)
+    assert breaker.state == "half_open"
+    breaker.before_call()
+    # Only one probe at a time
+    with pytest.raises(CircuitOpen):
+        breaker.before_call()
+    breaker.record_success()
+
+    snapshot = breaker.snapshot()
+    assert transitions == ["open", "half_open", "closed"]
+    assert snapshot["state"] == "closed" and snapshot["rejected"] == 2
+    assert snapshot["last_error"] == "refused"
+
+def test_retries_only_retriable_errors():
+    """Test that overload statuses are retried, client errors are not, and 500s count as failures."""
+    breaker = CircuitBreaker("runner", failure_threshold=10)
+    calls = []
+
+    def flaky(timeout):
+        calls.append(timeout)
+        if len(calls) == 1:
+            raise RetriableStatus(503)
+        return "ok"
+
+    assert call_with_retries(flaky, breaker, Deadline(5), 2, attempts=3, backoff=0.001) == "ok"
+    assert len(calls) == 2 and breaker.snapshot()["consecutive_failures"] == 0
+
+    def bad_request(timeout):
+        calls.append(timeout)
+        raise ValueError("bad request")
+
+    calls.clear()
+    with pytest.raises(ValueError):
+        call_with_retries(bad_request, breaker, Deadline(5), 2, attempts=3, backoff=0.001)
+    assert len(calls) == 1 and breaker.snapshot()["consecutive_failures"] == 0
+
+    def server_error(timeout):
+        calls.append(timeout)
+        raise DependencyError(500)
+
+    calls.clear()
+    with pytest.raises(DependencyError):
+        call_with_retries(server_error, breaker, Deadline(5), 2, attempts=3, backoff=0.001)
+    assert len(calls) == 1 and breaker.snapshot()["consecutive_failures"] == 1
+
+class UnexpectedResponse(Exception):
+    """Stand-in for a client library's error carrying the HTTP status."""
+
+    def __init__(self, status_code):
+        super().__init__(f"Unexpected Response: {status_code}")
+        self.status_code = status_code
+
+def test_failure_classifier_opens_breaker_on_server_errors():
+    """Test that classified 5xx errors open the breaker while 4xx and unknown errors do not."""
+    breaker = CircuitBreaker("qdrant", failure_threshold=5)
+    server_error = lambda error: getattr(error, "status_code", 0) >= 500
+
+    def respond(status):
+        def call(timeout):
+            raise UnexpectedResponse(status)
+        return call
+
+    for _ in range(4):
+        with pytest.raises(UnexpectedResponse):
+            call_with_retries(respond(500), breaker, Deadline(5), 2, attempts=1, failure=server_error)
+    assert breaker.snapshot()["consecutive_failures"] == 4
+
+    # An error the dependency may or may not be to blame for is not judged
+    with pytest.raises(KeyError):
+        call_with_retries(lambda timeout: {}["missing"], breaker, Deadline(5), 2, failure=server_error)
+    assert breaker.snapshot()["consecutive_failures"] == 4
+
+    with pytest.raises(UnexpectedResponse):
+        call_with_retries(respond(500), breaker, Deadline(5), 2, attempts=1, failure=server_error)
+    assert breaker.snapshot()["state"] == "open"
+
+    breaker = CircuitBreaker("qdrant", failure_threshold=5)
+    breaker.record_failure()
+    with pytest.raises(UnexpectedResponse):
+        call_with_retries(respond(404), breaker, Deadline(5), 2, failure=server_error)
+    assert breaker.snapshot()["consecutive_failures"] == 0
+
+def test_deadline_bounds_timeouts_and_retries():
+    """Test that timeouts come from the remaining budget and no retry outlives it."""
+    deadline = Deadline(0.5)
+    assert 0.4 < deadline.timeout(60) <= 0.5
+    assert deadline.timeout(0.1) == 0.1
+    assert Deadline().timeout(60) == 60
+
+    breaker = CircuitBreaker("runner")
+    calls = []
+
+    def timing_out(timeout):
+        calls.append(timeout)
+        raise requests.Timeout()
+
+    with pytest.raises(requests.Timeout):
+        call_with_retries(timing_out, breaker, Deadline(0.05), 1, attempts=5, backoff=0.1)
+    assert len(calls) == 1
+
+    expired = Deadline(0.01)
+    time.sleep(0.02)
+    with pytest.raises(DeadlineExceeded):
+        expired.timeout(60)
+    with pytest.raises(DeadlineExceeded):
+        list(expired.bounded(["token"]))
+    # Running out of time before a call doesn't count against the dependency
+    with pytest.raises(DeadlineExceeded):
+        call_with_retries(timing_out, breaker, expired, 1)
+    assert breaker.snapshot()["consecutive_failures"] == 1
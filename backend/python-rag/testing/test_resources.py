@@ -0,0 +1,68 @@
+"""Test resource sampling and attribution to model runs."""
+
+import os
+
+import pytest
+
+from observability.resources import CgroupSource, ProcessSource, RaplReader, ResourceSampler, estimate_cost
+
+class FakeSource:
+    def __init__(self):
+        self.cpu_seconds = 0.0
+        self.rss_bytes = 0
+
+    def read(self):
+        return self.cpu_seconds, self.rss_bytes
+
+def write(path, name, value):
+    path.mkdir(parents=True, exist_ok=True)
+    (path / name).write_text(f"{value}\n")
+
+def test_overlapping_runs_split_usage():
+    """Test that deltas are shared between the runs active in each interval."""
+    backend, runner = FakeSource(), FakeSource()
+    sampler = ResourceSampler({"backend": backend, "runner": runner}, interval=60)
+    backend.cpu_seconds = runner.cpu_seconds = 100.0
+    first = sampler.start("llama3.1")
+    backend.cpu_seconds, runner.rss_bytes = 101.0, 500
+    second = sampler.start("mistral")
+    backend.cpu_seconds, runner.cpu_seconds, runner.rss_bytes = 103.0, 104.0, 300
+    usage = sampler.stop(first)
+    backend.cpu_seconds = 104.0
+    other = sampler.stop(second)
+
+    # llama3.1 alone for 1s of backend CPU, then half of the next 2s and 4s
+    assert usage["cpu_seconds"] == {"backend": 2.0, "runner": 2.0}
+    assert usage["peak_rss_bytes"]["runner"] == 500 and usage["energy_joules"] is None
+    assert other["cpu_seconds"] == {"backend": 2.0, "runner": 2.0}
+    assert other["cpu_seconds_total"] == 4.0 and other["model"] == "mistral"
+    assert sampler.stop(first) is None
+
+def test_procfs_cgroup_and_rapl_readers(tmp_path):
+    """Test the procfs, cgroup v2 and RAPL readers, including energy counter wrap-around."""
+    cpu_seconds, rss_bytes = ProcessSource([os.getpid()]).read()
+    assert cpu_seconds > 0 and rss_bytes > 0
+
+    cgroup = tmp_path / "cgroup"
+    write(cgroup, "cpu.stat", "usage_usec 2500000\nuser_usec 2000000\nsystem_usec 500000")
+    write(cgroup, "memory.current", 1048576)
+    assert CgroupSource(str(cgroup)).read() == (2.5, 1048576)
+
+    package = tmp_path / "intel-rapl:0"
+    write(package, "energy_uj", 900000)
+    write(package, "max_energy_range_uj", 1000000)
+    # Subdomains (cores, dram) are part of the package and not added again
+    write(tmp_path / "intel-rapl:0:0", "energy_uj", 5)
+    rapl = RaplReader(str(tmp_path))
+    assert rapl.available() and rapl.read() == 0.0
+    write(package, "energy_uj", 100000)
+    assert rapl.read() == pytest.approx(0.2)
+
+def test_cost_estimate():
+    """Test cost and efficiency figures from CPU time and energy."""
+    cost = estimate_cost(3600.0, 3.6e6, 1000, cost_per_cpu_hour=0.5, cost_per_kwh=0.2)
+    assert cost["estimated_cost"] == pytest.approx(0.7)
+    assert cost["cost_per_1m_output_tokens"] == pytest.approx(700.0)
+    assert cost["tokens_per_joule"] == pytest.approx(1000 / 3.6e6)
+    without_energy = estimate_cost(0.0, None, 0)
+    assert without_energy["estimated_cost"] == 0.0 and without_energy["tokens_per_cpu_second"] is None
@@ -0,0 +1,121 @@
+"""Test sandboxed custom test execution."""
+
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+import pytest
+
+from sandbox import SandboxPool, SandboxLimits
+
+@pytest.fixture
+def sandbox_pool():
+    """Small sandbox pool with tight limits."""
+    pool = SandboxPool(
+        size=2,
+        limits=SandboxLimits(cpu_seconds=2, memory_mb=256, wall_timeout=3.0),
+        allowed_urls=["http://localhost:18001"],
+        preload=["json"],
+    )
+    pool.start()
+    yield pool
+    pool.close()
+
+def test_results_collected_per_model(sandbox_pool):
+    """Test that each model's 'results' variable is returned."""
+    code = "results = {'model': MODEL, 'models': MODELS, 'temp': CONFIG['temperature']}"
+    outcomes = asyncio.run(sandbox_pool.run_for_models(
+        code, ["llama3.1", "mistral"], {"temperature": 0.5}, "http://localhost:18001"
+    ))
+    assert set(outcomes) == {"llama3.1", "mistral"}
+    for model, outcome in outcomes.items():
+        assert outcome["status"] == "completed"
+        assert outcome["results"] == {"model": model, "models": [model], "temp": 0.5}
+
+def test_repeated_models_run_once(sandbox_pool):
+    """Test that a model listed twice is run once and its result kept."""
+    outcomes = asyncio.run(sandbox_pool.run_for_models(
+        "results = MODEL", ["mistral", "llama3.1", "mistral"], {}, "http://localhost:18001"
+    ))
+    assert list(outcomes) == ["mistral", "llama3.1"]
+    assert all(outcome["results"] == model for model, outcome in outcomes.items())
+
+def test_missing_results_variable(sandbox_pool):
+    """Test that code without 'results' reports an error."""
+    outcome = asyncio.run(sandbox_pool.run("x = 1", {}))
+    assert outcome["status"] == "error"
+    assert "results" in outcome["error"]
+
+def test_wall_clock_timeout(sandbox_pool):
+    """Test that blocking code is killed at the wall-clock limit."""
+    outcome = asyncio.run(sandbox_pool.run("import time\ntime.sleep(30)\nresults = 1", {}))
+    assert outcome["status"] == "error"
+    assert "timeout" in outcome["error"].lower()
+
+def test_network_restricted_to_api(sandbox_pool):
+    """Test that connections outside the backend API are refused."""
+    code = "import socket\nsocket.create_connection(('10.255.255.1', 80), timeout=1)\nresults = 1"
+    outcome = asyncio.run(sandbox_pool.run(code, {}))
+    assert outcome["status"] == "error"
+    assert "PermissionError" in outcome["error"]
+
+def test_subprocess_blocked(sandbox_pool):
+    """Test that test code cannot start new processes."""
+    outcome = asyncio.run(sandbox_pool.run("import os\nos.system('true')\nresults = 1", {}))
+    assert outcome["status"] == "error"
+    assert "not allowed" in outcome["error"]
+
+def test_worker_reused_after_failure(sandbox_pool):
+    """Test that a crashing test does not take the warm worker down."""
+    asyncio.run(sandbox_pool.run("raise SystemExit(3)", {}))
+    outcome = asyncio.run(sandbox_pool.run("results = [1, 2, 3]", {}))
+    assert outcome["results"] == [1, 2, 3]
+
+def test_raw_fork_exec_cannot_escape(sandbox_pool):
+    """Test that starting a process without audit events (_posixsubprocess.fork_exec) fails."""
+    target = tempfile.mkdtemp()
+    os.chmod(target, 0o777)
+    marker = os.path.join(target, "escaped_sbx")
+    code = (
+        "import gc, os, sys\n"
+        "native = next(o for o in gc.get_objects() if isinstance(o, type(sys)) and o.__name__ == '_posixsubprocess')\n"
+        "errpipe_read, errpipe_write = os.pipe()\n"
+        f"native.fork_exec([b'/bin/touch', {marker.encode()!r}], [b'/bin/touch'], True, (errpipe_write,), None, None,\n"
+        "                  -1, -1, -1, -1, -1, -1, errpipe_read, errpipe_write, False, False, -1,\n"
+        "                  None, None, None, -1, None, False)\n"
+        "results = 'escaped'"
+    )
+    try:
+        outcome = asyncio.run(sandbox_pool.run(code, {}))
+        time.sleep(0.2)
+        assert outcome["status"] == "error"
+        assert not os.path.exists(marker)
+    finally:
+        shutil.rmtree(target, ignore_errors=True)
+
+def test_native_modules_blocked(sandbox_pool):
+    """Test that modules bypassing the audit hook cannot be imported."""
+    for module in ("_posixsubprocess", "_posixshmem", "_ctypes"):
+        outcome = asyncio.run(sandbox_pool.run(f"import {module}\nresults = 1", {}))
+        assert outcome["status"] == "error"
+        assert "not allowed" in outcome["error"]
+
+def test_filesystem_and_environment_isolated(sandbox_pool):
+    """Test that test code sees a scratch directory and no backend environment."""
+    code = (
+        "import os\n"
+        "with open('notes.txt', 'w') as f:\n"
+        "    f.write('ok')\n"
+        "results = {'cwd': os.getcwd(), 'env': sorted(os.environ)}\n"
+        "try:\n"
+        "    open(os.path.join(os.path.dirname(os.getcwd()), 'outside.txt'), 'w')\n"
+        "    results['outside'] = 'written'\n"
+        "except PermissionError:\n"
+        "    results['outside'] = 'blocked'"
+    )
+    outcome = asyncio.run(sandbox_pool.run(code, {}))
+    assert outcome["status"] == "completed"
+    assert outcome["results"]["outside"] == "blocked"
+    assert set(outcome["results"]["env"]) <= {"PATH", "HOME", "TMPDIR", "LANG"}
+    assert not os.path.exists(outcome["results"]["cwd"])
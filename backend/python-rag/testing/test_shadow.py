@@ -0,0 +1,116 @@
+"""Test shadow traffic mirroring to candidate models."""
+
+import asyncio
+import json
+
+import pytest
+
+from evaluation.shadow import ShadowMirror, ShadowStore, shadow_candidates
+
+PRIMARY = {
+    "request_id": "r1",
+    "model": "llama3.1",
+    "response": "Paris is the capital of France",
+    "latency": {"total": 1.0, "ttft": 0.2},
+    "tokens": {"output": 6},
+}
+
+def test_sampling_excludes_primary_model():
+    """Test that only sampled requests are mirrored, never to the primary model itself."""
+    config = {"model": "llama3.1", "shadow_models": ["llama3.1", "mistral"], "shadow_sample_rate": 1.0}
+    assert shadow_candidates(config) == ["mistral"]
+    assert shadow_candidates({**config, "shadow_sample_rate": 0.0}) == []
+    assert shadow_candidates({"model": "llama3.1"}) == []
+
+def test_mirror_records_runs_and_drops_over_cap(tmp_path):
+    """Test recording candidate runs with agreement, errors, and dropping when at capacity."""
+    store = ShadowStore(str(tmp_path / "shadow.db"))
+    statuses = []
+    mirror = ShadowMirror(store, max_concurrency=1, on_result=lambda candidate, status: statuses.append(status))
+
+    async def run(candidate):
+        await asyncio.sleep(0.01)
+        if candidate == "broken":
+            raise RuntimeError("runner returned 500")
+        return {"response": "The capital of France is Paris", "latency": {"total": 2.0, "ttft": 0.5},
+                "tokens": {"output": 6}}
+
+    async def scenario():
+        first = asyncio.create_task(mirror.mirror("capital?", PRIMARY, ["mistral", "broken"], run))
+        await asyncio.sleep(0)
+        # The only slot is taken: this mirror is dropped instead of waiting
+        await mirror.mirror("capital?", PRIMARY, ["qwen3-coder"], run)
+        await first
+        await mirror.mirror("capital?", PRIMARY, ["mistral"], run, busy=lambda: True)
+
+    asyncio.run(scenario())
+    assert statuses == ["dropped", "ok", "error", "dropped"]
+    assert mirror.stats() == {"active": 0, "max_concurrency": 1, "ok": 1, "error": 1, "dropped": 2}
+
+    runs = store.recent()
+    assert [r["candidate_model"] for r in runs] == ["broken", "mistral"]
+    assert runs[0]["error"] == "runner returned 500"
+    assert runs[1]["token_f1"] == 1.0 and 0 < runs[1]["rouge_l"] < 1
+
+    summary = store.summary()
+    mistral = summary["mistral vs llama3.1"]
+    assert mistral["runs"] == 1 and mistral["error_rate"] == 0.0
+    assert mistral["latency_ratio_p50"] == 2.0 and mistral["candidate_ttft_p50"] == 0.5
+    assert summary["broken vs llama3.1"]["error_rate"] == 1.0
+
+class _RunnerResponse:
+    """Model runner response: an SSE stream on 200, an error status otherwise."""
+
+    def __init__(self, status_code, text=""):
+        self.status_code = status_code
+        chunk = {"choices": [{"delta": {"content": text}, "finish_reason": "stop"}]}
+        self.lines = [b"data: " + json.dumps(chunk).encode(), b"data: [DONE]"]
+
+    def iter_lines(self):
+        return iter(self.lines)
+
+    def json(self):
+        return {"detail": "model not found"}
+
+    def close(self):
+        pass
+
+def test_mirrored_runs_leave_query_series_unchanged(tmp_path, monkeypatch):
+    """Test that mirrored runs only reach the shadow store, not /query metrics or drift."""
+    main = pytest.importorskip("main")
+    from prometheus_client import REGISTRY
+
+    def post(url, json, **kwargs):
+        if json["model"] == "missing":
+            return _RunnerResponse(400)
+        return _RunnerResponse(200, "Paris is the capital")
+
+    drift_observations = []
+    monkeypatch.setattr(main.requests, "post", post)
+    monkeypatch.setattr(main.drift_monitor, "observe", lambda *args, **kwargs: drift_observations.append(args))
+    store = ShadowStore(str(tmp_path / "shadow.db"))
+    monkeypatch.setattr(main.shadow_mirror, "store", store)
+
+    def series():
+        query = {"method": "POST", "endpoint": "/query"}
+        return {
+            "requests": REGISTRY.get_sample_value("python_rag_requests_total", query),
+            "latency": REGISTRY.get_sample_value("python_rag_request_duration_seconds_count", query),
+            "errors": REGISTRY.get_sample_value("python_rag_errors_total", {"error_type": "query_error"}),
+            "tokens": REGISTRY.get_sample_value("python_rag_output_tokens_total", {"model": "mistral"}),
+            "tpot": REGISTRY.get_sample_value("python_rag_tpot_seconds_count", {"model": "mistral"}),
+            "tps": REGISTRY.get_sample_value("python_rag_output_tokens_per_second_count", {"model": "mistral"}),
+        }
+
+    config = {**main.config_store.get(), "model_runner": "docker-model-runner", "model": "llama3.1"}
+    request = main.QueryRequest(query="What is the capital of France?", use_rag=False)
+    primary = asyncio.run(main.execute_query(request, config))
+    before = series()
+    assert before["requests"] >= 1 and len(drift_observations) == 1
+
+    asyncio.run(main.mirror_query(request, primary, config, ["mistral", "missing"]))
+    runs = {run["candidate_model"]: run for run in store.recent()}
+    assert runs["mistral"]["status"] == "ok" and runs["mistral"]["rouge_l"] is not None
+    assert runs["missing"]["status"] == "error"
+    assert series() == before
+    assert len(drift_observations) == 1
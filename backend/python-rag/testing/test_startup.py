@@ -0,0 +1,58 @@
+"""Test import timing and warmup readiness."""
+
+import asyncio
+import sys
+
+import pytest
+
+from observability.startup import ImportTimer, StartupTracker
+
+@pytest.fixture
+def slow_modules(tmp_path, monkeypatch):
+    """Two importable modules, the first importing the second, each taking measurable time."""
+    (tmp_path / "startup_outer.py").write_text("import time\ntime.sleep(0.05)\nimport startup_inner\n")
+    (tmp_path / "startup_inner.py").write_text("import time\ntime.sleep(0.05)\n")
+    (tmp_path / "startup_named.py").write_text("import time\ntime.sleep(0.05)\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    yield
+    for name in ("startup_outer", "startup_inner", "startup_named"):
+        sys.modules.pop(name, None)
+
+def test_import_timer(slow_modules):
+    """Test that first-time imports are timed, nested ones attributed to the outer import, by name too."""
+    timer = ImportTimer()
+    timer.install()
+    try:
+        __import__("startup_outer")
+        __import__("startup_outer")  # already loaded: not timed again
+        timer.import_module("startup_named")
+    finally:
+        timer.uninstall()
+    import builtins
+    assert builtins.__import__ != timer._import
+
+    assert timer.timings["startup_outer"] >= 0.1
+    assert "startup_inner" not in timer.timings
+    assert timer.timings["startup_named"] >= 0.05
+    assert [entry["module"] for entry in timer.slowest(1)] == ["startup_outer"]
+
+def test_readiness_waits_for_required_tasks():
+    """Test that failed optional tasks are reported without blocking readiness, required ones block it."""
+    tracker = StartupTracker()
+    order = []
+    tracker.add_task("cache", lambda: order.append("cache"))
+    tracker.add_task("optional", lambda: 1 / 0)
+    assert not tracker.ready and tracker.report()["warmup"]["cache"]["status"] == "pending"
+
+    asyncio.run(tracker.run_warmup())
+    report = tracker.report()
+    assert tracker.ready and report["time_to_ready"] is not None
+    assert order == ["cache"]
+    assert report["warmup"]["optional"]["status"] == "failed"
+    assert "division by zero" in report["warmup"]["optional"]["error"]
+    assert {"warmup_started", "warmup_finished"} <= set(report["phases"])
+
+    blocked = StartupTracker()
+    blocked.add_task("qdrant", lambda: 1 / 0, required=True)
+    asyncio.run(blocked.run_warmup())
+    assert not blocked.ready and blocked.report()["time_to_ready"] is None
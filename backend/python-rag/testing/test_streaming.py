@@ -0,0 +1,54 @@
+"""Test the SSE stream decoder."""
+
+import json
+
+import pytest
+
+from core.streaming import StreamDecoder, StreamError
+
+def _event(payload):
+    return b"data: " + json.dumps(payload).encode()
+
+def _delta(content, finish_reason=None):
+    return _event({"choices": [{"delta": {"content": content}, "finish_reason": finish_reason}]})
+
+def test_decodes_content_until_done():
+    """Test accumulation, skipped non-data lines, final usage and [DONE]."""
+    lines = [
+        b": keep-alive",
+        _event({"choices": [{"delta": {"role": "assistant"}}]}),
+        b"",
+        _delta("Hello"),
+        b"data: {not json",
+        _delta(", world", "stop"),
+        _event({"choices": [], "usage": {"completion_tokens": 2}, "timings": {"cache_n": 5}}),
+        b"data: [DONE]",
+        _delta("ignored"),
+    ]
+    decoder = StreamDecoder().decode(lines)
+    assert decoder.text == "Hello, world"
+    assert decoder.done and not decoder.truncated
+    assert decoder.final["usage"]["completion_tokens"] == 2
+    assert decoder.parse_errors == 1
+
+    stats = decoder.stats()
+    assert stats["chunks"] == 2 and stats["finish_reason"] == "stop"
+    assert stats["ttft"] >= 0 and stats["itl_p50"] == stats["itl_max"] >= 0
+
+def test_stalls_and_decode_rate():
+    """Test ITL percentiles, stall counting and decode rate from arrival times."""
+    decoder = StreamDecoder(start=0.0)
+    decoder.arrivals = [1.0, 1.1, 1.2, 2.2, 2.3]
+    stats = decoder.stats(stall_seconds=0.5)
+    assert stats["ttft"] == 1.0
+    assert stats["stalls"] == 1 and stats["stall_seconds"] == pytest.approx(1.0)
+    assert stats["itl_max"] == pytest.approx(1.0)
+    assert stats["decode_rate"] == pytest.approx(4 / 1.3)
+    assert stats["truncated"]
+
+def test_error_event_raises():
+    """Test that an error event from the runner is raised, not dropped."""
+    decoder = StreamDecoder()
+    with pytest.raises(StreamError, match="out of memory"):
+        decoder.decode([_delta("partial"), _event({"error": {"message": "out of memory"}})])
+    assert decoder.text == "partial"
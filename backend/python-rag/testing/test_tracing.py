@@ -0,0 +1,97 @@
+"""Test trace context propagation, span nesting and OTLP export."""
+
+import json
+import time
+
+import pytest
+
+from observability.tracing import SPAN_KIND_CLIENT, SPAN_KIND_SERVER, SpanExporter, Trace
+
+INCOMING = "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01"
+
+def test_valid_traceparent_continued():
+    """Test that a valid incoming traceparent sets the trace id and the root's parent."""
+    trace = Trace("POST /query", INCOMING, request_id="r1")
+    assert trace.trace_id == "4bf92f3577b34da6a3ce929d0e0e4736"
+    assert trace.root.parent_id == "00f067aa0ba902b7"
+    assert trace.root.kind == SPAN_KIND_SERVER and trace.root.attributes == {"request_id": "r1"}
+    # Downstream calls continue the trace from the current span
+    assert trace.traceparent == f"00-{trace.trace_id}-{trace.root.span_id}-01"
+
+@pytest.mark.parametrize("header", [
+    None,
+    "",
+    "garbage",
+    "01-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01",  # unknown version
+    "00-4BF92F3577B34DA6A3CE929D0E0E4736-00f067aa0ba902b7-01",  # uppercase
+    "00-4bf92f3577b34da6a3ce929d0e0e473-00f067aa0ba902b7-01",   # short trace id
+    "00-00000000000000000000000000000000-00f067aa0ba902b7-01",  # all-zero trace id
+    "00-4bf92f3577b34da6a3ce929d0e0e4736-0000000000000000-01",  # all-zero parent id
+])
+def test_invalid_traceparent_starts_new_trace(header):
+    """Test that malformed or invalid headers are ignored rather than propagated."""
+    trace = Trace("POST /query", header)
+    assert len(trace.trace_id) == 32 and trace.trace_id != "4bf92f3577b34da6a3ce929d0e0e4736"
+    assert int(trace.trace_id, 16) != 0
+    assert trace.root.parent_id is None
+
+def test_span_nesting_and_timing():
+    """Test parent ids of nested and after-the-fact spans, error capture and stage timings."""
+    trace = Trace("POST /query", INCOMING)
+    with trace.span("retrieve") as retrieve:
+        with trace.span("vector_search", SPAN_KIND_CLIENT, limit=3) as search:
+            assert trace.traceparent.split("-")[2] == search.span_id
+            time.sleep(0.01)
+        start = time.time_ns()
+        recorded = trace.add_span("rerank", start - 5_000_000, start, documents=3)
+    with pytest.raises(RuntimeError):
+        with trace.span("generate") as generate:
+            raise RuntimeError("runner down")
+    trace.root.end_ns = time.time_ns()
+
+    assert retrieve.parent_id == trace.root.span_id
+    assert search.parent_id == retrieve.span_id and search.kind == SPAN_KIND_CLIENT
+    assert recorded.parent_id == retrieve.span_id
+    assert generate.parent_id == trace.root.span_id
+    assert generate.error == "RuntimeError: runner down"
+    assert trace.traceparent.split("-")[2] == trace.root.span_id
+
+    timings = trace.timings()
+    assert timings["vector_search"] >= 0.01
+    assert timings["retrieve"] >= timings["vector_search"]
+    assert timings["rerank"] == pytest.approx(0.005)
+    assert timings["total"] >= timings["retrieve"] + timings["generate"]
+
+def test_otlp_export_payload(tmp_path):
+    """Test the OTLP/JSON ExportTraceServiceRequest written by the exporter."""
+    exporter = SpanExporter(str(tmp_path / "traces.jsonl"), "", max_bytes=1 << 20, flush_interval=0.05)
+    trace = Trace("POST /query", INCOMING, cached=True, tokens=12, score=0.5)
+    with trace.span("generate"):
+        pass
+    trace.root.end_ns = time.time_ns()
+    trace.root.error = "boom"
+    exporter.submit(trace)
+
+    path = tmp_path / "traces.jsonl"
+    for _ in range(100):
+        if path.exists() and path.read_text():
+            break
+        time.sleep(0.02)
+    payload = json.loads(path.read_text().splitlines()[0])
+
+    (resource_spans,) = payload["resourceSpans"]
+    resource = {a["key"]: a["value"] for a in resource_spans["resource"]["attributes"]}
+    assert "stringValue" in resource["service.name"] and "intValue" in resource["process.pid"]
+    (scope_spans,) = resource_spans["scopeSpans"]
+    assert scope_spans["scope"]["name"] == "python-rag.tracing"
+    root, child = scope_spans["spans"]
+    assert root["traceId"] == child["traceId"] == trace.trace_id
+    assert root["parentSpanId"] == "00f067aa0ba902b7" and child["parentSpanId"] == root["spanId"]
+    assert root["kind"] == SPAN_KIND_SERVER and root["status"] == {"code": 2, "message": "boom"}
+    assert child["status"] == {"code": 1}
+    assert int(root["endTimeUnixNano"]) >= int(root["startTimeUnixNano"])
+    assert {a["key"]: a["value"] for a in root["attributes"]} == {
+        "cached": {"boolValue": True},
+        "tokens": {"intValue": "12"},
+        "score": {"doubleValue": 0.5},
+    }
@@ -1,7 +1,10 @@
-use actix_web::{web, App, HttpServer, HttpResponse, Result as ActixResult};
+use actix_web::{http::header, web, App, HttpRequest, HttpServer, HttpResponse, Result as ActixResult};
 use serde::{Deserialize, Serialize};
 use prometheus::{Encoder, TextEncoder, Counter, Histogram, HistogramOpts, Gauge, Opts};
 
+mod tensor;
+use tensor::{decode_tensors, encode_tensors, top_k_row, Tensor, TENSOR_CONTENT_TYPE};
+
 // Prometheus metrics
 lazy_static::lazy_static! {
     static ref REQUEST_COUNT: Counter = Counter::with_opts(
@@ -44,6 +47,14 @@ struct MathResponse {
     duration_ms: f64,
 }
 
+// Query parameters of binary /compute/math requests
+#[derive(Deserialize)]
+struct TensorParams {
+    operation: String,
+    k: Option<usize>,
+    metric: Option<String>,
+}
+
 // High-performance matrix multiplication using ndarray
 fn compute_matrix_multiply(size: usize) -> f64 {
     use ndarray::Array2;
@@ -93,37 +104,176 @@ async fn benchmark_compute(req: web::Json<BenchmarkRequest>) -> ActixResult<Http
     }))
 }
 
-// Math computation endpoint
-async fn compute_math(req: web::Json<MathRequest>) -> ActixResult<HttpResponse> {
-    let timer = REQUEST_LATENCY.start_timer();
-    REQUEST_COUNT.inc();
+// Element-wise operations on a flat array
+fn compute_elementwise(operation: &str, data: &[f64]) -> Option<Vec<f64>> {
+    use rayon::prelude::*;
     
-    let start = std::time::Instant::now();
+    match operation {
+        "embedding" => Some(compute_embeddings(data)),
+        "multiply" => Some(data.par_iter().map(|x| x * 2.0).collect()),
+        "add" => Some(data.par_iter().map(|x| x + 1.0).collect()),
+        _ => None,
+    }
+}
+
+fn to_matrix(tensor: Tensor) -> Result<ndarray::Array2<f32>, String> {
+    let (rows, cols) = match tensor.dims.as_slice() {
+        [cols] => (1, *cols),
+        [rows, cols] => (*rows, *cols),
+        _ => return Err("Expected a 1-D or 2-D tensor".to_string()),
+    };
+    ndarray::Array2::from_shape_vec((rows, cols), tensor.into_f32()).map_err(|e| e.to_string())
+}
+
+fn normalize_rows(mut matrix: ndarray::Array2<f32>) -> ndarray::Array2<f32> {
+    for mut row in matrix.rows_mut() {
+        let norm = row.iter().map(|x| x * x).sum::<f32>().sqrt();
+        if norm > 0.0 {
+            row.mapv_inplace(|x| x / norm);
+        }
+    }
+    matrix
+}
+
+// Queries (m x d) and documents (n x d), rows L2-normalized for cosine
+fn matrix_pair(inputs: Vec<Tensor>, cosine: bool) -> Result<(ndarray::Array2<f32>, ndarray::Array2<f32>), String> {
+    let mut inputs = inputs.into_iter();
+    let (queries, docs) = match (inputs.next(), inputs.next()) {
+        (Some(q), Some(d)) => (to_matrix(q)?, to_matrix(d)?),
+        _ => return Err("Expected query and document tensors".to_string()),
+    };
+    if queries.ncols() != docs.ncols() {
+        return Err(format!("Dimension mismatch: {} vs {}", queries.ncols(), docs.ncols()));
+    }
+    if cosine {
+        Ok((normalize_rows(queries), normalize_rows(docs)))
+    } else {
+        Ok((queries, docs))
+    }
+}
+
+fn run_tensor_operation(params: &TensorParams, inputs: Vec<Tensor>) -> Result<Vec<Tensor>, String> {
+    use rayon::prelude::*;
     
-    let result = match req.operation.as_str() {
-        "embedding" => compute_embeddings(&req.data),
-        "multiply" => {
-            use rayon::prelude::*;
-            req.data.par_iter().map(|x| x * 2.0).collect()
+    let cosine = params.metric.as_deref().unwrap_or("cosine") == "cosine";
+    match params.operation.as_str() {
+        // Full (m x n) similarity matrix
+        "similarity" => {
+            let (queries, docs) = matrix_pair(inputs, cosine)?;
+            let scores = queries.dot(&docs.t());
+            let (m, n) = scores.dim();
+            Ok(vec![Tensor::f32(vec![m, n], scores.into_raw_vec())])
         }
-        "add" => {
-            use rayon::prelude::*;
-            req.data.par_iter().map(|x| x + 1.0).collect()
+        // Similarity of row i of the first tensor with row i of the second
+        "pairwise" => {
+            let (a, b) = matrix_pair(inputs, cosine)?;
+            if a.nrows() != b.nrows() {
+                return Err(format!("Row count mismatch: {} vs {}", a.nrows(), b.nrows()));
+            }
+            let scores: Vec<f32> = (0..a.nrows())
+                .into_par_iter()
+                .map(|i| a.row(i).dot(&b.row(i)))
+                .collect();
+            Ok(vec![Tensor::f32(vec![scores.len()], scores)])
         }
-        _ => return Ok(HttpResponse::BadRequest().json(serde_json::json!({
-            "error": "Unknown operation"
-        }))),
+        // Best k documents per query: u32 indices and f32 scores, both (m x k)
+        "top_k" => {
+            let (queries, docs) = matrix_pair(inputs, cosine)?;
+            let k = params.k.unwrap_or(10).min(docs.nrows());
+            let scores = queries.dot(&docs.t());
+            let rows: Vec<Vec<(u32, f32)>> = (0..scores.nrows())
+                .into_par_iter()
+                .map(|i| {
+                    // Matrix products are row-major, so each row is contiguous
+                    let row = scores.row(i);
+                    top_k_row(row.as_slice().expect("row-major scores"), k)
+                })
+                .collect();
+            let m = rows.len();
+            let indices = rows.iter().flat_map(|r| r.iter().map(|&(j, _)| j)).collect();
+            let values = rows.iter().flat_map(|r| r.iter().map(|&(_, s)| s)).collect();
+            Ok(vec![Tensor::u32(vec![m, k], indices), Tensor::f32(vec![m, k], values)])
+        }
+        operation => {
+            let input = inputs.into_iter().next().ok_or_else(|| "Expected one tensor".to_string())?;
+            let result = compute_elementwise(operation, &input.into_f64())
+                .ok_or_else(|| "Unknown operation".to_string())?;
+            Ok(vec![Tensor::f64(vec![result.len()], result)])
+        }
+    }
+}
+
+fn bad_request(message: String) -> HttpResponse {
+    HttpResponse::BadRequest().json(serde_json::json!({ "error": message }))
+}
+
+fn compute_math_json(body: &[u8]) -> HttpResponse {
+    let req: MathRequest = match serde_json::from_slice(body) {
+        Ok(req) => req,
+        Err(e) => return bad_request(e.to_string()),
+    };
+    
+    let start = std::time::Instant::now();
+    
+    let result = match compute_elementwise(&req.operation, &req.data) {
+        Some(result) => result,
+        None => return bad_request("Unknown operation".to_string()),
     };
     
     let duration = start.elapsed();
     let duration_ms = duration.as_secs_f64() * 1000.0;
     
-    timer.observe_duration();
-    
-    Ok(HttpResponse::Ok().json(MathResponse {
+    HttpResponse::Ok().json(MathResponse {
         result,
         duration_ms,
-    }))
+    })
+}
+
+fn compute_math_tensor(req: &HttpRequest, body: &[u8]) -> HttpResponse {
+    let params = match web::Query::<TensorParams>::from_query(req.query_string()) {
+        Ok(params) => params.into_inner(),
+        Err(e) => return bad_request(e.to_string()),
+    };
+    let inputs = match decode_tensors(body) {
+        Ok(inputs) => inputs,
+        Err(e) => return bad_request(e),
+    };
+    
+    let start = std::time::Instant::now();
+    
+    let outputs = match run_tensor_operation(&params, inputs) {
+        Ok(outputs) => outputs,
+        Err(e) => return bad_request(e),
+    };
+    
+    let duration_ms = start.elapsed().as_secs_f64() * 1000.0;
+    COMPUTE_OPERATIONS.inc();
+    
+    HttpResponse::Ok()
+        .content_type(TENSOR_CONTENT_TYPE)
+        .insert_header(("X-Compute-Duration-Ms", format!("{:.3}", duration_ms)))
+        .body(encode_tensors(&outputs))
+}
+
+// Math computation endpoint: JSON, or packed tensors with the operation in the query string
+async fn compute_math(req: HttpRequest, body: web::Bytes) -> ActixResult<HttpResponse> {
+    let timer = REQUEST_LATENCY.start_timer();
+    REQUEST_COUNT.inc();
+    
+    let is_tensor = req.headers()
+        .get(header::CONTENT_TYPE)
+        .and_then(|v| v.to_str().ok())
+        .map_or(false, |v| v.starts_with(TENSOR_CONTENT_TYPE));
+    
+    let response = if is_tensor {
+        compute_math_tensor(&req, &body)
+    } else {
+        compute_math_json(&body)
+    };
+    
+    timer.observe_duration();
+    
+    Ok(response)
 }
 
 // Health check endpoint
@@ -154,10 +304,17 @@ async fn main() -> std::io::Result<()> {
     prometheus::register(Box::new(COMPUTE_OPERATIONS.clone())).unwrap();
     prometheus::register(Box::new(TOKENS_PER_SECOND.clone())).unwrap();
     
+    // Request bodies are buffered in full; embedding matrices can be large
+    let max_payload_mb: usize = std::env::var("MAX_PAYLOAD_MB")
+        .ok()
+        .and_then(|v| v.parse().ok())
+        .unwrap_or(256);
+    
     println!("Starting Rust/Wasm Compute Service on port 8080");
     
-    HttpServer::new(|| {
+    HttpServer::new(move || {
         App::new()
+            .app_data(web::PayloadConfig::new(max_payload_mb * 1024 * 1024))
             .route("/health", web::get().to(health))
             .route("/metrics", web::get().to(metrics))
             .route("/benchmark", web::post().to(benchmark_compute))
@@ -0,0 +1,266 @@
+// Packed little-endian tensor payloads for /compute/math
+//
+// Layout (all integers little-endian):
+//   magic   b"PKT1"
+//   count   u32                      number of tensors
+//   per tensor:
+//     dtype u8                       1 = f32, 2 = f64, 3 = u32
+//     ndim  u8
+//     pad   u16
+//     dims  u32 * ndim
+//     data  product(dims) * itemsize bytes, row-major
+
+pub const TENSOR_CONTENT_TYPE: &str = "application/x-penknife-tensor";
+const MAGIC: &[u8; 4] = b"PKT1";
+const MAX_TENSORS: usize = 64;
+
+pub enum TensorData {
+    F32(Vec<f32>),
+    F64(Vec<f64>),
+    U32(Vec<u32>),
+}
+
+pub struct Tensor {
+    pub dims: Vec<usize>,
+    pub data: TensorData,
+}
+
+impl Tensor {
+    pub fn f32(dims: Vec<usize>, data: Vec<f32>) -> Self {
+        Tensor { dims, data: TensorData::F32(data) }
+    }
+
+    pub fn f64(dims: Vec<usize>, data: Vec<f64>) -> Self {
+        Tensor { dims, data: TensorData::F64(data) }
+    }
+
+    pub fn u32(dims: Vec<usize>, data: Vec<u32>) -> Self {
+        Tensor { dims, data: TensorData::U32(data) }
+    }
+
+    pub fn into_f32(self) -> Vec<f32> {
+        match self.data {
+            TensorData::F32(v) => v,
+            TensorData::F64(v) => v.into_iter().map(|x| x as f32).collect(),
+            TensorData::U32(v) => v.into_iter().map(|x| x as f32).collect(),
+        }
+    }
+
+    pub fn into_f64(self) -> Vec<f64> {
+        match self.data {
+            TensorData::F32(v) => v.into_iter().map(|x| x as f64).collect(),
+            TensorData::F64(v) => v,
+            TensorData::U32(v) => v.into_iter().map(|x| x as f64).collect(),
+        }
+    }
+}
+
+struct Reader<'a> {
+    buf: &'a [u8],
+    pos: usize,
+}
+
+impl<'a> Reader<'a> {
+    fn take(&mut self, n: usize) -> Result<&'a [u8], String> {
+        let end = self.pos.checked_add(n).filter(|&end| end <= self.buf.len())
+            .ok_or_else(|| "Truncated tensor payload".to_string())?;
+        let slice = &self.buf[self.pos..end];
+        self.pos = end;
+        Ok(slice)
+    }
+
+    fn u8(&mut self) -> Result<u8, String> {
+        Ok(self.take(1)?[0])
+    }
+
+    fn u32(&mut self) -> Result<u32, String> {
+        let b = self.take(4)?;
+        Ok(u32::from_le_bytes([b[0], b[1], b[2], b[3]]))
+    }
+}
+
+pub fn decode_tensors(body: &[u8]) -> Result<Vec<Tensor>, String> {
+    let mut reader = Reader { buf: body, pos: 0 };
+    if reader.take(4)? != MAGIC {
+        return Err("Bad tensor payload magic".to_string());
+    }
+    let count = reader.u32()? as usize;
+    if count > MAX_TENSORS {
+        return Err(format!("Too many tensors: {}", count));
+    }
+
+    let mut tensors = Vec::with_capacity(count);
+    for _ in 0..count {
+        let dtype = reader.u8()?;
+        let ndim = reader.u8()? as usize;
+        reader.take(2)?;
+        let mut dims = Vec::with_capacity(ndim);
+        for _ in 0..ndim {
+            dims.push(reader.u32()? as usize);
+        }
+        let len = dims.iter().try_fold(1usize, |acc, &d| acc.checked_mul(d))
+            .ok_or_else(|| "Tensor too large".to_string())?;
+        let itemsize = match dtype {
+            1 | 3 => 4,
+            2 => 8,
+            _ => return Err(format!("Unknown tensor dtype: {}", dtype)),
+        };
+        let bytes = reader.take(len.checked_mul(itemsize).ok_or_else(|| "Tensor too large".to_string())?)?;
+        let data = match dtype {
+            1 => TensorData::F32(bytes.chunks_exact(4)
+                .map(|c| f32::from_le_bytes([c[0], c[1], c[2], c[3]]))
+                .collect()),
+            2 => TensorData::F64(bytes.chunks_exact(8)
+                .map(|c| f64::from_le_bytes([c[0], c[1], c[2], c[3], c[4], c[5], c[6], c[7]]))
+                .collect()),
+            _ => TensorData::U32(bytes.chunks_exact(4)
+                .map(|c| u32::from_le_bytes([c[0], c[1], c[2], c[3]]))
+                .collect()),
+        };
+        tensors.push(Tensor { dims, data });
+    }
+    Ok(tensors)
+}
+
+pub fn encode_tensors(tensors: &[Tensor]) -> Vec<u8> {
+    let size: usize = tensors.iter().map(|t| {
+        let items = match &t.data {
+            TensorData::F32(v) => v.len() * 4,
+            TensorData::F64(v) => v.len() * 8,
+            TensorData::U32(v) => v.len() * 4,
+        };
+        4 + 4 * t.dims.len() + items
+    }).sum();
+    let mut out = Vec::with_capacity(8 + size);
+    out.extend_from_slice(MAGIC);
+    out.extend_from_slice(&(tensors.len() as u32).to_le_bytes());
+    for tensor in tensors {
+        let dtype: u8 = match tensor.data {
+            TensorData::F32(_) => 1,
+            TensorData::F64(_) => 2,
+            TensorData::U32(_) => 3,
+        };
+        out.push(dtype);
+        out.push(tensor.dims.len() as u8);
+        out.extend_from_slice(&[0, 0]);
+        for &d in &tensor.dims {
+            out.extend_from_slice(&(d as u32).to_le_bytes());
+        }
+        match &tensor.data {
+            TensorData::F32(v) => v.iter().for_each(|x| out.extend_from_slice(&x.to_le_bytes())),
+            TensorData::F64(v) => v.iter().for_each(|x| out.extend_from_slice(&x.to_le_bytes())),
+            TensorData::U32(v) => v.iter().for_each(|x| out.extend_from_slice(&x.to_le_bytes())),
+        }
+    }
+    out
+}
+
+// Indices and scores of the k largest entries of each row, best first
+pub fn top_k_row(row: &[f32], k: usize) -> Vec<(u32, f32)> {
+    let k = k.min(row.len());
+    let mut order: Vec<u32> = (0..row.len() as u32).collect();
+    let cmp = |a: &u32, b: &u32| {
+        row[*b as usize].partial_cmp(&row[*a as usize]).unwrap_or(std::cmp::Ordering::Equal)
+    };
+    if k < order.len() {
+        order.select_nth_unstable_by(k, cmp);
+        order.truncate(k);
+    }
+    order.sort_unstable_by(cmp);
+    order.into_iter().map(|j| (j, row[j as usize])).collect()
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    fn header(count: u32) -> Vec<u8> {
+        let mut out = MAGIC.to_vec();
+        out.extend_from_slice(&count.to_le_bytes());
+        out
+    }
+
+    fn error(body: &[u8]) -> String {
+        match decode_tensors(body) {
+            Ok(_) => panic!("decoded a malformed payload"),
+            Err(e) => e,
+        }
+    }
+
+    #[test]
+    fn roundtrip_dtypes_scalars_and_empty() {
+        let body = encode_tensors(&[
+            Tensor::f32(vec![2, 2], vec![1.0, -2.0, 3.5, 0.0]),
+            Tensor::f64(vec![], vec![2.5]),
+            Tensor::u32(vec![0, 384], vec![]),
+            Tensor::u32(vec![3], vec![1, 2, u32::MAX]),
+        ]);
+        let tensors = decode_tensors(&body).unwrap();
+        assert_eq!(tensors.len(), 4);
+        assert_eq!(tensors[0].dims, vec![2, 2]);
+        assert!(matches!(&tensors[0].data, TensorData::F32(v) if v == &[1.0, -2.0, 3.5, 0.0]));
+        assert!(tensors[1].dims.is_empty());
+        assert!(matches!(&tensors[1].data, TensorData::F64(v) if v == &[2.5]));
+        assert_eq!(tensors[2].dims, vec![0, 384]);
+        assert!(matches!(&tensors[2].data, TensorData::U32(v) if v.is_empty()));
+        assert!(matches!(&tensors[3].data, TensorData::U32(v) if v == &[1, 2, u32::MAX]));
+    }
+
+    #[test]
+    fn rejects_bad_magic_and_truncated_headers() {
+        assert_eq!(error(b""), "Truncated tensor payload");
+        assert_eq!(error(b"PKT"), "Truncated tensor payload");
+        assert_eq!(error(b"PKT2\x00\x00\x00\x00"), "Bad tensor payload magic");
+        assert_eq!(error(b"PKT1\x01\x00"), "Truncated tensor payload");
+        // Count says one tensor, but its header is cut short
+        let mut body = header(1);
+        body.extend_from_slice(&[1, 2, 0]);
+        assert_eq!(error(&body), "Truncated tensor payload");
+        // Dims promised but missing
+        let mut body = header(1);
+        body.extend_from_slice(&[1, 2, 0, 0]);
+        body.extend_from_slice(&4u32.to_le_bytes());
+        assert_eq!(error(&body), "Truncated tensor payload");
+    }
+
+    #[test]
+    fn rejects_truncated_data_and_bad_dtypes() {
+        let full = encode_tensors(&[Tensor::f32(vec![2, 3], vec![0.0; 6])]);
+        for cut in [full.len() - 1, full.len() - 4, 16] {
+            assert_eq!(error(&full[..cut]), "Truncated tensor payload");
+        }
+        let mut body = full.clone();
+        body[8] = 7;
+        assert_eq!(error(&body), "Unknown tensor dtype: 7");
+        // Count larger than the tensors present
+        let mut body = header(2);
+        body.extend_from_slice(&full[8..]);
+        assert_eq!(error(&body), "Truncated tensor payload");
+    }
+
+    #[test]
+    fn rejects_oversized_headers_without_allocating() {
+        assert_eq!(error(&header(MAX_TENSORS as u32 + 1)), format!("Too many tensors: {}", MAX_TENSORS + 1));
+        // Dims whose product overflows usize
+        let mut body = header(1);
+        body.extend_from_slice(&[1, 4, 0, 0]);
+        for _ in 0..4 {
+            body.extend_from_slice(&u32::MAX.to_le_bytes());
+        }
+        assert_eq!(error(&body), "Tensor too large");
+        // Plausible dims with no data behind them
+        let mut body = header(1);
+        body.extend_from_slice(&[2, 2, 0, 0]);
+        body.extend_from_slice(&65536u32.to_le_bytes());
+        body.extend_from_slice(&65536u32.to_le_bytes());
+        assert_eq!(error(&body), "Truncated tensor payload");
+    }
+
+    #[test]
+    fn top_k_rows_best_first() {
+        let row = [0.1, 0.9, -1.0, 0.5];
+        assert_eq!(top_k_row(&row, 2), vec![(1, 0.9), (3, 0.5)]);
+        assert_eq!(top_k_row(&row, 10).len(), 4);
+        assert!(top_k_row(&row, 0).is_empty());
+    }
+}
@@ -2,7 +2,7 @@
 set -e
 
 echo "Installing core dependencies..."
-pip install --no-cache-dir fastapi==0.104.1 uvicorn[standard]==0.24.0 requests==2.31.0 pydantic==2.5.2
+pip install --no-cache-dir fastapi==0.104.1 uvicorn[standard]==0.24.0 httpx==0.25.2 pydantic==2.5.2
 
 echo "Installing llama-index separately first (to avoid hang during deepeval install)..."
 # Install llama-index core first with timeout - this is the problematic dependency
@@ -2,11 +2,15 @@
 
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
-import requests
+from typing import List, Optional, Dict, Any, AsyncIterator
+import asyncio
+import httpx
+import json
 import os
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
@@ -30,15 +34,43 @@ app.add_middleware(
 )
 
 API_URL = os.getenv("API_URL", "http://python-rag:8000")
+# Forwarding limits: concurrent in-flight requests to the evaluation API,
+# cases per batch request, and per-request timeout in seconds
+EVAL_CONCURRENCY = int(os.getenv("EVAL_CONCURRENCY", "8"))
+EVAL_BATCH_SIZE = int(os.getenv("EVAL_BATCH_SIZE", "16"))
+EVAL_TIMEOUT = float(os.getenv("EVAL_TIMEOUT", "120"))
+
+# Pooled client, created on startup
+http_client: Optional[httpx.AsyncClient] = None
+# None until probed; then whether the API exposes /evaluate/batch
+batch_endpoint_available: Optional[bool] = None
 
 class EvaluationRequest(BaseModel):
     test_cases: List[Dict[str, Any]]
     model: Optional[str] = None
+    stream: bool = True
+
+@app.on_event("startup")
+async def startup():
+    global http_client
+    http_client = httpx.AsyncClient(
+        base_url=API_URL,
+        timeout=httpx.Timeout(EVAL_TIMEOUT, connect=10.0),
+        limits=httpx.Limits(
+            max_connections=EVAL_CONCURRENCY,
+            max_keepalive_connections=EVAL_CONCURRENCY
+        )
+    )
+
+@app.on_event("shutdown")
+async def shutdown():
+    if http_client is not None:
+        await http_client.aclose()
 
 @app.get("/")
 async def root():
     return {
-        "message": "DeepEval Service", 
+        "message": "DeepEval Service",
         "status": "running",
         "deepeval_available": DEEPEVAL_AVAILABLE
     }
@@ -47,29 +79,155 @@ async def root():
 async def health():
     return {"status": "healthy"}
 
+def build_payload(test_case: Dict[str, Any], model: Optional[str]) -> Dict[str, Any]:
+    """Map a test case onto the comprehensive evaluation request body"""
+    return {
+        "query": test_case.get("query", ""),
+        "context": test_case.get("context", []),
+        "answer": test_case.get("answer", ""),
+        "ground_truth": test_case.get("ground_truth"),
+        "model": model or test_case.get("model")
+    }
+
+def error_detail(response: httpx.Response) -> str:
+    try:
+        return str(response.json().get("detail", response.text))
+    except ValueError:
+        return response.text[:500]
+
+async def evaluate_case(index: int, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Forward one test case, keeping errors and timing"""
+    start = time.perf_counter()
+    try:
+        response = await http_client.post("/evaluate/comprehensive", json=payload)
+        duration = time.perf_counter() - start
+        if response.status_code == 200:
+            return {"index": index, "status": "ok", "result": response.json(), "duration": duration}
+        return {
+            "index": index,
+            "status": "error",
+            "status_code": response.status_code,
+            "error": error_detail(response),
+            "duration": duration
+        }
+    except httpx.HTTPError as e:
+        return {
+            "index": index,
+            "status": "error",
+            "error": f"{type(e).__name__}: {e}",
+            "duration": time.perf_counter() - start
+        }
+    except ValueError as e:
+        return {
+            "index": index,
+            "status": "error",
+            "error": f"Invalid response: {e}",
+            "duration": time.perf_counter() - start
+        }
+
+def batch_errors(indices: List[int], error: str, duration: float, **fields: Any) -> List[Dict[str, Any]]:
+    """The same error row for every case of a batch"""
+    return [{"index": i, "status": "error", **fields, "error": error, "duration": duration} for i in indices]
+
+async def evaluate_batch(indices: List[int], payloads: List[Dict[str, Any]]) -> Optional[List[Dict[str, Any]]]:
+    """
+    Forward a batch to /evaluate/batch.
+
+    Returns None when the API has no batch endpoint, so the caller can fall
+    back to per-case forwarding.
+    """
+    global batch_endpoint_available
+    start = time.perf_counter()
+    try:
+        response = await http_client.post("/evaluate/batch", json={"cases": payloads})
+    except httpx.HTTPError as e:
+        return batch_errors(indices, f"{type(e).__name__}: {e}", time.perf_counter() - start)
+    duration = time.perf_counter() - start
+
+    if response.status_code in (404, 405):
+        batch_endpoint_available = False
+        return None
+    batch_endpoint_available = True
+
+    if response.status_code != 200:
+        return batch_errors(indices, error_detail(response), duration, status_code=response.status_code)
+
+    try:
+        payload = response.json()
+    except ValueError as e:
+        return batch_errors(indices, f"Invalid batch response: {e}", duration)
+    items = payload.get("results") if isinstance(payload, dict) else None
+    if not isinstance(items, list):
+        return batch_errors(indices, "Invalid batch response: no results list", duration)
+
+    # One row per case even when the response is short or has malformed entries
+    results = []
+    for position, i in enumerate(indices):
+        if position >= len(items):
+            error = f"Missing from batch response ({len(items)} results for {len(indices)} cases)"
+        elif not isinstance(items[position], dict):
+            error = "Malformed entry in batch response"
+        else:
+            results.append({"index": i, **items[position]})
+            continue
+        results.append({"index": i, "status": "error", "error": error, "duration": duration})
+    return results
+
+async def run_evaluation(request: EvaluationRequest) -> AsyncIterator[Dict[str, Any]]:
+    """Forward all test cases with bounded concurrency, yielding results as they complete"""
+    payloads = [build_payload(tc, request.model) for tc in request.test_cases]
+    semaphore = asyncio.Semaphore(EVAL_CONCURRENCY)
+
+    async def run_chunk(indices: List[int]) -> List[Dict[str, Any]]:
+        async with semaphore:
+            if batch_endpoint_available is not False and len(indices) > 1:
+                results = await evaluate_batch(indices, [payloads[i] for i in indices])
+                if results is not None:
+                    return results
+        return list(await asyncio.gather(*[run_single(i) for i in indices]))
+
+    async def run_single(index: int) -> Dict[str, Any]:
+        async with semaphore:
+            return await evaluate_case(index, payloads[index])
+
+    indices = list(range(len(payloads)))
+    chunks = [indices[i:i + EVAL_BATCH_SIZE] for i in range(0, len(indices), EVAL_BATCH_SIZE)]
+    for finished in asyncio.as_completed([run_chunk(chunk) for chunk in chunks]):
+        for result in await finished:
+            yield result
+
+async def ndjson_stream(request: EvaluationRequest) -> AsyncIterator[bytes]:
+    start = time.perf_counter()
+    completed = failed = 0
+    async for result in run_evaluation(request):
+        completed += 1
+        failed += result["status"] != "ok"
+        yield (json.dumps(result) + "\n").encode()
+    summary = {
+        "summary": {
+            "total": completed,
+            "succeeded": completed - failed,
+            "failed": failed,
+            "duration": time.perf_counter() - start
+        }
+    }
+    yield (json.dumps(summary) + "\n").encode()
+
 @app.post("/evaluate")
 async def evaluate(request: EvaluationRequest):
     """Run DeepEval evaluation"""
     try:
         # DeepEval integration would go here
         # For now, proxy to main evaluation service
-        results = []
-        for test_case in request.test_cases:
-            # Call comprehensive evaluation endpoint
-            eval_response = requests.post(
-                f"{API_URL}/evaluate/comprehensive",
-                json={
-                    "query": test_case.get("query", ""),
-                    "context": test_case.get("context", []),
-                    "answer": test_case.get("answer", ""),
-                    "ground_truth": test_case.get("ground_truth"),
-                    "model": request.model or test_case.get("model")
-                }
-            )
-            if eval_response.status_code == 200:
-                results.append(eval_response.json())
-        
-        return {"results": results}
+        if request.stream:
+            return StreamingResponse(ndjson_stream(request), media_type="application/x-ndjson")
+
+        results = [r async for r in run_evaluation(request)]
+        results.sort(key=lambda r: r["index"])
+        return {
+            "results": [r["result"] for r in results if r["status"] == "ok"],
+            "errors": [r for r in results if r["status"] != "ok"],
+            "timings": [r["duration"] for r in results]
+        }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-
@@ -0,0 +1,36 @@
+"""Pytest configuration and fixtures for the DeepEval service."""
+
+import pytest
+import os
+import sys
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import main
+
+@pytest.fixture
+def evaluation_api():
+    """
+    Point the forwarding client at an in-process fake of the evaluation API.
+
+    Returns a function taking a handler ``(request) -> httpx.Response``; the
+    requests it received are collected in ``calls``.
+    """
+    import httpx
+
+    calls = []
+
+    def install(handler):
+        calls.clear()
+
+        def record(request):
+            calls.append(request)
+            return handler(request)
+        main.http_client = httpx.AsyncClient(base_url="http://api", transport=httpx.MockTransport(record))
+        return calls
+
+    main.batch_endpoint_available = None
+    yield install
+    main.http_client = None
+    main.batch_endpoint_available = None
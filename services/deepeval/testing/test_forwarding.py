@@ -0,0 +1,82 @@
+"""Test forwarding of test cases to the evaluation API."""
+
+import asyncio
+import json
+
+import httpx
+
+import main
+
+def cases(n):
+    return [{"query": f"q{i}", "context": ["c"], "answer": f"a{i}"} for i in range(n)]
+
+def run(request):
+    async def collect():
+        return [json.loads(line) async for line in main.ndjson_stream(request)]
+    return asyncio.run(collect())
+
+def batch_ok(request):
+    """Evaluation API with /evaluate/batch scoring every case."""
+    body = json.loads(request.content)
+    if request.url.path == "/evaluate/batch":
+        rows = [{"status": "ok", "result": {"query": c["query"]}, "duration": 0.1} for c in body["cases"]]
+        return httpx.Response(200, json={"results": rows, "total_time": 0.1})
+    return httpx.Response(200, json={"query": body["query"]})
+
+def test_batches_forwarded_as_ndjson(evaluation_api, monkeypatch):
+    """Test that cases go out in batches and come back as one NDJSON row each plus a summary."""
+    monkeypatch.setattr(main, "EVAL_BATCH_SIZE", 2)
+    calls = evaluation_api(batch_ok)
+    rows = run(main.EvaluationRequest(test_cases=cases(5)))
+
+    assert [c.url.path for c in calls].count("/evaluate/batch") == 2
+    assert [c.url.path for c in calls].count("/evaluate/comprehensive") == 1  # the chunk of one
+    results = sorted(rows[:-1], key=lambda r: r["index"])
+    assert [r["index"] for r in results] == [0, 1, 2, 3, 4]
+    assert all(r["status"] == "ok" and r["result"]["query"] == f"q{r['index']}" for r in results)
+    assert rows[-1]["summary"]["total"] == 5 and rows[-1]["summary"]["failed"] == 0
+
+def test_fallback_without_batch_endpoint(evaluation_api, monkeypatch):
+    """Test per-case forwarding when /evaluate/batch answers 404 or 405."""
+    monkeypatch.setattr(main, "EVAL_BATCH_SIZE", 4)
+    for status in (404, 405):
+        main.batch_endpoint_available = None
+
+        def handler(request):
+            if request.url.path == "/evaluate/batch":
+                return httpx.Response(status, json={"detail": "Not Found"})
+            return httpx.Response(200, json={"query": json.loads(request.content)["query"]})
+
+        calls = evaluation_api(handler)
+        rows = run(main.EvaluationRequest(test_cases=cases(8)))
+        paths = [c.url.path for c in calls]
+        # Probed once, then every case goes to /evaluate/comprehensive
+        assert 1 <= paths.count("/evaluate/batch") <= 2
+        assert paths.count("/evaluate/comprehensive") == 8
+        assert main.batch_endpoint_available is False
+        assert sorted(r["index"] for r in rows[:-1]) == list(range(8))
+        assert rows[-1]["summary"]["succeeded"] == 8
+
+def test_short_batch_response_reports_missing_cases(evaluation_api, monkeypatch):
+    """Test that cases missing from a batch response become error rows instead of disappearing."""
+    monkeypatch.setattr(main, "EVAL_BATCH_SIZE", 4)
+
+    def handler(request):
+        body = json.loads(request.content)
+        rows = [{"status": "ok", "result": {}, "duration": 0.1} for _ in body["cases"][:2]]
+        return httpx.Response(200, json={"results": rows})
+
+    evaluation_api(handler)
+    rows = run(main.EvaluationRequest(test_cases=cases(4)))
+    results = sorted(rows[:-1], key=lambda r: r["index"])
+    assert [r["status"] for r in results] == ["ok", "ok", "error", "error"]
+    assert "Missing from batch response" in results[2]["error"]
+    assert rows[-1]["summary"]["total"] == 4 and rows[-1]["summary"]["failed"] == 2
+
+def test_non_json_batch_response(evaluation_api):
+    """Test that an unparseable 200 fails its cases without aborting the stream."""
+    evaluation_api(lambda request: httpx.Response(200, content=b"<html>proxy error</html>"))
+    rows = run(main.EvaluationRequest(test_cases=cases(3)))
+    assert len(rows) == 4
+    assert all(r["status"] == "error" and "Invalid batch response" in r["error"] for r in rows[:-1])
+    assert rows[-1]["summary"]["failed"] == 3